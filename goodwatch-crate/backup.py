@@ -8,12 +8,24 @@
 
 import requests
 import datetime
+import os
+import shutil
+import sys
 import time
+from pathlib import Path
+
+# Prometheus textfile helpers shared by the backup scripts, from the monorepo checkout the cron job runs in
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "goodwatch-metrics"))
+from textfile_metrics import backup_metric, previous_metric_value, throughput_megabytes_per_second, write_metrics_textfile  # noqa: E402
 
 # --- CONFIGURATION ---
 CRATE_HOST = "http://10.0.0.11:4200"
 REPO_NAME = "goodwatch-db-backup"
 RETENTION_DAYS = 90
+# Host path of the snapshot repository (mounted as /snapshots into the crate container)
+REPO_PATH = Path(os.getenv("CRATE_BACKUP_REPO_PATH", "/mnt/backup-cratedb/snapshots"))
+# Picked up by node-exporter's textfile collector, which Alloy scrapes
+METRICS_TEXTFILE = Path(os.getenv("BACKUP_METRICS_TEXTFILE", "/var/lib/node_exporter/textfile/goodwatch_crate_backup.prom"))
 # ---------------------
 
 SQL_URL = f"{CRATE_HOST}/_sql"
@@ -28,29 +40,67 @@ def run_sql(stmt):
         print(f"Error executing SQL: {stmt}\n{e}")
         return None
 
+def bytes_written_since(path, since):
+    """
+    Size of the files in the snapshot repository written at or after `since` (unix time), None if
+    it is not mounted on this host. Snapshots are incremental and only add files, so this is what
+    the run wrote, from a single walk of the repository.
+    """
+    if not path.exists():
+        return None
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                stat = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            if stat.st_mtime >= since:
+                total += stat.st_size
+    return total
+
 def create_snapshot():
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     snapshot_name = f"snap_{timestamp}"
     print(f"Creating snapshot: {snapshot_name}...")
-    
+    result = {"snapshot": snapshot_name, "success": False}
+
+    started_at = time.time()
+    started = time.monotonic()
+
     # wait_for_completion=true ensures we don't exit until Crate finishes writing
     stmt = f"CREATE SNAPSHOT \"{REPO_NAME}\".\"{snapshot_name}\" ALL WITH (wait_for_completion=true)"
     res = run_sql(stmt)
-    
+    result["duration_seconds"] = time.monotonic() - started
+
     if res and res.get('rowcount', -1) >= 0:
         print("Snapshot created successfully.")
+        result["success"] = True
     else:
         print("Snapshot creation failed.")
 
+    bytes_written = bytes_written_since(REPO_PATH, started_at)
+    if bytes_written is not None:
+        result["bytes_written"] = bytes_written
+
+    data = run_sql(
+        f"SELECT array_length(tables, 1) FROM sys.snapshots "
+        f"WHERE repository = '{REPO_NAME}' AND name = '{snapshot_name}'"
+    )
+    if data and data.get('rows'):
+        result["tables"] = data['rows'][0][0] or 0
+    return result
+
 def clean_old_snapshots():
     print("Checking for expired snapshots...")
-    
+    result = {"deleted": 0, "retained": 0}
+
     # CrateDB stores 'created' as a timestamp in milliseconds
     stmt = f"SELECT name, finished FROM sys.snapshots WHERE repository = '{REPO_NAME}'"
     data = run_sql(stmt)
-    
+
     if not data or 'rows' not in data:
-        return
+        return result
 
     current_ms = time.time() * 1000
     retention_ms = RETENTION_DAYS * 24 * 60 * 60 * 1000
@@ -63,7 +113,42 @@ def clean_old_snapshots():
         if snap_created < cutoff_ms:
             print(f"Deleting expired snapshot: {snap_name}")
             run_sql(f"DROP SNAPSHOT \"{REPO_NAME}\".\"{snap_name}\"")
+            result["deleted"] += 1
+        else:
+            result["retained"] += 1
+    return result
+
+# --- METRICS ---
+
+def report_metrics(snapshot, cleanup):
+    # Crate snapshots all tables as one unit, so durations are per snapshot (target="all")
+    base = {"service": "crate"}
+    target = {**base, "target": "all"}
+    now = time.time()
+    metrics = [
+        backup_metric("goodwatch_backup_success", [(target, 1 if snapshot["success"] else 0)]),
+        backup_metric("goodwatch_backup_duration_seconds", [(target, round(snapshot["duration_seconds"], 3))]),
+        ("goodwatch_backup_snapshot_tables", "Tables included in the snapshot",
+            [(target, snapshot.get("tables", 0))]),
+        backup_metric("goodwatch_backup_tier_snapshots", [({**base, "tier": f"{RETENTION_DAYS}d"}, cleanup["retained"])]),
+        ("goodwatch_backup_deleted_snapshots", "Expired snapshots deleted in the last run",
+            [(base, cleanup["deleted"])]),
+        backup_metric("goodwatch_backup_last_run_timestamp_seconds", [(base, int(now))]),
+    ]
+    if "bytes_written" in snapshot:
+        metrics.append(backup_metric("goodwatch_backup_bytes_written", [(target, snapshot["bytes_written"])]))
+        metrics.append(backup_metric("goodwatch_backup_throughput_megabytes_per_second",
+            [(target, throughput_megabytes_per_second(snapshot["bytes_written"], snapshot["duration_seconds"]))]))
+    if REPO_PATH.exists():
+        disk = shutil.disk_usage(REPO_PATH)
+        metrics.append(backup_metric("goodwatch_backup_disk_free_bytes", [(base, disk.free)]))
+        metrics.append(backup_metric("goodwatch_backup_disk_total_bytes", [(base, disk.total)]))
+    last_success = now if snapshot["success"] else previous_metric_value(METRICS_TEXTFILE, "goodwatch_backup_last_success_timestamp_seconds")
+    if last_success:
+        metrics.append(backup_metric("goodwatch_backup_last_success_timestamp_seconds", [(base, int(last_success))]))
+    write_metrics_textfile(METRICS_TEXTFILE, metrics)
 
 if __name__ == "__main__":
-    create_snapshot()
-    clean_old_snapshots()
\ No newline at end of file
+    snapshot_result = create_snapshot()
+    cleanup_result = clean_old_snapshots()
+    report_metrics(snapshot_result, cleanup_result)
@@ -5,6 +5,7 @@ from psycopg2.extras import execute_values
 
 from f.db.mongodb import init_mongodb, close_mongodb
 from f.db.postgres import init_postgres, generate_upsert_query
+from f.utils.instrumentation import SyncMetrics, bson_bytes, json_bytes
 
 
 BATCH_SIZE = 1000
@@ -21,6 +22,7 @@ def init_postgres_tables(pg):
 
 
 def copy_collections(pg):
+    metrics = SyncMetrics("copy_collections")
     pg_cursor = pg.cursor()
     mongo_db = get_db()
 
@@ -34,36 +36,43 @@ def copy_collections(pg):
         "updated_at",
     ]
 
-    unique_collections = mongo_db.tmdb_movie_details.aggregate([
-        {"$match": {"belongs_to_collection.id": {"$ne": None}}},
-        {"$group": {
-            "_id": "$belongs_to_collection.id",
-            "collection": {"$first": "$belongs_to_collection"},
-            "tmdb_ids": {"$push": "$tmdb_id"}
-        }}
-    ])
-
-    batch_data = []
-    for result in unique_collections:
-        collection = result["collection"]
-        batch_data.append((
-            collection.get('id'),
-            collection.get('name'),
-            collection.get('poster_path'),
-            collection.get('backdrop_path'),
-            result['tmdb_ids'],
-            datetime.utcnow()
-        ))
-
-    for i in range(0, len(batch_data), BATCH_SIZE):
-        batch = batch_data[i:i + BATCH_SIZE]
-        query = generate_upsert_query(table_name, columns)
-        execute_values(pg_cursor, query, batch)
-        pg.commit()
+    with metrics.stage("mongo_read") as stage:
+        unique_collections = mongo_db.tmdb_movie_details.aggregate([
+            {"$match": {"belongs_to_collection.id": {"$ne": None}}},
+            {"$group": {
+                "_id": "$belongs_to_collection.id",
+                "collection": {"$first": "$belongs_to_collection"},
+                "tmdb_ids": {"$push": "$tmdb_id"}
+            }}
+        ])
+
+        batch_data = []
+        for result in unique_collections:
+            stage.bytes += bson_bytes((result,))
+            collection = result["collection"]
+            batch_data.append((
+                collection.get('id'),
+                collection.get('name'),
+                collection.get('poster_path'),
+                collection.get('backdrop_path'),
+                result['tmdb_ids'],
+                datetime.utcnow()
+            ))
+        stage.rows = len(batch_data)
+
+    with metrics.stage("postgres_write") as stage:
+        for i in range(0, len(batch_data), BATCH_SIZE):
+            batch = batch_data[i:i + BATCH_SIZE]
+            query = generate_upsert_query(table_name, columns)
+            execute_values(pg_cursor, query, batch)
+            stage.bytes += json_bytes(batch)
+            pg.commit()
+        stage.rows = len(batch_data)
 
     pg_cursor.close()
     return {
-        "total_count": len(batch_data)
+        "total_count": len(batch_data),
+        "metrics": metrics.finish(),
     }
 
 
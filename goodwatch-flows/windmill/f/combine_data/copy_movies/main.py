@@ -4,12 +4,14 @@ from collections import defaultdict
 from mongoengine import get_db
 from psycopg2.extras import execute_values
 
+from f.data_source.id_filter import existing_ids
 from f.db.mongodb import (
     init_mongodb,
     close_mongodb,
     build_query_selector_for_object_ids,
 )
 from f.db.postgres import init_postgres, generate_upsert_query
+from f.utils.instrumentation import SyncMetrics, bson_bytes, json_bytes
 
 
 BATCH_SIZE = 1000
@@ -27,6 +29,9 @@ def init_postgres_tables(pg):
 
 
 def fetch_documents_in_batch(tmdb_ids, collection):
+    tmdb_ids = existing_ids(collection, tmdb_ids)
+    if not tmdb_ids:
+        return {}
     return {
         doc["tmdb_id"]: doc for doc in collection.find({"tmdb_id": {"$in": tmdb_ids}})
     }
@@ -57,6 +62,7 @@ def fetch_collections_by_tmdb_id(pg):
 
 
 def copy_movies(pg, query_selector: dict = {}):
+    metrics = SyncMetrics("copy_movies")
     pg_cursor = pg.cursor()
     mongo_db = get_db()
 
@@ -150,7 +156,9 @@ def copy_movies(pg, query_selector: dict = {}):
 
     while True:
         aggregated_data = []
+        batch_no = start // BATCH_SIZE
 
+        stage = metrics.begin("mongo_read", batch_no)
         tmdb_details_batch = list(
             # mongo_db.tmdb_movie_details.find({"original_title": "The Matrix"})
             mongo_db.tmdb_movie_details.find(query_selector)
@@ -159,6 +167,7 @@ def copy_movies(pg, query_selector: dict = {}):
                 .limit(BATCH_SIZE)
         )
         if not tmdb_details_batch:
+            metrics.end(stage)
             break
 
         tmdb_ids = [doc["tmdb_id"] for doc in tmdb_details_batch]
@@ -177,7 +186,23 @@ def copy_movies(pg, query_selector: dict = {}):
         tmdb_providers = fetch_documents_in_batch(
             tmdb_ids, mongo_db.tmdb_movie_providers
         )
+        metrics.end(
+            stage,
+            rows=len(tmdb_details_batch),
+            bytes_=bson_bytes(tmdb_details_batch) + sum(
+                bson_bytes(docs.values())
+                for docs in (
+                    imdb_ratings,
+                    metacritic_ratings,
+                    rotten_tomatoes_ratings,
+                    tv_tropes_tags,
+                    genomes,
+                    tmdb_providers,
+                )
+            ),
+        )
 
+        stage = metrics.begin("transform", batch_no)
         for tmdb_details in tmdb_details_batch:
             tmdb_id = tmdb_details["tmdb_id"]
 
@@ -441,6 +466,8 @@ def copy_movies(pg, query_selector: dict = {}):
             )
             aggregated_data.append(data)
 
+        metrics.end(stage, rows=len(aggregated_data))
+
         print(f"executing batch from {start} to {start + len(aggregated_data)} movies")
         query = generate_upsert_query(table_name, columns)
 
@@ -449,7 +476,10 @@ def copy_movies(pg, query_selector: dict = {}):
             tmdb_id = row[0]
             unique_rows[tmdb_id] = row
 
-        execute_values(pg_cursor, query, list(unique_rows.values()))
+        stage = metrics.begin("postgres_write", batch_no)
+        rows = list(unique_rows.values())
+        execute_values(pg_cursor, query, rows)
+        stage.bytes = json_bytes(rows)
         #execute_values(pg_cursor, query, aggregated_data)
 
         try:
@@ -459,10 +489,11 @@ def copy_movies(pg, query_selector: dict = {}):
             print("An error occurred:", e)
             pg.rollback()
 
+        metrics.end(stage, rows=len(rows))
         start += BATCH_SIZE
 
     pg_cursor.close()
-    return {"total_count": total_count}
+    return {"total_count": total_count, "metrics": metrics.finish()}
 
 
 def main(movie_ids: list[str] = []):
@@ -5,6 +5,7 @@ from psycopg2.extras import execute_values
 
 from f.db.mongodb import init_mongodb, close_mongodb
 from f.db.postgres import init_postgres, generate_upsert_query
+from f.utils.instrumentation import SyncMetrics, bson_bytes, json_bytes
 
 
 BATCH_SIZE = 1000
@@ -21,6 +22,7 @@ def init_postgres_tables(pg):
 
 
 def copy_networks(pg):
+    metrics = SyncMetrics("copy_networks")
     pg_cursor = pg.cursor()
     mongo_db = get_db()
 
@@ -34,40 +36,47 @@ def copy_networks(pg):
         "updated_at",
     ]
 
-    unique_networks = mongo_db.tmdb_tv_details.aggregate([
-        {"$match": {"networks.id": {"$ne": None}}},
-        {"$unwind": "$networks"},
-        {"$group": {
-            "_id": "$networks.id",
-            "network": {"$first": "$networks"},
-            "tv_ids": {"$push": "$tmdb_id"}
-        }}
-    ])
-
-    batch_data = []
-    for result in unique_networks:
-        network = result["network"]
-        batch_data.append((
-            network.get('id'),
-            network.get('name'),
-            network.get('logo_path'),
-            network.get('origin_country'),
-            result['tv_ids'],
-            datetime.utcnow()
-        ))
+    with metrics.stage("mongo_read") as stage:
+        unique_networks = mongo_db.tmdb_tv_details.aggregate([
+            {"$match": {"networks.id": {"$ne": None}}},
+            {"$unwind": "$networks"},
+            {"$group": {
+                "_id": "$networks.id",
+                "network": {"$first": "$networks"},
+                "tv_ids": {"$push": "$tmdb_id"}
+            }}
+        ])
+
+        batch_data = []
+        for result in unique_networks:
+            stage.bytes += bson_bytes((result,))
+            network = result["network"]
+            batch_data.append((
+                network.get('id'),
+                network.get('name'),
+                network.get('logo_path'),
+                network.get('origin_country'),
+                result['tv_ids'],
+                datetime.utcnow()
+            ))
+        stage.rows = len(batch_data)
 
     print(f"selected {len(batch_data)} networks")
 
-    for i in range(0, len(batch_data), BATCH_SIZE):
-        print(f"processing {i} to {i + BATCH_SIZE} networks")
-        batch = batch_data[i:i + BATCH_SIZE]
-        query = generate_upsert_query(table_name, columns)
-        execute_values(pg_cursor, query, batch)
-        pg.commit()
+    with metrics.stage("postgres_write") as stage:
+        for i in range(0, len(batch_data), BATCH_SIZE):
+            print(f"processing {i} to {i + BATCH_SIZE} networks")
+            batch = batch_data[i:i + BATCH_SIZE]
+            query = generate_upsert_query(table_name, columns)
+            execute_values(pg_cursor, query, batch)
+            stage.bytes += json_bytes(batch)
+            pg.commit()
+        stage.rows = len(batch_data)
 
     pg_cursor.close()
     return {
-        "total_count": len(batch_data)
+        "total_count": len(batch_data),
+        "metrics": metrics.finish(),
     }
 
 
@@ -5,6 +5,7 @@ from psycopg2.extras import execute_values
 
 from f.db.mongodb import init_mongodb, close_mongodb
 from f.db.postgres import init_postgres, generate_upsert_query
+from f.utils.instrumentation import SyncMetrics, bson_bytes, json_bytes
 
 
 BATCH_SIZE = 10000
@@ -21,6 +22,7 @@ def init_postgres_tables(pg):
 
 
 def copy_production_companies(pg):
+    metrics = SyncMetrics("copy_production_companies")
     pg_cursor = pg.cursor()
     mongo_db = get_db()
 
@@ -35,51 +37,55 @@ def copy_production_companies(pg):
         "updated_at",
     ]
 
-    unique_movie_production_companies = mongo_db.tmdb_movie_details.aggregate([
-        {"$match": {"production_companies.id": {"$ne": None}}},
-        {"$unwind": "$production_companies"},
-        {"$group": {
-            "_id": "$production_companies.id",
-            "production_company": {"$first": "$production_companies"},
-            "movie_ids": {"$push": "$tmdb_id"},
-        }}
-    ])
-
-    unique_tv_production_companies = mongo_db.tmdb_tv_details.aggregate([
-        {"$match": {"production_companies.id": {"$ne": None}}},
-        {"$unwind": "$production_companies"},
-        {"$group": {
-            "_id": "$production_companies.id",
-            "production_company": {"$first": "$production_companies"},
-            "tv_ids": {"$push": "$tmdb_id"},
-        }}
-    ])
-
-    merged_production_companies = {}
-
-    # Process movie production companies
-    for result in unique_movie_production_companies:
-        production_company = result["production_company"]
-        company_id = production_company.get('id')
-        merged_production_companies[company_id] = {
-            'production_company': production_company,
-            'movie_ids': result['movie_ids'],
-            'tv_ids': [],
-        }
-
-    # Process TV production companies
-    for result in unique_tv_production_companies:
-        production_company = result["production_company"]
-        company_id = production_company.get('id')
-        if company_id in merged_production_companies:
-            merged_production_companies[company_id]['tv_ids'] = result['tv_ids']
-        else:
+    with metrics.stage("mongo_read") as stage:
+        unique_movie_production_companies = mongo_db.tmdb_movie_details.aggregate([
+            {"$match": {"production_companies.id": {"$ne": None}}},
+            {"$unwind": "$production_companies"},
+            {"$group": {
+                "_id": "$production_companies.id",
+                "production_company": {"$first": "$production_companies"},
+                "movie_ids": {"$push": "$tmdb_id"},
+            }}
+        ])
+
+        unique_tv_production_companies = mongo_db.tmdb_tv_details.aggregate([
+            {"$match": {"production_companies.id": {"$ne": None}}},
+            {"$unwind": "$production_companies"},
+            {"$group": {
+                "_id": "$production_companies.id",
+                "production_company": {"$first": "$production_companies"},
+                "tv_ids": {"$push": "$tmdb_id"},
+            }}
+        ])
+
+        merged_production_companies = {}
+
+        # Process movie production companies
+        for result in unique_movie_production_companies:
+            stage.bytes += bson_bytes((result,))
+            production_company = result["production_company"]
+            company_id = production_company.get('id')
             merged_production_companies[company_id] = {
                 'production_company': production_company,
-                'movie_ids': [],
-                'tv_ids': result['tv_ids'],
+                'movie_ids': result['movie_ids'],
+                'tv_ids': [],
             }
 
+        # Process TV production companies
+        for result in unique_tv_production_companies:
+            stage.bytes += bson_bytes((result,))
+            production_company = result["production_company"]
+            company_id = production_company.get('id')
+            if company_id in merged_production_companies:
+                merged_production_companies[company_id]['tv_ids'] = result['tv_ids']
+            else:
+                merged_production_companies[company_id] = {
+                    'production_company': production_company,
+                    'movie_ids': [],
+                    'tv_ids': result['tv_ids'],
+                }
+        stage.rows = len(merged_production_companies)
+
     print(f"selected {len(merged_production_companies.keys())} production_companies")
 
     # Prepare batch data
@@ -96,16 +102,20 @@ def copy_production_companies(pg):
             datetime.utcnow(),
         ))
 
-    for i in range(0, len(batch_data), BATCH_SIZE):
-        print(f"processing {i} to {i + BATCH_SIZE} production companies")
-        batch = batch_data[i:i + BATCH_SIZE]
-        query = generate_upsert_query(table_name, columns)
-        execute_values(pg_cursor, query, batch)
-        pg.commit()
+    with metrics.stage("postgres_write") as stage:
+        for i in range(0, len(batch_data), BATCH_SIZE):
+            print(f"processing {i} to {i + BATCH_SIZE} production companies")
+            batch = batch_data[i:i + BATCH_SIZE]
+            query = generate_upsert_query(table_name, columns)
+            execute_values(pg_cursor, query, batch)
+            stage.bytes += json_bytes(batch)
+            pg.commit()
+        stage.rows = len(batch_data)
 
     pg_cursor.close()
     return {
-        "total_count": len(batch_data)
+        "total_count": len(batch_data),
+        "metrics": metrics.finish(),
     }
 
 
@@ -1,6 +1,7 @@
 from collections import defaultdict
 
 from f.db.postgres import init_postgres
+from f.utils.instrumentation import SyncMetrics
 
 
 BATCH_SIZE = 1000
@@ -76,6 +77,7 @@ def batch_update_streaming_country_codes(pg_cursor, media_type, updates):
 
 
 def copy_streaming_countries(pg):
+    metrics = SyncMetrics("copy_streaming_countries")
     pg_cursor = pg.cursor()
 
     media_types = ["movie", "tv"]
@@ -87,11 +89,13 @@ def copy_streaming_countries(pg):
 
         while True:
             # Step 1: Get the next batch of tmdb_id's for the current media_type
+            stage = metrics.begin("postgres_read")
             tmdb_ids = get_next_batch_of_tmdb_ids(pg_cursor, media_type, last_id)
 
             if not tmdb_ids:
                 print(f"No more TMDB IDs to process for {media_type}.")
                 counts[media_type] = start
+                metrics.end(stage)
                 break  # Exit the loop if no more IDs are found
 
             end = start + len(tmdb_ids)
@@ -102,6 +106,7 @@ def copy_streaming_countries(pg):
 
             # Step 2: Fetch distinct country codes for each tmdb_id within the current media_type
             results = fetch_country_codes_for_ids(pg_cursor, media_type, tmdb_ids)
+            metrics.end(stage, rows=len(results))
             countries_by_tmdb_id = defaultdict(list)
             for row in results:
                 countries_by_tmdb_id[row[0]].append(row[1])
@@ -111,8 +116,10 @@ def copy_streaming_countries(pg):
                 for tmdb_id, country_codes in countries_by_tmdb_id.items()
             ]
             if updates:
+                stage = metrics.begin("postgres_write")
                 batch_update_streaming_country_codes(pg_cursor, media_type, updates)
                 pg.commit()
+                metrics.end(stage, rows=len(updates), bytes_=len(pg_cursor.query))
 
             # for tmdb_id, country_codes in countries_by_tmdb_id.items():
             #    # Update the relevant table with the aggregated country codes
@@ -124,7 +131,7 @@ def copy_streaming_countries(pg):
             last_id = tmdb_ids[-1]
 
     pg_cursor.close()
-    return {"total_counts": counts}
+    return {"total_counts": counts, "metrics": metrics.finish()}
 
 
 def main():
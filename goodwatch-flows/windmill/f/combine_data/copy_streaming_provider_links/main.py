@@ -3,15 +3,30 @@
 
 from datetime import datetime
 import gc
+from typing import Dict, Optional
 
 from mongoengine import get_db
 from psycopg2.extras import execute_batch, execute_values
 from wmill import set_progress
 
 from f.db.mongodb import init_mongodb
-from f.db.postgres import init_postgres, generate_insert_query
+from f.db.postgres import init_postgres, generate_insert_query, copy_rows
+from f.utils.instrumentation import SyncMetrics, bson_bytes, json_bytes
 
 BATCH_SIZE = 5000
+STAGE_TABLE = "streaming_provider_links_stage"
+STAGE_SCOPE_TABLE = "streaming_provider_links_stage_scope"
+STAGE_COLUMNS = [
+    "tmdb_id",
+    "tmdb_url",
+    "provider_id",
+    "country_code",
+    "stream_url",
+    "stream_type",
+    "price_dollar",
+    "quality",
+    "display_priority",
+]
 
 
 def init_postgres_tables(pg):
@@ -78,8 +93,14 @@ def process_link(
 
 
 def copy_streaming_provider_links(
-    pg, media_type, mongo_collection, details_collection, query_selector: dict = {}
+    pg,
+    media_type,
+    mongo_collection,
+    details_collection,
+    query_selector: dict = {},
+    metrics: Optional[SyncMetrics] = None,
 ):
+    metrics = metrics or SyncMetrics(f"copy_streaming_provider_links_{media_type}")
     mongo_db = get_db()
     pg_cursor = pg.cursor()
 
@@ -121,6 +142,7 @@ def copy_streaming_provider_links(
         print(f"Processing records {i} to {end}...")
         #set_progress((BATCH_SIZE / count) / 2)
 
+        stage = metrics.begin("mongo_read", i // BATCH_SIZE)
         providers = list(
             mongo_db[mongo_collection]
                 .find(query_selector)
@@ -128,12 +150,14 @@ def copy_streaming_provider_links(
                 .skip(i)
                 .limit(BATCH_SIZE)
         )
+        metrics.end(stage, rows=len(providers), bytes_=bson_bytes(providers))
         now = datetime.utcnow()
 
         # Collect tmdb_ids for fetching existing links and details
         tmdb_ids = [p.get("tmdb_id") for p in providers]
 
         # Fetch existing streaming links from the database
+        stage = metrics.begin("postgres_read", i // BATCH_SIZE)
         placeholders = ",".join(["%s"] * len(tmdb_ids))
         pg_cursor.execute(
             f"""
@@ -153,6 +177,7 @@ def copy_streaming_provider_links(
             tmdb_ids + [media_type],
         )
         existing_links = pg_cursor.fetchall()
+        metrics.end(stage, rows=len(existing_links))
         print(f"  Fetched {len(existing_links)} streaming links rows from target table")
 
         # Build a dictionary for existing links
@@ -182,8 +207,10 @@ def copy_streaming_provider_links(
             }
 
         # Fetch details documents for these tmdb_ids
-        details_docs = mongo_db[details_collection].find({"tmdb_id": {"$in": tmdb_ids}})
+        stage = metrics.begin("mongo_read", i // BATCH_SIZE)
+        details_docs = list(mongo_db[details_collection].find({"tmdb_id": {"$in": tmdb_ids}}))
         tmdb_id_to_details = {doc["tmdb_id"]: doc for doc in details_docs}
+        metrics.end(stage, rows=len(details_docs), bytes_=bson_bytes(details_docs))
         print(
             f"  Fetched {len(tmdb_id_to_details.keys())} docs from details collection"
         )
@@ -324,6 +351,9 @@ def copy_streaming_provider_links(
 
             print("")
 
+            stage = metrics.begin("postgres_write", i // BATCH_SIZE)
+            written_rows = len(batch_update_data) + len(batch_obsolete_links) + len(batch_insert_data)
+
             # Update existing links
             if batch_update_data:
                 print(f"  Updating {len(batch_update_data)} existing links...")
@@ -339,6 +369,7 @@ def copy_streaming_provider_links(
                       AND stream_type = %(stream_type)s;
                 """
                 execute_batch(pg_cursor, update_query, batch_update_data)
+                stage.bytes += json_bytes(batch_update_data)
 
             # Mark obsolete links
             if batch_obsolete_links:
@@ -352,15 +383,18 @@ def copy_streaming_provider_links(
                       AND stream_type = %(stream_type)s;
                 """
                 execute_batch(pg_cursor, obsolete_query, batch_obsolete_links)
+                stage.bytes += json_bytes(batch_obsolete_links)
 
             # Insert new links
             if batch_insert_data:
                 print(f"  Inserting {len(batch_insert_data)} new links...")
                 insert_query = generate_insert_query(table_name, columns)
                 execute_values(pg_cursor, insert_query, batch_insert_data)
+                stage.bytes += json_bytes(batch_insert_data)
 
             # Commit the transaction for this batch
             pg_cursor.execute("COMMIT")
+            metrics.end(stage, rows=written_rows)
 
             print("------------------")
 
@@ -386,27 +420,303 @@ def copy_streaming_provider_links(
     return count
 
 
-def main():
+def staged_links_for_provider(provider, details_doc, provider_lookup):
+    """
+    Links of one provider document (one tmdb_id in one country) as staging rows.
+    Same merge as the row-wise copy: crawled links first, then links only known from the details.
+    Missing values get the defaults of the row-wise copy, links without stream_type (part of the
+    link key) are left out, so the COPY never hits a NOT NULL column.
+    """
+    tmdb_id = provider.get("tmdb_id")
+    country_code = provider.get("country_code")
+    tmdb_watch_url = provider.get("tmdb_watch_url") or ""
+    display_priority = 1
+    seen = set()
+
+    for link in provider.get("streaming_links") or []:
+        provider_id = provider_lookup.get(link.get("provider_name"))
+        if not provider_id:
+            continue
+        stream_type = link.get("stream_type")
+        if not stream_type:
+            continue
+        seen.add((provider_id, stream_type))
+        yield (
+            tmdb_id,
+            tmdb_watch_url,
+            provider_id,
+            country_code,
+            link.get("stream_url") or "",
+            stream_type,
+            link.get("price_dollar"),
+            link.get("quality") or "",
+            display_priority,
+        )
+        display_priority += 1
+
+    if not details_doc:
+        return
+    country_data = dict(
+        ((details_doc.get("watch_providers") or {}).get("results") or {}).get(country_code) or {}
+    )
+    tmdb_url = country_data.pop("link", None) or tmdb_watch_url
+    for stream_type, providers_list in country_data.items():
+        if not stream_type or not isinstance(providers_list, list):
+            continue
+        for p_info in providers_list:
+            provider_id = provider_lookup.get(p_info.get("provider_name"))
+            if not provider_id or (provider_id, stream_type) in seen:
+                continue
+            seen.add((provider_id, stream_type))
+            yield (
+                tmdb_id,
+                tmdb_url,
+                provider_id,
+                country_code,
+                "",
+                stream_type,
+                None,
+                "",
+                display_priority,
+            )
+            display_priority += 1
+
+
+def stage_streaming_provider_links(
+    pg_cursor,
+    mongo_db,
+    mongo_collection,
+    details_collection,
+    query_selector,
+    provider_lookup,
+    stats: Optional[Dict[str, int]] = None,
+):
+    """
+    Stream the provider collection once and COPY all links plus the covered (tmdb_id, country_code)
+    scope into staging tables. They are temporary to this session and dropped with the commit of
+    the reconcile transaction, so concurrent runs never see each other's rows.
+    With `stats`, the size of the read documents is added to stats["read_bytes"] and the size
+    of the COPY payload to stats["bytes"].
+    """
+    stats = stats if stats is not None else {}
+    pg_cursor.execute(f"""
+        CREATE TEMP TABLE {STAGE_TABLE} (
+            tmdb_id INTEGER NOT NULL,
+            tmdb_url TEXT NOT NULL,
+            provider_id INTEGER NOT NULL,
+            country_code CHAR(2) NOT NULL,
+            stream_url TEXT NOT NULL,
+            stream_type VARCHAR(16) NOT NULL,
+            price_dollar FLOAT,
+            quality VARCHAR(16) NOT NULL,
+            display_priority INTEGER NOT NULL
+        ) ON COMMIT DROP;
+        CREATE TEMP TABLE {STAGE_SCOPE_TABLE} (
+            tmdb_id INTEGER NOT NULL,
+            country_code CHAR(2) NOT NULL
+        ) ON COMMIT DROP;
+    """)
+
+    scope = []
+
+    def provider_rows():
+        cursor = (
+            mongo_db[mongo_collection]
+            .find(
+                query_selector,
+                {"_id": 0, "tmdb_id": 1, "country_code": 1, "tmdb_watch_url": 1, "streaming_links": 1},
+            )
+            .batch_size(BATCH_SIZE)
+        )
+        batch = []
+        for provider in cursor:
+            stats["read_bytes"] = stats.get("read_bytes", 0) + bson_bytes((provider,))
+            if provider.get("tmdb_id") is None or not provider.get("country_code"):
+                continue
+            batch.append(provider)
+            if len(batch) >= BATCH_SIZE:
+                yield from _rows_for_batch(batch)
+                batch = []
+        if batch:
+            yield from _rows_for_batch(batch)
+
+    def _rows_for_batch(providers):
+        tmdb_ids = list({p["tmdb_id"] for p in providers})
+        details_docs = list(mongo_db[details_collection].find(
+            {"tmdb_id": {"$in": tmdb_ids}},
+            {"_id": 0, "tmdb_id": 1, "watch_providers.results": 1},
+        ))
+        stats["read_bytes"] = stats.get("read_bytes", 0) + bson_bytes(details_docs)
+        tmdb_id_to_details = {doc["tmdb_id"]: doc for doc in details_docs}
+        for provider in providers:
+            scope.append((provider["tmdb_id"], provider["country_code"]))
+            yield from staged_links_for_provider(
+                provider, tmdb_id_to_details.get(provider["tmdb_id"]), provider_lookup
+            )
+        print(f"  Staged links for {len(scope)} provider documents")
+
+    staged_count = copy_rows(pg_cursor, STAGE_TABLE, STAGE_COLUMNS, provider_rows(), stats=stats)
+    copy_rows(pg_cursor, STAGE_SCOPE_TABLE, ["tmdb_id", "country_code"], scope, stats=stats)
+    pg_cursor.execute(f"ANALYZE {STAGE_TABLE}; ANALYZE {STAGE_SCOPE_TABLE};")
+    return staged_count, len(scope)
+
+
+def reconcile_streaming_provider_links(
+    pg,
+    media_type,
+    mongo_collection,
+    details_collection,
+    query_selector: dict = {},
+    metrics: Optional[SyncMetrics] = None,
+):
+    """
+    Set-based variant of `copy_streaming_provider_links`: stage all crawled links with COPY and
+    apply updates, reactivations, obsolete marks and inserts with one statement each.
+    """
+    metrics = metrics or SyncMetrics(f"copy_streaming_provider_links_{media_type}")
+    mongo_db = get_db()
+    pg_cursor = pg.cursor()
+
+    pg_cursor.execute("SELECT id, name FROM streaming_providers;")
+    provider_lookup = {name: id for id, name in pg_cursor.fetchall()}
+
+    now = datetime.utcnow()
+    # reading the provider documents and the COPY into the staging tables are interleaved,
+    # so they are one stage that counts the bytes of both
+    with metrics.stage("stage_links") as stage:
+        stage_stats = {}
+        staged_count, scope_count = stage_streaming_provider_links(
+            pg_cursor, mongo_db, mongo_collection, details_collection, query_selector, provider_lookup,
+            stats=stage_stats,
+        )
+        stage.rows = staged_count
+        stage.bytes = stage_stats.get("read_bytes", 0) + stage_stats.get("bytes", 0)
+    print(f"Staged {staged_count} {media_type} links from {scope_count} provider documents")
+    if not scope_count:
+        pg.commit()
+        pg_cursor.close()
+        return {"staged": 0}
+
+    # duplicated keys within one provider document keep their first occurrence
+    staged = f"""
+        SELECT DISTINCT ON (tmdb_id, provider_id, country_code, stream_type) *
+        FROM {STAGE_TABLE}
+        ORDER BY tmdb_id, provider_id, country_code, stream_type, display_priority
+    """
+    key_match = """
+        l.tmdb_id = s.tmdb_id
+        AND l.media_type = %(media_type)s
+        AND l.provider_id = s.provider_id
+        AND l.country_code = s.country_code
+        AND l.stream_type = s.stream_type
+    """
+    params = {"media_type": media_type, "now": now}
+    counts = {"staged": staged_count}
+
+    phases = {
+        "updated": f"""
+            UPDATE streaming_provider_links l
+            SET updated_at = %(now)s, price_dollar = s.price_dollar, quality = s.quality
+            FROM ({staged}) s
+            WHERE {key_match}
+              AND l.obsolete_at IS NULL
+              AND (l.price_dollar IS DISTINCT FROM s.price_dollar OR l.quality IS DISTINCT FROM s.quality)
+        """,
+        "reactivated": f"""
+            UPDATE streaming_provider_links l
+            SET updated_at = %(now)s, price_dollar = s.price_dollar, quality = s.quality, obsolete_at = NULL
+            FROM ({staged}) s
+            WHERE {key_match}
+              AND l.obsolete_at IS NOT NULL
+        """,
+        "obsoleted": f"""
+            UPDATE streaming_provider_links l
+            SET obsolete_at = %(now)s
+            FROM {STAGE_SCOPE_TABLE} sc
+            WHERE l.media_type = %(media_type)s
+              AND l.tmdb_id = sc.tmdb_id
+              AND l.country_code = sc.country_code
+              AND l.obsolete_at IS NULL
+              AND NOT EXISTS (SELECT 1 FROM {STAGE_TABLE} s WHERE {key_match})
+        """,
+        "inserted": f"""
+            INSERT INTO streaming_provider_links (
+                tmdb_id, tmdb_url, media_type, provider_id, country_code, stream_url,
+                stream_type, price_dollar, quality, display_priority, updated_at, obsolete_at
+            )
+            SELECT
+                s.tmdb_id, s.tmdb_url, %(media_type)s, s.provider_id, s.country_code, s.stream_url,
+                s.stream_type, s.price_dollar, s.quality, s.display_priority, %(now)s, NULL
+            FROM ({staged}) s
+            WHERE NOT EXISTS (SELECT 1 FROM streaming_provider_links l WHERE {key_match})
+        """,
+    }
+    try:
+        with metrics.stage("postgres_reconcile") as stage:
+            for change_type, query in phases.items():
+                pg_cursor.execute(query, params)
+                counts[change_type] = pg_cursor.rowcount
+                stage.rows += pg_cursor.rowcount
+                stage.bytes += len(pg_cursor.query)
+                print(f"  {change_type}: {pg_cursor.rowcount}")
+            pg.commit()
+    except Exception:
+        pg.rollback()
+        raise
+    finally:
+        pg_cursor.close()
+
+    return counts
+
+
+def main(mode: str = "set"):
     init_mongodb()
     pg = init_postgres()
+    tv_metrics = SyncMetrics("copy_streaming_provider_links_tv")
+    movie_metrics = SyncMetrics("copy_streaming_provider_links_movie")
+
+    if mode == "set":
+        tv_counts = reconcile_streaming_provider_links(
+            pg,
+            "tv",
+            "tmdb_tv_providers",
+            "tmdb_tv_details",
+            metrics=tv_metrics,
+        )
+        movie_counts = reconcile_streaming_provider_links(
+            pg,
+            "movie",
+            "tmdb_movie_providers",
+            "tmdb_movie_details",
+            metrics=movie_metrics,
+        )
+        pg.close()
+        return {
+            "tv": tv_counts,
+            "movie": movie_counts,
+            "metrics": {"tv": tv_metrics.finish(), "movie": movie_metrics.finish()},
+        }
 
     total_tv_count = copy_streaming_provider_links(
         pg,
         "tv",
         "tmdb_tv_providers",
         "tmdb_tv_details",
+        metrics=tv_metrics,
     )
     total_movie_count = copy_streaming_provider_links(
         pg,
         "movie",
         "tmdb_movie_providers",
         "tmdb_movie_details",
+        metrics=movie_metrics,
     )
 
     pg.close()
     return {
         "total_tv_count": total_tv_count,
         "total_movie_count": total_movie_count,
+        "metrics": {"tv": tv_metrics.finish(), "movie": movie_metrics.finish()},
     }
 
 
@@ -1,4 +1,5 @@
 from f.db.postgres import init_postgres
+from f.utils.instrumentation import SyncMetrics, json_bytes
 
 
 def init_postgres_tables(pg):
@@ -11,6 +12,7 @@ def init_postgres_tables(pg):
 
 
 def main():
+    metrics = SyncMetrics("copy_streaming_provider_ranking")
     pg = init_postgres()
     pg_cursor = pg.cursor()
 
@@ -35,16 +37,21 @@ def main():
     ORDER BY
       provider_count DESC;
     """
-    pg_cursor.execute(query)
-    rows = pg_cursor.fetchall()
+    with metrics.stage("postgres_read") as stage:
+        pg_cursor.execute(query)
+        rows = pg_cursor.fetchall()
+        stage.rows = len(rows)
     
     insert_query = f"""
     INSERT INTO {table_name} (id, name, logo_path, link_count)
     VALUES (%s, %s, %s, %s)
     """
-    pg_cursor.executemany(insert_query, [(row[0], row[1], row[2], row[3]) for row in rows])
-
-    pg.commit()
+    with metrics.stage("postgres_write") as stage:
+        values = [(row[0], row[1], row[2], row[3]) for row in rows]
+        pg_cursor.executemany(insert_query, values)
+        pg.commit()
+        stage.rows = len(values)
+        stage.bytes = json_bytes(values)
     pg_cursor.close()
     pg.close()
 
@@ -54,7 +61,7 @@ def main():
         "logo_path": row[2],
         "link_count": row[3]
     } for row in rows[:10]]
-    return {"count": len(rows), "top10": top10}
+    return {"count": len(rows), "top10": top10, "metrics": metrics.finish()}
 
 
 if __name__ == "__main__":
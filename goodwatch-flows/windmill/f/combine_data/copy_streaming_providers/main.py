@@ -8,6 +8,7 @@ from psycopg2.extras import execute_values
 
 from f.db.mongodb import init_mongodb, close_mongodb
 from f.db.postgres import init_postgres, generate_upsert_query
+from f.utils.instrumentation import SyncMetrics, bson_bytes, json_bytes
 
 
 BATCH_SIZE = 100
@@ -24,6 +25,7 @@ def init_postgres_tables(pg):
 
 
 def copy_streaming_providers(pg):
+    metrics = SyncMetrics("copy_streaming_providers")
     pg_cursor = pg.cursor()
     mongo_db = get_db()
 
@@ -70,32 +72,39 @@ def copy_streaming_providers(pg):
             "provider": {"$first": "$all_providers"},
         }}
     ]
-    unique_watch_providers = mongo_db.tmdb_movie_details.aggregate(pipeline)
-
-    now = datetime.utcnow()
-    batch_data = []
-    for result in unique_watch_providers:
-        provider = result["provider"]
-        batch_data.append((
-            provider.get('provider_id'),
-            provider.get('provider_name'),
-            provider.get('logo_path'),
-            provider.get('display_priority'),
-            now
-        ))
+    with metrics.stage("mongo_read") as stage:
+        unique_watch_providers = mongo_db.tmdb_movie_details.aggregate(pipeline)
+
+        now = datetime.utcnow()
+        batch_data = []
+        for result in unique_watch_providers:
+            stage.bytes += bson_bytes((result,))
+            provider = result["provider"]
+            batch_data.append((
+                provider.get('provider_id'),
+                provider.get('provider_name'),
+                provider.get('logo_path'),
+                provider.get('display_priority'),
+                now
+            ))
+        stage.rows = len(batch_data)
 
     print(f"selected {len(batch_data)} streaming providers")
 
-    for i in range(0, len(batch_data), BATCH_SIZE):
-        print(f"processing {i} to {i + BATCH_SIZE} streaming providers")
-        batch = batch_data[i:i + BATCH_SIZE]
-        query = generate_upsert_query(table_name, columns)
-        execute_values(pg_cursor, query, batch)
-        pg.commit()
+    with metrics.stage("postgres_write") as stage:
+        for i in range(0, len(batch_data), BATCH_SIZE):
+            print(f"processing {i} to {i + BATCH_SIZE} streaming providers")
+            batch = batch_data[i:i + BATCH_SIZE]
+            query = generate_upsert_query(table_name, columns)
+            execute_values(pg_cursor, query, batch)
+            stage.bytes += json_bytes(batch)
+            pg.commit()
+        stage.rows = len(batch_data)
 
     pg_cursor.close()
     return {
-        "total_count": len(batch_data)
+        "total_count": len(batch_data),
+        "metrics": metrics.finish(),
     }
 
 
@@ -4,12 +4,14 @@ from collections import defaultdict
 from mongoengine import get_db
 from psycopg2.extras import execute_values
 
+from f.data_source.id_filter import existing_ids
 from f.db.mongodb import (
     init_mongodb,
     close_mongodb,
     build_query_selector_for_object_ids,
 )
 from f.db.postgres import init_postgres, generate_upsert_query
+from f.utils.instrumentation import SyncMetrics, bson_bytes, json_bytes
 
 
 BATCH_SIZE = 1000
@@ -26,12 +28,16 @@ def init_postgres_tables(pg):
 
 
 def fetch_documents_in_batch(tmdb_ids, collection):
+    tmdb_ids = existing_ids(collection, tmdb_ids)
+    if not tmdb_ids:
+        return {}
     return {
         doc["tmdb_id"]: doc for doc in collection.find({"tmdb_id": {"$in": tmdb_ids}})
     }
 
 
 def copy_tv(pg, query_selector: dict = {}):
+    metrics = SyncMetrics("copy_tv")
     pg_cursor = pg.cursor()
     mongo_db = get_db()
 
@@ -132,7 +138,9 @@ def copy_tv(pg, query_selector: dict = {}):
 
     while True:
         aggregated_data = []
+        batch_no = start // BATCH_SIZE
 
+        stage = metrics.begin("mongo_read", batch_no)
         tmdb_details_batch = list(
             # mongo_db.tmdb_tv_details.find({"original_title": "Breaking Bad"})
             mongo_db.tmdb_tv_details
@@ -142,6 +150,7 @@ def copy_tv(pg, query_selector: dict = {}):
                 .limit(BATCH_SIZE)
         )
         if not tmdb_details_batch:
+            metrics.end(stage)
             break
 
         tmdb_ids = [doc["tmdb_id"] for doc in tmdb_details_batch]
@@ -156,7 +165,23 @@ def copy_tv(pg, query_selector: dict = {}):
         tv_tropes_tags = fetch_documents_in_batch(tmdb_ids, mongo_db.tv_tropes_tv_tags)
         genomes = fetch_documents_in_batch(tmdb_ids, mongo_db.genome_tv)
         tmdb_providers = fetch_documents_in_batch(tmdb_ids, mongo_db.tmdb_tv_providers)
+        metrics.end(
+            stage,
+            rows=len(tmdb_details_batch),
+            bytes_=bson_bytes(tmdb_details_batch) + sum(
+                bson_bytes(docs.values())
+                for docs in (
+                    imdb_ratings,
+                    metacritic_ratings,
+                    rotten_tomatoes_ratings,
+                    tv_tropes_tags,
+                    genomes,
+                    tmdb_providers,
+                )
+            ),
+        )
 
+        stage = metrics.begin("transform", batch_no)
         for tmdb_details in tmdb_details_batch:
             tmdb_id = tmdb_details["tmdb_id"]
 
@@ -444,6 +469,8 @@ def copy_tv(pg, query_selector: dict = {}):
             )
             aggregated_data.append(data)
 
+        metrics.end(stage, rows=len(aggregated_data))
+
         print(
             f"executing batch from {start} to {start + len(aggregated_data)} tv shows"
         )
@@ -453,7 +480,10 @@ def copy_tv(pg, query_selector: dict = {}):
         for row in aggregated_data:
             tmdb_id = row[0]
             unique_rows[tmdb_id] = row
-        execute_values(pg_cursor, query, list(unique_rows.values()))
+        stage = metrics.begin("postgres_write", batch_no)
+        rows = list(unique_rows.values())
+        execute_values(pg_cursor, query, rows)
+        stage.bytes = json_bytes(rows)
 
         try:
             pg.commit()
@@ -462,10 +492,11 @@ def copy_tv(pg, query_selector: dict = {}):
             print("An error occurred:", e)
             pg.rollback()
 
+        metrics.end(stage, rows=len(rows))
         start += BATCH_SIZE
 
     pg_cursor.close()
-    return {"total_count": total_count}
+    return {"total_count": total_count, "metrics": metrics.finish()}
 
 
 def main(tv_ids: list[str] = []):
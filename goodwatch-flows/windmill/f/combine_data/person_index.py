@@ -0,0 +1,293 @@
+import heapq
+import os
+import pickle
+import tempfile
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from mongoengine import get_db
+
+from f.db.mongodb import init_mongodb, close_mongodb
+from f.db.postgres import init_postgres, copy_rows
+from f.utils.instrumentation import SyncMetrics, bson_bytes
+
+# rough in-memory cost of one buffered credit (id, string, dict/set overhead)
+APPROX_BYTES_PER_CREDIT = 160
+DEFAULT_MEMORY_BUDGET_MB = 512
+FIND_BATCH_SIZE = 2000
+SPILL_CHUNK_SIZE = 5000
+
+PERSON_FIELDS = [
+    "name",
+    "original_name",
+    "gender",
+    "adult",
+    "popularity",
+    "profile_path",
+    "known_for_department",
+]
+
+# per role: target table, name of the details columns and how to read details from a credit
+ROLE_SPECS = {
+    "cast": {
+        "table": "cast",
+        "details_column": "characters",
+        "movie_path": "credits.cast",
+        "tv_path": "aggregate_credits.cast",
+        "movie_detail": lambda credit: [credit.get("character")],
+        "tv_detail": lambda credit: [role.get("character") for role in credit.get("roles") or []],
+    },
+    "crew": {
+        "table": "crew",
+        "details_column": "jobs",
+        "movie_path": "credits.crew",
+        "tv_path": "aggregate_credits.crew",
+        "movie_detail": lambda credit: [credit.get("job")],
+        "tv_detail": lambda credit: [job.get("job") for job in credit.get("jobs") or []],
+    },
+}
+
+# buffered entry: [person attributes, movie details, movie ids, tv details, tv ids]
+PersonEntry = List
+
+
+def _table_columns(role: str) -> List[str]:
+    details = ROLE_SPECS[role]["details_column"]
+    return [
+        "id",
+        *PERSON_FIELDS,
+        f"movie_{details}",
+        "movie_ids",
+        f"tv_{details}",
+        "tv_ids",
+        "updated_at",
+    ]
+
+
+def _person_attributes(credit: dict) -> tuple:
+    return tuple(
+        credit.get(field, False) if field == "adult" else credit.get(field)
+        for field in PERSON_FIELDS
+    )
+
+
+class PersonSpill:
+    """
+    Inverted credits of one role (person id -> details and media ids).
+
+    Entries are buffered in memory and written as sorted runs to disk once the
+    buffer exceeds its budget. `merged` k-way merges all runs back into one
+    entry per person, in person id order.
+    """
+
+    def __init__(self, role: str, spill_dir: str, max_credits: int):
+        self.role = role
+        self.spill_dir = spill_dir
+        self.max_credits = max_credits
+        self.buffer: Dict[int, PersonEntry] = {}
+        self.buffered_credits = 0
+        self.runs: List[str] = []
+
+    def add(self, person_id: int, credit: dict, media: str, tmdb_id: int, details: List[str]):
+        entry = self.buffer.get(person_id)
+        if entry is None:
+            entry = [_person_attributes(credit), set(), [], set(), []]
+            self.buffer[person_id] = entry
+        offset = 1 if media == "movie" else 3
+        entry[offset].update(d for d in details if d is not None)
+        entry[offset + 1].append(tmdb_id)
+        self.buffered_credits += 1 + len(details)
+        if self.buffered_credits >= self.max_credits:
+            self.spill()
+
+    def spill(self):
+        if not self.buffer:
+            return
+        path = os.path.join(self.spill_dir, f"{self.role}_{len(self.runs):05d}.run")
+        items = sorted(self.buffer.items())
+        with open(path, "wb") as f:
+            for i in range(0, len(items), SPILL_CHUNK_SIZE):
+                pickle.dump(items[i : i + SPILL_CHUNK_SIZE], f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.runs.append(path)
+        print(f"spilled {len(items)} {self.role} members ({self.buffered_credits} credits) to {path}")
+        self.buffer = {}
+        self.buffered_credits = 0
+
+    @staticmethod
+    def _read_run(path: str) -> Iterator[Tuple[int, PersonEntry]]:
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    chunk = pickle.load(f)
+                except EOFError:
+                    return
+                yield from chunk
+
+    def merged(self) -> Iterator[Tuple[int, PersonEntry]]:
+        if not self.runs:
+            yield from sorted(self.buffer.items())
+            return
+
+        self.spill()
+        # heapq.merge is stable, so for equal ids the entry from the earliest run
+        # comes first and keeps its person attributes (same as `$first` before)
+        streams = [self._read_run(path) for path in self.runs]
+        current_id, current = None, None
+        for person_id, entry in heapq.merge(*streams, key=lambda item: item[0]):
+            if person_id != current_id:
+                if current is not None:
+                    yield current_id, current
+                current_id, current = person_id, entry
+                continue
+            current[1].update(entry[1])
+            current[2].extend(entry[2])
+            current[3].update(entry[3])
+            current[4].extend(entry[4])
+        if current is not None:
+            yield current_id, current
+
+
+def scan_credits(mongo_db, spills: Dict[str, PersonSpill], stats: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """
+    Stream both details collections exactly once and feed every credit into the spills.
+    With `stats`, the size of the read documents is added to stats["bytes"].
+    """
+    scanned = {}
+    for media, collection in (("movie", mongo_db.tmdb_movie_details), ("tv", mongo_db.tmdb_tv_details)):
+        paths = {role: ROLE_SPECS[role][f"{media}_path"] for role in spills}
+        projection = {"_id": 0, "tmdb_id": 1, **{path: 1 for path in paths.values()}}
+        cursor = collection.find({}, projection).batch_size(FIND_BATCH_SIZE)
+
+        count = 0
+        for doc in cursor:
+            tmdb_id = doc.get("tmdb_id")
+            if stats is not None:
+                stats["bytes"] = stats.get("bytes", 0) + bson_bytes((doc,))
+            if tmdb_id is None:
+                continue
+            for role, spill in spills.items():
+                section, key = paths[role].split(".")
+                read_details = ROLE_SPECS[role][f"{media}_detail"]
+                for credit in (doc.get(section) or {}).get(key) or []:
+                    person_id = credit.get("id")
+                    details = read_details(credit)
+                    # tv credits without any role/job were dropped by `$unwind` before
+                    if person_id is None or not details:
+                        continue
+                    spill.add(person_id, credit, media, tmdb_id, details)
+            count += 1
+            if count % 50_000 == 0:
+                print(f"scanned {count} {media} details")
+        scanned[media] = count
+        print(f"scanned {count} {media} details")
+    return scanned
+
+
+def _person_row(person_id: int, entry: PersonEntry, date_now: datetime) -> tuple:
+    attributes, movie_details, movie_ids, tv_details, tv_ids = entry
+    return (
+        person_id,
+        *attributes,
+        sorted(movie_details),
+        sorted(set(movie_ids)),
+        sorted(tv_details),
+        sorted(set(tv_ids)),
+        date_now,
+    )
+
+
+def load_person_table(
+    pg,
+    role: str,
+    entries: Iterator[Tuple[int, PersonEntry]],
+    stats: Optional[Dict[str, int]] = None,
+) -> int:
+    """
+    COPY all merged entries into a temp staging table in chunks, then upsert into the target table.
+    """
+    table_name = ROLE_SPECS[role]["table"]
+    stage_name = f"{table_name}_stage"
+    columns = _table_columns(role)
+    columns_str = ", ".join([f'"{column}"' for column in columns])
+    update_str = ", ".join([f'"{col}" = EXCLUDED."{col}"' for col in columns[1:]])
+
+    pg_cursor = pg.cursor()
+    pg_cursor.execute(
+        f'CREATE TEMP TABLE "{stage_name}" (LIKE "{table_name}" INCLUDING DEFAULTS) ON COMMIT DROP'
+    )
+    date_now = datetime.utcnow()
+    total_count = copy_rows(
+        pg_cursor,
+        stage_name,
+        columns,
+        (_person_row(person_id, entry, date_now) for person_id, entry in entries),
+        stats=stats,
+    )
+
+    pg_cursor.execute(
+        f"""
+        INSERT INTO "{table_name}" ({columns_str})
+        SELECT {columns_str} FROM "{stage_name}"
+        ON CONFLICT (id) DO UPDATE SET {update_str}
+        """
+    )
+    pg.commit()
+    pg_cursor.close()
+    print(f"upserted {total_count} {role} members")
+    return total_count
+
+
+def build_person_index(
+    pg,
+    roles: List[str],
+    memory_budget_mb: int = DEFAULT_MEMORY_BUDGET_MB,
+    spill_dir: Optional[str] = None,
+    metrics: Optional[SyncMetrics] = None,
+) -> dict:
+    """
+    Rebuild the person tables (cast and/or crew) from one scan over the details collections.
+    """
+    metrics = metrics or SyncMetrics("person_index")
+    if not roles:
+        raise ValueError(f"No person roles given, expected any of {list(ROLE_SPECS)}")
+    unknown = [role for role in roles if role not in ROLE_SPECS]
+    if unknown:
+        raise ValueError(f"Unknown person roles: {unknown}")
+
+    mongo_db = get_db()
+    max_credits = max(1, memory_budget_mb * 1024 * 1024 // APPROX_BYTES_PER_CREDIT // len(roles))
+
+    with tempfile.TemporaryDirectory(prefix="person_index_", dir=spill_dir) as tmp_dir:
+        spills = {role: PersonSpill(role, tmp_dir, max_credits) for role in roles}
+        with metrics.stage("mongo_scan") as stage:
+            scan_stats = {}
+            scanned = scan_credits(mongo_db, spills, stats=scan_stats)
+            stage.rows = sum(scanned.values())
+            stage.bytes = scan_stats.get("bytes", 0)
+
+        result = {"scanned": scanned, "spilled_runs": {}, "total_count": {}}
+        for role, spill in spills.items():
+            # merging the spilled runs is consumed by the COPY, so both are one stage
+            with metrics.stage(f"postgres_load_{role}") as stage:
+                load_stats = {}
+                result["total_count"][role] = load_person_table(pg, role, spill.merged(), stats=load_stats)
+                stage.rows = result["total_count"][role]
+                stage.bytes = load_stats.get("bytes", 0)
+            # counted after the merge, which spills the remaining buffer as its last run
+            result["spilled_runs"][role] = len(spill.runs)
+    return result
+
+
+def main(
+    roles: Optional[List[str]] = None,
+    memory_budget_mb: int = DEFAULT_MEMORY_BUDGET_MB,
+):
+    roles = list(ROLE_SPECS) if roles is None else roles
+    init_mongodb()
+    pg = init_postgres()
+    metrics = SyncMetrics("person_index")
+    result = build_person_index(pg, roles=roles, memory_budget_mb=memory_budget_mb, metrics=metrics)
+    result["metrics"] = metrics.finish()
+    pg.close()
+    close_mongodb()
+    return result
@@ -4,6 +4,8 @@ from typing import Union, Literal
 from mongoengine import Document, Q
 from pydantic import BaseModel
 
+from f.data_source.stats import increment
+
 
 class IdParameter(BaseModel):
     id: str
@@ -232,6 +234,13 @@ def update_selected_for_next_entries(
         entry.id for entry in next_entries if isinstance(entry, tv_model)
     ]
 
+    # entries selected for the first time enter the "selected" stats
+    for model in (movie_model, tv_model):
+        first_selected = sum(
+            1 for entry in next_entries if isinstance(entry, model) and entry.selected_at is None
+        )
+        increment(model._get_collection_name(), {"selected": first_selected})
+
     if movie_ids_to_update:
         movie_model.objects(id__in=movie_ids_to_update).update(
             selected_at=datetime.utcnow(),
@@ -0,0 +1,328 @@
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+from f.db.connections import redis
+
+# Per data source: ceilings for requests in flight (across all fetch jobs) and for the
+# batch size `next` selects, start values, and the p90 latency above which the site is
+# treated as struggling. Ceilings are what the site tolerated without bans so far.
+# request_timeout_s is the longest one fetch can take (browser timeout or step timeout of
+# the flow), in-flight slots are leased for that plus SLOT_LEASE_MARGIN_S.
+SOURCE_LIMITS = {
+    "imdb": {
+        "batch_size": (5, 15, 60),  # (min, start, max)
+        "concurrency": (1, 2, 6),
+        "target_latency_s": 4.0,
+        "request_timeout_s": 30,
+    },
+    "metacritic": {
+        "batch_size": (3, 6, 30),
+        "concurrency": (1, 1, 4),
+        "target_latency_s": 6.0,
+        "request_timeout_s": 30,
+    },
+    "rotten_tomatoes": {
+        "batch_size": (2, 3, 15),
+        "concurrency": (1, 1, 3),
+        "target_latency_s": 25.0,
+        "request_timeout_s": 180,
+    },
+    "tv_tropes": {
+        "batch_size": (4, 8, 30),
+        "concurrency": (1, 1, 4),
+        "target_latency_s": 25.0,
+        "request_timeout_s": 300,
+    },
+}
+
+WINDOW_S = 600
+WINDOW_EVENTS = 200
+MIN_SAMPLES = 10
+BLOCKED_RATE_MAX = 0.02
+ERROR_RATE_MAX = 0.2
+DECREASE_FACTOR = 0.5
+COOLDOWN_S = 900
+ADJUST_INTERVAL_S = 30
+SLOT_LEASE_MARGIN_S = 30
+SLOT_WAIT_S = 60
+KEY_TTL_S = 7 * 24 * 3600
+
+# Atomically take an in-flight slot: drop expired leases, then add ours if below the limit.
+ACQUIRE_SLOT_LUA = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[4]) then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+    redis.call('EXPIRE', KEYS[1], ARGV[5])
+    return 1
+end
+return 0
+"""
+
+
+class RateLimitReached(Exception):
+    """Raised by fetch scripts on 403/429, counted as `blocked` by the crawl controller."""
+
+
+class NoCrawlSlot(Exception):
+    """
+    Raised before the request when no in-flight slot could be taken. The entry stays
+    selected, so the step is retried or `next` picks it up again after its buffer.
+    """
+
+
+class CrawlController:
+    """
+    AIMD controller for one crawled data source, state shared by all fetch jobs in Redis.
+
+    - every fetch records its outcome (ok / blocked / error) and latency into a sliding window
+    - blocked responses above BLOCKED_RATE_MAX halve concurrency and batch size, followed by a cooldown
+    - a p90 latency above target lowers concurrency by one
+    - a clean window raises concurrency by one and batch size by its minimum step
+    - in-flight requests are limited by leased slots, so fan-out of the flow can't exceed it
+
+    Redis failures fall back to the start values for limits and batch sizes. Slots are the
+    exception: without Redis the in-flight limit can't be enforced, so no request is sent.
+    """
+
+    def __init__(self, source: str):
+        if source not in SOURCE_LIMITS:
+            raise ValueError(f"Unknown crawl source: {source}")
+        self.source = source
+        self.spec = SOURCE_LIMITS[source]
+        # hash tag keeps all keys of a source on one cluster slot (needed for the lua script)
+        prefix = f"crawl:{{{source}}}"
+        self.events_key = f"{prefix}:events"
+        self.limits_key = f"{prefix}:limits"
+        self.inflight_key = f"{prefix}:inflight"
+        self.adjust_lock_key = f"{prefix}:adjust_lock"
+        self.slot_lease_s = self.spec["request_timeout_s"] + SLOT_LEASE_MARGIN_S
+
+    def _defaults(self) -> dict:
+        return {
+            "batch_size": self.spec["batch_size"][1],
+            "concurrency": self.spec["concurrency"][1],
+            "adjusted_at": 0.0,
+            "cooldown_until": 0.0,
+        }
+
+    @staticmethod
+    def _clamp(value: float, bounds: tuple) -> int:
+        low, _, high = bounds
+        return int(max(low, min(high, value)))
+
+    # ---- state ----
+
+    def limits(self) -> dict:
+        limits = self._defaults()
+        try:
+            with redis() as rc:
+                stored = rc.get_redis().hgetall(self.limits_key)
+        except Exception as e:
+            print(f"crawl control ({self.source}): using defaults, redis unavailable: {e}")
+            return limits
+        for key in limits:
+            if key in stored:
+                limits[key] = float(stored[key])
+        limits["batch_size"] = self._clamp(limits["batch_size"], self.spec["batch_size"])
+        limits["concurrency"] = self._clamp(limits["concurrency"], self.spec["concurrency"])
+        return limits
+
+    def record(self, outcome: str, latency_s: float):
+        event = f"{time.time():.3f}|{outcome}|{latency_s:.3f}"
+        try:
+            with redis() as rc:
+                r = rc.get_redis()
+                r.lpush(self.events_key, event)
+                r.ltrim(self.events_key, 0, WINDOW_EVENTS - 1)
+                r.expire(self.events_key, KEY_TTL_S)
+        except Exception as e:
+            print(f"crawl control ({self.source}): could not record outcome: {e}")
+
+    def window(self, since: float = 0.0) -> dict:
+        """Outcome rates and latency of the events in the sliding window (after `since`)."""
+        try:
+            with redis() as rc:
+                raw_events = rc.get_redis().lrange(self.events_key, 0, WINDOW_EVENTS - 1)
+        except Exception as e:
+            print(f"crawl control ({self.source}): could not read window: {e}")
+            raw_events = []
+
+        cutoff = max(time.time() - WINDOW_S, since)
+        counts = {"ok": 0, "blocked": 0, "error": 0}
+        latencies = []
+        for raw_event in raw_events:
+            timestamp, outcome, latency = raw_event.split("|")
+            if float(timestamp) <= cutoff:
+                continue
+            counts[outcome] = counts.get(outcome, 0) + 1
+            if outcome == "ok":
+                latencies.append(float(latency))
+
+        total = sum(counts.values())
+        latencies.sort()
+        return {
+            "samples": total,
+            "success_rate": counts["ok"] / total if total else None,
+            "blocked_rate": counts["blocked"] / total if total else None,
+            "error_rate": counts["error"] / total if total else None,
+            "p50_latency_s": latencies[len(latencies) // 2] if latencies else None,
+            "p90_latency_s": latencies[int(len(latencies) * 0.9)] if latencies else None,
+        }
+
+    # ---- AIMD ----
+
+    def decide(self, limits: dict, window: dict, now: float) -> Optional[dict]:
+        """New limits for the window, or None to keep the current ones. Pure, no Redis."""
+        if window["samples"] == 0:
+            return None
+        batch_size, concurrency = limits["batch_size"], limits["concurrency"]
+
+        # any block is a strong signal, react without waiting for MIN_SAMPLES
+        if window["blocked_rate"] > BLOCKED_RATE_MAX:
+            return {
+                "batch_size": self._clamp(batch_size * DECREASE_FACTOR, self.spec["batch_size"]),
+                "concurrency": self._clamp(concurrency * DECREASE_FACTOR, self.spec["concurrency"]),
+                "cooldown_until": now + COOLDOWN_S,
+                "reason": f"blocked rate {window['blocked_rate']:.0%}",
+            }
+        if window["samples"] < MIN_SAMPLES:
+            return None
+
+        p90 = window["p90_latency_s"]
+        if p90 is not None and p90 > self.spec["target_latency_s"]:
+            if concurrency <= self.spec["concurrency"][0]:
+                return None
+            return {
+                "batch_size": batch_size,
+                "concurrency": self._clamp(concurrency - 1, self.spec["concurrency"]),
+                "reason": f"p90 latency {p90:.1f}s",
+            }
+        if window["error_rate"] > ERROR_RATE_MAX or now < limits["cooldown_until"]:
+            return None
+
+        increased = {
+            "batch_size": self._clamp(batch_size + self.spec["batch_size"][0], self.spec["batch_size"]),
+            "concurrency": self._clamp(concurrency + 1, self.spec["concurrency"]),
+            "reason": f"success rate {window['success_rate']:.0%}",
+        }
+        if increased["batch_size"] == batch_size and increased["concurrency"] == concurrency:
+            return None
+        return increased
+
+    def adjust(self) -> Optional[dict]:
+        """Apply `decide` to the shared limits, at most once per ADJUST_INTERVAL_S across all jobs."""
+        try:
+            with redis() as rc:
+                r = rc.get_redis()
+                if not r.set(self.adjust_lock_key, "1", nx=True, ex=ADJUST_INTERVAL_S):
+                    return None
+                limits = self.limits()
+                # only events after the last change count, so one burst of 403s halves once
+                window = self.window(since=limits["adjusted_at"])
+                now = time.time()
+                decision = self.decide(limits, window, now)
+                if decision is None:
+                    return None
+                r.hset(self.limits_key, mapping={
+                    "batch_size": decision["batch_size"],
+                    "concurrency": decision["concurrency"],
+                    "adjusted_at": now,
+                    "cooldown_until": decision.get("cooldown_until", limits["cooldown_until"]),
+                })
+                r.expire(self.limits_key, KEY_TTL_S)
+        except Exception as e:
+            print(f"crawl control ({self.source}): could not adjust limits: {e}")
+            return None
+
+        print(
+            f"crawl control ({self.source}): concurrency {limits['concurrency']} -> {decision['concurrency']}, "
+            f"batch size {limits['batch_size']} -> {decision['batch_size']} ({decision['reason']})"
+        )
+        return decision
+
+    # ---- in-flight slots ----
+
+    def _acquire_slot(self, slot_id: str, concurrency: int) -> bool:
+        now = time.time()
+        with redis() as rc:
+            return bool(rc.get_redis().eval(
+                ACQUIRE_SLOT_LUA, 1, self.inflight_key,
+                now, now + self.slot_lease_s, slot_id, concurrency, KEY_TTL_S,
+            ))
+
+    def _release_slot(self, slot_id: str):
+        with redis() as rc:
+            rc.get_redis().zrem(self.inflight_key, slot_id)
+
+    @contextmanager
+    def slot(self):
+        """
+        Wait for one of `concurrency` in-flight slots. Leases outlive the longest request of
+        the source, so crashed jobs don't leak slots and slow ones don't lose theirs.
+        Raises NoCrawlSlot when none is free after SLOT_WAIT_S or Redis is unavailable.
+        """
+        slot_id = uuid.uuid4().hex
+        concurrency = self.limits()["concurrency"]
+        deadline = time.monotonic() + SLOT_WAIT_S
+        delay = 0.5
+        try:
+            while not self._acquire_slot(slot_id, concurrency):
+                if time.monotonic() > deadline:
+                    raise NoCrawlSlot(f"crawl control ({self.source}): no free slot after {SLOT_WAIT_S}s")
+                time.sleep(delay)
+                delay = min(delay * 1.5, 5.0)
+        except NoCrawlSlot:
+            raise
+        except Exception as e:
+            raise NoCrawlSlot(f"crawl control ({self.source}): slot limiting unavailable: {e}") from e
+        try:
+            yield
+        finally:
+            try:
+                self._release_slot(slot_id)
+            except Exception as e:
+                print(f"crawl control ({self.source}): could not release slot: {e}")
+
+
+def crawl_batch_size(source: str) -> int:
+    """Batch size for the `next` step of a crawl flow."""
+    limits = CrawlController(source).limits()
+    print(f"crawl control ({source}): batch size {limits['batch_size']}, concurrency {limits['concurrency']}")
+    return limits["batch_size"]
+
+
+@contextmanager
+def track_crawl(source: str):
+    """
+    Wrap one fetch: waits for an in-flight slot, records outcome and latency, adjusts the limits.
+    Raises NoCrawlSlot without sending the request when no slot is available.
+
+    usage:
+        with track_crawl("imdb"):
+            result = crawl(...)   # raise RateLimitReached on 403/429
+    """
+    controller = CrawlController(source)
+    try:
+        with controller.slot():
+            started = time.monotonic()
+            outcome = "error"
+            try:
+                yield controller
+                outcome = "ok"
+            except RateLimitReached:
+                outcome = "blocked"
+                raise
+            finally:
+                controller.record(outcome, time.monotonic() - started)
+    finally:
+        controller.adjust()
+
+
+def main(source: str = "imdb"):
+    controller = CrawlController(source)
+    return {
+        "limits": controller.limits(),
+        "window": controller.window(),
+    }
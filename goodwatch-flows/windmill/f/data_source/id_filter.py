@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo.collection import Collection
+
+# Which tmdb ids have a document in a collection, as one bit per id. TMDB ids are dense
+# integers (about 1.5M movies), so the bitmap is ~200 KB per collection and exact: unlike a
+# Bloom filter it has no false positives, and it is smaller than one at 1% error rate.
+# Persisted per worker and refreshed incrementally on every lookup, see `id_filter`.
+FILTER_DIR = os.getenv("ID_FILTER_DIR", "/tmp/goodwatch/id_filter")
+# how often the refreshed bitmap is written back to disk for the other jobs on the worker
+SAVE_INTERVAL_S = int(os.getenv("ID_FILTER_SAVE_INTERVAL_S", "300"))
+ENABLED = os.getenv("ID_FILTER", "true").lower() != "false"
+# ids above are never added, lookups treat them as present and go to the database
+MAX_TMDB_ID = 100_000_000
+# ObjectIds of upserts come from the server clock, of mongoengine saves from the client clock
+CLOCK_SKEW = timedelta(minutes=10)
+
+_lock = threading.Lock()
+_filters: Dict[str, "IdFilter"] = {}
+
+stats = {"ids_checked": 0, "ids_skipped": 0, "queries_skipped": 0}
+
+
+class IdFilter:
+    """
+    usage:
+        f = id_filter(mongo_db.imdb_movie_rating)
+        tmdb_ids = f.existing(tmdb_ids)
+
+    `id_filter` refreshes the bitmap before every lookup, so ids inserted up to that moment
+    are in it. Deleted documents stay in the bitmap, they only cost a query that finds nothing.
+    Ids it cannot place (not an int, out of range) count as present and go to the database.
+    """
+
+    def __init__(self, name: str, bitmap: bytearray, refreshed_at: Optional[datetime] = None):
+        self.name = name
+        self.bitmap = bitmap
+        self.refreshed_at = refreshed_at
+        self.saved_at: Optional[datetime] = None
+
+    def __contains__(self, tmdb_id) -> bool:
+        if not isinstance(tmdb_id, int):
+            try:
+                tmdb_id = int(tmdb_id)
+            except (TypeError, ValueError):
+                return True
+        if tmdb_id > MAX_TMDB_ID or tmdb_id < 0:
+            return True
+        byte = tmdb_id >> 3
+        return byte < len(self.bitmap) and bool(self.bitmap[byte] >> (tmdb_id & 7) & 1)
+
+    def __len__(self) -> int:
+        return sum(bin(byte).count("1") for byte in self.bitmap)
+
+    def add(self, tmdb_ids: Iterable[int]):
+        bitmap = self.bitmap
+        for tmdb_id in tmdb_ids:
+            if not isinstance(tmdb_id, int) or tmdb_id < 0 or tmdb_id > MAX_TMDB_ID:
+                continue
+            byte = tmdb_id >> 3
+            if byte >= len(bitmap):
+                # grow with headroom, new ids are mostly the highest ones
+                bitmap.extend(bytes(byte - len(bitmap) + 1 + len(bitmap) // 8))
+            bitmap[byte] |= 1 << (tmdb_id & 7)
+
+    def existing(self, tmdb_ids: List[int]) -> List[int]:
+        """The ids that have a document, in input order."""
+        result = [tmdb_id for tmdb_id in tmdb_ids if tmdb_id in self]
+        stats["ids_checked"] += len(tmdb_ids)
+        stats["ids_skipped"] += len(tmdb_ids) - len(result)
+        return result
+
+    # ---- Persistence ----
+
+    @classmethod
+    def load(cls, name: str, filter_dir: str = FILTER_DIR) -> Optional["IdFilter"]:
+        try:
+            with open(os.path.join(filter_dir, f"{name}.json")) as f:
+                meta = json.load(f)
+            with open(os.path.join(filter_dir, f"{name}.bitmap"), "rb") as f:
+                bitmap = bytearray(f.read())
+        except (OSError, ValueError):
+            return None
+        return cls(name, bitmap, datetime.fromisoformat(meta["refreshed_at"]))
+
+    def save(self, filter_dir: str = FILTER_DIR):
+        """Write next to the target and rename, so concurrent jobs never read a half-written file."""
+        os.makedirs(filter_dir, exist_ok=True)
+        suffix = f".{os.getpid()}.tmp"
+        bitmap_path = os.path.join(filter_dir, f"{self.name}.bitmap")
+        meta_path = os.path.join(filter_dir, f"{self.name}.json")
+        with open(bitmap_path + suffix, "wb") as f:
+            f.write(self.bitmap)
+        with open(meta_path + suffix, "w") as f:
+            json.dump({"refreshed_at": self.refreshed_at.isoformat(), "bytes": len(self.bitmap)}, f)
+        os.replace(bitmap_path + suffix, bitmap_path)
+        os.replace(meta_path + suffix, meta_path)
+        self.saved_at = datetime.utcnow()
+
+    # ---- Build & refresh ----
+
+    @classmethod
+    def build(cls, name: str, collection: Collection) -> "IdFilter":
+        started_at = datetime.utcnow()
+        id_filter = cls(name, bytearray())
+        id_filter.add(doc.get("tmdb_id") for doc in collection.find({}, {"tmdb_id": 1, "_id": 0}).batch_size(50_000))
+        id_filter.refreshed_at = started_at
+        print(f"id_filter: built {name} ({len(id_filter)} ids) in {(datetime.utcnow() - started_at).total_seconds():.1f}s")
+        return id_filter
+
+    def refresh(self, collection: Collection) -> int:
+        """
+        Add the ids inserted since the last refresh. Inserts set created_at, not updated_at,
+        so the insertion time comes from the ObjectId, which every document has indexed.
+        """
+        started_at = datetime.utcnow()
+        since = ObjectId.from_datetime(self.refreshed_at - CLOCK_SKEW)
+        tmdb_ids = [doc.get("tmdb_id") for doc in collection.find({"_id": {"$gte": since}}, {"tmdb_id": 1, "_id": 0})]
+        self.add(tmdb_ids)
+        self.refreshed_at = started_at
+        return len(tmdb_ids)
+
+
+def id_filter(collection: Collection, save_interval_s: int = SAVE_INTERVAL_S) -> Optional[IdFilter]:
+    """
+    The filter of a collection: from memory, then from disk (shared by the jobs on a worker),
+    built with a full id scan only if neither exists. Refreshed on every call, an indexed `_id`
+    range query that only returns the inserts since the last call, so a lookup never misses a
+    document that existed when it was made. Written back to disk every save_interval_s.
+    None when disabled or when it can't be built or refreshed, callers then query everything.
+    """
+    if not ENABLED:
+        return None
+    name = f"{collection.database.name}.{collection.name}"
+    with _lock:
+        try:
+            current = _filters.get(name)
+            if current is None:
+                current = IdFilter.load(name)
+            if current is None:
+                current = IdFilter.build(name, collection)
+                current.save()
+            else:
+                current.refresh(collection)
+                if current.saved_at is None or (datetime.utcnow() - current.saved_at).total_seconds() >= save_interval_s:
+                    current.save()
+            _filters[name] = current
+            return current
+        except Exception as e:
+            print(f"id_filter: not using a filter for {name}: {e}")
+            return None
+
+
+def existing_ids(collection: Collection, tmdb_ids: List[int]) -> List[int]:
+    """Drop the ids without a document in the collection, before an `$in` query on it."""
+    f = id_filter(collection)
+    if f is None:
+        return tmdb_ids
+    result = f.existing(tmdb_ids)
+    if tmdb_ids and not result:
+        stats["queries_skipped"] += 1
+    return result
+
+
+def summary() -> str:
+    checked = stats["ids_checked"]
+    rate = stats["ids_skipped"] / checked if checked else 0.0
+    return (f"id_filter: {stats['ids_skipped']}/{checked} ids skipped ({rate:.0%}), "
+            f"{stats['queries_skipped']} queries skipped")
+
+
+def main(collections: List[str] = []):
+    """Build or refresh the filters of the given collections, e.g. to warm a worker."""
+    from mongoengine import get_db
+    from f.db.mongodb import init_mongodb, close_mongodb
+
+    init_mongodb()
+    try:
+        db = get_db()
+        filters = {name: id_filter(db[name], save_interval_s=0) for name in collections}
+        return {name: len(f) if f is not None else None for name, f in filters.items()}
+    finally:
+        close_mongodb()
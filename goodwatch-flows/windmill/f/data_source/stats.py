@@ -0,0 +1,266 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional
+
+from mongoengine import Document
+
+from f.db.connections import mongodb, redis
+from f.imdb_web.models import ImdbMovieRating, ImdbTvRating
+from f.metacritic_web.models import MetacriticMovieRating, MetacriticTvRating
+from f.rotten_web.models import RottenTomatoesMovieRating, RottenTomatoesTvRating
+from f.tmdb_api.models import TmdbMovieDetails, TmdbTvDetails
+from f.tmdb_web.models import TmdbMovieProviders, TmdbTvProviders
+from f.tvtropes_web.models import TvTropesMovieTags, TvTropesTvTags
+
+# hash tag keeps both keys on one cluster slot, so they can share a pipeline
+SNAPSHOT_KEY = "stats:{counts}:snapshot"
+DELTAS_KEY = "stats:{counts}:deltas"
+SNAPSHOT_MAX_AGE_S = 3600
+PARALLEL_COLLECTIONS = 12
+
+
+class Condition:
+    """A field that is set (not null) or, with `non_empty`, a list that has entries."""
+
+    def __init__(self, field: str, non_empty: bool = False):
+        self.field = field
+        self.non_empty = non_empty
+
+    def mongo_filter(self) -> dict:
+        if self.non_empty:
+            return {f"{self.field}.0": {"$exists": True}}
+        return {self.field: {"$ne": None}}
+
+    def matches(self, document: Document) -> bool:
+        value = getattr(document, self.field, None)
+        return bool(value) if self.non_empty else value is not None
+
+
+# facet name -> conditions (any of them), no conditions counts all documents
+STATS = {
+    "tmdb_details": {
+        "models": {"movie": TmdbMovieDetails, "tv": TmdbTvDetails},
+        "facets": {
+            "total": [],
+            "with_details": [Condition("title")],
+        },
+    },
+    "tmdb_providers": {
+        "models": {"movie": TmdbMovieProviders, "tv": TmdbTvProviders},
+        "facets": {
+            "selected": [Condition("selected_at")],
+            "with_providers": [Condition("streaming_links", non_empty=True)],
+        },
+    },
+    "imdb_ratings": {
+        "models": {"movie": ImdbMovieRating, "tv": ImdbTvRating},
+        "facets": {
+            "selected": [Condition("selected_at")],
+            "with_rating": [Condition("user_score_original")],
+        },
+    },
+    "metacritic_ratings": {
+        "models": {"movie": MetacriticMovieRating, "tv": MetacriticTvRating},
+        "facets": {
+            "selected": [Condition("selected_at")],
+            "with_rating": [Condition("user_score_original"), Condition("meta_score_original")],
+        },
+    },
+    "rotten_ratings": {
+        "models": {"movie": RottenTomatoesMovieRating, "tv": RottenTomatoesTvRating},
+        "facets": {
+            "selected": [Condition("selected_at")],
+            "with_rating": [Condition("audience_score_original"), Condition("tomato_score_original")],
+        },
+    },
+    "tvtropes_tags": {
+        "models": {"movie": TvTropesMovieTags, "tv": TvTropesTvTags},
+        "facets": {
+            "selected": [Condition("selected_at")],
+            "with_tags": [Condition("tropes", non_empty=True)],
+        },
+    },
+}
+
+COLLECTION_FACETS = {
+    model._get_collection_name(): stat["facets"]
+    for stat in STATS.values()
+    for model in stat["models"].values()
+}
+
+
+# ===== Full count =====
+
+def facet_pipeline(facets: dict) -> list[dict]:
+    """All facets of a collection in one aggregation, so the collection is scanned once."""
+    stages = {}
+    for name, conditions in facets.items():
+        if not conditions:
+            stages[name] = [{"$count": "count"}]
+        elif len(conditions) == 1:
+            stages[name] = [{"$match": conditions[0].mongo_filter()}, {"$count": "count"}]
+        else:
+            stages[name] = [
+                {"$match": {"$or": [condition.mongo_filter() for condition in conditions]}},
+                {"$count": "count"},
+            ]
+    return [{"$facet": stages}]
+
+
+def count_collection(model, facets: dict) -> dict[str, int]:
+    result = next(model._get_collection().aggregate(facet_pipeline(facets), allowDiskUse=True), {})
+    return {name: (result.get(name) or [{"count": 0}])[0]["count"] for name in facets}
+
+
+def count_all() -> dict[str, dict[str, int]]:
+    """Counts per collection and facet, one aggregation per collection, run in parallel."""
+    jobs = {
+        model._get_collection_name(): (model, stat["facets"])
+        for stat in STATS.values()
+        for model in stat["models"].values()
+    }
+    with ThreadPoolExecutor(max_workers=PARALLEL_COLLECTIONS) as executor:
+        futures = {
+            collection: executor.submit(count_collection, model, facets)
+            for collection, (model, facets) in jobs.items()
+        }
+        return {collection: future.result() for collection, future in futures.items()}
+
+
+def shape(collection_counts: dict[str, dict[str, int]]) -> dict:
+    """Collection counts in the layout of the stats app: stat -> facet -> media type."""
+    result = {}
+    for stat_name, stat in STATS.items():
+        result[stat_name] = {
+            facet: {
+                media_type: collection_counts.get(model._get_collection_name(), {}).get(facet, 0)
+                for media_type, model in stat["models"].items()
+            }
+            for facet in stat["facets"]
+        }
+    return result
+
+
+# ===== Incremental counters =====
+
+def _delta_field(collection: str, facet: str) -> str:
+    return f"{collection}|{facet}"
+
+
+def increment(collection: str, changes: dict[str, int]):
+    """Add state changes since the last snapshot. Never fails the caller, the next full count corrects drift."""
+    changes = {facet: amount for facet, amount in changes.items() if amount}
+    if not changes:
+        return
+    try:
+        with redis() as rc:
+            pipe = rc.get_redis().pipeline(transaction=False)
+            for facet, amount in changes.items():
+                pipe.hincrby(DELTAS_KEY, _delta_field(collection, facet), amount)
+            pipe.execute()
+    except Exception as e:
+        print(f"stats: could not update counters for {collection}: {e}")
+
+
+def document_state(document: Document) -> dict[str, bool]:
+    """Facets the document is counted in, take it before changing the document."""
+    facets = COLLECTION_FACETS.get(document._get_collection_name(), {})
+    return {
+        name: (document.pk is not None) if not conditions else any(c.matches(document) for c in conditions)
+        for name, conditions in facets.items()
+    }
+
+
+def count_changes(document: Document, before: dict[str, bool]):
+    """
+    Update the counters with the facets a document entered or left since `document_state`.
+
+    usage:
+        state = document_state(next_entry)
+        next_entry.user_score_original = score
+        next_entry.save()
+        count_changes(next_entry, state)
+    """
+    after = document_state(document)
+    increment(
+        document._get_collection_name(),
+        {name: int(after[name]) - int(before.get(name, False)) for name in after if after[name] != before.get(name)},
+    )
+
+
+# ===== Snapshot =====
+
+def refresh_snapshot() -> dict:
+    """Run the full count, store it as the snapshot and drop the counters it already includes."""
+    started = time.time()
+    pending = {}
+    try:
+        with redis() as rc:
+            pending = rc.get_redis().hgetall(DELTAS_KEY)
+    except Exception as e:
+        print(f"stats: could not read counters: {e}")
+
+    with mongodb():
+        counts = count_all()
+    snapshot = {
+        "computed_at": started,
+        "seconds": None,
+        "counts": counts,
+    }
+    snapshot["seconds"] = round(time.time() - started, 2)
+    print(f"stats: counted all collections in {snapshot['seconds']}s")
+
+    try:
+        with redis() as rc:
+            pipe = rc.get_redis().pipeline(transaction=False)
+            pipe.set(SNAPSHOT_KEY, json.dumps(snapshot))
+            for field, value in pending.items():
+                pipe.hincrby(DELTAS_KEY, field, -int(value))
+            pipe.execute()
+    except Exception as e:
+        print(f"stats: could not store snapshot: {e}")
+    return snapshot
+
+
+def load_snapshot() -> tuple[Optional[dict], dict]:
+    try:
+        with redis() as rc:
+            r = rc.get_redis()
+            raw_snapshot, deltas = r.get(SNAPSHOT_KEY), r.hgetall(DELTAS_KEY)
+    except Exception as e:
+        print(f"stats: could not load snapshot: {e}")
+        return None, {}
+    return (json.loads(raw_snapshot) if raw_snapshot else None), deltas
+
+
+def current_stats(max_age_s: int = SNAPSHOT_MAX_AGE_S, refresh: bool = False) -> dict:
+    """
+    Snapshot plus counters. The snapshot is refreshed by the f/data_source/refresh_stats schedule,
+    an old one is still served (flagged `stale`), the full count only runs inline when there is
+    no snapshot yet or `refresh` is set.
+    """
+    snapshot, deltas = (None, {}) if refresh else load_snapshot()
+    if snapshot is None:
+        snapshot, deltas = refresh_snapshot(), {}
+
+    counts = {collection: dict(facets) for collection, facets in snapshot["counts"].items()}
+    for field, value in deltas.items():
+        collection, facet = field.split("|", 1)
+        if facet in counts.get(collection, {}):
+            counts[collection][facet] += int(value)
+
+    result = shape(counts)
+    result["snapshot"] = {
+        "computed_at": datetime.fromtimestamp(snapshot["computed_at"], timezone.utc).isoformat(),
+        "age_seconds": round(time.time() - snapshot["computed_at"]),
+        "count_seconds": snapshot["seconds"],
+        "pending_changes": sum(abs(int(value)) for value in deltas.values()),
+        "stale": time.time() - snapshot["computed_at"] > max_age_s,
+    }
+    return result
+
+
+def main():
+    pass
@@ -2,42 +2,111 @@
 # python-arango
 # wmill
 
+from collections import defaultdict
 from datetime import datetime, timezone
+import hashlib
+import json
+import os
 import time
 import re
+from typing import Dict, Optional
 
 from arango import ArangoClient, DocumentInsertError
 from requests import Timeout
-import wmill
+
+from f.db.connections import get_variable
+from f.utils.instrumentation import json_bytes
 
 
 REQUEST_TIMEOUT = 900
 RETRY_COUNT = 20
 RETRY_DELAY_SEC = 10
 UPSERT_ERRORS_TO_RETRY = [3, 4, 1200, 1227]
+STUB_HASH = 0
+
+
+class WriteRegistry:
+    """
+    Keys and content hashes of the documents written through `upsert_many`, so later batches
+    of the same run skip documents that would not change anything:
+    - a full document is skipped if the same key was written with the same content
+    - a stub (e.g. a referenced movie with only its title) is skipped if the key was written at all
+
+    Persisting the registry (`save`/`load`) extends this across runs, which is only safe while
+    nothing else writes to or empties these collections.
+    """
+
+    def __init__(self, hashes: Optional[Dict[str, Dict[str, int]]] = None):
+        self._hashes: Dict[str, Dict[str, int]] = defaultdict(dict, hashes or {})
+        self.skipped: Dict[str, int] = defaultdict(int)
+
+    @staticmethod
+    def content_hash(doc_dict: dict) -> int:
+        encoded = json.dumps(doc_dict, sort_keys=True, separators=(",", ":"), default=str).encode()
+        return int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), "little") or 1
+
+    def should_write(self, collection_name: str, key: str, content_hash: int, stub: bool = False) -> bool:
+        written = self._hashes[collection_name].get(key)
+        return written is None or (not stub and written != content_hash)
+
+    def record(self, collection_name: str, entries: list[tuple[str, int]], skipped: int = 0):
+        self.skipped[collection_name] += skipped
+        hashes = self._hashes[collection_name]
+        for key, content_hash in entries:
+            # a stub must not replace the hash of a full document written before
+            if content_hash != STUB_HASH or key not in hashes:
+                hashes[key] = content_hash
+
+    def __len__(self) -> int:
+        return sum(len(hashes) for hashes in self._hashes.values())
+
+    def summary(self) -> str:
+        total = sum(self.skipped.values())
+        per_collection = ", ".join(f"{name}: {count}" for name, count in sorted(self.skipped.items()) if count)
+        return f"Skipped {total} writes of documents already written ({per_collection or 'none'}), {len(self)} keys tracked"
+
+    @classmethod
+    def load(cls, path: str) -> "WriteRegistry":
+        if not path or not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self._hashes, f, separators=(",", ":"))
+        os.replace(f"{path}.tmp", path)
 
 
 class ArangoConnector:
+    # databases verified to exist by this process, later connectors skip the `_system` round trips
+    _known_databases: set = set()
+
     def __init__(self):
         print(f"Initializing ArangoDB...")
-        db_hosts = wmill.get_variable("u/Alp/ARANGO_HOSTS").split(",")
-        db_name = wmill.get_variable("u/Alp/ARANGO_DB")
-        db_user = wmill.get_variable("u/Alp/ARANGO_USER")
-        db_pass = wmill.get_variable("u/Alp/ARANGO_PASS")
+        db_hosts = get_variable("u/Alp/ARANGO_HOSTS").split(",")
+        db_name = get_variable("u/Alp/ARANGO_DB")
+        db_user = get_variable("u/Alp/ARANGO_USER")
+        db_pass = get_variable("u/Alp/ARANGO_PASS")
     
         self.client = ArangoClient(
             hosts=db_hosts,
             request_timeout=REQUEST_TIMEOUT,
         )
         
-        sys_db = self.client.db("_system", username=db_user, password=db_pass)
-        if not sys_db.has_database(db_name):
-            print(f"Creating database '{db_name}'...")
-            sys_db.create_database(db_name, users=[
-                {'username': db_user, 'password': db_pass, 'active': True}
-            ])
+        if db_name not in ArangoConnector._known_databases:
+            sys_db = self.client.db("_system", username=db_user, password=db_pass)
+            if not sys_db.has_database(db_name):
+                print(f"Creating database '{db_name}'...")
+                sys_db.create_database(db_name, users=[
+                    {'username': db_user, 'password': db_pass, 'active': True}
+                ])
+            ArangoConnector._known_databases.add(db_name)
         
         self.db = self.client.db(db_name, username=db_user, password=db_pass)
+        # JSON payload of all successful imports, read by sync metrics as write bytes
+        self.bytes_sent = 0
         print(f"Successfully initialized ArangoDB")
 
     def ensure_collection(self, name, **kwargs):
@@ -240,7 +309,12 @@ class ArangoConnector:
             self.client = None
             self.db = None
 
-    def upsert_many(self, collection, documents, retry_attempt = 0):
+    def upsert_many(self, collection, documents, retry_attempt = 0, registry: Optional[WriteRegistry] = None, stub: bool = False):
+        """
+        With a `registry`, documents already written in this run (see WriteRegistry) are skipped,
+        their count is returned as "skipped". `stub` marks documents that only carry a few fields
+        of a vertex another batch may write in full.
+        """
         current_ts = datetime.now(timezone.utc).timestamp()
 
         docs_to_upsert: list[dict] = []
@@ -259,12 +333,11 @@ class ArangoConnector:
                 continue
             unique_documents[sanitized_key] = (document_model, original_key_before_sanitize)
 
+        written_entries = []
+        skipped = 0
         for doc_key, (document_model, original_key) in unique_documents.items():
-            original_keys_for_batch.append(str(original_key))
-
             doc_dict = document_model.model_dump(by_alias=True, exclude_none=True)
             doc_dict.pop('created_at', None)
-            doc_dict['updated_at'] = current_ts
 
             if "_key" in doc_dict and doc_dict["_key"] is not None:
                 doc_dict["_key"] = self._sanitize_key(str(doc_dict["_key"]), edge=False)
@@ -272,9 +345,22 @@ class ArangoConnector:
                 doc_dict["_from"] = self._sanitize_key(str(doc_dict["_from"]), edge=True)
             if "_to" in doc_dict and doc_dict["_to"] is not None:
                 doc_dict["_to"] = self._sanitize_key(str(doc_dict["_to"]), edge=True)
-            
+
+            if registry is not None and doc_key is not None:
+                content_hash = STUB_HASH if stub else WriteRegistry.content_hash(doc_dict)
+                if not registry.should_write(collection.name, doc_key, content_hash, stub):
+                    skipped += 1
+                    continue
+                written_entries.append((doc_key, content_hash))
+
+            doc_dict['updated_at'] = current_ts
+            original_keys_for_batch.append(str(original_key))
             docs_to_upsert.append(doc_dict)
 
+        if not docs_to_upsert and skipped:
+            registry.record(collection.name, [], skipped)
+            return {"created": 0, "errors": 0, "empty": 0, "updated": 0, "ignored": 0, "skipped": skipped}
+
         try:
             result_stats = collection.import_bulk(
                 docs_to_upsert,
@@ -282,6 +368,11 @@ class ArangoConnector:
                 details=True,
                 sync=True,
             )
+            if registry is not None:
+                # with failed documents in the batch, none of it counts as written
+                registry.record(collection.name, [] if result_stats.get("errors") else written_entries, skipped)
+            self.bytes_sent += json_bytes(docs_to_upsert)
+            result_stats["skipped"] = skipped
             return result_stats
         except Timeout as e:
             final_error_message = f"Timeout: {e}"
@@ -289,7 +380,7 @@ class ArangoConnector:
                 print(final_error_message)
                 print(f"Retrying ({retry_attempt + 1}/{RETRY_COUNT})...")
                 time.sleep(RETRY_DELAY_SEC) 
-                return self.upsert_many(collection, documents, retry_attempt + 1)
+                return self.upsert_many(collection, documents, retry_attempt + 1, registry, stub)
             else:
                 raise Timeout(final_error_message) from e
         except DocumentInsertError as e:
@@ -452,7 +543,7 @@ class ArangoConnector:
                 print(final_error_message)
                 print(f"Retrying ({retry_attempt + 1}/{RETRY_COUNT})...")
                 time.sleep(RETRY_DELAY_SEC) 
-                return self.upsert_many(collection, documents, retry_attempt + 1)
+                return self.upsert_many(collection, documents, retry_attempt + 1, registry, stub)
             else:
                 raise ValueError(final_error_message) from e
 
@@ -0,0 +1,198 @@
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Tuple
+
+import wmill
+
+# Windmill runs each job in a fresh process, unless the script runs on a dedicated
+# worker, where `main` is called again in the same process. Everything below is
+# process-wide, so repeated steps on a dedicated worker (and repeated connects
+# within one job) reuse resolved credentials and open clients instead of paying
+# for variable lookups, TCP/TLS and auth handshakes again.
+SHARED_CONNECTIONS = os.getenv("WINDMILL_SHARED_CONNECTIONS", "true").lower() != "false"
+CREDENTIALS_TTL_S = int(os.getenv("WINDMILL_CREDENTIALS_TTL_S", "900"))
+POSTGRES_POOL_MIN = 1
+POSTGRES_POOL_MAX = int(os.getenv("POSTGRES_POOL_MAX", "8"))
+
+_lock = threading.RLock()
+_variables: Dict[str, Tuple[float, str]] = {}
+_clients: Dict[str, object] = {}
+
+
+# ===== Credentials =====
+
+def get_variable(path: str) -> str:
+    """`wmill.get_variable`, cached per process for CREDENTIALS_TTL_S."""
+    now = time.monotonic()
+    cached = _variables.get(path)
+    if cached and now - cached[0] < CREDENTIALS_TTL_S:
+        return cached[1]
+    value = wmill.get_variable(path)
+    _variables[path] = (now, value)
+    return value
+
+
+def forget_credentials():
+    """Drop cached variables, e.g. after a password rotation made a connect fail."""
+    _variables.clear()
+
+
+# ===== Shared clients =====
+
+def shared_client(name: str, factory: Callable[[], object]):
+    """Return the process-wide client `name`, creating it with `factory` on first use."""
+    with _lock:
+        client = _clients.get(name)
+        if client is None:
+            started = time.perf_counter()
+            client = factory()
+            _clients[name] = client
+            print(f"Opened shared {name} connection in {time.perf_counter() - started:.2f}s")
+        return client
+
+
+def _close_client(name: str, client):
+    try:
+        for method in ("closeall", "close", "disconnect"):
+            if hasattr(client, method):
+                getattr(client, method)()
+                return
+    except Exception as e:
+        print(f"Error closing shared {name} connection: {e}")
+
+
+def drop_client(name: str):
+    """Close and forget a shared client, the next use opens a new one."""
+    with _lock:
+        client = _clients.pop(name, None)
+    if client is not None:
+        _close_client(name, client)
+
+
+def close_all():
+    with _lock:
+        clients = list(_clients.items())
+        _clients.clear()
+    for name, client in clients:
+        _close_client(name, client)
+
+
+atexit.register(close_all)
+
+
+def _checkout(name: str, factory: Callable[[], object]):
+    if SHARED_CONNECTIONS:
+        return shared_client(name, factory), False
+    return factory(), True
+
+
+# ===== Context managers =====
+
+@contextmanager
+def mongodb():
+    """
+    usage:
+        with mongodb() as db:
+            db.tmdb_movie_details.find(...)
+    Mongoengine documents work inside the block as well.
+    """
+    from mongoengine import get_db
+    from f.db.mongodb import init_mongodb, close_mongodb
+
+    init_mongodb()
+    try:
+        yield get_db()
+    finally:
+        close_mongodb()
+
+
+def _create_postgres_pool():
+    from psycopg2.pool import ThreadedConnectionPool
+
+    return ThreadedConnectionPool(
+        POSTGRES_POOL_MIN,
+        POSTGRES_POOL_MAX,
+        database=get_variable("u/Alp/POSTGRES_DB"),
+        host=get_variable("u/Alp/POSTGRES_HOST"),
+        port=int(get_variable("u/Alp/POSTGRES_PORT")),
+        user=get_variable("u/Alp/POSTGRES_USER"),
+        password=get_variable("u/Alp/POSTGRES_PASS"),
+    )
+
+
+@contextmanager
+def postgres():
+    """
+    A pooled psycopg2 connection. Commits when the block succeeds, rolls back otherwise,
+    same as `with connection:`. The connection goes back to the pool, don't close it.
+    """
+    pool, owned = _checkout("postgres", _create_postgres_pool)
+    connection = pool.getconn()
+    if connection.closed:
+        # server side disconnect while idle in the pool
+        pool.putconn(connection, close=True)
+        connection = pool.getconn()
+    try:
+        yield connection
+        if not connection.closed:
+            connection.commit()
+    except Exception:
+        if not connection.closed:
+            connection.rollback()
+        raise
+    finally:
+        pool.putconn(connection, close=bool(connection.closed))
+        if owned:
+            pool.closeall()
+
+
+@contextmanager
+def _shared_connector(name: str, factory: Callable[[], object]):
+    connector, owned = _checkout(name, factory)
+    try:
+        yield connector
+    finally:
+        if owned:
+            _close_client(name, connector)
+
+
+def crate():
+    """Shared CrateConnector, keeps the HTTP connection pool of the crate client."""
+    from f.db.cratedb import CrateConnector
+
+    return _shared_connector("crate", CrateConnector)
+
+
+def arango():
+    """Shared ArangoConnector, keeps the HTTP session and skips the `_system` database checks."""
+    from f.db.arango import ArangoConnector
+
+    return _shared_connector("arango", ArangoConnector)
+
+
+def qdrant():
+    """Shared QdrantConnector, keeps the gRPC channel open between calls."""
+    from f.db.qdrant import QdrantConnector
+
+    return _shared_connector("qdrant", QdrantConnector)
+
+
+def redis():
+    """Shared RedisConnector, keeps the cluster slot map and node connections."""
+    from f.db.redis import RedisConnector
+
+    return _shared_connector("redis", RedisConnector)
+
+
+def redis_binary():
+    """Shared RedisConnector that returns raw bytes, for binary values like msgpack documents."""
+    from f.db.redis import RedisConnector
+
+    return _shared_connector("redis_binary", lambda: RedisConnector(decode_responses=False))
+
+
+def main():
+    pass
@@ -4,18 +4,22 @@ from typing import Iterable, List
 
 from crate import client
 from pydantic import BaseModel
-import wmill
+
+from f.db.connections import get_variable
+from f.utils.instrumentation import json_bytes
 
 
 class CrateConnector:
     def __init__(self):
         try:
-            db_hosts = wmill.get_variable("u/Alp/CRATE_HOSTS").split(",")
-            db_user = wmill.get_variable("u/Alp/CRATE_USER")
-            db_pass = wmill.get_variable("u/Alp/CRATE_PASS")
+            db_hosts = get_variable("u/Alp/CRATE_HOSTS").split(",")
+            db_user = get_variable("u/Alp/CRATE_USER")
+            db_pass = get_variable("u/Alp/CRATE_PASS")
 
             self.con = client.connect(db_hosts, username=db_user, password=db_pass)
             self.cur = self.con.cursor()
+            # JSON payload of all upserts, read by sync metrics as write bytes
+            self.bytes_sent = 0
             print("Successfully connected to CrateDB.")
         except Exception as e:
             print(f"Failed to connect to CrateDB: {e}")
@@ -129,7 +133,72 @@ class CrateConnector:
                 ordered_non_ts.append(c)
 
         all_cols = ordered_non_ts + ["created_at", "updated_at"]
+        sql = self._upsert_sql(table, all_cols, conflict_columns)
+
+        # ── 5) Bind values (ensure every row has every column; use None when missing) ─
+        data = []
+        for d in cleaned:
+            row = [d.get(c) for c in all_cols]
+            data.append(row)
+
+        self.cur.executemany(sql, data)
+        self.bytes_sent += json_bytes(data)
+
+        return {
+            "records_received": len(records),
+            "rows_upserted": len(records),  # CrateDB rowcount is -1 on executemany
+        }
+
+    def upsert_rows(
+        self,
+        table: str,
+        columns: list[str],
+        rows: list[tuple],
+        conflict_columns: list[str],
+        silent: bool = False,
+    ) -> dict[str, int]:
+        """
+        Batch upsert plain tuples into CrateDB, same semantics as `upsert_many`.
+
+        Skips the per-row model_dump, so transforms can hand over tuples built in worker processes.
+        `columns` gives the tuple layout; created_at/updated_at are appended with `now`.
+        """
+        if not silent:
+            print(f"    Executing batch upsert of {len(rows)} rows into '{table}'.")
+
+        if not rows:
+            return {"records_received": 0, "rows_upserted": 0}
+
+        if not conflict_columns:
+            raise ValueError(
+                "`conflict_columns` must be provided for an upsert operation."
+            )
+
+        key_idx = [columns.index(c) for c in conflict_columns]
+        seen = defaultdict(int)
+        for row in rows:
+            seen[tuple(row[i] for i in key_idx)] += 1
+        dup_keys = {k: n for k, n in seen.items() if n > 1}
+        if dup_keys:
+            msg = "Upsert aborted. Duplicate records found:\n"
+            for k, n in dup_keys.items():
+                msg += f"  - Conflict Key {k}: {n} duplicates\n"
+            raise ValueError(msg)
+
+        now = datetime.utcnow()
+        all_cols = list(columns) + ["created_at", "updated_at"]
+        sql = self._upsert_sql(table, all_cols, conflict_columns)
+        data = [(*row, now, now) for row in rows]
+        self.cur.executemany(sql, data)
+        self.bytes_sent += json_bytes(data)
+
+        return {
+            "records_received": len(rows),
+            "rows_upserted": len(rows),  # CrateDB rowcount is -1 on executemany
+        }
 
+    @staticmethod
+    def _upsert_sql(table: str, all_cols: list[str], conflict_columns: list[str]) -> str:
         # Columns to update on conflict: everything except the conflict key and created_at
         update_cols = [
             c for c in all_cols if c not in set(conflict_columns) | {"created_at"}
@@ -145,24 +214,11 @@ class CrateConnector:
         else:
             updates = "NOTHING"
 
-        sql = (
+        return (
             f"INSERT INTO {table} ({col_list}) VALUES ({placeholders}) "
             f"ON CONFLICT ({conflict_list}) DO {updates}"
         )
 
-        # ── 5) Bind values (ensure every row has every column; use None when missing) ─
-        data = []
-        for d in cleaned:
-            row = [d.get(c) for c in all_cols]
-            data.append(row)
-
-        self.cur.executemany(sql, data)
-
-        return {
-            "records_received": len(records),
-            "rows_upserted": len(records),  # CrateDB rowcount is -1 on executemany
-        }
-
     def table_exists(self, table_name: str) -> bool:
         if not self.cur:
             return False
@@ -0,0 +1,238 @@
+import os
+import struct
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import msgpack
+from bson import ObjectId
+
+from f.db.connections import redis_binary
+
+# Read-through cache for media documents in the Redis cluster (allkeys-lfu, so cold titles
+# fall out by themselves). Keys share a hash tag per title, so stamp and document of one
+# title live on the same slot:
+#   media:{movie:603}:details:ver             -> version (updated_at in epoch ms)
+#   media:{movie:603}:details:1718000000000   -> msgpack document of that version
+# Sync scripts raise the stamp when they save a document, the next read misses the new
+# version and loads it from the database. Old versions are never read again and expire.
+# Writes that don't touch updated_at (the daily dump refreshes popularity) show up once the
+# cached document expires, hence a TTL of one dump cycle.
+ENABLED = os.getenv("MEDIA_CACHE", "true").lower() != "false"
+DOCUMENT_TTL_S = int(os.getenv("MEDIA_CACHE_TTL_S", str(24 * 3600)))
+STAMP_TTL_S = DOCUMENT_TTL_S * 2
+MEDIA_TYPES = {"movie": "movie", "tv": "tv", "show": "tv"}
+
+EXT_DATETIME = 1
+EXT_OBJECT_ID = 2
+_EPOCH = datetime(1970, 1, 1)
+
+# Only ever raise the stamp: a reader that loaded an older document must not roll back a newer save
+_STAMP_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]))
+local version = tonumber(ARGV[1])
+if current and current >= version then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+# Loads the documents of the given ids from the primary database, ids without document are left out
+Loader = Callable[[List[int]], Dict[int, dict]]
+
+
+# ===== Encoding =====
+
+def _encode(value: Any):
+    if isinstance(value, datetime):
+        # pymongo returns naive UTC datetimes, aware ones are converted
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return msgpack.ExtType(EXT_DATETIME, struct.pack(">q", (value - _EPOCH) // timedelta(microseconds=1)))
+    if isinstance(value, ObjectId):
+        return msgpack.ExtType(EXT_OBJECT_ID, value.binary)
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+def _decode(code: int, data: bytes):
+    if code == EXT_DATETIME:
+        return _EPOCH + timedelta(microseconds=struct.unpack(">q", data)[0])
+    if code == EXT_OBJECT_ID:
+        return ObjectId(data)
+    return msgpack.ExtType(code, data)
+
+
+def pack(document: dict) -> bytes:
+    return msgpack.packb(document, default=_encode, use_bin_type=True)
+
+
+def unpack(raw: bytes) -> dict:
+    return msgpack.unpackb(raw, ext_hook=_decode, raw=False, strict_map_key=False)
+
+
+def version_of(updated_at: Optional[datetime]) -> Optional[int]:
+    """updated_at in epoch milliseconds, the precision Mongo stores."""
+    if updated_at is None:
+        return None
+    if updated_at.tzinfo is not None:
+        updated_at = updated_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return (updated_at - _EPOCH) // timedelta(milliseconds=1)
+
+
+# ===== Cache =====
+
+class MediaCache:
+    """
+    usage:
+        cache = MediaCache("details")
+        docs = cache.get_many("movie", ids, lambda missing: _fetch_map_by_ids(collection, missing))
+
+        # after saving a document
+        cache.stamp_version("movie", tmdb_id, next_entry.updated_at)
+
+    Redis errors never fail the caller, the cache then falls back to the loader.
+    """
+
+    def __init__(self, kind: str = "details"):
+        self.kind = kind
+        self.stats = {"hits": 0, "misses": 0, "loaded": 0, "stored": 0, "errors": 0}
+
+    def _prefix(self, media_type: str, tmdb_id: int) -> str:
+        return f"media:{{{MEDIA_TYPES.get(media_type, media_type)}:{tmdb_id}}}:{self.kind}"
+
+    def stamp_key(self, media_type: str, tmdb_id: int) -> str:
+        return f"{self._prefix(media_type, tmdb_id)}:ver"
+
+    def document_key(self, media_type: str, tmdb_id: int, version: int) -> str:
+        return f"{self._prefix(media_type, tmdb_id)}:{version}"
+
+    # ---- reads ----
+
+    def get_many(self, media_type: str, ids: Iterable[int], loader: Loader) -> Dict[int, dict]:
+        """Documents by tmdb_id: cached ones at their current version, the rest from `loader` (then cached)."""
+        ids = list(dict.fromkeys(ids))
+        if not ENABLED or not ids:
+            return loader(ids) if ids else {}
+
+        found: Dict[int, dict] = {}
+        try:
+            with redis_binary() as rc:
+                r = rc.get_redis()
+                stamps = _mget(r, {tmdb_id: self.stamp_key(media_type, tmdb_id) for tmdb_id in ids})
+                versions = {tmdb_id: int(raw) for tmdb_id, raw in stamps.items() if raw is not None}
+                raw_documents = _mget(r, {
+                    tmdb_id: self.document_key(media_type, tmdb_id, version)
+                    for tmdb_id, version in versions.items()
+                })
+            for tmdb_id, raw in raw_documents.items():
+                if raw is not None:
+                    found[tmdb_id] = unpack(raw)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"media_cache: read failed, loading {len(ids)} {media_type} {self.kind} from the database: {e}")
+            found = {}
+
+        missing = [tmdb_id for tmdb_id in ids if tmdb_id not in found]
+        self.stats["hits"] += len(found)
+        self.stats["misses"] += len(missing)
+        if missing:
+            loaded = loader(missing)
+            self.stats["loaded"] += len(loaded)
+            self.put_many(media_type, loaded)
+            found.update(loaded)
+        return found
+
+    # ---- writes ----
+
+    def put_many(self, media_type: str, documents: Dict[int, dict]):
+        """Store documents under their updated_at version and raise the stamps. Documents without updated_at are not cached."""
+        if not ENABLED or not documents:
+            return
+        entries = []
+        for tmdb_id, document in documents.items():
+            version = version_of(document.get("updated_at"))
+            if version is None:
+                continue
+            try:
+                entries.append((tmdb_id, version, pack(document)))
+            except (TypeError, ValueError) as e:
+                print(f"media_cache: not caching {media_type} {tmdb_id}: {e}")
+        if not entries:
+            return
+        try:
+            with redis_binary() as rc:
+                pipe = rc.get_redis().pipeline(transaction=False)
+                for tmdb_id, version, raw in entries:
+                    pipe.set(self.document_key(media_type, tmdb_id, version), raw, ex=DOCUMENT_TTL_S)
+                    pipe.execute_command("EVAL", _STAMP_SCRIPT, 1, self.stamp_key(media_type, tmdb_id), version, STAMP_TTL_S)
+                pipe.execute()
+            self.stats["stored"] += len(entries)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"media_cache: could not store {len(entries)} {media_type} {self.kind}: {e}")
+
+    def stamp_versions(self, media_type: str, updated_at_by_id: Dict[int, datetime]):
+        """Call after saving documents: readers skip cached versions older than the stamp."""
+        if not ENABLED or not updated_at_by_id:
+            return
+        try:
+            with redis_binary() as rc:
+                pipe = rc.get_redis().pipeline(transaction=False)
+                for tmdb_id, updated_at in updated_at_by_id.items():
+                    version = version_of(updated_at)
+                    if version is not None:
+                        pipe.execute_command("EVAL", _STAMP_SCRIPT, 1, self.stamp_key(media_type, tmdb_id), version, STAMP_TTL_S)
+                pipe.execute()
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"media_cache: could not stamp {len(updated_at_by_id)} {media_type} {self.kind}: {e}")
+
+    def stamp_version(self, media_type: str, tmdb_id: int, updated_at: datetime):
+        self.stamp_versions(media_type, {tmdb_id: updated_at})
+
+    def invalidate(self, media_type: str, ids: Iterable[int]):
+        """Drop the stamps, the next read loads from the database whatever version is cached."""
+        keys = [self.stamp_key(media_type, tmdb_id) for tmdb_id in ids]
+        if not ENABLED or not keys:
+            return
+        try:
+            with redis_binary() as rc:
+                pipe = rc.get_redis().pipeline(transaction=False)
+                for key in keys:
+                    pipe.delete(key)
+                pipe.execute()
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"media_cache: could not invalidate {len(keys)} {media_type} {self.kind}: {e}")
+
+    def summary(self) -> str:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        rate = self.stats["hits"] / lookups if lookups else 0.0
+        return (f"media_cache {self.kind}: {self.stats['hits']}/{lookups} hits ({rate:.0%}), "
+                f"{self.stats['loaded']} loaded, {self.stats['stored']} stored, {self.stats['errors']} errors")
+
+
+def _mget(r, keys_by_id: Dict[int, str]) -> Dict[int, Optional[bytes]]:
+    """
+    MGET across cluster slots: keys are grouped by slot (MGET only takes keys of one slot),
+    one MGET per slot, all sent in one pipeline, which is one round trip per node.
+    """
+    if not keys_by_id:
+        return {}
+    by_slot = defaultdict(list)
+    for tmdb_id, key in keys_by_id.items():
+        by_slot[r.connection_pool.nodes.keyslot(key)].append(tmdb_id)
+
+    pipe = r.pipeline(transaction=False)
+    groups = list(by_slot.values())
+    for group in groups:
+        pipe.execute_command("MGET", *(keys_by_id[tmdb_id] for tmdb_id in group))
+    result = {}
+    for group, values in zip(groups, pipe.execute()):
+        result.update(zip(group, values))
+    return result
+
+
+def main():
+    pass
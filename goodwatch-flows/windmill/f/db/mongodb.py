@@ -1,5 +1,7 @@
 from mongoengine import connect, disconnect
-import wmill
+from mongoengine.connection import _connections
+
+from f.db.connections import SHARED_CONNECTIONS, get_variable
 
 
 CONNECTION_ALIAS = "default"
@@ -9,12 +11,15 @@ MAX_QUERY_TIME_MS = 240000
 
 
 def init_mongodb():
+    if CONNECTION_ALIAS in _connections:
+        # already connected in this process, MongoClient pools and reconnects itself
+        return
     print(f"Initializing mongodb...")
-    db_user = wmill.get_variable("u/Alp/MONGODB_USER")
-    db_pass = wmill.get_variable("u/Alp/MONGODB_PASS")
-    db_hosts = wmill.get_variable("u/Alp/MONGODB_HOSTS")
-    db_name = wmill.get_variable("u/Alp/MONGODB_DB")
-    db_rs = wmill.get_variable("u/Alp/MONGODB_RS")
+    db_user = get_variable("u/Alp/MONGODB_USER")
+    db_pass = get_variable("u/Alp/MONGODB_PASS")
+    db_hosts = get_variable("u/Alp/MONGODB_HOSTS")
+    db_name = get_variable("u/Alp/MONGODB_DB")
+    db_rs = get_variable("u/Alp/MONGODB_RS")
     connection_string = f"mongodb://{db_user}:{db_pass}@{db_hosts}/{db_name}?replicaSet={db_rs}&retryWrites=true&w=majority&readPreference=primaryPreferred&socketTimeoutMS=45000&connectTimeoutMS=10000&serverSelectionTimeoutMS=30000&appName=windmill"
     try:
         connect(
@@ -30,7 +35,10 @@ def init_mongodb():
         print(f"Failed mongodb initialization: ", error)
 
 
-def close_mongodb():
+def close_mongodb(force: bool = False):
+    """With shared connections the client stays open for the next step in this process."""
+    if SHARED_CONNECTIONS and not force:
+        return
     disconnect(alias=CONNECTION_ALIAS)
 
 
@@ -1,17 +1,24 @@
 # extra_requirements:
 # psycopg2-binary
 
+import io
+from typing import Dict, Iterable, List, Optional
+
 import psycopg2
-import wmill
+
+from f.db.connections import get_variable
+from f.utils.instrumentation import MEASURE_BYTES
+
+COPY_CHUNK_ROWS = 50_000
 
 
 def init_postgres():
     print(f"Initializing postregsql...")
-    db_name = wmill.get_variable("u/Alp/POSTGRES_DB")
-    db_host = wmill.get_variable("u/Alp/POSTGRES_HOST")
-    db_port = int(wmill.get_variable("u/Alp/POSTGRES_PORT"))
-    db_user = wmill.get_variable("u/Alp/POSTGRES_USER")
-    db_pass = wmill.get_variable("u/Alp/POSTGRES_PASS")
+    db_name = get_variable("u/Alp/POSTGRES_DB")
+    db_host = get_variable("u/Alp/POSTGRES_HOST")
+    db_port = int(get_variable("u/Alp/POSTGRES_PORT"))
+    db_user = get_variable("u/Alp/POSTGRES_USER")
+    db_pass = get_variable("u/Alp/POSTGRES_PASS")
     try:
         connection = psycopg2.connect(
             database=db_name,
@@ -50,5 +57,78 @@ def generate_upsert_query(table_name, columns):
     return query
 
 
+def _copy_array_literal(values) -> str:
+    elements = []
+    for value in values:
+        if value is None:
+            elements.append("NULL")
+        elif isinstance(value, str):
+            elements.append('"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"')
+        else:
+            elements.append(str(value))
+    return "{" + ",".join(elements) + "}"
+
+
+def format_copy_value(value) -> str:
+    """
+    Encode a python value as one field of COPY ... FROM STDIN (text format).
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (list, tuple, set)):
+        value = _copy_array_literal(value)
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_rows(
+    pg_cursor,
+    table_name: str,
+    columns: List[str],
+    rows: Iterable[tuple],
+    chunk_rows: int = COPY_CHUNK_ROWS,
+    stats: Optional[Dict[str, int]] = None,
+) -> int:
+    """
+    Bulk load rows with COPY in chunks, so memory stays bounded for large generators.
+    With `stats` and SYNC_MEASURE_BYTES set, the size of the sent COPY payload is added to stats["bytes"].
+    """
+    columns_str = ", ".join([f'"{column}"' for column in columns])
+    copy_sql = f'COPY "{table_name}" ({columns_str}) FROM STDIN'
+
+    output = io.StringIO()
+    total_count = 0
+    buffered = 0
+    for row in rows:
+        output.write("\t".join(format_copy_value(value) for value in row))
+        output.write("\n")
+        buffered += 1
+        total_count += 1
+        if buffered >= chunk_rows:
+            _count_copy_bytes(output, stats)
+            output.seek(0)
+            pg_cursor.copy_expert(copy_sql, output)
+            print(f"copied {total_count} rows into {table_name}")
+            output = io.StringIO()
+            buffered = 0
+    if buffered:
+        _count_copy_bytes(output, stats)
+        output.seek(0)
+        pg_cursor.copy_expert(copy_sql, output)
+    return total_count
+
+
+def _count_copy_bytes(output: io.StringIO, stats: Optional[Dict[str, int]]):
+    if stats is not None and MEASURE_BYTES:
+        stats["bytes"] = stats.get("bytes", 0) + len(output.getvalue().encode())
+
+
 def main():
     pass
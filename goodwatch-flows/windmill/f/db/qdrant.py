@@ -1,8 +1,9 @@
 from typing import Any, Dict, List, Optional, Tuple
 
-import wmill
 from qdrant_client import QdrantClient, models as qm
 
+from f.db.connections import get_variable
+
 
 GRPC_OPTS: dict[str, object] = {
     # --- Keep the connection alive even when idle ---
@@ -40,11 +41,69 @@ GRPC_OPTS: dict[str, object] = {
 }
 
 
+def build_quantization_config(spec: Optional[Dict[str, Any]]):
+    """
+    Translate a plain quantization dict into the qdrant-client model.
+
+    `spec` example:
+    {"kind": "scalar", "always_ram": True, "quantile": 0.99}
+    {"kind": "binary", "always_ram": True}
+    """
+    if not spec:
+        return None
+    kind = spec.get("kind", "scalar")
+    always_ram = bool(spec.get("always_ram", True))
+    if kind == "scalar":
+        return qm.ScalarQuantization(
+            scalar=qm.ScalarQuantizationConfig(
+                type=qm.ScalarType.INT8,
+                quantile=spec.get("quantile"),
+                always_ram=always_ram,
+            )
+        )
+    if kind == "binary":
+        return qm.BinaryQuantization(
+            binary=qm.BinaryQuantizationConfig(always_ram=always_ram)
+        )
+    raise ValueError(f"Unknown quantization kind '{kind}'")
+
+
+def build_search_params(
+    oversampling: Optional[float] = None,
+    rescore: Optional[bool] = None,
+    hnsw_ef: Optional[int] = None,
+    exact: bool = False,
+    ignore_quantization: bool = False,
+) -> Optional[qm.SearchParams]:
+    """
+    Search params for quantized vectors.
+
+    - oversampling: fetch `limit * oversampling` candidates from the quantized index
+    - rescore: re-rank those candidates with the original (on-disk) vectors
+    - exact: brute-force scan over the original vectors (baseline for recall measurements)
+    - ignore_quantization: traverse HNSW with the original vectors
+    """
+    if oversampling is None and rescore is None and hnsw_ef is None and not exact and not ignore_quantization:
+        return None
+    quantization = None
+    if oversampling is not None or rescore is not None or ignore_quantization:
+        quantization = qm.QuantizationSearchParams(
+            ignore=ignore_quantization,
+            rescore=rescore,
+            oversampling=oversampling,
+        )
+    return qm.SearchParams(
+        hnsw_ef=hnsw_ef,
+        exact=exact,
+        quantization=quantization,
+    )
+
+
 class QdrantConnector:
     def __init__(self):
-        host = wmill.get_variable("u/Alp/QDRANT_HOST")
-        port = wmill.get_variable("u/Alp/QDRANT_PORT")
-        api_key = wmill.get_variable("u/Alp/QDRANT_API_KEY")
+        host = get_variable("u/Alp/QDRANT_HOST")
+        port = get_variable("u/Alp/QDRANT_PORT")
+        api_key = get_variable("u/Alp/QDRANT_API_KEY")
         use_grpc = True
 
         self.client = QdrantClient(
@@ -82,9 +141,12 @@ class QdrantConnector:
 
         `vectors` example:
         {
-            "essence_text_v1": {"size": 768, "distance": "Cosine", "on_disk": False},
+            "essence_text_v1": {"size": 768, "distance": "Cosine", "on_disk": True, "quantization": {"kind": "scalar"}},
             "fingerprint_v1": {"size": 74,  "distance": "Cosine", "on_disk": False},
         }
+
+        With `quantization` set, only the quantized copy is kept in RAM (`always_ram`)
+        while `on_disk` moves the float32 originals to disk for rescoring.
         """
         if self.collection_exists(name):
             print(f"Collection '{name}' already exists. Skipping create.")
@@ -96,6 +158,7 @@ class QdrantConnector:
                 size=spec["size"],
                 distance=qm.Distance(spec.get("distance", "Cosine")),
                 on_disk=bool(spec.get("on_disk", False)),
+                quantization_config=build_quantization_config(spec.get("quantization")),
             )
             for vname, spec in vectors.items()
         }
@@ -113,6 +176,25 @@ class QdrantConnector:
             write_consistency_factor=write_consistency_factor,
         )
 
+    def update_vectors(self, name: str, vectors: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Apply on_disk / quantization settings to the named vectors of an existing collection.
+        Qdrant rebuilds the quantized copies in the background via the optimizer.
+        """
+        vector_diffs = {
+            vname: qm.VectorParamsDiff(
+                on_disk=bool(spec.get("on_disk", False)),
+                quantization_config=build_quantization_config(spec.get("quantization"))
+                or qm.Disabled.DISABLED,
+            )
+            for vname, spec in vectors.items()
+        }
+        print(f"Updating named vectors of '{name}': {list(vector_diffs.keys())}")
+        self.client.update_collection(
+            collection_name=name,
+            vectors_config=vector_diffs,
+        )
+
     def create_payload_index(self, collection: str, field: str, field_schema: str) -> None:
         """
         Idempotently create a payload index. If it exists, ignore the error.
@@ -205,6 +287,7 @@ class QdrantConnector:
         filter_: Optional[qm.Filter] = None,
         with_payload: bool = False,
         with_vectors: bool = False,
+        search_params: Optional[qm.SearchParams] = None,
     ):
         return self.client.search(
             collection_name=collection,
@@ -214,6 +297,64 @@ class QdrantConnector:
             query_filter=filter_,
             with_payload=with_payload,
             with_vectors=with_vectors,
+            search_params=search_params,
+        )
+
+    def search_quantized(
+        self,
+        collection: str,
+        vector_name: str,
+        query_vector: List[float],
+        limit: int = 50,
+        *,
+        oversampling: float = 2.0,
+        rescore: bool = True,
+        hnsw_ef: Optional[int] = None,
+        score_threshold: Optional[float] = None,
+        filter_: Optional[qm.Filter] = None,
+        with_payload: bool = False,
+        with_vectors: bool = False,
+    ):
+        """
+        Search the quantized index with `limit * oversampling` candidates,
+        then rescore them with the original vectors and return the top `limit`.
+        Callers pass the params configured for the named vector (`search_spec` in
+        f/sync/models/qdrant_schemas), the defaults match its `SearchSpec` defaults.
+        """
+        return self.search(
+            collection,
+            vector_name,
+            query_vector,
+            limit=limit,
+            score_threshold=score_threshold,
+            filter_=filter_,
+            with_payload=with_payload,
+            with_vectors=with_vectors,
+            search_params=build_search_params(
+                oversampling=oversampling,
+                rescore=rescore,
+                hnsw_ef=hnsw_ef,
+            ),
+        )
+
+    def search_exact(
+        self,
+        collection: str,
+        vector_name: str,
+        query_vector: List[float],
+        limit: int = 50,
+        filter_: Optional[qm.Filter] = None,
+    ):
+        """
+        Brute-force search over the original vectors. Slow, only meant as recall baseline.
+        """
+        return self.search(
+            collection,
+            vector_name,
+            query_vector,
+            limit=limit,
+            filter_=filter_,
+            search_params=build_search_params(exact=True, ignore_quantization=True),
         )
 
     def scroll(
@@ -1,17 +1,18 @@
 from rediscluster import RedisCluster # pin: redis-py-cluster
-import wmill
+
+from f.db.connections import get_variable
 
 
 class RedisConnector:
-    def __init__(self) -> None:
-        hosts = wmill.get_variable("u/Alp/REDIS_HOSTS")
-        port = wmill.get_variable("u/Alp/REDIS_PORT")
-        redis_pass = wmill.get_variable("u/Alp/REDIS_PASS")
+    def __init__(self, decode_responses: bool = True) -> None:
+        hosts = get_variable("u/Alp/REDIS_HOSTS")
+        port = get_variable("u/Alp/REDIS_PORT")
+        redis_pass = get_variable("u/Alp/REDIS_PASS")
         startup_nodes = [{"host": host, "port": port} for host in hosts.split(",")]
         self.r = RedisCluster(
             startup_nodes=startup_nodes,
             password=redis_pass,
-            decode_responses=True,
+            decode_responses=decode_responses,
         )
 
     def debug(self) -> None:
@@ -6,11 +6,9 @@ from google import genai # pin: google-api-python-client
 from google.genai import types # pin: google-genai
 from pydantic import TypeAdapter, ValidationError
 from rediscluster import RedisCluster # pin: redis-py-cluster
-import wmill
 
 from f.data_source.common import get_document_for_id
-from f.db.mongodb import init_mongodb, close_mongodb
-from f.db.redis import RedisConnector
+from f.db.connections import get_variable, mongodb, redis as shared_redis
 from f.dna.models import DnaMovie, DnaTv, DNAAnalysis
 
 # Example input for The Matrix (1999)
@@ -480,24 +478,24 @@ def store_result(next_entry: Union[DnaMovie, DnaTv], dna: dict, model_name: str)
 def generate_dna(next_entries: list[Union[DnaMovie, DnaTv]]):
     print("Generate DNA via Gemini")
 
-    rc = RedisConnector()
-    redis = rc.get_redis()
+    with shared_redis() as rc:
+        redis = rc.get_redis()
 
-    model_name = choose_model(redis=redis)
-    api_key = wmill.get_variable("u/Alp/GEMINI_API_KEY")
-    client = genai.Client(api_key=api_key)
+        model_name = choose_model(redis=redis)
+        api_key = get_variable("u/Alp/GEMINI_API_KEY")
+        client = genai.Client(api_key=api_key)
 
-    if not next_entries:
-        print(f"warning: no entries to fetch for DNA")
-        return
+        if not next_entries:
+            print(f"warning: no entries to fetch for DNA")
+            return
 
-    print("next entries are:")
-    for next_entry in next_entries:
-        print(
-            f"{next_entry.original_title} (popularity: {next_entry.popularity})"
-        )
+        print("next entries are:")
+        for next_entry in next_entries:
+            print(
+                f"{next_entry.original_title} (popularity: {next_entry.popularity})"
+            )
 
-    results = ask_ai(client=client, redis=redis, model_name=model_name, next_entries=next_entries)
+        results = ask_ai(client=client, redis=redis, model_name=model_name, next_entries=next_entries)
 
     for index, next_entry in enumerate(next_entries):
         result = results[index]
@@ -511,14 +509,12 @@ def main(next_ids: list[dict] = [{
   "tmdb_id": 603,
   "type": "movie",
 }]):
-    init_mongodb()
-    next_entries = []
-    for next_id in next_ids:
-        next_entries.append(get_document_for_id(
-            next_id=next_id,
-            movie_model=DnaMovie,
-            tv_model=DnaTv,
-        ))
-    result = generate_dna(next_entries)
-    close_mongodb()
-    return result
+    with mongodb():
+        next_entries = []
+        for next_id in next_ids:
+            next_entries.append(get_document_for_id(
+                next_id=next_id,
+                movie_model=DnaMovie,
+                tv_model=DnaTv,
+            ))
+        return generate_dna(next_entries)
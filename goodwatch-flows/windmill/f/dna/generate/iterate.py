@@ -1,5 +1,5 @@
 from f.data_source.common import get_documents_for_ids, IdParameter
-from f.db.mongodb import init_mongodb, close_mongodb
+from f.db.connections import mongodb
 from f.dna.models import DnaMovie, DnaTv
 
 
@@ -7,31 +7,29 @@ DNA_CHUNK_SIZE = 5
 
 
 def main(next_ids: dict):
-    init_mongodb()
-    next_entries = get_documents_for_ids(
-        next_ids=next_ids,
-        movie_model=DnaMovie,
-        tv_model=DnaTv,
-    )
-
-    entries_to_fetch = []
-    for next_entry in next_entries:
-        if isinstance(next_entry, DnaMovie):
-            id_type = "movie"
-        elif isinstance(next_entry, DnaTv):
-            id_type = "tv"
-        else:
-            raise Exception(f"next_entry has an unexpected type: {type(next_entry)}")
-
-        entries_to_fetch.append(
-            IdParameter(
-                id=str(next_entry.id),
-                tmdb_id=next_entry.tmdb_id,
-                type=id_type,
-            ).model_dump()
+    with mongodb():
+        next_entries = get_documents_for_ids(
+            next_ids=next_ids,
+            movie_model=DnaMovie,
+            tv_model=DnaTv,
         )
 
-    close_mongodb()
+        entries_to_fetch = []
+        for next_entry in next_entries:
+            if isinstance(next_entry, DnaMovie):
+                id_type = "movie"
+            elif isinstance(next_entry, DnaTv):
+                id_type = "tv"
+            else:
+                raise Exception(f"next_entry has an unexpected type: {type(next_entry)}")
+
+            entries_to_fetch.append(
+                IdParameter(
+                    id=str(next_entry.id),
+                    tmdb_id=next_entry.tmdb_id,
+                    type=id_type,
+                ).model_dump()
+            )
     
     chunked_list = [
         entries_to_fetch[i : i + DNA_CHUNK_SIZE]
@@ -1,5 +1,5 @@
 from f.data_source.common import retrieve_next_entry_ids_full
-from f.db.mongodb import init_mongodb, close_mongodb
+from f.db.connections import mongodb
 from f.dna.models import DnaMovie, DnaTv
 
 
@@ -8,15 +8,13 @@ BUFFER_SELECTED_AT_MINUTES = 60
 
 
 def main():
-    init_mongodb()
-    result = retrieve_next_entry_ids_full(
-        count=BATCH_SIZE,
-        buffer_minutes=BUFFER_SELECTED_AT_MINUTES,
-        movie_model=DnaMovie,
-        tv_model=DnaTv,
-    )
-    close_mongodb()
-    return result
+    with mongodb():
+        return retrieve_next_entry_ids_full(
+            count=BATCH_SIZE,
+            buffer_minutes=BUFFER_SELECTED_AT_MINUTES,
+            movie_model=DnaMovie,
+            tv_model=DnaTv,
+        )
 
 
 if __name__ == "__main__":
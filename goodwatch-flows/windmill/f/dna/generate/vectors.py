@@ -7,9 +7,8 @@ from typing import Union
 
 from google import genai
 from google.genai import types
-import wmill
 
-from f.db.mongodb import init_mongodb, close_mongodb
+from f.db.connections import get_variable, mongodb
 from f.dna.models import CoreScores, DnaMovie, DnaTv
 
 # model names: https://ai.google.dev/gemini-api/docs/embeddings#embeddings-models
@@ -24,7 +23,7 @@ max_inputs = 100
 
 
 def generate_vectors(results: list[dict]):
-    api_key = wmill.get_variable("u/Alp/GEMINI_API_KEY")
+    api_key = get_variable("u/Alp/GEMINI_API_KEY")
     client = genai.Client(
         api_key=api_key,
     )
@@ -69,18 +68,17 @@ def store_result(next_entry: Union[DnaMovie, DnaTv], vector_essence_text: list[f
 def main(ids: dict[str, list], results: list[dict]):
     embeddings = generate_vectors(results)
 
-    init_mongodb()
-    for index, result in enumerate(results):
-        result_id = result["id"]
-        embedding = embeddings[index]
+    with mongodb():
+        for index, result in enumerate(results):
+            result_id = result["id"]
+            embedding = embeddings[index]
 
-        collection_class = DnaMovie if result_id in ids["movie_ids"] else DnaTv
-        next_entry = collection_class.objects.get(id=result_id)
-        fingerprint = create_embedding_from_scores(next_entry.dna["fingerprint"]["scores"])
+            collection_class = DnaMovie if result_id in ids["movie_ids"] else DnaTv
+            next_entry = collection_class.objects.get(id=result_id)
+            fingerprint = create_embedding_from_scores(next_entry.dna["fingerprint"]["scores"])
 
-        store_result(next_entry, embedding, fingerprint)
-        print(fingerprint)
-    close_mongodb()
+            store_result(next_entry, embedding, fingerprint)
+            print(fingerprint)
 
     return {
         "embeddings_count": len(embeddings),
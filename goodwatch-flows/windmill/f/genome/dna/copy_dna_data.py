@@ -1,7 +1,22 @@
+from array import array
 from collections import defaultdict
 from io import StringIO
 import csv
-from f.db.postgres import init_postgres
+import os
+import queue
+import struct
+import tempfile
+import threading
+from f.db.postgres import init_postgres, copy_rows
+
+MEDIA_TYPES = ["movie", "tv"]
+FETCH_ROWS = 2000
+COPY_CHUNK_ROWS = 2000
+MEMORY_BUDGET_MB = 256
+SPILL_DIR = os.getenv("DNA_SPILL_DIR") or None
+# spill record: key index, media type index, number of ids (followed by the int32 ids)
+SPILL_HEADER = struct.Struct("=iBi")
+TEMP_COLUMNS = ["category", "label", "count_all", "count_movies", "count_tv", "movie_tmdb_id", "tv_tmdb_id", "cluster_id"]
 
 def get_clusters(pg_cursor):
     print("Fetching cluster mappings...")
@@ -53,6 +68,143 @@ def load_all_data(pg, media_type):
 
     return dna_map, {"processed": processed, "dna_entries": dna_entries}
 
+def stream_chunks(pg, media_type, fetch_rows=FETCH_ROWS):
+    """
+    Rows of a named (server-side) cursor in chunks of `fetch_rows`. A background thread
+    fetches the next chunk while the caller aggregates the current one.
+    """
+    chunks = queue.Queue(maxsize=2)
+    table = "movies" if media_type == "movie" else "tv"
+
+    def fetch():
+        try:
+            with pg.cursor(name=f"dna_stream_{media_type}") as cursor:
+                cursor.itersize = fetch_rows
+                cursor.execute(f"""
+                    SELECT tmdb_id, dna
+                    FROM {table}
+                    ORDER BY tmdb_id
+                """)
+                while True:
+                    chunk = cursor.fetchmany(fetch_rows)
+                    if not chunk:
+                        break
+                    chunks.put(chunk)
+            chunks.put(None)
+        except Exception as error:
+            chunks.put(error)
+
+    reader = threading.Thread(target=fetch, daemon=True)
+    reader.start()
+    while True:
+        chunk = chunks.get()
+        if chunk is None:
+            break
+        if isinstance(chunk, Exception):
+            raise chunk
+        yield chunk
+    reader.join()
+
+class SpillReader:
+    def __init__(self, file):
+        self.file = file
+        self.file.seek(0)
+        self.header = None
+        self.advance()
+
+    def advance(self):
+        raw = self.file.read(SPILL_HEADER.size)
+        self.header = SPILL_HEADER.unpack(raw) if raw else None
+
+    def read_ids(self, count):
+        ids = array("i")
+        ids.frombytes(self.file.read(count * ids.itemsize))
+        return ids
+
+class DnaAggregator:
+    """
+    Ids per (category, label) as int32 arrays instead of sets. Once the buffered ids
+    exceed the memory budget they are appended to a spill file, ordered by key, and
+    `rows` merges all spill files with what is left in memory.
+    Expects the rows of each media type ordered by tmdb_id, one row per tmdb_id.
+    """
+
+    def __init__(self, memory_budget_mb=MEMORY_BUDGET_MB):
+        self.budget_ids = memory_budget_mb * 1024 * 1024 // array("i").itemsize
+        self.key_index = {}
+        self.keys = []
+        self.counts = []
+        self.ids = ([], [])
+        self.buffered_ids = 0
+        self.spills = []
+        self.stats = {media_type: {"processed": 0, "dna_entries": 0} for media_type in MEDIA_TYPES}
+
+    def add(self, media_type, tmdb_id, dna_data):
+        media_index = MEDIA_TYPES.index(media_type)
+        stats = self.stats[media_type]
+        stats["processed"] += 1
+        for category, values in dna_data.items():
+            for value in values:
+                stats["dna_entries"] += 1
+                index = self.key_index.get((category, value))
+                if index is None:
+                    index = len(self.keys)
+                    self.key_index[(category, value)] = index
+                    self.keys.append((category, value))
+                    self.counts.append([0, 0, 0])
+                    self.ids[0].append(array("i"))
+                    self.ids[1].append(array("i"))
+                counts = self.counts[index]
+                counts[0] += 1
+                counts[media_index + 1] += 1
+                ids = self.ids[media_index][index]
+                if not ids or ids[-1] != tmdb_id:
+                    ids.append(tmdb_id)
+                    self.buffered_ids += 1
+        if self.buffered_ids > self.budget_ids:
+            self.spill()
+
+    def spill(self):
+        spill_file = tempfile.TemporaryFile(dir=SPILL_DIR)
+        for index in range(len(self.keys)):
+            for media_index in (0, 1):
+                ids = self.ids[media_index][index]
+                if ids:
+                    spill_file.write(SPILL_HEADER.pack(index, media_index, len(ids)))
+                    ids.tofile(spill_file)
+                    self.ids[media_index][index] = array("i")
+        self.spills.append(spill_file)
+        print(f"Spilled {self.buffered_ids:,} ids to disk (spill {len(self.spills)})")
+        self.buffered_ids = 0
+
+    def rows(self):
+        """(category, label, counts, movie_ids, tv_ids) in key order, releasing memory as it goes."""
+        readers = [SpillReader(spill_file) for spill_file in self.spills]
+        for index, (category, label) in enumerate(self.keys):
+            merged = (array("i"), array("i"))
+            for reader in readers:
+                while reader.header and reader.header[0] == index:
+                    _, media_index, count = reader.header
+                    merged[media_index].extend(reader.read_ids(count))
+                    reader.advance()
+            for media_index in (0, 1):
+                merged[media_index].extend(self.ids[media_index][index])
+                self.ids[media_index][index] = None
+            yield category, label, self.counts[index], merged[0], merged[1]
+
+    def close(self):
+        for spill_file in self.spills:
+            spill_file.close()
+        self.spills = []
+
+def load_all_data_streaming(pg, aggregator, media_type):
+    print(f"\nStreaming all {media_type} data...")
+    for chunk in stream_chunks(pg, media_type):
+        for tmdb_id, dna_data in chunk:
+            aggregator.add(media_type, tmdb_id, dna_data)
+    stats = aggregator.stats[media_type]
+    print(f"Processed {stats['processed']:,} {media_type}s, found {stats['dna_entries']:,} DNA entries")
+
 def setup_temp_table(pg):
     print("\nCreating temporary table...")
     with pg.cursor() as cursor:
@@ -81,11 +233,7 @@ def write_to_temp_table(pg, combined_data, clusters):
     row_count = 0
 
     # First, get existing DNA IDs
-    dna_ids = {}
-    with pg.cursor() as cursor:
-        cursor.execute("SELECT category, label, id FROM dna")
-        for category, label, dna_id in cursor.fetchall():
-            dna_ids[(category, label)] = dna_id
+    dna_ids = get_dna_ids(pg)
 
     for (category, label), data in combined_data.items():
         # Look up the DNA ID and its potential cluster
@@ -116,6 +264,29 @@ def write_to_temp_table(pg, combined_data, clusters):
         )
     pg.commit()
 
+def get_dna_ids(pg):
+    dna_ids = {}
+    with pg.cursor() as cursor:
+        cursor.execute("SELECT category, label, id FROM dna")
+        for category, label, dna_id in cursor.fetchall():
+            dna_ids[(category, label)] = dna_id
+    return dna_ids
+
+def copy_aggregated_to_temp_table(pg, aggregator, clusters):
+    print("Streaming aggregated data to temp table...")
+    dna_ids = get_dna_ids(pg)
+
+    def temp_rows():
+        for category, label, counts, movie_ids, tv_ids in aggregator.rows():
+            dna_id = dna_ids.get((category, label))
+            cluster_id = clusters.get(dna_id) if dna_id else None
+            yield (category, label, *counts, movie_ids.tolist(), tv_ids.tolist(), cluster_id)
+
+    with pg.cursor() as cursor:
+        row_count = copy_rows(cursor, "dna_temp", TEMP_COLUMNS, temp_rows(), chunk_rows=COPY_CHUNK_ROWS)
+    pg.commit()
+    print(f"Loaded {row_count:,} rows into temp table")
+
 def merge_in_batches(pg, batch_size=1000):
     print("\nMerging data in batches...")
     processed = 0
@@ -175,34 +346,46 @@ def cleanup_zero_counts(pg):
         print(f"Removed {deleted_count:,} zero-count entries")
     pg.commit()
 
-def copy_dna_data(pg):
+def aggregate_in_memory(pg):
+    combined_data = defaultdict(lambda: {
+        "count_all": 0, 
+        "count_movies": 0, 
+        "count_tv": 0, 
+        "movie_ids": set(), 
+        "tv_ids": set()
+    })
+
+    stats = {}
+    for media_type in MEDIA_TYPES:
+        data, media_stats = load_all_data(pg, media_type)
+        stats[media_type] = media_stats
+
+        for key, value in data.items():
+            entry = combined_data[key]
+            entry["count_all"] += value["count_all"]
+            entry["count_movies"] += value["count_movies"]
+            entry["count_tv"] += value["count_tv"]
+            entry["movie_ids"].update(value["movie_ids"])
+            entry["tv_ids"].update(value["tv_ids"])
+    return combined_data, stats
+
+def copy_dna_data(pg, streaming=True, memory_budget_mb=MEMORY_BUDGET_MB):
+    aggregator = None
     try:
         with pg.cursor() as cursor:
             clusters = get_clusters(cursor)
-        
-        combined_data = defaultdict(lambda: {
-            "count_all": 0, 
-            "count_movies": 0, 
-            "count_tv": 0, 
-            "movie_ids": set(), 
-            "tv_ids": set()
-        })
-        
-        stats = {}
-        for media_type in ["movie", "tv"]:
-            data, media_stats = load_all_data(pg, media_type)
-            stats[media_type] = media_stats
-            
-            for key, value in data.items():
-                entry = combined_data[key]
-                entry["count_all"] += value["count_all"]
-                entry["count_movies"] += value["count_movies"]
-                entry["count_tv"] += value["count_tv"]
-                entry["movie_ids"].update(value["movie_ids"])
-                entry["tv_ids"].update(value["tv_ids"])
-        
-        setup_temp_table(pg)
-        write_to_temp_table(pg, combined_data, clusters)
+
+        if streaming:
+            aggregator = DnaAggregator(memory_budget_mb)
+            for media_type in MEDIA_TYPES:
+                load_all_data_streaming(pg, aggregator, media_type)
+            stats = aggregator.stats
+            setup_temp_table(pg)
+            copy_aggregated_to_temp_table(pg, aggregator, clusters)
+        else:
+            combined_data, stats = aggregate_in_memory(pg)
+            setup_temp_table(pg)
+            write_to_temp_table(pg, combined_data, clusters)
         
         merge_in_batches(pg)
         cleanup_zero_counts(pg)
@@ -213,16 +396,21 @@ def copy_dna_data(pg):
         print(f"TV shows processed: {stats['tv']['processed']:,}")
         print(f"Total DNA entries processed: {total_dna_entries:,}")
         
-        return {
+        result = {
             "total_counts": {k: v["processed"] for k, v in stats.items()},
             "total_dna_entries": total_dna_entries
         }
+        if aggregator:
+            result["spills"] = len(aggregator.spills)
+        return result
     finally:
+        if aggregator:
+            aggregator.close()
         cleanup_temp_table(pg)
 
-def main():
+def main(streaming: bool = True, memory_budget_mb: int = MEMORY_BUDGET_MB):
     with init_postgres() as pg:
-        return copy_dna_data(pg)
+        return copy_dna_data(pg, streaming=streaming, memory_budget_mb=memory_budget_mb)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -6,9 +6,13 @@ from ssl import SSLError
 from typing import Union
 
 from f.data_source.common import get_document_for_id
+from f.data_source.crawl_control import RateLimitReached, track_crawl
+from f.data_source.stats import count_changes, document_state
 from f.db.mongodb import init_mongodb, close_mongodb
 from f.imdb_web.models import ImdbCrawlResult, ImdbMovieRating, ImdbTvRating
 
+CRAWL_SOURCE = "imdb"
+
 
 def crawl_data(
     next_entry: Union[ImdbMovieRating, ImdbTvRating],
@@ -46,6 +50,15 @@ def crawl_imdb_page(imdb_id: str) -> ImdbCrawlResult:
         # TODO error handling
         raise error
 
+    if response.status_code in (403, 429):
+        return ImdbCrawlResult(
+            url=url,
+            user_score_original=None,
+            user_score_normalized_percent=None,
+            user_score_vote_count=None,
+            rate_limit_reached=True,
+        )
+
     html = response.text
     soup = BeautifulSoup(html, "html.parser")
 
@@ -94,6 +107,7 @@ def crawl_imdb_page(imdb_id: str) -> ImdbCrawlResult:
 def store_result(
     next_entry: Union[ImdbMovieRating, ImdbTvRating], result: ImdbCrawlResult
 ):
+    state = document_state(next_entry)
     print(
         f"saving rating for {next_entry.original_title}: {result.user_score_original} ({result.user_score_vote_count})"
     )
@@ -107,6 +121,7 @@ def store_result(
     next_entry.updated_at = datetime.utcnow()
     next_entry.is_selected = False
     next_entry.save()
+    count_changes(next_entry, state)
 
 
 async def imdb_crawl_ratings(next_entry: Union[ImdbMovieRating, ImdbTvRating]):
@@ -123,7 +138,7 @@ async def imdb_crawl_ratings(next_entry: Union[ImdbMovieRating, ImdbTvRating]):
     (crawl_result, _) = crawl_data(next_entry)
 
     if crawl_result.rate_limit_reached:
-        raise Exception(
+        raise RateLimitReached(
             f"Rate limit reached for {next_entry.original_title}, retrying."
         )
 
@@ -142,6 +157,7 @@ def main(next_id: dict):
         movie_model=ImdbMovieRating,
         tv_model=ImdbTvRating,
     )
-    result = asyncio.run(imdb_crawl_ratings(next_entry))
+    with track_crawl(CRAWL_SOURCE):
+        result = asyncio.run(imdb_crawl_ratings(next_entry))
     close_mongodb()
     return result
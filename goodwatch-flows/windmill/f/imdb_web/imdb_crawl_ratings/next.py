@@ -1,16 +1,17 @@
 from f.data_source.common import retrieve_next_entry_ids
+from f.data_source.crawl_control import crawl_batch_size
 from f.db.mongodb import init_mongodb, close_mongodb
 from f.imdb_web.models import ImdbMovieRating, ImdbTvRating
 
 
-BATCH_SIZE = 15
+CRAWL_SOURCE = "imdb"
 BUFFER_SELECTED_AT_MINUTES = 10
 
 
 def main():
     init_mongodb()
     ids = retrieve_next_entry_ids(
-        count=BATCH_SIZE,
+        count=crawl_batch_size(CRAWL_SOURCE),
         buffer_minutes=BUFFER_SELECTED_AT_MINUTES,
         movie_model=ImdbMovieRating,
         tv_model=ImdbTvRating,
@@ -5,7 +5,8 @@ from typing import Optional
 
 from mongoengine import get_db
 
-from f.db.arango import ArangoConnector
+from f.data_source.id_filter import existing_ids, summary as id_filter_summary
+from f.db.arango import ArangoConnector, WriteRegistry
 from f.db.mongodb import (
     init_mongodb,
     close_mongodb,
@@ -33,9 +34,21 @@ from f.main_db.models.arango import (
     Score,
     StreamingAvailability,
 )
+from f.utils.instrumentation import SyncMetrics, bson_bytes
 
 BATCH_SIZE = 1000
 SUB_BATCH_SIZE = 5000
+# vertices many titles point to, rewritten by every batch that references them unless tracked
+SHARED_VERTICES = {
+    "persons",
+    "production_companies",
+    "networks",
+    "movie_series",
+    "tropes",
+    "essence_tags",
+    "content_advisories",
+}
+REGISTRY_PATH = "/tmp/goodwatch/arango_write_registry.json"
 
 
 # TODO: remove or flag obsolete documents and edges
@@ -64,42 +77,59 @@ def to_timestamp(dt_input) -> Optional[float]:
 
 
 def fetch_documents_in_batch(tmdb_ids, collection):
+    tmdb_ids = existing_ids(collection, tmdb_ids)
+    if not tmdb_ids:
+        return {}
     return {
         doc["tmdb_id"]: doc for doc in collection.find({"tmdb_id": {"$in": tmdb_ids}})
     }
 
 
 def fetch_all_documents_in_batch(tmdb_ids, collection):
+    tmdb_ids = existing_ids(collection, tmdb_ids)
+    if not tmdb_ids:
+        return {}
     results = defaultdict(list)
     for doc in collection.find({"tmdb_id": {"$in": tmdb_ids}}):
         results[doc["tmdb_id"]].append(doc)
     return dict(results)
 
 
-def process_and_insert_entities(entities_to_process: list[BaseArangoModel], connector: ArangoConnector, collection, entity_type: str):
+def process_and_insert_entities(entities_to_process: list[BaseArangoModel], connector: ArangoConnector, collection, entity_type: str, registry: Optional[WriteRegistry] = None):
     """Process and insert entities and return upsert results."""
-    total_result = {"created": 0, "updated": 0, "ignored": 0}
+    total_result = {"created": 0, "updated": 0, "ignored": 0, "skipped": 0}
     
     if entities_to_process:
         print(f"    Upserting {len(entities_to_process)} {entity_type}")
         for i in range(0, len(entities_to_process), SUB_BATCH_SIZE):
             sub_batch = entities_to_process[i:i + SUB_BATCH_SIZE]
             if sub_batch:
-                result = connector.upsert_many(collection, sub_batch)
+                result = connector.upsert_many(collection, sub_batch, registry=registry)
                 total_result["created"] += result["created"]
                 total_result["updated"] += result["updated"]
                 total_result["ignored"] += result["ignored"]
+                total_result["skipped"] += result.get("skipped", 0)
     
     return total_result
 
 
+def _written_count(*count_maps) -> int:
+    return sum(counts["created"] + counts["updated"] for count_map in count_maps for counts in count_map.values())
+
+
 def copy_media(
     connector: ArangoConnector, 
     query_selector: dict = {},
-    media_type: str = "movie" 
+    media_type: str = "movie",
+    metrics: Optional[SyncMetrics] = None,
+    registry: Optional[WriteRegistry] = None,
 ):
-    """Generic function to copy movies or shows from MongoDB to ArangoDB."""
+    """
+    Generic function to copy movies or shows from MongoDB to ArangoDB.
+    With a `registry`, media, their stubs and SHARED_VERTICES already written in the run are skipped.
+    """
     mongo_db = get_db()
+    metrics = metrics or SyncMetrics(f"arango_{media_type}")
 
     is_movie = media_type == "movie"
 
@@ -127,8 +157,8 @@ def copy_media(
     start = 0
     
     # Initialize comprehensive count tracking
-    entity_counts = defaultdict(lambda: {"created": 0, "updated": 0, "ignored": 0})
-    edge_counts = defaultdict(lambda: {"created": 0, "updated": 0, "ignored": 0})
+    entity_counts = defaultdict(lambda: {"created": 0, "updated": 0, "ignored": 0, "skipped": 0})
+    edge_counts = defaultdict(lambda: {"created": 0, "updated": 0, "ignored": 0, "skipped": 0})
     
     while True:
         media_documents = []
@@ -137,6 +167,8 @@ def copy_media(
         entity_batches = defaultdict(list)
         edge_batches = defaultdict(list)
 
+        batch_no = start // BATCH_SIZE
+        stage = metrics.begin("mongo_read", batch_no)
         tmdb_details_batch = list(
             #mongo_collection.find({"tmdb_id": {"$lt": 1000}})
             mongo_collection.find(query_selector)
@@ -145,6 +177,7 @@ def copy_media(
                 .limit(BATCH_SIZE)
         )
         if not tmdb_details_batch:
+            metrics.end(stage, rows=0)
             break
 
         tmdb_ids = [doc["tmdb_id"] for doc in tmdb_details_batch]
@@ -174,7 +207,13 @@ def copy_media(
             tmdb_ids, 
             mongo_db.tmdb_movie_providers if is_movie else mongo_db.tmdb_tv_providers
         )
+        metrics.end(stage, rows=len(tmdb_details_batch), bytes_=bson_bytes(
+            [*tmdb_details_batch, *imdb_ratings.values(), *metacritic_ratings.values(),
+             *rotten_tomatoes_ratings.values(), *tv_tropes_tags.values(), *dna_data.values(),
+             *(doc for docs in tmdb_all_providers.values() for doc in docs)]
+        ))
 
+        stage = metrics.begin("transform", batch_no)
         for tmdb_details in tmdb_details_batch:
             tmdb_id = tmdb_details["tmdb_id"]
             media_key = str(tmdb_id)
@@ -985,6 +1024,8 @@ def copy_media(
             media_documents.append(media)
             
 
+        metrics.end(stage, rows=len(media_documents))
+
         # Collect all referenced media IDs for this batch
         referenced_media_ids = set()
         for media_item in media_documents: 
@@ -994,6 +1035,7 @@ def copy_media(
         # Insert batch of media
         print(f"\nExecuting batch from {start} to {start + len(media_documents)} {media_type}s")
         
+        stage = metrics.begin("serialize", batch_no)
         media_for_upsert = []
         for media_item in media_documents: 
             media_dict = media_item.model_dump(
@@ -1006,10 +1048,15 @@ def copy_media(
             )
             cleaned_media_instance = MediaClass(**media_dict)
             media_for_upsert.append(cleaned_media_instance)
+        metrics.end(stage, rows=len(media_for_upsert))
         
+        stage = metrics.begin("arango_write", batch_no)
+        written_before = _written_count(entity_counts, edge_counts)
+        bytes_before = connector.bytes_sent
         upsert_result = connector.upsert_many(
             collections[media_collection_name],
-            media_for_upsert
+            media_for_upsert,
+            registry=registry,
         )
         
         # Track media counts
@@ -1017,6 +1064,7 @@ def copy_media(
         entity_counts[media_type_key]["created"] += upsert_result["created"]
         entity_counts[media_type_key]["updated"] += upsert_result["updated"]
         entity_counts[media_type_key]["ignored"] += upsert_result["ignored"]
+        entity_counts[media_type_key]["skipped"] += upsert_result.get("skipped", 0)
         
         # Insert all documents for batch and track counts
         print(f"\n  Upserting entities for {media_type}s:")
@@ -1026,11 +1074,13 @@ def copy_media(
                 connector,
                 collections[name], 
                 name.replace('_', ' '), 
+                registry=registry if name in SHARED_VERTICES else None,
             )
             # Accumulate node counts
             entity_counts[name]["created"] += result["created"]
             entity_counts[name]["updated"] += result["updated"]
             entity_counts[name]["ignored"] += result["ignored"]
+            entity_counts[name]["skipped"] += result["skipped"]
 
         # Insert edges for batch and track counts
         print(f"\n  Upserting edges for {media_type}s:")
@@ -1055,7 +1105,7 @@ def copy_media(
             referenced_media_data = list(
                 mongo_collection.find(
                     {
-                        "tmdb_id": {"$in": list(referenced_media_ids)}
+                        "tmdb_id": {"$in": existing_ids(mongo_collection, list(referenced_media_ids))}
                     }, {
                         "tmdb_id": 1,
                         "title": 1,
@@ -1096,12 +1146,15 @@ def copy_media(
                 print(f"    Upserting {len(minimal_media_list)} minimal {media_type} records...")
                 result = connector.upsert_many(
                     collections[media_collection_name],
-                    minimal_media_list
+                    minimal_media_list,
+                    registry=registry,
+                    stub=True,
                 )
                 # Track referenced media counts
                 entity_counts[f"{media_type_key}_referenced"]["created"] += result["created"]
                 entity_counts[f"{media_type_key}_referenced"]["updated"] += result["updated"]
                 entity_counts[f"{media_type_key}_referenced"]["ignored"] += result["ignored"]
+                entity_counts[f"{media_type_key}_referenced"]["skipped"] += result.get("skipped", 0)
             
             # Now create recommendation and similar edges (only for media that exist)
             recommendation_edges = []
@@ -1141,6 +1194,12 @@ def copy_media(
                 edge_counts['tmdb_similar_to']["updated"] += result["updated"]
                 edge_counts['tmdb_similar_to']["ignored"] += result["ignored"]
         
+        metrics.end(
+            stage,
+            rows=_written_count(entity_counts, edge_counts) - written_before,
+            bytes_=connector.bytes_sent - bytes_before,
+        )
+
         del tmdb_details_batch
         del imdb_ratings
         del metacritic_ratings
@@ -1161,6 +1220,7 @@ def copy_media(
 
         start += BATCH_SIZE
 
+    print(id_filter_summary())
     return {
         "entity_counts": dict(entity_counts),
         "edge_counts": dict(edge_counts),
@@ -1303,14 +1363,24 @@ def print_summary(results):
           f"Created: {grand_total['created']:>9,} | "
           f"Updated: {grand_total['updated']:>9,} | "
           f"Ignored: {grand_total['ignored']:>9,}")
+
+    writes_avoided = sum(
+        counts.get("skipped", 0)
+        for result_type in ["movies", "shows"] if results.get(result_type)
+        for counts in results[result_type].get("entity_counts", {}).values()
+    )
+    print(f"  {'WRITES AVOIDED':<29} | {writes_avoided:>18,} (already written in this run)")
     
 
-def main(movie_ids: list[str] = [], show_ids: list[str] = [], skip_movies = False):
+def main(movie_ids: list[str] = [], show_ids: list[str] = [], skip_movies = False, profile_batch: Optional[int] = None, persist_registry: bool = False):
     init_mongodb()
 
     connector = ArangoConnector()
+    # one registry for movies and shows, with persist_registry unchanged vertices of earlier runs are skipped as well
+    registry = WriteRegistry.load(REGISTRY_PATH) if persist_registry else WriteRegistry()
 
     results = {}
+    stage_metrics = {}
 
     if skip_movies:
         results["movies"] = None
@@ -1322,11 +1392,15 @@ def main(movie_ids: list[str] = [], show_ids: list[str] = [], skip_movies = Fals
         else:
             movie_query_selector = build_query_selector_for_object_ids(ids=movie_ids)
         
+        movie_metrics = SyncMetrics("arango_movie", profile_batch=profile_batch)
         results["movies"] = copy_media(
             connector=connector, 
             query_selector=movie_query_selector,
-            media_type="movie"
+            media_type="movie",
+            metrics=movie_metrics,
+            registry=registry,
         )
+        stage_metrics["movies"] = movie_metrics.finish()
     
     # Process shows
     if show_ids is None or len(show_ids) == 0:
@@ -1335,17 +1409,25 @@ def main(movie_ids: list[str] = [], show_ids: list[str] = [], skip_movies = Fals
     else:
         show_query_selector = build_query_selector_for_object_ids(ids=show_ids)
     
+    show_metrics = SyncMetrics("arango_show", profile_batch=profile_batch)
     results["shows"] = copy_media(
         connector=connector, 
         query_selector=show_query_selector,
-        media_type="show"
+        media_type="show",
+        metrics=show_metrics,
+        registry=registry,
     )
+    stage_metrics["shows"] = show_metrics.finish()
 
     connector.close()
     close_mongodb()
+    if persist_registry:
+        registry.save(REGISTRY_PATH)
     
     # Print comprehensive summary
     print_summary(results)
+    print(registry.summary())
+    results["metrics"] = stage_metrics
     
     return results
 
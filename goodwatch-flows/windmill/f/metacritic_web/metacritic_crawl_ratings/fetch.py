@@ -7,6 +7,8 @@ from ssl import SSLError
 from typing import Union
 
 from f.data_source.common import get_document_for_id
+from f.data_source.crawl_control import RateLimitReached, track_crawl
+from f.data_source.stats import count_changes, document_state
 from f.db.mongodb import init_mongodb, close_mongodb
 from f.metacritic_web.models import (
     MetacriticMovieRating,
@@ -14,6 +16,8 @@ from f.metacritic_web.models import (
     MetacriticCrawlResult,
 )
 
+CRAWL_SOURCE = "metacritic"
+
 
 def crawl_data(
     next_entry: Union[MetacriticMovieRating, MetacriticTvRating],
@@ -66,7 +70,7 @@ def crawl_metacritic_page(
         except SSLError as error:
             # TODO error handling
             raise error
-        if response.status_code == 403:
+        if response.status_code in (403, 429):
             return MetacriticCrawlResult(
                 url=None,
                 meta_score_original=None,
@@ -159,6 +163,7 @@ def store_result(
     next_entry: Union[MetacriticMovieRating, MetacriticTvRating],
     result: MetacriticCrawlResult,
 ):
+    state = document_state(next_entry)
     print(
         f"saving rating for {next_entry.original_title}: {result.meta_score_original} ({result.meta_score_vote_count}) / {result.user_score_original} ({result.user_score_vote_count})"
     )
@@ -183,6 +188,7 @@ def store_result(
     next_entry.updated_at = datetime.utcnow()
     next_entry.is_selected = False
     next_entry.save()
+    count_changes(next_entry, state)
 
 
 async def metacritic_crawl_ratings(
@@ -201,7 +207,7 @@ async def metacritic_crawl_ratings(
     (crawl_result, _) = crawl_data(next_entry)
 
     if crawl_result.rate_limit_reached:
-        raise Exception(
+        raise RateLimitReached(
             f"Rate limit reached for {next_entry.original_title}, retrying."
         )
 
@@ -220,6 +226,7 @@ def main(next_id: dict):
         movie_model=MetacriticMovieRating,
         tv_model=MetacriticTvRating,
     )
-    result = asyncio.run(metacritic_crawl_ratings(next_entry))
+    with track_crawl(CRAWL_SOURCE):
+        result = asyncio.run(metacritic_crawl_ratings(next_entry))
     close_mongodb()
     return result
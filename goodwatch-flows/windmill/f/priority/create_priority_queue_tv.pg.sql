@@ -6,5 +6,13 @@ CREATE TABLE priority_queue_tv (
     priority INTEGER NOT NULL,
     created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
     updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
-    reset_at TIMESTAMP WITHOUT TIME ZONE
-)
+    reset_at TIMESTAMP WITHOUT TIME ZONE,
+    claimed_by TEXT,
+    claimed_at TIMESTAMP WITH TIME ZONE,
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    claim_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX priority_queue_tv_claim_idx
+    ON priority_queue_tv (priority DESC, updated_at)
+    WHERE priority > 0;
@@ -0,0 +1,23 @@
+-- https://www.windmill.dev/docs/getting_started/scripts_quickstart/sql#result-collection
+-- result_collection=legacy
+
+-- adds lease columns and the claim index to existing priority queue tables
+ALTER TABLE priority_queue_movie
+    ADD COLUMN IF NOT EXISTS claimed_by TEXT,
+    ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP WITH TIME ZONE,
+    ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITH TIME ZONE,
+    ADD COLUMN IF NOT EXISTS claim_count INTEGER NOT NULL DEFAULT 0;
+
+ALTER TABLE priority_queue_tv
+    ADD COLUMN IF NOT EXISTS claimed_by TEXT,
+    ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP WITH TIME ZONE,
+    ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITH TIME ZONE,
+    ADD COLUMN IF NOT EXISTS claim_count INTEGER NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS priority_queue_movie_claim_idx
+    ON priority_queue_movie (priority DESC, updated_at)
+    WHERE priority > 0;
+
+CREATE INDEX IF NOT EXISTS priority_queue_tv_claim_idx
+    ON priority_queue_tv (priority DESC, updated_at)
+    WHERE priority > 0;
@@ -3,19 +3,18 @@ from typing import Optional, Union, Literal
 from mongoengine import get_db
 
 from f.data_source.common import IdsParameter
+from f.db.connections import postgres
 from f.db.mongodb import init_mongodb, close_mongodb
-from f.db.postgres import init_postgres
+from f.priority.queue import claim, queue_table
 
 
+# entries claimed per type and flow run, several flow runs can claim in parallel
 BATCH_SIZE = 10
-BUFFER_SELECTED_AT_MINUTES = 30
 
 
 def main(movie_tmdb_id: str, tv_tmdb_id: str):
     init_mongodb()
     mongo_db = get_db()
-    pg = init_postgres()
-    pg_cursor = pg.cursor()
 
     if movie_tmdb_id or tv_tmdb_id:
         next_movie_ids = get_ids_from_tmdb_id(mongo_db, "movie", [movie_tmdb_id]) if movie_tmdb_id else []
@@ -30,8 +29,11 @@ def main(movie_tmdb_id: str, tv_tmdb_id: str):
             tv_ids=[tv_tmdb_id] if tv_tmdb_id else [],
         )
     else:
-        next_movie_ids = get_next_ids(pg_cursor, mongo_db, "movie")
-        next_tv_ids = get_next_ids(pg_cursor, mongo_db, "tv")
+        # committed when the block ends, so the leases are visible to other runs
+        with postgres() as pg:
+            with pg.cursor() as pg_cursor:
+                next_movie_ids = get_next_ids(pg_cursor, mongo_db, "movie")
+                next_tv_ids = get_next_ids(pg_cursor, mongo_db, "tv")
 
         ids = IdsParameter(
             movie_ids=next_movie_ids.get("ids") or [],
@@ -42,7 +44,6 @@ def main(movie_tmdb_id: str, tv_tmdb_id: str):
             tv_ids=next_tv_ids.get("tmdb_ids") or [],
         )
 
-    pg.close()
     close_mongodb()
 
     result = {
@@ -65,18 +66,9 @@ def get_ids_from_tmdb_id(
 def get_next_ids(
     pg_cursor, mongo_db, type: Union[Literal["movie"], Literal["tv"]]
 ) -> dict[str, list[str]]:
-    query = f"""
-    SELECT tmdb_id
-    FROM priority_queue_{type}
-    WHERE priority > 0
-    AND (reset_at IS NULL OR reset_at AT TIME ZONE 'UTC' < NOW() AT TIME ZONE 'UTC' - INTERVAL '1 week')
-    ORDER BY priority DESC
-    LIMIT 1;
-    """
-    pg_cursor.execute(query)
-    rows = pg_cursor.fetchall()
-
-    tmdb_ids = [str(row[0]) for row in rows]
+    claimed = claim(pg_cursor, queue_table(type), count=BATCH_SIZE)
+    print(f"Claimed {len(claimed)} {type} entries")
+    tmdb_ids = [str(tmdb_id) for tmdb_id in claimed]
     if not tmdb_ids:
         return {}
 
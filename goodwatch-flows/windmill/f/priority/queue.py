@@ -0,0 +1,117 @@
+import os
+import socket
+from typing import Literal, Union
+
+from f.db.connections import postgres
+
+# Claimed entries are leased. A flow that crashes or times out never resets its batch,
+# so once the lease runs out the entries are claimable again (re-queued) by the next run.
+LEASE_MINUTES = 45
+RECRAWL_AFTER = "1 week"
+
+QueueType = Union[Literal["movie"], Literal["tv"]]
+
+
+def queue_table(type: QueueType) -> str:
+    if type not in ("movie", "tv"):
+        raise ValueError(f"Unknown priority queue type: {type}")
+    return f"priority_queue_{type}"
+
+
+def worker_id() -> str:
+    """Identifies the claiming job in `claimed_by`, useful when looking at stuck leases."""
+    job_id = os.getenv("WM_JOB_ID")
+    return job_id or f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(
+    pg_cursor,
+    table: str,
+    count: int,
+    lease_minutes: float = LEASE_MINUTES,
+    claimed_by: str = "",
+) -> list[int]:
+    """
+    Claim up to `count` entries with the highest priority in one statement.
+
+    `FOR UPDATE SKIP LOCKED` lets concurrent workers pass over rows another
+    transaction is claiming instead of waiting for it, so every worker gets a
+    disjoint batch. Entries with a running lease are skipped, expired leases are
+    treated as unclaimed. Commit the transaction to make the claim visible.
+    """
+    query = f"""
+    WITH next_entries AS (
+        SELECT tmdb_id
+        FROM {table}
+        WHERE priority > 0
+        AND (reset_at IS NULL OR reset_at AT TIME ZONE 'UTC' < NOW() AT TIME ZONE 'UTC' - INTERVAL '{RECRAWL_AFTER}')
+        AND (lease_expires_at IS NULL OR lease_expires_at < NOW())
+        ORDER BY priority DESC, updated_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE {table} AS queue
+    SET claimed_by = %s,
+        claimed_at = NOW(),
+        lease_expires_at = NOW() + make_interval(secs => %s),
+        claim_count = COALESCE(queue.claim_count, 0) + 1
+    FROM next_entries
+    WHERE queue.tmdb_id = next_entries.tmdb_id
+    RETURNING queue.tmdb_id, queue.priority;
+    """
+    pg_cursor.execute(query, (count, claimed_by or worker_id(), lease_minutes * 60))
+    rows = sorted(pg_cursor.fetchall(), key=lambda row: -row[1])
+    return [row[0] for row in rows]
+
+
+def complete(pg_cursor, table: str, tmdb_ids: list[int]) -> int:
+    """Reset priority and release the lease of processed entries (inserts unknown ids with priority 0)."""
+    query = f"""
+        INSERT INTO {table} (tmdb_id, priority, created_at, updated_at, reset_at)
+        SELECT UNNEST(%s::int[]), 0, NOW(), NOW(), NOW()
+        ON CONFLICT (tmdb_id)
+        DO UPDATE
+            SET priority = EXCLUDED.priority,
+                updated_at = EXCLUDED.updated_at,
+                reset_at = NOW(),
+                claimed_by = NULL,
+                lease_expires_at = NULL
+    """
+    pg_cursor.execute(query, (tmdb_ids,))
+    return pg_cursor.rowcount
+
+
+def release(pg_cursor, table: str, tmdb_ids: list[int]) -> int:
+    """Give claimed entries back right away instead of waiting for the lease to expire."""
+    query = f"""
+        UPDATE {table}
+        SET claimed_by = NULL, lease_expires_at = NULL
+        WHERE tmdb_id = ANY(%s::int[])
+    """
+    pg_cursor.execute(query, (tmdb_ids,))
+    return pg_cursor.rowcount
+
+
+def stats(pg_cursor, table: str) -> dict:
+    query = f"""
+    SELECT
+        COUNT(*) FILTER (WHERE priority > 0),
+        COUNT(*) FILTER (WHERE priority > 0 AND lease_expires_at >= NOW()),
+        COUNT(*) FILTER (WHERE priority > 0 AND lease_expires_at < NOW()),
+        MAX(claim_count)
+    FROM {table};
+    """
+    pg_cursor.execute(query)
+    queued, leased, expired, max_claims = pg_cursor.fetchone()
+    return {
+        "queued": queued,
+        "leased": leased,
+        "expired_leases": expired,
+        "max_claim_count": max_claims or 0,
+    }
+
+
+def main(type: str = "movie"):
+    with postgres() as pg:
+        with pg.cursor() as pg_cursor:
+            return stats(pg_cursor, queue_table(type))
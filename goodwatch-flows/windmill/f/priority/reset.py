@@ -2,6 +2,7 @@ from typing import Union, Literal
 
 from f.data_source.common import IdsParameter
 from f.db.postgres import init_postgres
+from f.priority.queue import complete, queue_table
 
 
 def main(next_ids: dict):
@@ -18,16 +19,7 @@ def main(next_ids: dict):
 
 
 def reset_priority(pg, pg_cursor, type: Union[Literal["movie"], Literal["tv"]], tmdb_ids: list[int]):
-    query = f"""
-        INSERT INTO priority_queue_{type} (tmdb_id, priority, created_at, updated_at, reset_at)
-        SELECT UNNEST(%s::int[]), 0, NOW(), NOW(), NOW()
-        ON CONFLICT (tmdb_id)
-        DO UPDATE 
-            SET priority = EXCLUDED.priority,
-                updated_at = EXCLUDED.updated_at,
-                reset_at = NOW()
-    """
-    pg_cursor.execute(query, (tmdb_ids,))
+    row_count = complete(pg_cursor, queue_table(type), tmdb_ids)
     pg.commit()
 
-    print(f"Upserted priority=0 for {pg_cursor.rowcount} {type} rows")
\ No newline at end of file
+    print(f"Upserted priority=0 for {row_count} {type} rows")
\ No newline at end of file
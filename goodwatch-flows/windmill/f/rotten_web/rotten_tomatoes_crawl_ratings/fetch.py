@@ -10,6 +10,8 @@ from typing import Optional, Union
 from playwright.async_api import async_playwright, BrowserContext
 
 from f.data_source.common import get_document_for_id
+from f.data_source.crawl_control import RateLimitReached, track_crawl
+from f.data_source.stats import count_changes, document_state
 from f.db.mongodb import init_mongodb, close_mongodb
 from f.rotten_web.models import (
     RottenTomatoesCrawlResult,
@@ -18,6 +20,7 @@ from f.rotten_web.models import (
 )
 
 BROWSER_TIMEOUT = 180000
+CRAWL_SOURCE = "rotten_tomatoes"
 
 
 def extract_numeric_value(banded_rating_count) -> Optional[int]:
@@ -111,8 +114,8 @@ async def crawl_rotten_tomatoes_page(
         print(f"trying url: {url}")
         page = await browser.new_page()
         response = await page.goto(url)
-        if response.status == 403:
-            print("403: Rate limit reached")
+        if response.status in (403, 429):
+            print(f"{response.status}: Rate limit reached")
             return RottenTomatoesCrawlResult(
                 url=None,
                 tomato_score_original=None,
@@ -210,6 +213,7 @@ def store_result(
     next_entry: Union[RottenTomatoesMovieRating, RottenTomatoesTvRating],
     result: RottenTomatoesCrawlResult,
 ):
+    state = document_state(next_entry)
     if type(result.url) in [str]:
         next_entry.rotten_tomatoes_url = result.url
 
@@ -247,6 +251,7 @@ def store_result(
 
     next_entry.is_selected = False
     next_entry.save()
+    count_changes(next_entry, state)
 
 
 async def rotten_tomatoes_crawl_ratings(
@@ -273,7 +278,7 @@ async def rotten_tomatoes_crawl_ratings(
             await browser.close()
 
     if crawl_result.rate_limit_reached:
-        raise Exception(
+        raise RateLimitReached(
             f"Rate limit reached for {next_entry.original_title}, retrying."
         )
 
@@ -292,6 +297,7 @@ def main(next_id: dict):
         movie_model=RottenTomatoesMovieRating,
         tv_model=RottenTomatoesTvRating,
     )
-    result = asyncio.run(rotten_tomatoes_crawl_ratings(next_entry))
+    with track_crawl(CRAWL_SOURCE):
+        result = asyncio.run(rotten_tomatoes_crawl_ratings(next_entry))
     close_mongodb()
     return result
@@ -0,0 +1,688 @@
+# extra_requirements:
+# mongomock>=4.1.2
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+import mongoengine
+from mongoengine import get_db
+
+from f.data_source import id_filter
+from f.db import media_cache
+from f.db.arango import STUB_HASH, WriteRegistry
+from f.dna.models import CoreScores
+from f.main_db.config.graph import COLLECTIONS
+from f.main_db.sync import movies_and_shows
+from f.sync.copy import tmdb_details, vector_data
+from f.utils.instrumentation import SyncMetrics
+
+BENCHMARK_DB = "goodwatch_benchmark"
+REPORT_DIR = os.getenv("SYNC_BENCHMARK_DIR", "/tmp/goodwatch/benchmarks")
+INSERT_CHUNK_SIZE = 1000
+TOP_ALLOCATIONS = 10
+
+TARGETS = ["tmdb_details", "vector_data", "movies_and_shows"]
+MEDIA_TYPES = ["movie", "show"]
+
+# per document: how many entries of each nested list are generated (averages, +-50%)
+DEFAULT_FANOUT = {
+    "cast": 25,
+    "crew": 35,
+    "images": 40,
+    "videos": 6,
+    "keywords": 12,
+    "translations": 20,
+    "alternative_titles": 8,
+    "release_countries": 8,
+    "provider_countries": 12,
+    "providers_per_country": 4,
+    "recommendations": 20,
+    "similar": 20,
+    "seasons": 4,
+    "tropes": 20,
+    "essence_tags": 8,
+    "vector_dim": 768,
+}
+
+COUNTRIES = ["US", "GB", "DE", "FR", "ES", "IT", "JP", "KR", "IN", "BR", "MX", "CA", "AU", "NL", "SE", "PL"]
+LANGUAGES = ["en", "de", "fr", "es", "it", "ja", "ko", "hi", "pt", "nl", "sv", "pl"]
+GENRES = ["Action", "Adventure", "Animation", "Comedy", "Crime", "Documentary", "Drama", "Family",
+          "Fantasy", "History", "Horror", "Music", "Mystery", "Romance", "Science Fiction", "Thriller"]
+STREAM_TYPES = ["flatrate", "free", "ads", "rent", "buy"]
+IMAGE_TYPES = ["backdrops", "posters", "logos"]
+DEPARTMENTS = {"Directing": "Director", "Writing": "Screenplay", "Production": "Producer",
+               "Sound": "Original Music Composer", "Camera": "Director of Photography", "Editing": "Editor"}
+CONTENT_ADVISORIES = ["violence", "gore", "sexual content", "nudity", "strong language", "drug use"]
+SUITABILITY_KEYS = ["solo_watch", "date_night", "group_party", "family", "partner", "friends",
+                    "kids", "teens", "adults", "intergenerational", "public_viewing_safe"]
+CONTEXT_KEYS = ["is_thought_provoking", "is_pure_escapism", "is_background_friendly",
+                "is_comfort_watch", "is_binge_friendly", "is_drop_in_friendly"]
+
+
+# ===== Synthetic data =====
+
+class SyntheticCatalog:
+    """
+    Deterministic generator for TMDB details, provider, rating, tropes and DNA documents
+    in the shape the crawlers store them. Shared entities (people, companies, networks,
+    collections) are drawn from pools, so cross-document deduplication is exercised too.
+    """
+
+    def __init__(self, count: int, seed: int = 42, fanout: Optional[dict] = None):
+        self.count = count
+        self.seed = seed
+        self.fanout = {**DEFAULT_FANOUT, **(fanout or {})}
+        self.now = datetime.utcnow()
+        pool = max(100, count)
+        self.person_ids = range(1, pool * 10 + 1)
+        self.company_ids = range(1, pool // 5 + 2)
+        self.network_ids = range(1, 200)
+        self.collection_ids = range(1, pool // 10 + 2)
+        self.keyword_ids = range(1, 5000)
+        self.streaming_services = [
+            {"tmdb_id": service_id, "name": f"Streaming Service {service_id}"}
+            for service_id in range(1, 121)
+        ]
+
+    def _rng(self, media_type: str, tmdb_id: int, salt: str) -> random.Random:
+        return random.Random(f"{self.seed}:{media_type}:{tmdb_id}:{salt}")
+
+    def _n(self, rng: random.Random, key: str) -> int:
+        mean = self.fanout[key]
+        return rng.randint(mean // 2, mean + mean // 2) if mean else 0
+
+    def _date(self, rng: random.Random) -> datetime:
+        return datetime(1950, 1, 1) + timedelta(days=rng.randint(0, 27000))
+
+    def _person(self, rng: random.Random, department: str) -> dict:
+        person_id = rng.choice(self.person_ids)
+        return {
+            "id": person_id,
+            "name": f"Person {person_id}",
+            "original_name": f"Person {person_id}",
+            "profile_path": f"/p{person_id}.jpg",
+            "popularity": round(rng.uniform(0, 80), 3),
+            "adult": False,
+            "gender": rng.randint(0, 2),
+            "known_for_department": department,
+        }
+
+    def _cast(self, rng: random.Random, is_movie: bool) -> list[dict]:
+        cast = []
+        for order in range(self._n(rng, "cast")):
+            member = self._person(rng, "Acting")
+            member["order"] = order
+            if is_movie:
+                member["credit_id"] = f"c{rng.getrandbits(48):012x}"
+                member["character"] = f"Character {order}"
+            else:
+                roles = [
+                    {"credit_id": f"c{rng.getrandbits(48):012x}", "character": f"Character {order}.{i}",
+                     "episode_count": rng.randint(1, 24)}
+                    for i in range(rng.randint(1, 2))
+                ]
+                member["roles"] = roles
+                member["total_episode_count"] = sum(role["episode_count"] for role in roles)
+            cast.append(member)
+        return cast
+
+    def _crew(self, rng: random.Random, is_movie: bool) -> list[dict]:
+        crew = []
+        for _ in range(self._n(rng, "crew")):
+            department, job = rng.choice(list(DEPARTMENTS.items()))
+            member = self._person(rng, department)
+            if is_movie:
+                member["credit_id"] = f"w{rng.getrandbits(48):012x}"
+                member["job"] = job
+                member["department"] = department
+            else:
+                member["jobs"] = [{"credit_id": f"w{rng.getrandbits(48):012x}", "job": job,
+                                   "department": department, "episode_count": rng.randint(1, 24)}]
+                member["total_episode_count"] = member["jobs"][0]["episode_count"]
+            crew.append(member)
+        return crew
+
+    def _watch_providers(self, rng: random.Random, media_type: str, tmdb_id: int) -> dict:
+        results = {}
+        for country_code in rng.sample(COUNTRIES, min(len(COUNTRIES), self._n(rng, "provider_countries"))):
+            entry = {"link": f"https://www.themoviedb.org/{media_type}/{tmdb_id}/watch?locale={country_code}"}
+            for stream_type in rng.sample(["flatrate", "rent", "buy"], rng.randint(1, 3)):
+                entry[stream_type] = [
+                    {"provider_id": service["tmdb_id"], "provider_name": service["name"],
+                     "display_priority": priority, "logo_path": f"/l{service['tmdb_id']}.jpg"}
+                    for priority, service in enumerate(
+                        rng.sample(self.streaming_services, self._n(rng, "providers_per_country"))
+                    )
+                ]
+            results[country_code] = entry
+        return {"results": results}
+
+    def details(self, media_type: str, tmdb_id: int) -> dict:
+        rng = self._rng(media_type, tmdb_id, "details")
+        is_movie = media_type == "movie"
+        release_date = self._date(rng)
+        imdb_id = f"tt{tmdb_id:07d}"
+        doc = {
+            "tmdb_id": tmdb_id,
+            "title": f"Title {tmdb_id}",
+            "original_title": f"Original Title {tmdb_id}",
+            "tagline": "A synthetic tagline.",
+            "overview": " ".join(f"word{rng.randint(0, 999)}" for _ in range(rng.randint(20, 80))),
+            "popularity": round(rng.uniform(0, 500), 3),
+            "status": "Released",
+            "adult": False,
+            "poster_path": f"/poster{tmdb_id}.jpg",
+            "backdrop_path": f"/backdrop{tmdb_id}.jpg",
+            "budget": rng.randint(0, 200_000_000) if is_movie else None,
+            "revenue": rng.randint(0, 900_000_000) if is_movie else None,
+            "genres": [{"id": i, "name": name} for i, name in enumerate(rng.sample(GENRES, rng.randint(1, 4)))],
+            "keywords": [{"id": k, "name": f"keyword {k}"} for k in rng.sample(self.keyword_ids, self._n(rng, "keywords"))],
+            "homepage": f"https://example.com/{media_type}/{tmdb_id}",
+            "imdb_id": imdb_id,
+            "external_ids": {"imdb_id": imdb_id},
+            "wikidata_id": f"Q{tmdb_id}",
+            "production_companies": [
+                {"id": c, "name": f"Company {c}", "logo_path": f"/c{c}.png", "origin_country": rng.choice(COUNTRIES)}
+                for c in rng.sample(self.company_ids, min(len(self.company_ids), rng.randint(1, 4)))
+            ],
+            "production_countries": [{"iso_3166_1": c, "name": c} for c in rng.sample(COUNTRIES, rng.randint(1, 3))],
+            "origin_country": [rng.choice(COUNTRIES)],
+            "original_language": rng.choice(LANGUAGES),
+            "spoken_languages": [{"iso_639_1": lang} for lang in rng.sample(LANGUAGES, rng.randint(1, 3))],
+            "vote_average": round(rng.uniform(1, 10), 1),
+            "vote_count": rng.randint(0, 30000),
+            "recommendations": {"results": [{"id": rng.randint(1, self.count)} for _ in range(self._n(rng, "recommendations"))]},
+            "similar": {"results": [{"id": rng.randint(1, self.count)} for _ in range(self._n(rng, "similar"))]},
+            "images": {image_type: [] for image_type in IMAGE_TYPES},
+            "videos": [
+                {"id": f"v{tmdb_id}_{i}", "site": "YouTube", "key": f"yt{rng.getrandbits(40):010x}",
+                 "type": rng.choice(["Trailer", "Teaser", "Clip", "Featurette"]),
+                 "iso_639_1": "en", "iso_3166_1": "US", "name": f"Video {i}", "size": 1080,
+                 "official": rng.random() < 0.7, "published_at": "2020-05-01T10:00:00.000Z"}
+                for i in range(self._n(rng, "videos"))
+            ],
+            "alternative_titles": [
+                {"title": f"Alt Title {tmdb_id} {c}", "iso_3166_1": c}
+                for c in rng.sample(COUNTRIES, min(len(COUNTRIES), self._n(rng, "alternative_titles")))
+            ],
+            "translations": [
+                {"iso_639_1": lang, "iso_3166_1": rng.choice(COUNTRIES), "name": lang, "english_name": lang,
+                 "data": {"title": f"Title {tmdb_id} ({lang})", "overview": "Translated overview.",
+                          "tagline": "", "homepage": "", "runtime": rng.randint(20, 180)}}
+                for lang in (LANGUAGES * 3)[: self._n(rng, "translations")]
+            ],
+            "watch_providers": self._watch_providers(rng, media_type, tmdb_id),
+            "created_at": self.now - timedelta(days=rng.randint(1, 900)),
+            "updated_at": self.now - timedelta(minutes=rng.randint(1, 600)),
+        }
+        for i in range(self._n(rng, "images")):
+            doc["images"][IMAGE_TYPES[i % len(IMAGE_TYPES)]].append({
+                "file_path": f"/img{tmdb_id}_{i}.jpg",
+                "iso_639_1": rng.choice(LANGUAGES + [None]),
+                "aspect_ratio": rng.choice([0.667, 1.778]),
+                "width": 1920, "height": 1080,
+                "vote_average": round(rng.uniform(0, 10), 2), "vote_count": rng.randint(0, 40),
+            })
+
+        if is_movie:
+            doc["release_date"] = release_date
+            doc["runtime"] = rng.randint(70, 190)
+            doc["credits"] = {"cast": self._cast(rng, True), "crew": self._crew(rng, True)}
+            doc["release_dates"] = {"results": [
+                {"iso_3166_1": c, "release_dates": [
+                    {"certification": rng.choice(["", "PG", "PG-13", "R", "12", "16"]),
+                     "release_date": "2020-05-01T00:00:00.000Z", "type": rng.randint(1, 6),
+                     "note": "", "descriptors": []}
+                ]}
+                for c in rng.sample(COUNTRIES, min(len(COUNTRIES), self._n(rng, "release_countries")))
+            ]}
+            if rng.random() < 0.3:
+                collection_id = rng.choice(self.collection_ids)
+                doc["belongs_to_collection"] = {"id": collection_id, "name": f"Collection {collection_id}",
+                                                "poster_path": f"/s{collection_id}.jpg", "backdrop_path": None}
+        else:
+            seasons = [
+                {"id": tmdb_id * 100 + n, "season_number": n, "name": f"Season {n}",
+                 "air_date": (release_date + timedelta(days=365 * n)).strftime("%Y-%m-%d"),
+                 "episode_count": rng.randint(6, 24), "overview": "", "poster_path": f"/s{tmdb_id}_{n}.jpg",
+                 "vote_average": round(rng.uniform(1, 10), 1)}
+                for n in range(1, self._n(rng, "seasons") + 1)
+            ]
+            doc["first_air_date"] = release_date
+            doc["last_air_date"] = release_date + timedelta(days=365 * len(seasons))
+            doc["number_of_seasons"] = len(seasons)
+            doc["number_of_episodes"] = sum(season["episode_count"] for season in seasons)
+            doc["episode_run_time"] = [rng.randint(20, 60)]
+            doc["in_production"] = rng.random() < 0.3
+            doc["seasons"] = seasons
+            doc["networks"] = [{"id": n, "name": f"Network {n}", "logo_path": f"/n{n}.png", "origin_country": "US"}
+                               for n in rng.sample(self.network_ids, rng.randint(1, 2))]
+            doc["aggregate_credits"] = {"cast": self._cast(rng, False), "crew": self._crew(rng, False)}
+            doc["content_ratings"] = [{"iso_3166_1": c, "rating": rng.choice(["TV-14", "TV-MA", "12", "16"])}
+                                      for c in rng.sample(COUNTRIES, 4)]
+        return doc
+
+    def providers(self, media_type: str, tmdb_id: int) -> list[dict]:
+        rng = self._rng(media_type, tmdb_id, "providers")
+        return [
+            {
+                "tmdb_id": tmdb_id,
+                "country_code": country_code,
+                "updated_at": self.now - timedelta(hours=rng.randint(1, 72)),
+                "streaming_links": [
+                    {"provider_name": service["name"], "stream_type": rng.choice(STREAM_TYPES),
+                     "stream_url": f"https://watch.example.com/{service['tmdb_id']}/{tmdb_id}",
+                     "price_dollar": round(rng.uniform(0, 20), 2), "quality": rng.choice(["SD", "HD", "4K"])}
+                    for service in rng.sample(self.streaming_services, self._n(rng, "providers_per_country"))
+                ],
+            }
+            for country_code in rng.sample(COUNTRIES, min(len(COUNTRIES), self._n(rng, "provider_countries")))
+        ]
+
+    def ratings(self, media_type: str, tmdb_id: int) -> dict[str, dict]:
+        rng = self._rng(media_type, tmdb_id, "ratings")
+        user, meta, audience, tomato = (rng.uniform(10, 100) for _ in range(4))
+        base = {"tmdb_id": tmdb_id, "updated_at": self.now}
+        return {
+            "imdb": {**base, "imdb_url": f"https://www.imdb.com/title/tt{tmdb_id:07d}",
+                     "user_score_original": round(user / 10, 1), "user_score_normalized_percent": user,
+                     "user_score_vote_count": rng.randint(0, 2_000_000)},
+            "metacritic": {**base, "metacritic_url": f"https://www.metacritic.com/{tmdb_id}",
+                           "user_score_original": round(user / 10, 1), "user_score_normalized_percent": user,
+                           "user_score_vote_count": rng.randint(0, 5000),
+                           "meta_score_original": round(meta), "meta_score_normalized_percent": meta,
+                           "meta_score_vote_count": rng.randint(0, 60)},
+            "rotten_tomatoes": {**base, "rotten_tomatoes_url": f"https://www.rottentomatoes.com/{tmdb_id}",
+                                "audience_score_original": round(audience), "audience_score_normalized_percent": audience,
+                                "audience_score_vote_count": rng.randint(0, 250_000),
+                                "tomato_score_original": round(tomato), "tomato_score_normalized_percent": tomato,
+                                "tomato_score_vote_count": rng.randint(0, 400)},
+        }
+
+    def tropes(self, media_type: str, tmdb_id: int) -> dict:
+        rng = self._rng(media_type, tmdb_id, "tropes")
+        return {
+            "tmdb_id": tmdb_id,
+            "updated_at": self.now,
+            "tropes": [
+                {"name": f"Trope{t}", "url": f"https://tvtropes.org/pmwiki/pmwiki.php/Main/Trope{t}",
+                 "html": f"<p>How Trope{t} shows up in title {tmdb_id}.</p>"}
+                for t in rng.sample(range(1, 20000), self._n(rng, "tropes"))
+            ],
+        }
+
+    def dna(self, media_type: str, tmdb_id: int) -> dict:
+        rng = self._rng(media_type, tmdb_id, "dna")
+        dim = self.fanout["vector_dim"]
+        scores = {key: rng.randint(0, 10) for key in CoreScores.model_fields}
+        return {
+            "tmdb_id": tmdb_id,
+            "updated_at": self.now,
+            "dna": {
+                "essence_text": "A synthetic essence text.",
+                "essence_tags": [f"tag {rng.randint(1, 400)}" for _ in range(self._n(rng, "essence_tags"))],
+                "fingerprint": {"scores": scores, "highlight_keys": rng.sample(list(scores), 3)},
+                "is_anime": rng.random() < 0.05,
+                "production_info": {"method": "Live-Action", "animation_style": None},
+                "content_advisories": rng.sample(CONTENT_ADVISORIES, rng.randint(0, 3)),
+                "social_suitability": {key: rng.random() < 0.5 for key in SUITABILITY_KEYS},
+                "viewing_context": {key: rng.random() < 0.5 for key in CONTEXT_KEYS},
+            },
+            "vector_essence_text": [rng.uniform(-1, 1) for _ in range(dim)],
+            "vector_fingerprint": [rng.uniform(-1, 1) for _ in range(dim)],
+        }
+
+
+def _source_collection_names(media_type: str) -> dict[str, str]:
+    is_movie = media_type == "movie"
+    suffix = "movie" if is_movie else "tv"
+    return {
+        "details": f"tmdb_{suffix}_details",
+        "providers": f"tmdb_{suffix}_providers",
+        "imdb": f"imdb_{suffix}_rating",
+        "metacritic": f"metacritic_{suffix}_rating",
+        "rotten_tomatoes": f"rotten_tomatoes_{suffix}_rating",
+        "tropes": f"tv_tropes_{suffix}_tags",
+        "dna": f"dna_{suffix}",
+    }
+
+
+def seed_mongo(db, catalog: SyntheticCatalog, media_type: str) -> dict[str, int]:
+    """Replace the source collections of a media type with `catalog.count` synthetic titles."""
+    names = _source_collection_names(media_type)
+    buffers = defaultdict(list)
+    inserted = defaultdict(int)
+
+    def flush(key: str):
+        if buffers[key]:
+            db[names[key]].insert_many(buffers[key], ordered=False)
+            inserted[names[key]] += len(buffers[key])
+            buffers[key] = []
+
+    for name in names.values():
+        db[name].drop()
+        db[name].create_index("tmdb_id")
+    for tmdb_id in range(1, catalog.count + 1):
+        buffers["details"].append(catalog.details(media_type, tmdb_id))
+        buffers["providers"].extend(catalog.providers(media_type, tmdb_id))
+        for source, doc in catalog.ratings(media_type, tmdb_id).items():
+            buffers[source].append(doc)
+        buffers["tropes"].append(catalog.tropes(media_type, tmdb_id))
+        buffers["dna"].append(catalog.dna(media_type, tmdb_id))
+        if tmdb_id % INSERT_CHUNK_SIZE == 0:
+            for key in names:
+                flush(key)
+    for key in names:
+        flush(key)
+    return dict(inserted)
+
+
+def connect_mongo(mongo_uri: str = ""):
+    """
+    Default connection for `get_db()`: an in-process mongomock database, or a local
+    Mongo (e.g. `docker run -p 27017:27017 mongo`) when `mongo_uri` is given.
+    """
+    mongoengine.disconnect()
+    if mongo_uri:
+        mongoengine.connect(db=BENCHMARK_DB, host=mongo_uri)
+    else:
+        import mongomock
+        mongoengine.connect(db=BENCHMARK_DB, host="mongodb://localhost", mongo_client_class=mongomock.MongoClient)
+    return get_db()
+
+
+# ===== Write sinks =====
+
+def _encoded_size(payload) -> int:
+    # both clients send JSON bodies, encoding is the last client-side cost before the network
+    return len(json.dumps(payload, default=str, separators=(",", ":")))
+
+
+class CrateSink:
+    """Stands in for CrateConnector in `tmdb_details.copy_media`: encodes and counts rows."""
+
+    def __init__(self, streaming_services: list[dict]):
+        self.streaming_services = streaming_services
+        self.rows = defaultdict(int)
+        self.bytes_sent = 0
+
+    def select(self, sql: str, params: tuple = None) -> list[dict]:
+        return self.streaming_services
+
+    def upsert_rows(self, table: str, columns: list[str], rows: list[tuple], conflict_columns: list[str], silent: bool = False):
+        self.bytes_sent += _encoded_size(rows)
+        self.rows[table] += len(rows)
+        return {"records_received": len(rows), "rows_upserted": len(rows)}
+
+    def summary(self) -> dict:
+        return {"rows": dict(self.rows), "bytes": self.bytes_sent}
+
+
+class _SinkCollection:
+    def __init__(self, name: str, documents: list[dict]):
+        self.name = name
+        self.documents = documents
+
+    def all(self):
+        return iter(self.documents)
+
+
+class _SinkDatabase:
+    def __init__(self, streaming_services: list[dict]):
+        self.streaming_services = streaming_services
+
+    def collection(self, name: str) -> _SinkCollection:
+        documents = self.streaming_services if name == COLLECTIONS["streaming_services"] else []
+        return _SinkCollection(name, documents)
+
+
+class ArangoSink:
+    """Stands in for ArangoConnector in `movies_and_shows.copy_media`: dumps models like `upsert_many` does."""
+
+    def __init__(self, streaming_services: list[dict]):
+        self.db = _SinkDatabase(streaming_services)
+        self.documents = defaultdict(int)
+        self.bytes_sent = 0
+
+    def upsert_many(self, collection, documents, retry_attempt=0, registry: Optional[WriteRegistry] = None, stub: bool = False):
+        docs = [
+            doc.model_dump(by_alias=True, exclude_none=True) if hasattr(doc, "model_dump") else doc
+            for doc in documents
+        ]
+        skipped = 0
+        if registry is not None:
+            kept, entries = [], []
+            for doc in docs:
+                content_hash = STUB_HASH if stub else WriteRegistry.content_hash(doc)
+                if registry.should_write(collection.name, doc["_key"], content_hash, stub):
+                    kept.append(doc)
+                    entries.append((doc["_key"], content_hash))
+            skipped = len(docs) - len(kept)
+            registry.record(collection.name, entries, skipped)
+            docs = kept
+        self.bytes_sent += _encoded_size(docs)
+        self.documents[collection.name] += len(docs)
+        return {"created": len(docs), "updated": 0, "ignored": 0, "skipped": skipped}
+
+    def summary(self) -> dict:
+        return {"documents": dict(self.documents), "bytes": self.bytes_sent}
+
+
+# ===== Targets =====
+
+def run_tmdb_details(media_type: str, catalog: SyntheticCatalog, metrics: SyncMetrics) -> dict:
+    sink = CrateSink(catalog.streaming_services)
+    tmdb_details.copy_media(sink, media_type=media_type, workers=1, metrics=metrics)
+    return sink.summary()
+
+
+def run_vector_data(media_type: str, catalog: SyntheticCatalog, metrics: SyncMetrics) -> dict:
+    cols = vector_data._source_collections(media_type)
+    ids = list(range(1, catalog.count + 1))
+    points = 0
+    vectors = 0
+    for batch_no, start in enumerate(range(0, len(ids), vector_data.BATCH_SIZE)):
+        batch_ids = ids[start:start + vector_data.BATCH_SIZE]
+        with metrics.stage("mongo_read", batch_no) as stage:
+            bytes_before = vector_data.read_stats["bytes"]
+            sources = vector_data._fetch_batch_sources(cols, batch_ids)
+            stage.rows = len(sources["details"])
+            stage.bytes = vector_data.read_stats["bytes"] - bytes_before
+        with metrics.stage("build_payload", batch_no) as stage:
+            for tmdb_id in batch_ids:
+                details = sources["details"].get(tmdb_id)
+                if not details:
+                    continue
+                payload, point_vectors = vector_data._build_payload(
+                    media_type=media_type,
+                    tmdb_id=tmdb_id,
+                    details=details,
+                    imdb=sources["imdb"].get(tmdb_id),
+                    meta=sources["meta"].get(tmdb_id),
+                    rotten=sources["rotten"].get(tmdb_id),
+                    providers_from_tmdb=(details.get("watch_providers") or {}).get("results"),
+                    providers_all_rows=sources["providers"].get(tmdb_id, []),
+                    dna=sources["dna"].get(tmdb_id),
+                    tropes=sources["tropes"].get(tmdb_id),
+                )
+                points += 1
+                vectors += sum(1 for vector in point_vectors.values() if vector)
+                stage.rows += 1
+    return {"points": points, "vectors": vectors}
+
+
+def run_movies_and_shows(media_type: str, catalog: SyntheticCatalog, metrics: SyncMetrics) -> dict:
+    sink = ArangoSink(catalog.streaming_services)
+    registry = WriteRegistry()
+    movies_and_shows.copy_media(sink, media_type=media_type, metrics=metrics, registry=registry)
+    return {**sink.summary(), "skipped": dict(registry.skipped)}
+
+
+TARGET_RUNNERS = {
+    "tmdb_details": run_tmdb_details,
+    "vector_data": run_vector_data,
+    "movies_and_shows": run_movies_and_shows,
+}
+
+
+def _top_allocations(snapshot: tracemalloc.Snapshot) -> list[dict]:
+    stats = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)]).statistics("lineno")
+    return [
+        {"where": f"{stat.traceback[0].filename.split('/f/', 1)[-1]}:{stat.traceback[0].lineno}",
+         "kib": round(stat.size / 1024, 1), "count": stat.count}
+        for stat in stats[:TOP_ALLOCATIONS]
+    ]
+
+
+def benchmark_target(target: str, media_type: str, catalog: SyntheticCatalog, trace_allocations: bool) -> dict:
+    """
+    One timed run (per-stage time from SyncMetrics), then optionally a second run under
+    tracemalloc for the allocation peak and the largest allocations still held afterwards,
+    so tracing overhead does not end up in docs/s.
+    """
+    runner = TARGET_RUNNERS[target]
+    metrics = SyncMetrics(f"bench_{target}_{media_type}", metrics_dir=REPORT_DIR)
+    started = time.perf_counter()
+    output = runner(media_type, catalog, metrics)
+    seconds = time.perf_counter() - started
+    summary = metrics.finish()
+
+    result = {
+        "docs": catalog.count,
+        "seconds": round(seconds, 3),
+        "docs_per_s": round(catalog.count / seconds, 1) if seconds else None,
+        "peak_rss_mb": summary["peak_rss_mb"],
+        "stages": {
+            name: {key: stage[key] for key in ("seconds", "share", "rows", "rows_per_s")}
+            for name, stage in summary["stages"].items()
+        },
+        "output": output,
+    }
+
+    if trace_allocations:
+        tracemalloc.start()
+        try:
+            runner(media_type, catalog, SyncMetrics(f"bench_{target}_{media_type}_traced", metrics_dir=REPORT_DIR))
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        result["alloc_peak_mb"] = round(peak / 1024**2, 1)
+        result["top_retained_allocations"] = _top_allocations(snapshot)
+    return result
+
+
+def compare_reports(report: dict, baseline: dict, max_regression: float) -> list[dict]:
+    """Targets whose docs/s dropped by more than `max_regression` (0.15 = 15%) against the baseline."""
+    regressions = []
+    for key, result in report["results"].items():
+        before = baseline.get("results", {}).get(key, {}).get("docs_per_s")
+        after = result.get("docs_per_s")
+        if before and after and after < before * (1 - max_regression):
+            regressions.append({"target": key, "baseline_docs_per_s": before, "docs_per_s": after,
+                                "change": round(after / before - 1, 3)})
+    return regressions
+
+
+def print_report(report: dict):
+    print(f"\n{'=' * 72}\nSYNC BENCHMARK ({report['params']['count']} docs per media type)\n{'=' * 72}")
+    for key, result in report["results"].items():
+        alloc = f"  alloc peak {result['alloc_peak_mb']:.1f} MB" if "alloc_peak_mb" in result else ""
+        print(f"{key:<28} {result['docs_per_s']:>10,.1f} docs/s  {result['seconds']:>8.2f}s{alloc}")
+        for name, stage in result["stages"].items():
+            print(f"    {name:<24} {stage['seconds']:>8.2f}s {stage['share']:>6.1%}")
+    for regression in report["regressions"]:
+        print(f"REGRESSION {regression['target']}: {regression['baseline_docs_per_s']} -> "
+              f"{regression['docs_per_s']} docs/s ({regression['change']:+.1%})")
+
+
+def main(
+    count: int = 1000,
+    targets: list[str] = TARGETS,
+    media_types: list[str] = MEDIA_TYPES,
+    seed: int = 42,
+    fanout: dict = {},
+    mongo_uri: str = "",
+    trace_allocations: bool = True,
+    baseline_path: str = "",
+    max_regression: float = 0.15,
+):
+    unknown = [target for target in targets if target not in TARGET_RUNNERS]
+    if unknown:
+        raise ValueError(f"Unknown benchmark targets: {unknown}")
+
+    catalog = SyntheticCatalog(count, seed=seed, fanout=fanout)
+    db = connect_mongo(mongo_uri)
+    # synthetic documents must not reach the shared Redis cache or id filters, and reads should measure Mongo
+    media_cache.ENABLED = False
+    id_filter.ENABLED = False
+
+    report = {
+        "params": {"count": count, "seed": seed, "fanout": catalog.fanout, "mongo": mongo_uri or "mongomock",
+                   "python": sys.version.split()[0], "created_at": datetime.utcnow().isoformat()},
+        "seeded": {},
+        "results": {},
+    }
+    try:
+        for media_type in media_types:
+            started = time.perf_counter()
+            report["seeded"][media_type] = seed_mongo(db, catalog, media_type)
+            print(f"Seeded {count} synthetic {media_type}s in {time.perf_counter() - started:.1f}s")
+            for target in targets:
+                report["results"][f"{target}_{media_type}"] = benchmark_target(target, media_type, catalog, trace_allocations)
+    finally:
+        if mongo_uri:
+            db.client.drop_database(BENCHMARK_DB)
+        mongoengine.disconnect()
+
+    baseline = {}
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    report["regressions"] = compare_reports(report, baseline, max_regression) if baseline else []
+
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    report_path = os.path.join(REPORT_DIR, f"sync_benchmark_{datetime.utcnow():%Y%m%d_%H%M%S}.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    report["report_path"] = report_path
+
+    print_report(report)
+    print(f"\nReport written to {report_path}")
+    return report
+
+
+if __name__ == "__main__":
+    # run from goodwatch-flows/windmill: python -m f.stress.sync_benchmark --count 500
+    parser = argparse.ArgumentParser(description="Benchmark the sync transforms against synthetic data")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--targets", nargs="+", default=TARGETS, choices=TARGETS)
+    parser.add_argument("--media-types", nargs="+", default=MEDIA_TYPES, choices=MEDIA_TYPES)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fanout", type=json.loads, default={}, help='e.g. \'{"cast": 80, "images": 200}\'')
+    parser.add_argument("--mongo-uri", default="", help="local Mongo instead of mongomock")
+    parser.add_argument("--no-allocations", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--baseline", default="", help="previous report to compare docs/s against")
+    parser.add_argument("--max-regression", type=float, default=0.15)
+    args = parser.parse_args()
+
+    result = main(
+        count=args.count,
+        targets=args.targets,
+        media_types=args.media_types,
+        seed=args.seed,
+        fanout=args.fanout,
+        mongo_uri=args.mongo_uri,
+        trace_allocations=not args.no_allocations,
+        baseline_path=args.baseline,
+        max_regression=args.max_regression,
+    )
+    sys.exit(1 if result["regressions"] else 0)
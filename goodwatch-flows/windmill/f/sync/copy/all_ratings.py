@@ -16,6 +16,7 @@ from f.sync.models.crate_models import (
     Show,
 )
 from f.sync.models.crate_schemas import SCHEMAS
+from f.utils.instrumentation import SyncMetrics, bson_bytes
 
 BATCH_SIZE = 5000
 SUB_BATCH_SIZE = 50000
@@ -92,9 +93,13 @@ def upsert_in_batches(connector: CrateConnector, table: str, records: list[BaseM
 
 
 def copy_media(
-    connector: CrateConnector, query_selector: dict = {}, media_type: str = "movie"
+    connector: CrateConnector,
+    query_selector: dict = {},
+    media_type: str = "movie",
+    metrics: Optional[SyncMetrics] = None,
 ):
     is_movie = media_type == "movie"
+    metrics = metrics or SyncMetrics(f"all_ratings_{media_type}")
 
     mongo_db = get_db()
     mongo_details = (
@@ -130,6 +135,8 @@ def copy_media(
         media_documents = []
         entity_batches = defaultdict(list)
 
+        batch_no = start // BATCH_SIZE
+        stage = metrics.begin("mongo_read", batch_no)
         tmdb_details_batch = list(
             mongo_details.find(
                 query_selector | updated_at_filter, tmdb_details_projection
@@ -165,6 +172,7 @@ def copy_media(
             )
         )
         if not tmdb_ids:
+            metrics.end(stage, rows=0)
             break
 
         # Insert batch of media
@@ -178,6 +186,15 @@ def copy_media(
                 tmdb_details_projection,
             )
         )
+        metrics.end(
+            stage,
+            rows=len(tmdb_details_batch) + len(imdb_batch) + len(meta_batch) + len(rotten_batch),
+            bytes_=bson_bytes(
+                [*tmdb_details_batch, *imdb_batch, *meta_batch, *rotten_batch, *tmdb_details_for_tmdb_ids]
+            ),
+        )
+
+        stage = metrics.begin("transform", batch_no)
         tmdb_details_map = {doc["tmdb_id"]: doc for doc in tmdb_details_for_tmdb_ids}
         imdb_map = {doc["tmdb_id"]: doc for doc in imdb_batch}
         meta_map = {doc["tmdb_id"]: doc for doc in meta_batch}
@@ -348,7 +365,10 @@ def copy_media(
             )
 
             media_documents.append(media)
+        metrics.end(stage, rows=len(media_documents))
 
+        stage = metrics.begin("crate_write", batch_no)
+        bytes_before = connector.bytes_sent
         upsert_result = upsert_in_batches(
             connector=connector,
             table=media_table_name,
@@ -360,6 +380,7 @@ def copy_media(
             "records_received"
         ]
         entity_counts[media_type_key]["rows_upserted"] += upsert_result["rows_upserted"]
+        rows_written = upsert_result["rows_upserted"]
 
         # Insert all row for batch and track counts
         for table_name, batch in entity_batches.items():
@@ -374,6 +395,8 @@ def copy_media(
             entity_counts[table_name]["rows_upserted"] += entity_upsert_result[
                 "rows_upserted"
             ]
+            rows_written += entity_upsert_result["rows_upserted"]
+        metrics.end(stage, rows=rows_written, bytes_=connector.bytes_sent - bytes_before)
 
         start += BATCH_SIZE
 
@@ -384,7 +407,7 @@ def main(movie_ids: list[str] = [], show_ids: list[str] = [], skip_movies=False)
     init_mongodb()
     connector = CrateConnector()
 
-    results = {}
+    results = {"metrics": {}}
 
     if skip_movies:
         results["movies"] = None
@@ -396,9 +419,14 @@ def main(movie_ids: list[str] = [], show_ids: list[str] = [], skip_movies=False)
         else:
             movie_query_selector = build_query_selector_for_object_ids(ids=movie_ids)
 
+        movie_metrics = SyncMetrics("all_ratings_movie")
         results["movies"] = copy_media(
-            connector=connector, query_selector=movie_query_selector, media_type="movie"
+            connector=connector,
+            query_selector=movie_query_selector,
+            media_type="movie",
+            metrics=movie_metrics,
         )
+        results["metrics"]["movies"] = movie_metrics.finish()
 
     # Process shows
     if show_ids is None or len(show_ids) == 0:
@@ -407,9 +435,14 @@ def main(movie_ids: list[str] = [], show_ids: list[str] = [], skip_movies=False)
     else:
         show_query_selector = build_query_selector_for_object_ids(ids=show_ids)
 
+    show_metrics = SyncMetrics("all_ratings_show")
     results["shows"] = copy_media(
-        connector=connector, query_selector=show_query_selector, media_type="show"
+        connector=connector,
+        query_selector=show_query_selector,
+        media_type="show",
+        metrics=show_metrics,
     )
+    results["metrics"]["shows"] = show_metrics.finish()
 
     connector.disconnect()
     close_mongodb()
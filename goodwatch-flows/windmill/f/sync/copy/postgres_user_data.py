@@ -13,6 +13,7 @@ from f.sync.models.crate_models import (
     UserFavorite,
     UserWatchHistory,
 )
+from f.utils.instrumentation import SyncMetrics
 
 BATCH_SIZE_SIMPLE = 5000
 BATCH_SIZE_UPSERT = 5000
@@ -274,19 +275,30 @@ def main():
     pg = init_postgres()
     crate = CrateConnector()
     try:
+        metrics = SyncMetrics("postgres_user_data")
+        copies = {
+            "user_favorite": copy_user_favorite,
+            "user_score": copy_user_score,
+            "user_setting": copy_user_setting,
+            "user_skipped": copy_user_skipped,
+            "user_wishlist": copy_user_wishlist,
+            "user_watch_history": copy_user_watch_history,
+        }
         results = {}
-        results["user_favorite"] = copy_user_favorite(pg, crate)
-        results["user_score"] = copy_user_score(pg, crate)
-        results["user_setting"] = copy_user_setting(pg, crate)
-        results["user_skipped"] = copy_user_skipped(pg, crate)
-        results["user_wishlist"] = copy_user_wishlist(pg, crate)
-        results["user_watch_history"] = copy_user_watch_history(pg, crate)
+        for table, copy_table in copies.items():
+            # one stage per table, bytes are the upserts sent to Crate
+            with metrics.stage(table) as stage:
+                bytes_before = crate.bytes_sent
+                results[table] = copy_table(pg, crate)
+                stage.rows = results[table]["rows_upserted"]
+                stage.bytes = crate.bytes_sent - bytes_before
 
         print("\n=== Migration Summary ===")
         for table, stats in results.items():
             print(
                 f"{table:>20s}: received={stats['records_received']}, upserted={stats['rows_upserted']}"
             )
+        results["metrics"] = metrics.finish()
         return results
     finally:
         try:
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from mongoengine import get_db
 
 from f.db.cratedb import CrateConnector
@@ -6,6 +8,7 @@ from f.db.mongodb import (
     close_mongodb,
 )
 from f.sync.models.crate_models import Movie, Show
+from f.utils.instrumentation import SyncMetrics, bson_bytes
 
 BATCH_SIZE = 50000
 
@@ -13,7 +16,9 @@ BATCH_SIZE = 50000
 def copy_media(
     connector: CrateConnector, 
     query_selector: dict = {},
+    metrics: Optional[SyncMetrics] = None,
 ):
+    metrics = metrics or SyncMetrics("tmdb_daily")
     mongo_db = get_db()
     mongo_collection = mongo_db.tmdb_daily_dump_data
 
@@ -24,7 +29,9 @@ def copy_media(
     while True:
         movies = []
         shows = []
-        
+
+        batch_no = start // BATCH_SIZE
+        stage = metrics.begin("mongo_read", batch_no)
         tmdb_details_batch = list(
             #mongo_collection.find({"tmdb_id": {"$lt": 1000}})
             mongo_collection.find(query_selector)
@@ -33,11 +40,14 @@ def copy_media(
                 .limit(BATCH_SIZE)
         )
         if not tmdb_details_batch:
+            metrics.end(stage, rows=0)
             break
+        metrics.end(stage, rows=len(tmdb_details_batch), bytes_=bson_bytes(tmdb_details_batch))
 
         # Insert batch of media
         print(f"\nBatch from {start} to {start + len(tmdb_details_batch)} TMDB daily entries")
 
+        stage = metrics.begin("transform", batch_no)
         for tmdb_details in tmdb_details_batch:
             tmdb_id = tmdb_details["tmdb_id"]
             media_type = "movie" if tmdb_details["type"] == "movie" else "show"
@@ -62,7 +72,10 @@ def copy_media(
                     adult=tmdb_details.get("adult"),
                 )
                 shows.append(show)
+        metrics.end(stage, rows=len(movies) + len(shows))
 
+        stage = metrics.begin("crate_write", batch_no)
+        bytes_before = connector.bytes_sent
         upsert_affected_rows = connector.upsert_many(
             table="movie",
             records=movies,
@@ -78,6 +91,7 @@ def copy_media(
         )
         show_counts["records_received"] += upsert_affected_rows["records_received"]
         show_counts["rows_upserted"] += upsert_affected_rows["rows_upserted"]
+        metrics.end(stage, rows=len(movies) + len(shows), bytes_=connector.bytes_sent - bytes_before)
 
         start += BATCH_SIZE
 
@@ -95,10 +109,13 @@ def main():
     print("Processing all daily media entries...")
     query_selector = {}
     
+    metrics = SyncMetrics("tmdb_daily")
     results = copy_media(
         connector=connector, 
         query_selector=query_selector,
+        metrics=metrics,
     )
+    results["metrics"] = metrics.finish()
 
     connector.disconnect()
     close_mongodb()
@@ -1,9 +1,11 @@
+import os
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Annotated, Optional
 
 from mongoengine import get_db
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 
 from f.db.cratedb import CrateConnector
 from f.db.mongodb import (
@@ -29,10 +31,55 @@ from f.sync.models.crate_models import (
     StreamingAvailability,
 )
 from f.sync.models.crate_schemas import SCHEMAS
+from f.utils.instrumentation import SyncMetrics, bson_bytes
 
 BATCH_SIZE = 15000
 SUB_BATCH_SIZE = 50000
 HOURS_TO_FETCH = 24*2
+# 0 = one transform process per core, 1 = transform inline without a pool
+TRANSFORM_WORKERS = 0
+MIN_SHARD_SIZE = 500
+
+TABLE_MODELS: dict[str, type[BaseModel]] = {
+    "movie": Movie,
+    "show": Show,
+    "movie_series": MovieSeries,
+    "season": Season,
+    "media_image": Image,
+    "media_video": Video,
+    "production_company": ProductionCompany,
+    "network": Network,
+    "alternative_title": AlternativeTitle,
+    "translation": Translation,
+    "release_event": ReleaseEvent,
+    "person": Person,
+    "person_appeared_in": PersonAppearedIn,
+    "person_worked_on": PersonWorkedOn,
+    "streaming_availability": StreamingAvailability,
+}
+# Shared across batches: keyed by tmdb_id, which is the first column of each of these tables
+DEDUPED_ENTITY_TABLES = ["movie_series", "production_company", "network", "person"]
+
+# Tuple layout per table: model fields in declaration order, same as model_dump()
+TABLE_COLUMNS: dict[str, list[str]] = {
+    table: list(model.model_fields.keys()) for table, model in TABLE_MODELS.items()
+}
+TABLE_DEFAULTS: dict[str, list] = {
+    table: [
+        field.get_default(call_default_factory=True)
+        for field in model.model_fields.values()
+    ]
+    for table, model in TABLE_MODELS.items()
+}
+# Validates and coerces a row tuple with the model's field types (lax mode, like constructing
+# the model), and dumps it back like model_dump() would, nested models as dicts
+TABLE_ROW_ADAPTERS: dict[str, TypeAdapter] = {
+    table: TypeAdapter(tuple[tuple(
+        Annotated[(field.annotation, *field.metadata)] if field.metadata else field.annotation
+        for field in model.model_fields.values()
+    )])
+    for table, model in TABLE_MODELS.items()
+}
 
 
 # ===== Helper Functions =====
@@ -74,7 +121,20 @@ def fetch_all_documents_in_batch(tmdb_ids, collection):
     return dict(results)
 
 
-def upsert_in_batches(connector: CrateConnector, table: str, records: list[BaseModel]):
+def _row(table: str, **values) -> tuple:
+    """
+    Plain tuple in TABLE_COLUMNS order. Unknown keys are ignored, missing fields get the
+    model default and values are validated and coerced with the model's field types, like
+    constructing the Pydantic model would. Raises pydantic.ValidationError on invalid data.
+    """
+    adapter = TABLE_ROW_ADAPTERS[table]
+    return adapter.dump_python(adapter.validate_python(tuple(
+        values.get(column, default)
+        for column, default in zip(TABLE_COLUMNS[table], TABLE_DEFAULTS[table])
+    )))
+
+
+def upsert_in_batches(connector: CrateConnector, table: str, records: list[tuple]):
     """Process and insert entities and return upsert results."""
     total_result = {"records_received": 0, "rows_upserted": 0}
     
@@ -83,9 +143,10 @@ def upsert_in_batches(connector: CrateConnector, table: str, records: list[BaseM
         for i in range(0, len(records), SUB_BATCH_SIZE):
             batch = records[i:i + SUB_BATCH_SIZE]
             if batch:
-                result = connector.upsert_many(
+                result = connector.upsert_rows(
                     table=table,
-                    records=batch,
+                    columns=TABLE_COLUMNS[table],
+                    rows=batch,
                     conflict_columns=SCHEMAS[table]["primary_key"],
                     silent=True,
                 )
@@ -94,17 +155,557 @@ def upsert_in_batches(connector: CrateConnector, table: str, records: list[BaseM
     
     return total_result
 
+# ===== Transform (runs in worker processes) =====
+
+def transform_media_document(
+    tmdb_details: dict,
+    media_type: str,
+    provider_docs: list[dict],
+    streaming_service_id_by_name: dict[str, int],
+    rows: dict[str, list[tuple]],
+    entity_ids: dict[str, set],
+) -> bool:
+    """
+    Append all table rows for one TMDB details document to `rows`.
+    Returns False if the document has no title and was skipped.
+    """
+    is_movie = media_type == "movie"
+    media_table_name = 'movie' if is_movie else 'show'
+    tmdb_id = tmdb_details["tmdb_id"]
+    media_id = str(tmdb_id)
+
+    title = tmdb_details.get("title")
+    original_title = tmdb_details.get("original_title")
+    if not title and not original_title:
+        return False
+
+    release_date = tmdb_details.get("release_date" if is_movie else "first_air_date")
+    release_year = release_date.year if release_date else None
+   
+    # Tags
+    genres = tmdb_details.get("genres", [])
+    keywords = tmdb_details.get("keywords", [])
+
+    # Streaming
+    tmdb_url = f"https://www.themoviedb.org/{media_type}/{tmdb_id}"
+    imdb_id = tmdb_details.get("imdb_id") if is_movie else tmdb_details.get("external_ids", {}).get("imdb_id")
+    imdb_url = f"https://www.imdb.com/title/{imdb_id}" if imdb_id else None
+    
+    # Scores
+    tmdb_vote_count = tmdb_details.get("vote_count")
+    tmdb_user_score_rating_count = tmdb_vote_count if tmdb_vote_count else None
+    tmdb_user_score = tmdb_details.get("vote_average")
+    tmdb_user_score_original = tmdb_user_score if tmdb_user_score else None
+    tmdb_user_score_normalized_percent = (
+        tmdb_user_score * 10 if tmdb_user_score else None
+    )
+
+    # Create Media document
+    media = dict(
+        _key=media_id, 
+        tmdb_id=tmdb_id,
+        title=title,
+        original_title=original_title,
+        tagline=tmdb_details.get("tagline"),
+        synopsis=tmdb_details.get("overview"),
+
+        popularity=tmdb_details.get("popularity"),
+        status=tmdb_details.get("status"),
+        adult=tmdb_details.get("adult"),
+        poster_path=tmdb_details.get("poster_path"),
+        backdrop_path=tmdb_details.get("backdrop_path"),
+        release_year=release_year,
+        budget=tmdb_details.get("budget"),
+        revenue=tmdb_details.get("revenue"),
+
+        genres=[genre.get("name") for genre in genres if genre.get("name")],
+        keywords=[keyword.get("name") for keyword in keywords if keyword.get("name")],
+
+        homepage=tmdb_details.get("homepage"),
+        imdb_id=imdb_id,
+        wikidata_id=tmdb_details.get("wikidata_id"),
+        facebook_id=tmdb_details.get("facebook_id"),
+        instagram_id=tmdb_details.get("instagram_id"),
+        twitter_id=tmdb_details.get("twitter_id"),
+        
+        # Production info
+        production_company_ids=[
+            company.get("id") for company in tmdb_details.get("production_companies", [])
+            if company.get("id")
+        ],
+        production_country_codes=[
+            country.get("iso_3166_1") for country in tmdb_details.get("production_countries", [])
+            if country.get("iso_3166_1")
+        ],
+        origin_country_codes=tmdb_details.get("origin_country"),
+        original_language_code=tmdb_details.get("original_language"),
+        spoken_language_codes=[
+            lang.get("iso_639_1") for lang in tmdb_details.get("spoken_languages", [])
+            if lang.get("iso_639_1")
+        ],
+        
+        # Scores
+        tmdb_url=tmdb_url,
+        tmdb_user_score_original=tmdb_user_score_original,
+        tmdb_user_score_normalized_percent=tmdb_user_score_normalized_percent,
+        tmdb_user_score_rating_count=tmdb_user_score_rating_count,
+        imdb_url=imdb_url,
+
+        # Similarity & Recommendations
+        tmdb_recommendation_ids=[
+            rec.get("id") for rec in tmdb_details.get("recommendations", {}).get("results", [])
+            if rec.get("id")
+        ],
+        tmdb_similar_ids=[
+            sim.get("id") for sim in tmdb_details.get("similar", {}).get("results", [])
+            if sim.get("id")
+        ],
+
+        # Metadata timestamps
+        tmdb_details_created_at=to_timestamp(tmdb_details.get("created_at")),
+        tmdb_details_updated_at=to_timestamp(tmdb_details.get("updated_at")),
+    )
+
+    # Movie and Show specific fields
+    if is_movie:
+        media["release_date"] = to_timestamp(release_date)
+        media["movie_series_id"] = tmdb_details.get("belongs_to_collection", {}).get("id")
+        media["runtime"] = tmdb_details.get("runtime")
+    else:
+        media["first_air_date"] = to_timestamp(tmdb_details.get("first_air_date"))
+        media["last_air_date"] = to_timestamp(tmdb_details.get("last_air_date"))
+        media["number_of_seasons"] = tmdb_details.get("number_of_seasons")
+        media["number_of_episodes"] = tmdb_details.get("number_of_episodes")
+        media["episode_runtime"] = tmdb_details.get("episode_run_time")
+        media["in_production"] = tmdb_details.get("in_production")
+        media["network_ids"] = [
+            network.get("id") for network in tmdb_details.get("networks", [])
+            if network.get("id")
+        ]
+
+
+    # Process movie collection (movies only)
+    if is_movie and tmdb_details.get("belongs_to_collection"):
+        collection_data = tmdb_details["belongs_to_collection"]
+        collection_id = collection_data.get("id")
+        collection_name = collection_data.get("name", "")
+        if collection_id and collection_name:
+            if collection_id not in entity_ids["movie_series"]:
+                entity_ids["movie_series"].add(collection_id)
+                rows['movie_series'].append(_row("movie_series", 
+                    tmdb_id=collection_id,
+                    name=collection_name,
+                    poster_path=collection_data.get("poster_path"),
+                    backdrop_path=collection_data.get("backdrop_path"),
+                ))
+    
+    # Process seasons (shows only)
+    if not is_movie and tmdb_details.get("seasons"):
+        for season in tmdb_details["seasons"]:
+            season_id = season.get("id")
+            if season_id:
+                season_number = season.get("season_number")
+                rows['season'].append(_row("season", 
+                    tmdb_id=season_id,
+                    show_id=tmdb_id,
+                    season_number=season_number,
+                    name=season.get("name", f"Season {season_number}"),
+                    air_date=to_timestamp(season.get("air_date")),
+                    episode_count=season.get("episode_count"),
+                    overview=season.get("overview"),
+                    poster_path=season.get("poster_path"),
+                    tmdb_vote_average=season.get("vote_average"),
+                ))
+    
+    # Process images
+    image_keys = set()
+    for image_type, images in tmdb_details.get("images", {}).items():
+        for image in images:
+            url_path = image.get("file_path")
+            if url_path:
+                language_code = image.get("iso_639_1")
+                image_key = (media_id, media_type, image_type, url_path, language_code)
+                if image_key not in image_keys:
+                    image_keys.add(image_key)
+                    rows['media_image'].append(_row("media_image", 
+                        media_tmdb_id=tmdb_id,
+                        media_type=media_type,
+                        image_type=image_type,
+                        url_path=url_path,
+                        language_code=language_code,
+                        aspect_ratio=image.get("aspect_ratio"),
+                        width=image.get("width"),
+                        height=image.get("height"),
+                        tmdb_vote_average=image.get("vote_average"),
+                        tmdb_vote_count=image.get("vote_count"),
+                    ))
+    
+    # Process videos
+    for video in tmdb_details.get("videos", []):
+        video_id = video.get("id")
+        site = video.get("site")
+        site_key = video.get("key")
+        if video_id and site and site_key:
+            rows['media_video'].append(_row("media_video", 
+                media_tmdb_id=tmdb_id,
+                media_type=media_type,
+                tmdb_id=video_id,
+                video_type=video.get("type"),
+                site=site,
+                site_key=site_key,
+                language_code=video.get("iso_639_1"),
+                country_code=video.get("iso_3166_1"),
+                name=video.get("name"),
+                size=video.get("size"),
+                official=video.get("official"),
+                published_at=to_timestamp(video.get("published_at")),
+            ))
+    
+    # Process production companies
+    for company in tmdb_details.get("production_companies", []):
+        company_id = company.get("id")
+        company_name = company.get("name")
+        if company_id and company_name:
+            if company_id not in entity_ids["production_company"]:
+                entity_ids["production_company"].add(company_id)
+                rows['production_company'].append(_row("production_company", 
+                    tmdb_id=company_id,
+                    name=company_name,
+                    logo_path=company.get("logo_path"),
+                    origin_country=company.get("origin_country"),
+                ))
+    
+    # Process networks (only shows)
+    for network in tmdb_details.get("networks", []):
+        network_id = network.get("id")
+        network_name = network.get("name")
+        if network_id and network_name:
+            if network_id not in entity_ids["network"]:
+                entity_ids["network"].add(network_id)
+                rows['network'].append(_row("network", 
+                    tmdb_id=network_id,
+                    name=network_name,
+                    logo_path=network.get("logo_path"),
+                    origin_country=network.get("origin_country"),
+                ))
+
+    # Process alternative titles
+    alt_title_keys = set()
+    for alt_title in tmdb_details.get("alternative_titles", []):
+        alt_title_text = alt_title.get("title", "")
+        country_code = alt_title.get("iso_3166_1", "")
+        if alt_title_text and country_code:
+            alt_title_key = (media_id, media_type, country_code)
+            if alt_title_key not in alt_title_keys:
+                alt_title_keys.add(alt_title_key)
+                rows['alternative_title'].append(_row("alternative_title", 
+                    media_tmdb_id=tmdb_id,
+                    media_type=media_type,
+                    country_code=country_code,
+                    title=alt_title_text,
+                ))
+    
+    # Process translations
+    for translation in tmdb_details.get("translations", []):
+        lang = translation.get("iso_639_1", "")
+        country_code = translation.get("iso_3166_1", "")
+        data = translation.get("data")
+        if lang and country_code:
+            rows['translation'].append(_row("translation", 
+                media_tmdb_id=tmdb_id,
+                media_type=media_type,
+                language_code=lang,
+                country_code=country_code,
+                name=translation.get("name"),
+                english_name=translation.get("english_name"),
+                title=data.get("title"),
+                overview=data.get("overview"),
+                tagline=data.get("tagline"),
+                homepage=data.get("homepage"),
+                runtime=data.get("runtime"),
+            ))
+    
+    # Process release events and age classifications (only movies)
+    certifications = set()
+    for country_data in tmdb_details.get("release_dates", {}).get("results", []):
+        country_code = country_data.get("iso_3166_1")
+        if country_code:
+            for release in country_data.get("release_dates", []):
+                certification = release.get("certification")
+                if certification:
+                    certifications.add(f"{country_code}_{certification}")
+                release_date = release.get("release_date")
+                release_type = release.get("type")
+                if release_date and release_type:
+                    rows['release_event'].append(_row("release_event", 
+                        media_tmdb_id=tmdb_id,
+                        media_type=media_type,
+                        country_code=country_code,
+                        release_type=release_type,
+                        release_date=to_timestamp(release_date),
+                        certification=certification,
+                        note=release.get("note"),
+                        descriptors=release.get("descriptors", []),
+                    ))
+    # Process age classifications (only shows)
+    for content_rating in tmdb_details.get("content_ratings", []):
+        country_code = content_rating.get("iso_3166_1")
+        certification = content_rating.get("rating")
+        if country_code and certification:
+            certifications.add(f"{country_code}_{certification}")
+    media["age_certifications"] = list(certifications)
+    
+    # Process cast (appeared_in)
+    cast_members = tmdb_details.get("credits", {}).get("cast", []) or tmdb_details.get("aggregate_credits", {}).get("cast", [])
+    for cast_member in cast_members:
+        person_id = cast_member.get("id")
+        person_name = cast_member.get("name")
+        if person_id and person_name:
+            if person_id not in entity_ids["person"]:
+                entity_ids["person"].add(person_id)
+                rows['person'].append(_row("person", 
+                    tmdb_id=person_id,
+                    name=person_name,
+                    original_name=cast_member.get("original_name"),
+                    profile_path=cast_member.get("profile_path"),
+                    popularity=cast_member.get("popularity"),
+                    adult=cast_member.get("adult"),
+                    gender=cast_member.get("gender"),
+                    known_for_department=cast_member.get("known_for_department"),
+                ))
+            roles = cast_member.get("roles", [])
+            credit_id = cast_member.get("credit_id")
+            character = cast_member.get("character")
+            if credit_id and character:
+                roles.append({
+                    "credit_id": credit_id,
+                    "character": character,
+                })
+            for role in roles:
+                rows['person_appeared_in'].append(_row("person_appeared_in", 
+                    media_tmdb_id=tmdb_id,
+                    media_type=media_type,
+                    person_tmdb_id=person_id,
+                    credit_id=role.get("credit_id"),
+                    character=role.get("character"),
+                    order_default=cast_member.get("order"),
+                    episode_count_character=role.get("episode_count"),
+                    episode_count_total=cast_member.get("total_episode_count"),
+                ))
+    
+    # Process crew (worked_on)
+    #person_worked_on_keys = set()
+    crew_members = tmdb_details.get("credits", {}).get("crew", []) or tmdb_details.get("aggregate_credits", {}).get("crew", [])
+    for crew_member in crew_members:
+        person_id = crew_member.get("id")
+        person_name = crew_member.get("name")
+        if person_id and person_name:
+            if person_id not in entity_ids["person"]:
+                entity_ids["person"].add(person_id)
+                rows['person'].append(_row("person", 
+                    tmdb_id=person_id,
+                    name=person_name,
+                    original_name=crew_member.get("original_name"),
+                    profile_path=crew_member.get("profile_path"),
+                    popularity=crew_member.get("popularity"),
+                    adult=crew_member.get("adult"),
+                    gender=crew_member.get("gender"),
+                    known_for_department=crew_member.get("known_for_department"),
+                ))
+
+            jobs = crew_member.get("jobs", [])
+            credit_id = crew_member.get("credit_id")
+            job = crew_member.get("job")
+            department = crew_member.get("department")
+            if credit_id and job:
+                jobs.append({
+                    "credit_id": credit_id,
+                    "job": job,
+                    "department": department,
+                })
+            #person_worked_on_key = (media_id, media_type, person_id, credit_id)
+            #if person_worked_on_key not in person_worked_on_keys:
+                #person_worked_on_keys.add(person_worked_on_key)
+            for job in jobs:
+                rows['person_worked_on'].append(_row("person_worked_on", 
+                    media_tmdb_id=tmdb_id,
+                    media_type=media_type,
+                    person_tmdb_id=person_id,
+                    credit_id=job.get("credit_id"),
+                    job=job.get("job"),
+                    department=job.get("department"),
+                    episode_count_job=job.get("episode_count"),
+                    episode_count_total=crew_member.get("total_episode_count"),
+                ))
+
+    # Process streaming availability
+    streaming_availabilities_to_add = {}
+    watch_provider_results = tmdb_details.get("watch_providers", {}).get("results", {})
+    if watch_provider_results:
+        for country_code, streaming_data in watch_provider_results.items():
+            link = streaming_data.pop("link")
+            if link:
+                for streaming_type, streaming_list in streaming_data.items():
+                    for streaming in streaming_list:
+                        streaming_service_id = streaming.get("provider_id")
+                        streaming_service_key = str(streaming_service_id)
+                        streaming_key = f"{media_id}_{country_code}_{streaming_type}_{streaming_service_key}"
+                        streaming_availabilities_to_add[streaming_key] = dict(
+                            media_tmdb_id=tmdb_id,
+                            media_type=media_type,
+                            country_code=country_code,
+                            streaming_type=streaming_type,
+                            streaming_service_id=streaming_service_id,
+                            display_priority=streaming.get("display_priority"),
+                            tmdb_link=link,
+                        )
+
+    tmdb_streaming_providers = provider_docs
+    for tmdb_streaming_provider in tmdb_streaming_providers:
+        country_code = tmdb_streaming_provider.get("country_code")
+        for streaming_link in tmdb_streaming_provider.get("streaming_links", []):
+            streaming_service_id = streaming_service_id_by_name.get(streaming_link["provider_name"])
+            if streaming_service_id:
+                streaming_type = streaming_link["stream_type"]
+                streaming_key = f"{media_id}_{country_code}_{streaming_type}_{streaming_service_id}"
+                if streaming_key not in streaming_availabilities_to_add.keys():
+                    streaming_availabilities_to_add[streaming_key] = dict(
+                        media_tmdb_id=tmdb_id,
+                        media_type=media_type,
+                        country_code=country_code,
+                        streaming_type=streaming_type,
+                        streaming_service_id=streaming_service_id,
+                        stream_url=streaming_link.get("stream_url"),
+                        price_dollar=streaming_link.get("price_dollar"),
+                        quality=streaming_link.get("quality"),
+                    )
+                else:
+                    streaming_availabilities_to_add[streaming_key]["stream_url"] = streaming_link.get("stream_url")
+                    streaming_availabilities_to_add[streaming_key]["price_dollar"] = streaming_link.get("price_dollar")
+                    streaming_availabilities_to_add[streaming_key]["quality"] = streaming_link.get("quality")
+
+    streaming_availability_countries = []
+    streaming_availability_services = []
+    streaming_availability_combos = []
+    for streaming_key, streaming_availability in streaming_availabilities_to_add.items():
+        rows['streaming_availability'].append(_row("streaming_availability", **streaming_availability))
+        country_code = streaming_availability["country_code"]
+        streaming_service_id = streaming_availability["streaming_service_id"]
+        if country_code not in streaming_availability_countries:
+            streaming_availability_countries.append(country_code)
+        if streaming_service_id not in streaming_availability_services:
+            streaming_availability_services.append(streaming_service_id)
+        combo = f"{country_code}_{streaming_service_id}"
+        if combo not in streaming_availability_combos:
+            streaming_availability_combos.append(combo)
+    media["streaming_country_codes"] = streaming_availability_countries
+    media["streaming_service_ids"] = streaming_availability_services
+    media["streaming_availabilities"] = streaming_availability_combos
+
+    rows[media_table_name].append(_row(media_table_name, **media))
+    return True
+
+
+def transform_shard(
+    documents: list[dict],
+    media_type: str,
+    providers_by_tmdb_id: dict[int, list[dict]],
+    streaming_service_id_by_name: dict[str, int],
+) -> dict[str, list[tuple]]:
+    """
+    Transform a contiguous shard of documents into per-table tuples.
+    Top-level so it can be pickled into a ProcessPoolExecutor.
+    """
+    rows = defaultdict(list)
+    entity_ids = defaultdict(set)
+    media_ids = set()
+    for tmdb_details in documents:
+        tmdb_id = tmdb_details["tmdb_id"]
+        if tmdb_id in media_ids:
+            continue
+        if transform_media_document(
+            tmdb_details,
+            media_type,
+            providers_by_tmdb_id.get(tmdb_id, []),
+            streaming_service_id_by_name,
+            rows,
+            entity_ids,
+        ):
+            media_ids.add(tmdb_id)
+    return dict(rows)
+
+
+def _split_shards(documents: list[dict], shard_count: int) -> list[list[dict]]:
+    """
+    Split a tmdb_id-sorted batch into contiguous shards, never separating equal tmdb_ids,
+    so in-batch duplicate handling stays the same as in a single pass.
+    """
+    size = max(MIN_SHARD_SIZE, -(-len(documents) // max(shard_count, 1)))
+    shards = []
+    start = 0
+    while start < len(documents):
+        end = min(start + size, len(documents))
+        while end < len(documents) and documents[end]["tmdb_id"] == documents[end - 1]["tmdb_id"]:
+            end += 1
+        shards.append(documents[start:end])
+        start = end
+    return shards
+
+
+def transform_batch(
+    pool: Optional[ProcessPoolExecutor],
+    shard_count: int,
+    documents: list[dict],
+    media_type: str,
+    providers_by_tmdb_id: dict[int, list[dict]],
+    streaming_service_id_by_name: dict[str, int],
+    entity_ids: dict[str, set],
+) -> dict[str, list[tuple]]:
+    """
+    Transform a batch, sharded across the pool if given, and merge the shard results in order.
+    Shared entities (people, companies, ...) are deduplicated against `entity_ids` across batches.
+    """
+    shards = _split_shards(documents, shard_count)
+    args = [
+        (
+            shard,
+            media_type,
+            {d["tmdb_id"]: providers_by_tmdb_id[d["tmdb_id"]] for d in shard if d["tmdb_id"] in providers_by_tmdb_id},
+            streaming_service_id_by_name,
+        )
+        for shard in shards
+    ]
+    if pool:
+        results = pool.map(transform_shard, *zip(*args)) if args else []
+    else:
+        results = (transform_shard(*a) for a in args)
+
+    merged = defaultdict(list)
+    for shard_rows in results:
+        for table, table_rows in shard_rows.items():
+            if table in DEDUPED_ENTITY_TABLES:
+                for row in table_rows:
+                    if row[0] not in entity_ids[table]:
+                        entity_ids[table].add(row[0])
+                        merged[table].append(row)
+            else:
+                merged[table].extend(table_rows)
+    return dict(merged)
+
+
 def copy_media(
     connector: CrateConnector, 
     query_selector: dict = {},
-    media_type: str = "movie" 
+    media_type: str = "movie",
+    workers: int = TRANSFORM_WORKERS,
+    metrics: Optional[SyncMetrics] = None,
 ):
     is_movie = media_type == "movie"
+    metrics = metrics or SyncMetrics(f"tmdb_details_{media_type}")
 
     mongo_db = get_db()
     mongo_collection = mongo_db.tmdb_movie_details if is_movie else mongo_db.tmdb_tv_details
     media_table_name = 'movie' if is_movie else 'show'
-    MediaClass = Movie if is_movie else Show
 
     updated_at_filter = {"updated_at": {"$gte": datetime.utcnow() - timedelta(hours=HOURS_TO_FETCH)}}
     total_entry_count = mongo_collection.count_documents(query_selector | updated_at_filter)
@@ -117,509 +718,112 @@ def copy_media(
     }
 
     start = 0
+    last_id = None
     entity_counts = defaultdict(lambda: {"records_received": 0, "rows_upserted": 0})
     entity_ids = defaultdict(set)
     
     projection = {
-        "_id": 0,
         "imdb_id": 0,
         "vote_average": 0,
         "vote_count": 0,
     }
-    
-    while True:
-        media_documents = []
-        entity_batches = defaultdict(list)
-
-        tmdb_details_batch = list(
-            #mongo_collection.find({"tmdb_id": 217} | updated_at_filter, projection)
-            #mongo_collection.find({"tmdb_id": {"$lt": 1000}} | updated_at_filter, projection)
-            mongo_collection.find(query_selector | updated_at_filter, projection)
-                .sort("tmdb_id", 1)
-                .skip(start)
-                .limit(BATCH_SIZE)
-        )
-        if not tmdb_details_batch:
-            break
 
-        # Insert batch of media
-        print(f"\nBatch from {start} to {start + len(tmdb_details_batch)} {media_type}s")
-
-        tmdb_ids = [doc["tmdb_id"] for doc in tmdb_details_batch]
-        tmdb_all_providers = fetch_all_documents_in_batch(
-            tmdb_ids, 
-            mongo_db.tmdb_movie_providers if is_movie else mongo_db.tmdb_tv_providers
-        )
-
-        media_ids = []
-        for index, tmdb_details in enumerate(tmdb_details_batch):
-            tmdb_id = tmdb_details["tmdb_id"]
-            media_id = str(tmdb_id)
-
-            title = tmdb_details.get("title")
-            original_title = tmdb_details.get("original_title")
-            if not title and not original_title:
-                continue
-            
-            if media_id in media_ids:
-                continue
-            
-            media_ids.append(media_id)
-
-            release_date = tmdb_details.get("release_date" if is_movie else "first_air_date")
-            release_year = release_date.year if release_date else None
-           
-            # Tags
-            genres = tmdb_details.get("genres", [])
-            keywords = tmdb_details.get("keywords", [])
-
-            # Streaming
-            tmdb_url = f"https://www.themoviedb.org/{media_type}/{tmdb_id}"
-            imdb_id = tmdb_details.get("imdb_id") if is_movie else tmdb_details.get("external_ids", {}).get("imdb_id")
-            imdb_url = f"https://www.imdb.com/title/{imdb_id}" if imdb_id else None
-            
-            # Scores
-            tmdb_vote_count = tmdb_details.get("vote_count")
-            tmdb_user_score_rating_count = tmdb_vote_count if tmdb_vote_count else None
-            tmdb_user_score = tmdb_details.get("vote_average")
-            tmdb_user_score_original = tmdb_user_score if tmdb_user_score else None
-            tmdb_user_score_normalized_percent = (
-                tmdb_user_score * 10 if tmdb_user_score else None
-            )
-
-            # Create Media document
-            media = MediaClass(
-                _key=media_id, 
-                tmdb_id=tmdb_id,
-                title=title,
-                original_title=original_title,
-                tagline=tmdb_details.get("tagline"),
-                synopsis=tmdb_details.get("overview"),
-
-                popularity=tmdb_details.get("popularity"),
-                status=tmdb_details.get("status"),
-                adult=tmdb_details.get("adult"),
-                poster_path=tmdb_details.get("poster_path"),
-                backdrop_path=tmdb_details.get("backdrop_path"),
-                release_year=release_year,
-                budget=tmdb_details.get("budget"),
-                revenue=tmdb_details.get("revenue"),
-
-                genres=[genre.get("name") for genre in genres if genre.get("name")],
-                keywords=[keyword.get("name") for keyword in keywords if keyword.get("name")],
-
-                homepage=tmdb_details.get("homepage"),
-                imdb_id=imdb_id,
-                wikidata_id=tmdb_details.get("wikidata_id"),
-                facebook_id=tmdb_details.get("facebook_id"),
-                instagram_id=tmdb_details.get("instagram_id"),
-                twitter_id=tmdb_details.get("twitter_id"),
+    worker_count = workers or len(os.sched_getaffinity(0))
+    pool = ProcessPoolExecutor(max_workers=worker_count) if worker_count > 1 else None
+    print(f"Transforming with {worker_count} worker process(es)")
+    
+    try:
+        batch_no = 0
+        while True:
+            with metrics.stage("mongo_read_details", batch_no) as stage:
+                # Keyset pagination on _id: every batch is an index range scan, no skipped documents
+                batch_filter = [query_selector, updated_at_filter]
+                if last_id is not None:
+                    batch_filter.append({"_id": {"$gt": last_id}})
+                tmdb_details_batch = list(
+                    #mongo_collection.find({"tmdb_id": 217} | updated_at_filter, projection)
+                    #mongo_collection.find({"tmdb_id": {"$lt": 1000}} | updated_at_filter, projection)
+                    mongo_collection.find({"$and": batch_filter}, projection)
+                        .sort("_id", 1)
+                        .limit(BATCH_SIZE)
+                )
+                stage.rows = len(tmdb_details_batch)
+                stage.bytes = bson_bytes(tmdb_details_batch)
+            if not tmdb_details_batch:
+                break
+            last_id = tmdb_details_batch[-1]["_id"]
+            # Sharding needs equal tmdb_ids next to each other
+            tmdb_details_batch.sort(key=lambda doc: doc["tmdb_id"])
+
+            # Insert batch of media
+            print(f"\nBatch from {start} to {start + len(tmdb_details_batch)} {media_type}s")
+
+            tmdb_ids = [doc["tmdb_id"] for doc in tmdb_details_batch]
+            with metrics.stage("mongo_read_providers", batch_no) as stage:
+                tmdb_all_providers = fetch_all_documents_in_batch(
+                    tmdb_ids, 
+                    mongo_db.tmdb_movie_providers if is_movie else mongo_db.tmdb_tv_providers
+                )
+                stage.rows = sum(len(docs) for docs in tmdb_all_providers.values())
+                stage.bytes = bson_bytes(doc for docs in tmdb_all_providers.values() for doc in docs)
+
+            with metrics.stage("transform", batch_no) as stage:
+                entity_batches = transform_batch(
+                    pool,
+                    worker_count,
+                    tmdb_details_batch,
+                    media_type,
+                    tmdb_all_providers,
+                    streaming_service_id_by_name,
+                    entity_ids,
+                )
+                stage.rows = sum(len(rows) for rows in entity_batches.values())
+
+            with metrics.stage("crate_write", batch_no) as stage:
+                bytes_before = connector.bytes_sent
+                upsert_result = upsert_in_batches(
+                    connector=connector,
+                    table=media_table_name,
+                    records=entity_batches.pop(media_table_name, []),
+                )
+                stage.rows += upsert_result["rows_upserted"]
                 
-                # Production info
-                production_company_ids=[
-                    company.get("id") for company in tmdb_details.get("production_companies", [])
-                    if company.get("id")
-                ],
-                production_country_codes=[
-                    country.get("iso_3166_1") for country in tmdb_details.get("production_countries", [])
-                    if country.get("iso_3166_1")
-                ],
-                origin_country_codes=tmdb_details.get("origin_country"),
-                original_language_code=tmdb_details.get("original_language"),
-                spoken_language_codes=[
-                    lang.get("iso_639_1") for lang in tmdb_details.get("spoken_languages", [])
-                    if lang.get("iso_639_1")
-                ],
+                media_type_key = 'movies' if is_movie else 'shows'
+                entity_counts[media_type_key]["records_received"] += upsert_result["records_received"]
+                entity_counts[media_type_key]["rows_upserted"] += upsert_result["rows_upserted"]
                 
-                # Scores
-                tmdb_url=tmdb_url,
-                tmdb_user_score_original=tmdb_user_score_original,
-                tmdb_user_score_normalized_percent=tmdb_user_score_normalized_percent,
-                tmdb_user_score_rating_count=tmdb_user_score_rating_count,
-                imdb_url=imdb_url,
-
-                # Similarity & Recommendations
-                tmdb_recommendation_ids=[
-                    rec.get("id") for rec in tmdb_details.get("recommendations", {}).get("results", [])
-                    if rec.get("id")
-                ],
-                tmdb_similar_ids=[
-                    sim.get("id") for sim in tmdb_details.get("similar", {}).get("results", [])
-                    if sim.get("id")
-                ],
-
-                # Metadata timestamps
-                tmdb_details_created_at=to_timestamp(tmdb_details.get("created_at")),
-                tmdb_details_updated_at=to_timestamp(tmdb_details.get("updated_at")),
-            )
-
-            # Movie and Show specific fields
-            if is_movie:
-                media.release_date = to_timestamp(release_date)
-                media.movie_series_id = tmdb_details.get("belongs_to_collection", {}).get("id")
-                media.runtime = tmdb_details.get("runtime")
-            else:
-                media.first_air_date = to_timestamp(tmdb_details.get("first_air_date"))
-                media.last_air_date = to_timestamp(tmdb_details.get("last_air_date"))
-                media.number_of_seasons = tmdb_details.get("number_of_seasons")
-                media.number_of_episodes = tmdb_details.get("number_of_episodes")
-                media.episode_runtime = tmdb_details.get("episode_run_time")
-                media.in_production = tmdb_details.get("in_production")
-                media.network_ids = [
-                    network.get("id") for network in tmdb_details.get("networks", [])
-                    if network.get("id")
-                ]
-
-
-            # Process movie collection (movies only)
-            if is_movie and tmdb_details.get("belongs_to_collection"):
-                collection_data = tmdb_details["belongs_to_collection"]
-                collection_id = collection_data.get("id")
-                collection_name = collection_data.get("name", "")
-                if collection_id and collection_name:
-                    if collection_id not in entity_ids["movie_series"]:
-                        entity_ids["movie_series"].add(collection_id)
-                        entity_batches['movie_series'].append(MovieSeries(
-                            tmdb_id=collection_id,
-                            name=collection_name,
-                            poster_path=collection_data.get("poster_path"),
-                            backdrop_path=collection_data.get("backdrop_path"),
-                        ))
-            
-            # Process seasons (shows only)
-            if not is_movie and tmdb_details.get("seasons"):
-                for season in tmdb_details["seasons"]:
-                    season_id = season.get("id")
-                    if season_id:
-                        season_number = season.get("season_number")
-                        entity_batches['season'].append(Season(
-                            tmdb_id=season_id,
-                            show_id=media_id,
-                            season_number=season_number,
-                            name=season.get("name", f"Season {season_number}"),
-                            air_date=to_timestamp(season.get("air_date")),
-                            episode_count=season.get("episode_count"),
-                            overview=season.get("overview"),
-                            poster_path=season.get("poster_path"),
-                            tmdb_vote_average=season.get("vote_average"),
-                        ))
-            
-            # Process images
-            image_keys = set()
-            for image_type, images in tmdb_details.get("images", {}).items():
-                for image in images:
-                    url_path = image.get("file_path")
-                    if url_path:
-                        language_code = image.get("iso_639_1")
-                        image_key = (media_id, media_type, image_type, url_path, language_code)
-                        if image_key not in image_keys:
-                            image_keys.add(image_key)
-                            entity_batches['media_image'].append(Image(
-                                media_tmdb_id=media_id,
-                                media_type=media_type,
-                                image_type=image_type,
-                                url_path=url_path,
-                                language_code=language_code,
-                                aspect_ratio=image.get("aspect_ratio"),
-                                width=image.get("width"),
-                                height=image.get("height"),
-                                tmdb_vote_average=image.get("vote_average"),
-                                tmdb_vote_count=image.get("vote_count"),
-                            ))
-            
-            # Process videos
-            for video in tmdb_details.get("videos", []):
-                video_id = video.get("id")
-                site = video.get("site")
-                site_key = video.get("key")
-                if video_id and site and site_key:
-                    entity_batches['media_video'].append(Video(
-                        media_tmdb_id=media_id,
-                        media_type=media_type,
-                        tmdb_id=video_id,
-                        video_type=video.get("type"),
-                        site=site,
-                        site_key=site_key,
-                        language_code=video.get("iso_639_1"),
-                        country_code=video.get("iso_3166_1"),
-                        name=video.get("name"),
-                        size=video.get("size"),
-                        official=video.get("official"),
-                        published_at=to_timestamp(video.get("published_at")),
-                    ))
-            
-            # Process production companies
-            for company in tmdb_details.get("production_companies", []):
-                company_id = company.get("id")
-                company_name = company.get("name")
-                if company_id and company_name:
-                    if company_id not in entity_ids["production_company"]:
-                        entity_ids["production_company"].add(company_id)
-                        entity_batches['production_company'].append(ProductionCompany(
-                            tmdb_id=company_id,
-                            name=company_name,
-                            logo_path=company.get("logo_path"),
-                            origin_country=company.get("origin_country"),
-                        ))
-            
-            # Process networks (only shows)
-            for network in tmdb_details.get("networks", []):
-                network_id = network.get("id")
-                network_name = network.get("name")
-                if network_id and network_name:
-                    if network_id not in entity_ids["network"]:
-                        entity_ids["network"].add(network_id)
-                        entity_batches['network'].append(Network(
-                            tmdb_id=network_id,
-                            name=network_name,
-                            logo_path=network.get("logo_path"),
-                            origin_country=network.get("origin_country"),
-                        ))
-
-            # Process alternative titles
-            alt_title_keys = set()
-            for alt_title in tmdb_details.get("alternative_titles", []):
-                alt_title_text = alt_title.get("title", "")
-                country_code = alt_title.get("iso_3166_1", "")
-                if alt_title_text and country_code:
-                    alt_title_key = (media_id, media_type, country_code)
-                    if alt_title_key not in alt_title_keys:
-                        alt_title_keys.add(alt_title_key)
-                        entity_batches['alternative_title'].append(AlternativeTitle(
-                            media_tmdb_id=media_id,
-                            media_type=media_type,
-                            country_code=country_code,
-                            title=alt_title_text,
-                        ))
-            
-            # Process translations
-            for translation in tmdb_details.get("translations", []):
-                lang = translation.get("iso_639_1", "")
-                country_code = translation.get("iso_3166_1", "")
-                data = translation.get("data")
-                if lang and country_code:
-                    entity_batches['translation'].append(Translation(
-                        media_tmdb_id=media_id,
-                        media_type=media_type,
-                        language_code=lang,
-                        country_code=country_code,
-                        name=translation.get("name"),
-                        english_name=translation.get("english_name"),
-                        title=data.get("title"),
-                        overview=data.get("overview"),
-                        tagline=data.get("tagline"),
-                        homepage=data.get("homepage"),
-                        runtime=data.get("runtime"),
-                    ))
-            
-            # Process release events and age classifications (only movies)
-            certifications = set()
-            for country_data in tmdb_details.get("release_dates", {}).get("results", []):
-                country_code = country_data.get("iso_3166_1")
-                if country_code:
-                    for release in country_data.get("release_dates", []):
-                        certification = release.get("certification")
-                        if certification:
-                            certifications.add(f"{country_code}_{certification}")
-                        release_date = release.get("release_date")
-                        release_type = release.get("type")
-                        if release_date and release_type:
-                            entity_batches['release_event'].append(ReleaseEvent(
-                                media_tmdb_id=media_id,
-                                media_type=media_type,
-                                country_code=country_code,
-                                release_type=release_type,
-                                release_date=to_timestamp(release_date),
-                                certification=certification,
-                                note=release.get("note"),
-                                descriptors=release.get("descriptors", []),
-                            ))
-            # Process age classifications (only shows)
-            for content_rating in tmdb_details.get("content_ratings", []):
-                country_code = content_rating.get("iso_3166_1")
-                certification = content_rating.get("rating")
-                if country_code and certification:
-                    certifications.add(f"{country_code}_{certification}")
-            media.age_certifications = list(certifications)
-            
-            # Process cast (appeared_in)
-            cast_members = tmdb_details.get("credits", {}).get("cast", []) or tmdb_details.get("aggregate_credits", {}).get("cast", [])
-            for cast_member in cast_members:
-                person_id = cast_member.get("id")
-                person_name = cast_member.get("name")
-                if person_id and person_name:
-                    if person_id not in entity_ids["person"]:
-                        entity_ids["person"].add(person_id)
-                        entity_batches['person'].append(Person(
-                            tmdb_id=person_id,
-                            name=person_name,
-                            original_name=cast_member.get("original_name"),
-                            profile_path=cast_member.get("profile_path"),
-                            popularity=cast_member.get("popularity"),
-                            adult=cast_member.get("adult"),
-                            gender=cast_member.get("gender"),
-                            known_for_department=cast_member.get("known_for_department"),
-                        ))
-                    roles = cast_member.get("roles", [])
-                    credit_id = cast_member.get("credit_id")
-                    character = cast_member.get("character")
-                    if credit_id and character:
-                        roles.append({
-                            "credit_id": credit_id,
-                            "character": character,
-                        })
-                    for role in roles:
-                        entity_batches['person_appeared_in'].append(PersonAppearedIn(
-                            media_tmdb_id=media_id,
-                            media_type=media_type,
-                            person_tmdb_id=person_id,
-                            credit_id=role.get("credit_id"),
-                            character=role.get("character"),
-                            order_default=cast_member.get("order"),
-                            episode_count_character=role.get("episode_count"),
-                            episode_count_total=cast_member.get("total_episode_count"),
-                        ))
-            
-            # Process crew (worked_on)
-            #person_worked_on_keys = set()
-            crew_members = tmdb_details.get("credits", {}).get("crew", []) or tmdb_details.get("aggregate_credits", {}).get("crew", [])
-            for crew_member in crew_members:
-                person_id = crew_member.get("id")
-                person_name = crew_member.get("name")
-                if person_id and person_name:
-                    if person_id not in entity_ids["person"]:
-                        entity_ids["person"].add(person_id)
-                        entity_batches['person'].append(Person(
-                            tmdb_id=person_id,
-                            name=person_name,
-                            original_name=crew_member.get("original_name"),
-                            profile_path=crew_member.get("profile_path"),
-                            popularity=crew_member.get("popularity"),
-                            adult=crew_member.get("adult"),
-                            gender=crew_member.get("gender"),
-                            known_for_department=crew_member.get("known_for_department"),
-                        ))
-
-                    jobs = crew_member.get("jobs", [])
-                    credit_id = crew_member.get("credit_id")
-                    job = crew_member.get("job")
-                    department = crew_member.get("department")
-                    if credit_id and job:
-                        jobs.append({
-                            "credit_id": credit_id,
-                            "job": job,
-                            "department": department,
-                        })
-                    #person_worked_on_key = (media_id, media_type, person_id, credit_id)
-                    #if person_worked_on_key not in person_worked_on_keys:
-                        #person_worked_on_keys.add(person_worked_on_key)
-                    for job in jobs:
-                        entity_batches['person_worked_on'].append(PersonWorkedOn(
-                            media_tmdb_id=media_id,
-                            media_type=media_type,
-                            person_tmdb_id=person_id,
-                            credit_id=job.get("credit_id"),
-                            job=job.get("job"),
-                            department=job.get("department"),
-                            episode_count_job=job.get("episode_count"),
-                            episode_count_total=crew_member.get("total_episode_count"),
-                        ))
-
-            # Process streaming availability
-            streaming_availabilities_to_add = {}
-            watch_provider_results = tmdb_details.get("watch_providers", {}).get("results", {})
-            if watch_provider_results:
-                for country_code, streaming_data in watch_provider_results.items():
-                    link = streaming_data.pop("link")
-                    if link:
-                        for streaming_type, streaming_list in streaming_data.items():
-                            for streaming in streaming_list:
-                                streaming_service_id = streaming.get("provider_id")
-                                streaming_service_key = str(streaming_service_id)
-                                streaming_key = f"{media_id}_{country_code}_{streaming_type}_{streaming_service_key}"
-                                streaming_availabilities_to_add[streaming_key] = StreamingAvailability(
-                                    media_tmdb_id=media_id,
-                                    media_type=media_type,
-                                    country_code=country_code,
-                                    streaming_type=streaming_type,
-                                    streaming_service_id=streaming_service_id,
-                                    display_priority=streaming.get("display_priority"),
-                                    tmdb_link=link,
-                                )
-        
-            tmdb_streaming_providers = tmdb_all_providers.get(tmdb_id, [])
-            for tmdb_streaming_provider in tmdb_streaming_providers:
-                country_code = tmdb_streaming_provider.get("country_code")
-                for streaming_link in tmdb_streaming_provider.get("streaming_links", []):
-                    streaming_service_id = streaming_service_id_by_name.get(streaming_link["provider_name"])
-                    if streaming_service_id:
-                        streaming_type = streaming_link["stream_type"]
-                        streaming_key = f"{media_id}_{country_code}_{streaming_type}_{streaming_service_id}"
-                        if streaming_key not in streaming_availabilities_to_add.keys():
-                            streaming_availabilities_to_add[streaming_key] = StreamingAvailability(
-                                media_tmdb_id=media_id,
-                                media_type=media_type,
-                                country_code=country_code,
-                                streaming_type=streaming_type,
-                                streaming_service_id=streaming_service_id,
-                                stream_url=streaming_link.get("stream_url"),
-                                price_dollar=streaming_link.get("price_dollar"),
-                                quality=streaming_link.get("quality"),
-                            )
-                        else:
-                            streaming_availabilities_to_add[streaming_key].stream_url = streaming_link.get("stream_url")
-                            streaming_availabilities_to_add[streaming_key].price_dollar = streaming_link.get("price_dollar")
-                            streaming_availabilities_to_add[streaming_key].quality = streaming_link.get("quality")
-
-            streaming_availability_countries = []
-            streaming_availability_services = []
-            streaming_availability_combos = []
-            for streaming_key, streaming_availability in streaming_availabilities_to_add.items():
-                entity_batches['streaming_availability'].append(streaming_availability)
-                if streaming_availability.country_code not in streaming_availability_countries:
-                    streaming_availability_countries.append(streaming_availability.country_code)
-                if streaming_availability.streaming_service_id not in streaming_availability_services:
-                    streaming_availability_services.append(streaming_availability.streaming_service_id)
-                combo = f"{streaming_availability.country_code}_{streaming_availability.streaming_service_id}"
-                if combo not in streaming_availability_combos:
-                    streaming_availability_combos.append(combo)
-            media.streaming_country_codes = streaming_availability_countries
-            media.streaming_service_ids = streaming_availability_services
-            media.streaming_availabilities = streaming_availability_combos
-            
-            media_documents.append(media)
-            
-
-        upsert_result = upsert_in_batches(
-            connector=connector,
-            table=media_table_name,
-            records=media_documents,
-        )
-        
-        media_type_key = 'movies' if is_movie else 'shows'
-        entity_counts[media_type_key]["records_received"] += upsert_result["records_received"]
-        entity_counts[media_type_key]["rows_upserted"] += upsert_result["rows_upserted"]
-        
-        # Insert all row for batch and track counts
-        for table_name, batch in entity_batches.items():
-            entity_upsert_result = upsert_in_batches(
-                connector=connector,
-                table=table_name,
-                records=batch, 
-            )
-            entity_counts[table_name]["records_received"] += entity_upsert_result["records_received"]
-            entity_counts[table_name]["rows_upserted"] += entity_upsert_result["rows_upserted"]
-
-        start += BATCH_SIZE
+                # Insert all row for batch and track counts
+                for table_name, batch in entity_batches.items():
+                    entity_upsert_result = upsert_in_batches(
+                        connector=connector,
+                        table=table_name,
+                        records=batch, 
+                    )
+                    entity_counts[table_name]["records_received"] += entity_upsert_result["records_received"]
+                    entity_counts[table_name]["rows_upserted"] += entity_upsert_result["rows_upserted"]
+                    stage.rows += entity_upsert_result["rows_upserted"]
+                stage.bytes = connector.bytes_sent - bytes_before
+
+            batch_no += 1
+            start += len(tmdb_details_batch)
+    finally:
+        if pool:
+            pool.shutdown()
 
     return entity_counts
 
 
-def main(movie_ids: list[str] = [], show_ids: list[str] = [], skip_movies = False):
+def main(
+    movie_ids: list[str] = [],
+    show_ids: list[str] = [],
+    skip_movies = False,
+    workers: int = TRANSFORM_WORKERS,
+    profile_batch: Optional[int] = None,
+):
     init_mongodb()
     connector = CrateConnector()
 
-    results = {}
+    results = {"metrics": {}}
 
     if skip_movies:
         results["movies"] = None
@@ -631,11 +835,15 @@ def main(movie_ids: list[str] = [], show_ids: list[str] = [], skip_movies = Fals
         else:
             movie_query_selector = build_query_selector_for_object_ids(ids=movie_ids)
         
+        movie_metrics = SyncMetrics("tmdb_details_movie", profile_batch=profile_batch)
         results["movies"] = copy_media(
             connector=connector, 
             query_selector=movie_query_selector,
-            media_type="movie"
+            media_type="movie",
+            workers=workers,
+            metrics=movie_metrics,
         )
+        results["metrics"]["movies"] = movie_metrics.finish()
     
     # Process shows
     if show_ids is None or len(show_ids) == 0:
@@ -644,11 +852,15 @@ def main(movie_ids: list[str] = [], show_ids: list[str] = [], skip_movies = Fals
     else:
         show_query_selector = build_query_selector_for_object_ids(ids=show_ids)
     
+    show_metrics = SyncMetrics("tmdb_details_show", profile_batch=profile_batch)
     results["shows"] = copy_media(
         connector=connector, 
         query_selector=show_query_selector,
-        media_type="show"
+        media_type="show",
+        workers=workers,
+        metrics=show_metrics,
     )
+    results["metrics"]["shows"] = show_metrics.finish()
 
     connector.disconnect()
     close_mongodb()
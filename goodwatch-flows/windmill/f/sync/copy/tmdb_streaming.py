@@ -17,11 +17,27 @@ from f.sync.models.crate_models import (
     StreamingAvailability,
 )
 from f.sync.models.crate_schemas import SCHEMAS
+from f.utils.instrumentation import SyncMetrics, bson_bytes
 
 BATCH_SIZE = 5000
 SUB_BATCH_SIZE = 50000
 HOURS_TO_FETCH = 24*2
 
+# served by the (updated_at, tmdb_id, _id) index of the provider models, created in tmdb_init_providers
+KEYSET_SORT = [("updated_at", 1), ("tmdb_id", 1), ("_id", 1)]
+PROVIDER_PROJECTION = {
+    "_id": 0,
+    "tmdb_id": 1,
+    "country_code": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "streaming_links.provider_name": 1,
+    "streaming_links.stream_type": 1,
+    "streaming_links.stream_url": 1,
+    "streaming_links.price_dollar": 1,
+    "streaming_links.quality": 1,
+}
+
 
 # ===== Helper Functions =====
 
@@ -56,8 +72,9 @@ def to_timestamp(dt_input: str) -> Optional[float]:
 
 def fetch_documents_in_batch(tmdb_ids, collection):
     projection = {
+        "_id": 0,
         "tmdb_id": 1,
-        "watch_providers": 1,
+        "watch_providers.results": 1,
     }
     return {
         doc["tmdb_id"]: doc for doc in collection.find({"tmdb_id": {"$in": tmdb_ids}}, projection)
@@ -66,12 +83,33 @@ def fetch_documents_in_batch(tmdb_ids, collection):
 
 def fetch_all_documents_in_batch(tmdb_ids, collection):
     results = defaultdict(list)
-    for doc in collection.find({"tmdb_id": {"$in": tmdb_ids}}):
+    for doc in collection.find({"tmdb_id": {"$in": tmdb_ids}}, PROVIDER_PROJECTION):
         if doc.get('created_at') and doc.get('updated_at'):
             results[doc["tmdb_id"]].append(doc)
     return dict(results)
 
 
+def fetch_next_keyset_batch(collection, base_filter: dict, after: Optional[tuple], limit: int) -> list:
+    """
+    Next provider rows of the sync window, ordered by (updated_at, tmdb_id, _id).
+    Seeks past the last seen key instead of skipping, so every batch costs the same.
+    """
+    keyset_filter = {}
+    if after:
+        updated_at, tmdb_id, object_id = after
+        keyset_filter = {"$or": [
+            {"updated_at": {"$gt": updated_at}},
+            {"updated_at": updated_at, "tmdb_id": {"$gt": tmdb_id}},
+            {"updated_at": updated_at, "tmdb_id": tmdb_id, "_id": {"$gt": object_id}},
+        ]}
+    query = {"$and": [base_filter, keyset_filter]} if keyset_filter else base_filter
+    return list(
+        collection.find(query, {"_id": 1, "tmdb_id": 1, "updated_at": 1})
+        .sort(KEYSET_SORT)
+        .limit(limit)
+    )
+
+
 def upsert_in_batches(connector: CrateConnector, table: str, records: list[BaseModel]):
     """Process and insert entities and return upsert results."""
     total_result = {"records_received": 0, "rows_upserted": 0}
@@ -95,9 +133,11 @@ def upsert_in_batches(connector: CrateConnector, table: str, records: list[BaseM
 def copy_media(
     connector: CrateConnector, 
     query_selector: dict = {},
-    media_type: str = "movie" 
+    media_type: str = "movie",
+    metrics: Optional[SyncMetrics] = None,
 ):
     is_movie = media_type == "movie"
+    metrics = metrics or SyncMetrics(f"tmdb_streaming_{media_type}")
 
     mongo_db = get_db()
     mongo_details = mongo_db.tmdb_movie_details if is_movie else mongo_db.tmdb_tv_details
@@ -115,38 +155,41 @@ def copy_media(
         for streaming_service in streaming_services
     }
 
-    start = 0
+    base_filter = query_selector | updated_at_filter
+
+    after = None
+    processed_ids = set()
+    batch_start = 0
     entity_counts = defaultdict(lambda: {"records_received": 0, "rows_upserted": 0})
     
+    batch_no = 0
     while True:
         media_documents = []
         entity_batches = defaultdict(list)
 
-        pipeline = [{
-            "$match": query_selector | updated_at_filter
-        }, {
-            "$group": {
-                "_id": "$tmdb_id",
-            }
-        }, {
-            "$sort": {
-                "_id": 1
-            }
-        }, {
-            "$skip": start
-        }, {
-            "$limit": BATCH_SIZE
-        }]
-
-        # Execute the aggregation pipeline
-        tmdb_provider_ids_batch = list(mongo_providers.aggregate(pipeline))
-        if not tmdb_provider_ids_batch:
+        stage = metrics.begin("mongo_read", batch_no)
+        keyset_batch = fetch_next_keyset_batch(mongo_providers, base_filter, after, BATCH_SIZE)
+        if not keyset_batch:
+            metrics.end(stage, rows=0)
             break
+        last = keyset_batch[-1]
+        after = (last["updated_at"], last.get("tmdb_id"), last["_id"])
+        batch_start += len(keyset_batch)
+
+        # all provider rows of an id are handled together, later rows of the same id are skipped
+        tmdb_ids = []
+        for doc in keyset_batch:
+            tmdb_id = doc.get("tmdb_id")
+            if tmdb_id is not None and tmdb_id not in processed_ids:
+                processed_ids.add(tmdb_id)
+                tmdb_ids.append(tmdb_id)
+        if not tmdb_ids:
+            metrics.end(stage, rows=len(keyset_batch), bytes_=bson_bytes(keyset_batch))
+            batch_no += 1
+            continue
+
+        print(f"\nBatch up to {batch_start} of {total_entry_count} {media_type} streaming entries ({len(tmdb_ids)} new ids)")
 
-        # Insert batch of media
-        print(f"\nBatch from {start} to {start + len(tmdb_provider_ids_batch)} {media_type} streaming entries")
-
-        tmdb_ids = [doc["_id"] for doc in tmdb_provider_ids_batch]
         tmdb_details_by_id = fetch_documents_in_batch(
             tmdb_ids, 
             mongo_details,
@@ -155,12 +198,19 @@ def copy_media(
             tmdb_ids, 
             mongo_providers,
         )
+        provider_docs = [doc for docs in tmdb_all_providers.values() for doc in docs]
+        metrics.end(
+            stage,
+            rows=len(keyset_batch) + len(tmdb_details_by_id) + len(provider_docs),
+            bytes_=bson_bytes([*keyset_batch, *tmdb_details_by_id.values(), *provider_docs]),
+        )
 
+        stage = metrics.begin("transform", batch_no)
         for tmdb_id, tmdb_details in tmdb_details_by_id.items():
             media_id = str(tmdb_id)
-            tmdb_provider_results = tmdb_all_providers[tmdb_id]
+            tmdb_provider_results = tmdb_all_providers.get(tmdb_id)
 
-            if not tmdb_details and not tmdb_provider_results:
+            if not tmdb_details or not tmdb_provider_results:
                 continue
             
             latest_created_at = max(tmdb_provider_results, key=lambda provider: provider['created_at'])['created_at']
@@ -239,7 +289,10 @@ def copy_media(
             )
 
             media_documents.append(media)
+        metrics.end(stage, rows=len(media_documents))
 
+        stage = metrics.begin("crate_write", batch_no)
+        bytes_before = connector.bytes_sent
         upsert_result = upsert_in_batches(
             connector=connector,
             table=media_table_name,
@@ -249,6 +302,7 @@ def copy_media(
         media_type_key = 'movies' if is_movie else 'shows'
         entity_counts[media_type_key]["records_received"] += upsert_result["records_received"]
         entity_counts[media_type_key]["rows_upserted"] += upsert_result["rows_upserted"]
+        rows_written = upsert_result["rows_upserted"]
         
         # Insert all row for batch and track counts
         for table_name, batch in entity_batches.items():
@@ -259,8 +313,9 @@ def copy_media(
             )
             entity_counts[table_name]["records_received"] += entity_upsert_result["records_received"]
             entity_counts[table_name]["rows_upserted"] += entity_upsert_result["rows_upserted"]
-
-        start += BATCH_SIZE
+            rows_written += entity_upsert_result["rows_upserted"]
+        metrics.end(stage, rows=rows_written, bytes_=connector.bytes_sent - bytes_before)
+        batch_no += 1
 
     return entity_counts
 
@@ -269,7 +324,7 @@ def main(movie_ids: list[str] = [], show_ids: list[str] = [], skip_movies = Fals
     init_mongodb()
     connector = CrateConnector()
 
-    results = {}
+    results = {"metrics": {}}
 
     if skip_movies:
         results["movies"] = None
@@ -281,11 +336,14 @@ def main(movie_ids: list[str] = [], show_ids: list[str] = [], skip_movies = Fals
         else:
             movie_query_selector = build_query_selector_for_object_ids(ids=movie_ids)
         
+        movie_metrics = SyncMetrics("tmdb_streaming_movie")
         results["movies"] = copy_media(
             connector=connector, 
             query_selector=movie_query_selector,
-            media_type="movie"
+            media_type="movie",
+            metrics=movie_metrics,
         )
+        results["metrics"]["movies"] = movie_metrics.finish()
     
     # Process shows
     if show_ids is None or len(show_ids) == 0:
@@ -294,11 +352,14 @@ def main(movie_ids: list[str] = [], show_ids: list[str] = [], skip_movies = Fals
     else:
         show_query_selector = build_query_selector_for_object_ids(ids=show_ids)
     
+    show_metrics = SyncMetrics("tmdb_streaming_show")
     results["shows"] = copy_media(
         connector=connector, 
         query_selector=show_query_selector,
-        media_type="show"
+        media_type="show",
+        metrics=show_metrics,
     )
+    results["metrics"]["shows"] = show_metrics.finish()
 
     connector.disconnect()
     close_mongodb()
@@ -17,6 +17,7 @@ from f.sync.models.crate_models import (
     Trope,
 )
 from f.sync.models.crate_schemas import SCHEMAS
+from f.utils.instrumentation import SyncMetrics, bson_bytes
 
 BATCH_SIZE = 5000
 SUB_BATCH_SIZE = 50000
@@ -94,9 +95,11 @@ def upsert_in_batches(connector: CrateConnector, table: str, records: list[BaseM
 def copy_media(
     connector: CrateConnector, 
     query_selector: dict = {},
-    media_type: str = "movie" 
+    media_type: str = "movie",
+    metrics: Optional[SyncMetrics] = None,
 ):
     is_movie = media_type == "movie"
+    metrics = metrics or SyncMetrics(f"tvtropes_{media_type}")
 
     mongo_db = get_db()
     mongo_details = mongo_db.tmdb_movie_details if is_movie else mongo_db.tmdb_tv_details
@@ -115,6 +118,8 @@ def copy_media(
         media_documents = []
         entity_batches = defaultdict(list)
 
+        batch_no = start // BATCH_SIZE
+        stage = metrics.begin("mongo_read", batch_no)
         tropes_batch = list(
             mongo_tropes.find(query_selector | updated_at_filter)
                 .sort("tmdb_id", 1)
@@ -122,6 +127,7 @@ def copy_media(
                 .limit(BATCH_SIZE)
         )
         if not tropes_batch:
+            metrics.end(stage, rows=0)
             break
 
         # Insert batch of media
@@ -132,7 +138,13 @@ def copy_media(
             tmdb_ids, 
             mongo_details,
         )
+        metrics.end(
+            stage,
+            rows=len(tropes_batch) + len(tmdb_details_by_id),
+            bytes_=bson_bytes([*tropes_batch, *tmdb_details_by_id.values()]),
+        )
 
+        stage = metrics.begin("transform", batch_no)
         for tropes_entry in tropes_batch:
             tmdb_id = tropes_entry["tmdb_id"]
             tmdb_details = tmdb_details_by_id[tmdb_id]
@@ -168,7 +180,10 @@ def copy_media(
                     ))
 
             media_documents.append(media)
+        metrics.end(stage, rows=len(media_documents))
 
+        stage = metrics.begin("crate_write", batch_no)
+        bytes_before = connector.bytes_sent
         upsert_result = upsert_in_batches(
             connector=connector,
             table=media_table_name,
@@ -178,6 +193,7 @@ def copy_media(
         media_type_key = 'movies' if is_movie else 'shows'
         entity_counts[media_type_key]["records_received"] += upsert_result["records_received"]
         entity_counts[media_type_key]["rows_upserted"] += upsert_result["rows_upserted"]
+        rows_written = upsert_result["rows_upserted"]
         
         # Insert all row for batch and track counts
         for table_name, batch in entity_batches.items():
@@ -188,6 +204,8 @@ def copy_media(
             )
             entity_counts[table_name]["records_received"] += entity_upsert_result["records_received"]
             entity_counts[table_name]["rows_upserted"] += entity_upsert_result["rows_upserted"]
+            rows_written += entity_upsert_result["rows_upserted"]
+        metrics.end(stage, rows=rows_written, bytes_=connector.bytes_sent - bytes_before)
 
         start += BATCH_SIZE
 
@@ -198,7 +216,7 @@ def main(movie_ids: list[str] = [], show_ids: list[str] = [], skip_movies = Fals
     init_mongodb()
     connector = CrateConnector()
 
-    results = {}
+    results = {"metrics": {}}
 
     if skip_movies:
         results["movies"] = None
@@ -210,11 +228,14 @@ def main(movie_ids: list[str] = [], show_ids: list[str] = [], skip_movies = Fals
         else:
             movie_query_selector = build_query_selector_for_object_ids(ids=movie_ids)
         
+        movie_metrics = SyncMetrics("tvtropes_movie")
         results["movies"] = copy_media(
             connector=connector, 
             query_selector={ "tropes": { "$ne": None }} | movie_query_selector,
-            media_type="movie"
+            media_type="movie",
+            metrics=movie_metrics,
         )
+        results["metrics"]["movies"] = movie_metrics.finish()
     
     # Process shows
     if show_ids is None or len(show_ids) == 0:
@@ -223,11 +244,14 @@ def main(movie_ids: list[str] = [], show_ids: list[str] = [], skip_movies = Fals
     else:
         show_query_selector = build_query_selector_for_object_ids(ids=show_ids)
     
+    show_metrics = SyncMetrics("tvtropes_show")
     results["shows"] = copy_media(
         connector=connector, 
         query_selector={ "tropes": { "$ne": None }} | show_query_selector,
-        media_type="show"
+        media_type="show",
+        metrics=show_metrics,
     )
+    results["metrics"]["shows"] = show_metrics.finish()
 
     connector.disconnect()
     close_mongodb()
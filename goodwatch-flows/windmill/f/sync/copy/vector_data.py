@@ -5,6 +5,7 @@ from typing import Any, Dict, List, Optional, Tuple
 from mongoengine import get_db
 from qdrant_client import models as qm
 
+from f.db.media_cache import MediaCache
 from f.db.mongodb import (
     init_mongodb,
     close_mongodb,
@@ -13,12 +14,18 @@ from f.db.qdrant import QdrantConnector
 from f.sync.models.qdrant_schemas import MEDIA_COLLECTION
 from f.sync.models.qdrant_models import QdrantMediaPoint
 from f.tmdb_api.models import TmdbMovieDetails, TmdbTvDetails
+from f.utils.instrumentation import SyncMetrics, bson_bytes, json_bytes
 
 # Tunables
 BATCH_SIZE = 2000  # ids per loop
 UPSERT_BATCH_SIZE = 1000  # qdrant upsert chunk
 HOURS_TO_FETCH = 24 * 2  # time window for "recent" updates
 
+# full details documents, titles updated within HOURS_TO_FETCH are rebuilt on every run
+details_cache = MediaCache("details")
+# documents read by the fetchers below, for the sync metrics
+read_stats = {"bytes": 0}
+
 # ---- Helpers ---------------------------------------------------------------
 
 
@@ -125,9 +132,11 @@ def _fetch_map_by_ids(
     if not ids:
         return {}
     proj = projection or {}
-    return {
+    docs = {
         doc["tmdb_id"]: doc for doc in collection.find({"tmdb_id": {"$in": ids}}, proj)
     }
+    read_stats["bytes"] += bson_bytes(docs.values())
+    return docs
 
 
 def _fetch_multimap_by_ids(collection, ids: List[int]) -> Dict[int, List[dict]]:
@@ -136,6 +145,7 @@ def _fetch_multimap_by_ids(collection, ids: List[int]) -> Dict[int, List[dict]]:
         return {}
     for doc in collection.find({"tmdb_id": {"$in": ids}}):
         res[doc["tmdb_id"]].append(doc)
+    read_stats["bytes"] += bson_bytes(doc for docs in res.values() for doc in docs)
     return dict(res)
 
 
@@ -350,39 +360,120 @@ def _build_payload(
     return payload, vectors
 
 
+def _fetch_details(
+    cols: Dict[str, Any],
+    ids: List[int],
+    details_projection: dict | None = None,
+) -> Dict[int, dict]:
+    """Full details documents go through the Redis cache, projected reads straight to Mongo."""
+    if details_projection:
+        return _fetch_map_by_ids(cols["details"], ids, details_projection)
+    media_type = "movie" if cols["details"].name == TmdbMovieDetails._get_collection_name() else "tv"
+    return details_cache.get_many(
+        media_type, ids, lambda missing: _fetch_map_by_ids(cols["details"], missing)
+    )
+
+
+def _fetch_batch_sources(
+    cols: Dict[str, Any],
+    ids: List[int],
+    details_projection: dict | None = None,
+) -> Dict[str, Dict[int, Any]]:
+    """
+    One `$in` lookup per source collection for a batch of ids.
+    Providers are a multimap (one row per country), everything else one doc per id.
+    """
+    return {
+        "details": _fetch_details(cols, ids, details_projection),
+        "imdb": _fetch_map_by_ids(cols["imdb"], ids),
+        "meta": _fetch_map_by_ids(cols["meta"], ids),
+        "rotten": _fetch_map_by_ids(cols["rotten"], ids),
+        "dna": _fetch_map_by_ids(cols["dna"], ids),
+        # providers: need both “latest row” per id (to get updated_at) and all rows (for merging tuples)
+        "providers": _fetch_multimap_by_ids(cols["providers"], ids),
+        "tropes": _fetch_map_by_ids(cols["tropes"], ids),
+    }
+
+
+def _build_batch_payloads(
+    cols: Dict[str, Any],
+    media_type: str,
+    ids: List[int],
+) -> List[Tuple[int, Dict[str, Any], Dict[str, List[float]]]]:
+    """
+    Fetch all sources for a batch of ids and build (tmdb_id, payload, vectors).
+    Ids without details are skipped.
+    """
+    sources = _fetch_batch_sources(cols, ids)
+
+    built = []
+    for tmdb_id in ids:
+        d = sources["details"].get(tmdb_id)
+        if not d:
+            # we still might have scores or providers, but no details: skip creating new points
+            continue
+
+        payload, vectors = _build_payload(
+            media_type=media_type,
+            tmdb_id=tmdb_id,
+            details=d,
+            imdb=sources["imdb"].get(tmdb_id),
+            meta=sources["meta"].get(tmdb_id),
+            rotten=sources["rotten"].get(tmdb_id),
+            providers_from_tmdb=(d.get("watch_providers") or {}).get("results")
+            if d
+            else None,
+            providers_all_rows=sources["providers"].get(tmdb_id, []),
+            dna=sources["dna"].get(tmdb_id),
+            tropes=sources["tropes"].get(tmdb_id),
+        )
+        built.append((tmdb_id, payload, vectors))
+    return built
+
+
 # ---- Main copy loop --------------------------------------------------------
 
 
+def _source_collections(media_type: str) -> Dict[str, Any]:
+    is_movie = media_type == "movie"
+    db = get_db()
+    return {
+        "details": (
+            TmdbMovieDetails._get_collection()
+            if is_movie
+            else TmdbTvDetails._get_collection()
+        ),
+        "imdb": db.imdb_movie_rating if is_movie else db.imdb_tv_rating,
+        "meta": db.metacritic_movie_rating if is_movie else db.metacritic_tv_rating,
+        "rotten": (
+            db.rotten_tomatoes_movie_rating
+            if is_movie
+            else db.rotten_tomatoes_tv_rating
+        ),
+        "providers": db.tmdb_movie_providers if is_movie else db.tmdb_tv_providers,
+        "dna": db.dna_movie if is_movie else db.dna_tv,
+        "tropes": db.tv_tropes_movie_tags if is_movie else db.tv_tropes_tv_tags,
+    }
+
+
 def copy_to_qdrant(
     qc: QdrantConnector,
     media_type: str,  # "movie" | "show"
     query_selector: dict,
+    metrics: Optional[SyncMetrics] = None,
 ):
     """
     Combined copy into Qdrant.
     - only upserts points **with vectors** (to create/refresh fully).
     """
-    is_movie = media_type == "movie"
-    db = get_db()
-    # collections
-    if is_movie:
-        c_details = TmdbMovieDetails._get_collection()
-    else:
-        c_details = TmdbTvDetails._get_collection()
-    c_imdb = db.imdb_movie_rating if is_movie else db.imdb_tv_rating
-    c_meta = db.metacritic_movie_rating if is_movie else db.metacritic_tv_rating
-    c_rotten = (
-        db.rotten_tomatoes_movie_rating if is_movie else db.rotten_tomatoes_tv_rating
-    )
-    c_prov = db.tmdb_movie_providers if is_movie else db.tmdb_tv_providers
-    c_dna = db.dna_movie if is_movie else db.dna_tv
-    c_tropes = db.tv_tropes_movie_tags if is_movie else db.tv_tropes_tv_tags
+    metrics = metrics or SyncMetrics(f"vector_data_{media_type}")
+    cols = _source_collections(media_type)
 
     updated = {"$gte": datetime.utcnow() - timedelta(hours=HOURS_TO_FETCH)}
     sel = dict(query_selector or {})
 
     # Driver: details (typically largest / frequently updated)
-    driver_collection = c_details
+    driver_collection = cols["details"]
 
     total_upserts = 0
     total_payload_updates = 0
@@ -394,7 +485,10 @@ def copy_to_qdrant(
     base_selector = {"updated_at": updated, **sel}
     use_compound_hint = "updated_at" in base_selector
 
+    batch_no = 0
     while True:
+        stage = metrics.begin("mongo_read", batch_no)
+        bytes_before = read_stats["bytes"]
         ids, last_tmdb_id = _fetch_tmdb_ids_keyset(
             driver_collection,
             base_selector=base_selector,
@@ -404,45 +498,17 @@ def copy_to_qdrant(
             use_compound_hint=use_compound_hint,
         )
         if not ids:
+            metrics.end(stage, rows=0)
             break
 
         processed += len(ids)
         print(f"\n{media_type} ids fetched: {processed} (last_tmdb_id={last_tmdb_id})")
 
-        # fetch maps by id
-        details_map = _fetch_map_by_ids(c_details, ids)
-        imdb_map = _fetch_map_by_ids(c_imdb, ids)
-        meta_map = _fetch_map_by_ids(c_meta, ids)
-        rotten_map = _fetch_map_by_ids(c_rotten, ids)
-        dna_map = _fetch_map_by_ids(c_dna, ids)
-        # providers: need both “latest row” per id (to get updated_at) and all rows (for merging tuples)
-        providers_multimap = _fetch_multimap_by_ids(c_prov, ids)
-        tropes_map = _fetch_map_by_ids(c_tropes, ids)
-
         # build points
         upsert_buffer: List[Tuple[str, Dict[str, Any], Dict[str, List[float]]]] = []
 
-        for tmdb_id in ids:
-            d = details_map.get(tmdb_id)
-            if not d:
-                # we still might have scores or providers, but no details: skip creating new points
-                continue
-
-            payload, vectors = _build_payload(
-                media_type=media_type,
-                tmdb_id=tmdb_id,
-                details=d,
-                imdb=imdb_map.get(tmdb_id),
-                meta=meta_map.get(tmdb_id),
-                rotten=rotten_map.get(tmdb_id),
-                providers_from_tmdb=(d.get("watch_providers") or {}).get("results")
-                if d
-                else None,
-                providers_all_rows=providers_multimap.get(tmdb_id, []),
-                dna=dna_map.get(tmdb_id),
-                tropes=tropes_map.get(tmdb_id),
-            )
-
+        # payloads are built while the sources are read, so one stage covers both
+        for tmdb_id, payload, vectors in _build_batch_payloads(cols, media_type, ids):
             pid = QdrantMediaPoint.make_point_id(media_type, tmdb_id)
 
             have_vectors = bool(vectors["essence_text_v1"]) and bool(
@@ -451,7 +517,12 @@ def copy_to_qdrant(
             if have_vectors:
                 upsert_buffer.append((pid, payload, vectors))
             # else: skip this id quietly (no vectors yet)
+        metrics.end(stage, rows=len(ids), bytes_=read_stats["bytes"] - bytes_before)
 
+        stage = metrics.begin("qdrant_write", batch_no)
+        # JSON size of the points, what the REST API receives (gRPC sends less)
+        write_bytes = json_bytes(upsert_buffer)
+        write_rows = len(upsert_buffer)
         if upsert_buffer:
             print(f"{media_type} start upload for {len(upsert_buffer)} points")
             qc.upsert_points(
@@ -463,7 +534,10 @@ def copy_to_qdrant(
             )
             total_upserts += len(upsert_buffer)
             upsert_buffer.clear()
+        metrics.end(stage, rows=write_rows, bytes_=write_bytes)
+        batch_no += 1
 
+    print(details_cache.summary())
     return {"upserts": total_upserts, "payload_updates": total_payload_updates}
 
 
@@ -499,13 +573,17 @@ def main(
         # your build_query_selector_for_object_ids logic inlined:
         return {"tmdb_id": {"$in": [int(x) for x in ids]}}
 
-    res = {}
+    res = {"metrics": {}}
     if movie_ids is not None:
         print("Copying MOVIES to Qdrant…")
-        res["movies"] = copy_to_qdrant(qc, "movie", _id_selector(movie_ids))
+        movie_metrics = SyncMetrics("vector_data_movie")
+        res["movies"] = copy_to_qdrant(qc, "movie", _id_selector(movie_ids), movie_metrics)
+        res["metrics"]["movies"] = movie_metrics.finish()
     if show_ids is not None:
         print("Copying SHOWS to Qdrant…")
-        res["shows"] = copy_to_qdrant(qc, "show", _id_selector(show_ids))
+        show_metrics = SyncMetrics("vector_data_show")
+        res["shows"] = copy_to_qdrant(qc, "show", _id_selector(show_ids), show_metrics)
+        res["metrics"]["shows"] = show_metrics.finish()
 
     # re-enable index building
     qc.client.update_collection(
@@ -0,0 +1,413 @@
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from f.db.mongodb import init_mongodb, close_mongodb
+from f.sync.copy.vector_data import (
+    _build_payload,
+    _compute_release_year,
+    _fetch_batch_sources,
+    _fetch_tmdb_ids_keyset,
+    _source_collections,
+)
+
+SNAPSHOT_ROOT = "/tmp/goodwatch/catalogue"
+LATEST_FILE = "LATEST"
+BATCH_SIZE = 5000
+ROW_GROUP_SIZE = 50_000
+COMPRESSION = "zstd"
+KEEP_SNAPSHOTS = 3
+
+DETAILS_PROJECTION = {
+    "_id": 0,
+    "tmdb_id": 1,
+    "title": 1,
+    "original_title": 1,
+    "name": 1,
+    "original_name": 1,
+    "tagline": 1,
+    "overview": 1,
+    "popularity": 1,
+    "status": 1,
+    "adult": 1,
+    "poster_path": 1,
+    "backdrop_path": 1,
+    "release_date": 1,
+    "first_air_date": 1,
+    "runtime": 1,
+    "episode_run_time": 1,
+    "original_language": 1,
+    "origin_country": 1,
+    "genres": 1,
+    "keywords": 1,
+    "vote_average": 1,
+    "vote_count": 1,
+    "imdb_id": 1,
+    "external_ids.imdb_id": 1,
+    "credits": 1,
+    "aggregate_credits": 1,
+    "watch_providers": 1,
+    "updated_at": 1,
+}
+
+# Flat payload fields taken over from `_build_payload` (same names as the Qdrant/Crate columns)
+SCORE_FIELDS = [
+    "tmdb_user_score_normalized_percent",
+    "imdb_user_score_normalized_percent",
+    "metacritic_user_score_normalized_percent",
+    "metacritic_meta_score_normalized_percent",
+    "rotten_tomatoes_audience_score_normalized_percent",
+    "rotten_tomatoes_tomato_score_normalized_percent",
+    "goodwatch_user_score_normalized_percent",
+    "goodwatch_official_score_normalized_percent",
+    "goodwatch_overall_score_normalized_percent",
+]
+COUNT_FIELDS = [
+    "tmdb_user_score_rating_count",
+    "imdb_user_score_rating_count",
+    "metacritic_user_score_rating_count",
+    "metacritic_meta_score_review_count",
+    "rotten_tomatoes_audience_score_rating_count",
+    "rotten_tomatoes_tomato_score_review_count",
+    "goodwatch_user_score_rating_count",
+    "goodwatch_official_score_review_count",
+    "goodwatch_overall_score_voting_count",
+]
+
+CAST_TYPE = pa.struct(
+    [
+        ("person_tmdb_id", pa.int64()),
+        ("name", pa.string()),
+        ("character", pa.string()),
+        ("order", pa.int32()),
+    ]
+)
+CREW_TYPE = pa.struct(
+    [
+        ("person_tmdb_id", pa.int64()),
+        ("name", pa.string()),
+        ("job", pa.string()),
+        ("department", pa.string()),
+    ]
+)
+PROVIDER_TYPE = pa.struct(
+    [
+        ("country_code", pa.string()),
+        ("streaming_type", pa.string()),
+        ("provider_id", pa.int64()),
+        ("provider_name", pa.string()),
+        ("stream_url", pa.string()),
+        ("price_dollar", pa.float64()),
+        ("quality", pa.string()),
+    ]
+)
+
+CATALOGUE_SCHEMA = pa.schema(
+    [
+        ("tmdb_id", pa.int64()),
+        ("media_type", pa.string()),
+        ("title", pa.string()),
+        ("original_title", pa.string()),
+        ("tagline", pa.string()),
+        ("overview", pa.string()),
+        ("popularity", pa.float64()),
+        ("status", pa.string()),
+        ("adult", pa.bool_()),
+        ("poster_path", pa.string()),
+        ("backdrop_path", pa.string()),
+        ("release_year", pa.int32()),
+        ("runtime", pa.int32()),
+        ("original_language_code", pa.string()),
+        ("origin_country_codes", pa.list_(pa.string())),
+        ("imdb_id", pa.string()),
+        ("genres", pa.list_(pa.string())),
+        ("keywords", pa.list_(pa.string())),
+        *[(f, pa.float64()) for f in SCORE_FIELDS],
+        *[(f, pa.int64()) for f in COUNT_FIELDS],
+        ("cast", pa.list_(CAST_TYPE)),
+        ("crew", pa.list_(CREW_TYPE)),
+        ("providers", pa.list_(PROVIDER_TYPE)),
+        ("streaming_availability", pa.list_(pa.string())),
+        ("tropes", pa.list_(pa.string())),
+        ("is_anime", pa.bool_()),
+        ("production_method", pa.string()),
+        ("dna_json", pa.string()),
+        ("vector_essence_text", pa.list_(pa.float32())),
+        ("vector_fingerprint", pa.list_(pa.float32())),
+        ("details_updated_at", pa.timestamp("ms")),
+    ]
+)
+
+
+# ---- Row builders ----------------------------------------------------------
+
+
+def _cast_rows(details: dict) -> List[Dict[str, Any]]:
+    members = (details.get("credits") or {}).get("cast") or (details.get("aggregate_credits") or {}).get("cast") or []
+    rows = []
+    for m in members:
+        if not m.get("id"):
+            continue
+        characters = [r.get("character") for r in m.get("roles") or [] if r.get("character")]
+        rows.append(
+            {
+                "person_tmdb_id": m["id"],
+                "name": m.get("name"),
+                "character": m.get("character") or ", ".join(characters) or None,
+                "order": m.get("order"),
+            }
+        )
+    return rows
+
+
+def _crew_rows(details: dict) -> List[Dict[str, Any]]:
+    members = (details.get("credits") or {}).get("crew") or (details.get("aggregate_credits") or {}).get("crew") or []
+    rows = []
+    for m in members:
+        if not m.get("id"):
+            continue
+        jobs = m.get("jobs") or [{"job": m.get("job")}]
+        for job in jobs:
+            rows.append(
+                {
+                    "person_tmdb_id": m["id"],
+                    "name": m.get("name"),
+                    "job": job.get("job"),
+                    "department": m.get("department") or job.get("department"),
+                }
+            )
+    return rows
+
+
+def _provider_rows(details: dict, provider_docs: List[dict]) -> List[Dict[str, Any]]:
+    rows = []
+    results = (details.get("watch_providers") or {}).get("results") or {}
+    for country_code, data in results.items():
+        if not isinstance(data, dict) or not data.get("link"):
+            continue
+        for streaming_type, entries in data.items():
+            if streaming_type == "link":
+                continue
+            for e in entries or []:
+                rows.append(
+                    {
+                        "country_code": country_code,
+                        "streaming_type": streaming_type,
+                        "provider_id": e.get("provider_id"),
+                        "provider_name": e.get("provider_name"),
+                        "stream_url": None,
+                        "price_dollar": None,
+                        "quality": None,
+                    }
+                )
+    for doc in provider_docs:
+        for link in doc.get("streaming_links") or []:
+            rows.append(
+                {
+                    "country_code": doc.get("country_code"),
+                    "streaming_type": link.get("stream_type"),
+                    "provider_id": link.get("provider_id"),
+                    "provider_name": link.get("provider_name"),
+                    "stream_url": link.get("stream_url"),
+                    "price_dollar": link.get("price_dollar"),
+                    "quality": link.get("quality"),
+                }
+            )
+    return rows
+
+
+def _float_list(values: Optional[List[float]]) -> Optional[List[float]]:
+    return [float(v) for v in values] if values else None
+
+
+def build_catalogue_row(media_type: str, tmdb_id: int, sources: Dict[str, Dict[int, Any]]) -> Optional[Dict[str, Any]]:
+    details = sources["details"].get(tmdb_id)
+    if not details:
+        return None
+    dna = sources["dna"].get(tmdb_id)
+    providers = sources["providers"].get(tmdb_id, [])
+    payload, _ = _build_payload(
+        media_type=media_type,
+        tmdb_id=tmdb_id,
+        details=details,
+        imdb=sources["imdb"].get(tmdb_id),
+        meta=sources["meta"].get(tmdb_id),
+        rotten=sources["rotten"].get(tmdb_id),
+        providers_from_tmdb=None,
+        providers_all_rows=providers,
+        dna=dna,
+        tropes=sources["tropes"].get(tmdb_id),
+    )
+    is_movie = media_type == "movie"
+    runtime = details.get("runtime") if is_movie else (details.get("episode_run_time") or [None])[0]
+    return {
+        "tmdb_id": tmdb_id,
+        "media_type": media_type,
+        "title": details.get("title") or details.get("name"),
+        "original_title": details.get("original_title") or details.get("original_name"),
+        "tagline": details.get("tagline"),
+        "overview": details.get("overview"),
+        "popularity": details.get("popularity"),
+        "status": details.get("status"),
+        "adult": details.get("adult"),
+        "poster_path": details.get("poster_path"),
+        "backdrop_path": details.get("backdrop_path"),
+        "release_year": _compute_release_year(details, media_type),
+        "runtime": runtime,
+        "original_language_code": details.get("original_language"),
+        "origin_country_codes": details.get("origin_country"),
+        "imdb_id": details.get("imdb_id") if is_movie else (details.get("external_ids") or {}).get("imdb_id"),
+        "genres": payload.get("genres"),
+        "keywords": [k.get("name") for k in details.get("keywords") or [] if k.get("name")],
+        **{f: payload.get(f) for f in SCORE_FIELDS + COUNT_FIELDS},
+        "cast": _cast_rows(details),
+        "crew": _crew_rows(details),
+        "providers": _provider_rows(details, providers),
+        "streaming_availability": payload.get("streaming_availability"),
+        "tropes": payload.get("tropes"),
+        "is_anime": payload.get("is_anime"),
+        "production_method": payload.get("production_method"),
+        "dna_json": json.dumps(dna.get("dna"), default=str) if dna and dna.get("dna") else None,
+        "vector_essence_text": _float_list(dna.get("vector_essence_text")) if dna else None,
+        "vector_fingerprint": _float_list(dna.get("vector_fingerprint")) if dna else None,
+        "details_updated_at": details.get("updated_at"),
+    }
+
+
+def _iter_batches(media_type: str, query_selector: dict) -> Iterator[List[Dict[str, Any]]]:
+    cols = _source_collections(media_type)
+    last_tmdb_id: Optional[int] = None
+    while True:
+        ids, last_tmdb_id = _fetch_tmdb_ids_keyset(
+            cols["details"],
+            base_selector=query_selector,
+            last_tmdb_id=last_tmdb_id,
+            limit=BATCH_SIZE,
+        )
+        if not ids:
+            break
+        sources = _fetch_batch_sources(cols, ids, DETAILS_PROJECTION)
+        rows = [build_catalogue_row(media_type, tmdb_id, sources) for tmdb_id in ids]
+        yield [r for r in rows if r]
+
+
+# ---- Export ----------------------------------------------------------------
+
+
+def export_catalogue(
+    root: str = SNAPSHOT_ROOT,
+    media_types: List[str] = ["movie", "show"],
+    query_selector: Optional[dict] = None,
+) -> Dict[str, Any]:
+    """
+    Materialize the joined per-title records into `<root>/<run_id>/media_type=<type>/part-*.parquet`.
+    `LATEST` is only switched once every partition has been written.
+    """
+    run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    run_dir = os.path.join(root, run_id)
+    counts: Dict[str, int] = {}
+
+    for media_type in media_types:
+        part_dir = os.path.join(run_dir, f"media_type={media_type}")
+        os.makedirs(part_dir, exist_ok=True)
+        writer: Optional[pq.ParquetWriter] = None
+        part = 0
+        rows_in_part = 0
+        counts[media_type] = 0
+        for rows in _iter_batches(media_type, query_selector or {}):
+            if writer is None or rows_in_part >= ROW_GROUP_SIZE * 4:
+                if writer:
+                    writer.close()
+                writer = pq.ParquetWriter(
+                    os.path.join(part_dir, f"part-{part:05d}.parquet"),
+                    CATALOGUE_SCHEMA,
+                    compression=COMPRESSION,
+                )
+                part += 1
+                rows_in_part = 0
+            table = pa.Table.from_pylist(rows, schema=CATALOGUE_SCHEMA)
+            writer.write_table(table, row_group_size=ROW_GROUP_SIZE)
+            rows_in_part += len(rows)
+            counts[media_type] += len(rows)
+            print(f"{media_type}: {counts[media_type]} rows exported")
+        if writer:
+            writer.close()
+
+    with open(os.path.join(run_dir, "_manifest.json"), "w") as f:
+        json.dump({"run_id": run_id, "rows": counts, "schema": CATALOGUE_SCHEMA.names}, f)
+    tmp_latest = os.path.join(root, f"{LATEST_FILE}.tmp")
+    with open(tmp_latest, "w") as f:
+        f.write(run_id)
+    os.replace(tmp_latest, os.path.join(root, LATEST_FILE))
+
+    _cleanup_old_snapshots(root, keep=KEEP_SNAPSHOTS)
+    return {"run_id": run_id, "path": run_dir, "rows": counts}
+
+
+def _cleanup_old_snapshots(root: str, keep: int) -> None:
+    runs = sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+    for run in runs[:-keep]:
+        print(f"Removing old catalogue snapshot {run}")
+        shutil.rmtree(os.path.join(root, run), ignore_errors=True)
+
+
+# ---- Reading ---------------------------------------------------------------
+
+
+def latest_snapshot_dir(root: str = SNAPSHOT_ROOT) -> str:
+    with open(os.path.join(root, LATEST_FILE)) as f:
+        return os.path.join(root, f.read().strip())
+
+
+def open_catalogue(root: str = SNAPSHOT_ROOT) -> ds.Dataset:
+    """
+    Hive-partitioned dataset of the latest snapshot, `media_type` is a partition column.
+    """
+    return ds.dataset(latest_snapshot_dir(root), format="parquet", partitioning="hive")
+
+
+def read_catalogue(
+    columns: Optional[List[str]] = None,
+    media_type: Optional[str] = None,
+    filter_: Optional[ds.Expression] = None,
+    root: str = SNAPSHOT_ROOT,
+) -> pa.Table:
+    """
+    Read only the requested columns (and partitions) of the latest snapshot.
+
+    Example:
+        read_catalogue(["tmdb_id", "vector_fingerprint"], media_type="show",
+                       filter_=ds.field("goodwatch_overall_score_voting_count") > 10000)
+    """
+    expr = filter_
+    if media_type:
+        partition_expr = ds.field("media_type") == media_type
+        expr = partition_expr if expr is None else (expr & partition_expr)
+    return open_catalogue(root).to_table(columns=columns, filter=expr)
+
+
+def iter_catalogue_batches(
+    columns: Optional[List[str]] = None,
+    media_type: Optional[str] = None,
+    batch_size: int = 10_000,
+    root: str = SNAPSHOT_ROOT,
+) -> Iterator[pa.RecordBatch]:
+    expr = ds.field("media_type") == media_type if media_type else None
+    yield from open_catalogue(root).to_batches(columns=columns, filter=expr, batch_size=batch_size)
+
+
+def main(
+    media_types: List[str] = ["movie", "show"],
+    root: str = SNAPSHOT_ROOT,
+):
+    init_mongodb()
+    try:
+        return export_catalogue(root=root, media_types=media_types)
+    finally:
+        close_mongodb()
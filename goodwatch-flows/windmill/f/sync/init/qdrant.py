@@ -2,6 +2,7 @@ from f.db.qdrant import QdrantConnector
 from f.sync.models.qdrant_schemas import (
     desired_media_collection,
     desired_payload_indexes,
+    vector_config,
     MEDIA_COLLECTION,
 )
 
@@ -11,23 +12,21 @@ def init_qdrant():
     qc = QdrantConnector()
     try:
         spec = desired_media_collection()
+        vectors = vector_config(spec)
+        existed = qc.collection_exists(spec.name)
         # Create collection if missing
         qc.ensure_collection(
             name=spec.name,
-            vectors={
-                vname: {
-                    "size": vs.size,
-                    "distance": vs.distance,
-                    "on_disk": vs.on_disk,
-                }
-                for vname, vs in spec.vectors.items()
-            },
+            vectors=vectors,
             shards=spec.shards,
             replication_factor=spec.replication_factor,
             write_consistency_factor=spec.write_consistency_factor,
             optimizers_config=spec.optimizers_config,
             hnsw_config=spec.hnsw_config,
         )
+        # Existing collections only pick up on_disk / quantization changes
+        if existed:
+            qc.update_vectors(spec.name, vectors)
 
         # Create payload indexes (idempotent)
         for idx in desired_payload_indexes():
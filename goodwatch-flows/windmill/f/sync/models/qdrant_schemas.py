@@ -5,6 +5,31 @@ from typing import Dict, List, Literal, Optional
 MEDIA_COLLECTION = "media"
 
 VectorDistance = Literal["Cosine", "Dot", "Euclid"]
+QuantizationKind = Literal["scalar", "binary"]
+
+
+@dataclass(frozen=True)
+class QuantizationSpec:
+    """
+    Compressed copy of a named vector that Qdrant keeps in RAM for HNSW traversal.
+
+    - scalar: int8 per dimension (~4x smaller than float32)
+    - binary: 1 bit per dimension (~32x smaller), only sensible for high-dim embeddings
+    """
+    kind: QuantizationKind = "scalar"
+    always_ram: bool = True  # keep the quantized vectors in RAM, originals may live on disk
+    quantile: Optional[float] = 0.99  # scalar only: clip outliers before int8 bucketing
+
+
+@dataclass(frozen=True)
+class SearchSpec:
+    """
+    Default search params for a quantized named vector.
+    Search oversamples candidates on the quantized vectors and rescores them with the originals.
+    """
+    oversampling: float = 2.0
+    rescore: bool = True
+    hnsw_ef: Optional[int] = None
 
 
 @dataclass(frozen=True)
@@ -12,8 +37,8 @@ class NamedVectorSpec:
     size: int
     distance: VectorDistance = "Cosine"
     on_disk: bool = False  # set True for large vectors if RAM tight
-    # You can extend with quantization if desired (e.g., Product, Scalar)
-    # quantization: Optional[dict] = None
+    quantization: Optional[QuantizationSpec] = None
+    search: Optional[SearchSpec] = None
 
 
 @dataclass(frozen=True)
@@ -39,11 +64,21 @@ def desired_media_collection() -> CollectionSpec:
     return CollectionSpec(
         name=MEDIA_COLLECTION,
         vectors={
+            # originals on disk, int8 copy in RAM, rescored from disk on search
             "essence_text_v1": NamedVectorSpec(
-                size=768, distance="Cosine", on_disk=False
+                size=768,
+                distance="Cosine",
+                on_disk=True,
+                quantization=QuantizationSpec(kind="scalar", always_ram=True),
+                search=SearchSpec(oversampling=2.0, rescore=True),
             ),
+            # 74 dims are too few for binary quantization to keep any useful recall
             "fingerprint_v1": NamedVectorSpec(
-                size=74, distance="Cosine", on_disk=False
+                size=74,
+                distance="Cosine",
+                on_disk=True,
+                quantization=QuantizationSpec(kind="scalar", always_ram=True),
+                search=SearchSpec(oversampling=3.0, rescore=True),
             ),
         },
         shards=6,
@@ -62,6 +97,45 @@ def desired_media_collection() -> CollectionSpec:
     )
 
 
+def desired_collections() -> Dict[str, CollectionSpec]:
+    spec = desired_media_collection()
+    return {spec.name: spec}
+
+
+def search_spec(collection: str, vector_name: str) -> SearchSpec:
+    """
+    Search params configured for a named vector, the `SearchSpec` defaults if it has none.
+    """
+    spec = desired_collections().get(collection)
+    vector_spec = spec.vectors.get(vector_name) if spec else None
+    if vector_spec is None or vector_spec.search is None:
+        return SearchSpec()
+    return vector_spec.search
+
+
+def vector_config(spec: CollectionSpec) -> Dict[str, dict]:
+    """
+    Plain dict form of the named vectors as expected by `QdrantConnector.ensure_collection`.
+    """
+    return {
+        vname: {
+            "size": vs.size,
+            "distance": vs.distance,
+            "on_disk": vs.on_disk,
+            "quantization": (
+                {
+                    "kind": vs.quantization.kind,
+                    "always_ram": vs.quantization.always_ram,
+                    "quantile": vs.quantization.quantile,
+                }
+                if vs.quantization
+                else None
+            ),
+        }
+        for vname, vs in spec.vectors.items()
+    }
+
+
 def desired_payload_indexes() -> List[PayloadIndexSpec]:
     """
     ONLY index fields you actually filter/sort on.
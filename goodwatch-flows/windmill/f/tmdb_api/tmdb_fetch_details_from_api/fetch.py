@@ -7,6 +7,8 @@ import requests
 import wmill
 
 from f.data_source.common import get_documents_for_ids
+from f.data_source.stats import count_changes, document_state
+from f.db.media_cache import MediaCache
 from f.db.mongodb import init_mongodb, close_mongodb
 from f.tmdb_api.models import TmdbMovieDetails, TmdbTvDetails
 
@@ -15,6 +17,8 @@ BATCH_SIZE = 30
 BUFFER_SELECTED_AT_MINUTES = 10
 TMDB_API_KEY = wmill.get_variable("u/Alp/TMDB_API_KEY")
 
+details_cache = MediaCache("details")
+
 
 async def fetch_api_data(
     next_entry: Union[TmdbMovieDetails, TmdbTvDetails],
@@ -55,6 +59,7 @@ async def convert_and_save_details(
     else:
         raise Exception(f"next_entry has an unexpected type: {type(next_entry)}")
 
+    state = document_state(next_entry)
     fields = (
         TmdbMovieDetails._fields
         if isinstance(next_entry, TmdbMovieDetails)
@@ -81,6 +86,12 @@ async def convert_and_save_details(
     next_entry.is_selected = False
     try:
         next_entry.save()
+        count_changes(next_entry, state)
+        details_cache.stamp_version(
+            "movie" if isinstance(next_entry, TmdbMovieDetails) else "tv",
+            next_entry.tmdb_id,
+            next_entry.updated_at,
+        )
         print(
             f"details saved for {next_entry.title} (id: {next_entry.tmdb_id}) (popularity: {next_entry.popularity})"
         )
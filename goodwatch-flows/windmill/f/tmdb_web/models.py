@@ -78,6 +78,8 @@ class BaseTmdbProviders(Document):
             "country_code",
             "selected_at",
             "updated_at",
+            # keyset of the streaming sync (f/sync/copy/tmdb_streaming.py), all three keys so it sorts on the index
+            ("updated_at", "tmdb_id", "id"),
             "is_selected",
             "count_expected",
             "count_available",
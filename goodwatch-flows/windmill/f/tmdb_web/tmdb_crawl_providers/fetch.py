@@ -8,6 +8,7 @@ from bs4 import BeautifulSoup
 import requests
 
 from f.data_source.common import get_document_for_id
+from f.data_source.stats import count_changes, document_state
 from f.db.mongodb import init_mongodb, close_mongodb
 from f.tmdb_web.models import (
     TmdbStreamingCrawlResult,
@@ -143,6 +144,7 @@ def store_result(
     next_entry: Union[TmdbMovieProviders, TmdbTvProviders],
     result: TmdbStreamingCrawlResult,
 ):
+    state = document_state(next_entry)
     if type(result.country_code) in [str]:
         next_entry.country_code = result.country_code
 
@@ -175,6 +177,7 @@ def store_result(
 
     next_entry.is_selected = False
     next_entry.save()
+    count_changes(next_entry, state)
 
 
 async def tmdb_crawl_streaming_providers(
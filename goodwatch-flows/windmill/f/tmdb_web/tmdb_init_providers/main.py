@@ -5,6 +5,7 @@ from pymongo import UpdateOne
 from pymongo.collection import Collection
 
 from f.db.mongodb import init_mongodb, close_mongodb
+from f.tmdb_web.models import TmdbMovieProviders, TmdbTvProviders
 
 BATCH_SIZE = 100000
 
@@ -53,6 +54,8 @@ watch_providers_pipeline = [
 def initialize_documents():
     print("Initializing documents for TMDB streaming data")
     mongo_db = get_db()
+    TmdbMovieProviders.ensure_indexes()
+    TmdbTvProviders.ensure_indexes()
 
     # ---- MOVIES ----
     movie_cursor = mongo_db.tmdb_movie_details.aggregate(
@@ -8,6 +8,8 @@ from playwright.async_api import async_playwright, BrowserContext
 from typing import Union
 
 from f.data_source.common import get_document_for_id
+from f.data_source.crawl_control import RateLimitReached, track_crawl
+from f.data_source.stats import count_changes, document_state
 from f.db.mongodb import init_mongodb, close_mongodb
 from f.tvtropes_web.models import (
     TvTropesCrawlResult,
@@ -20,6 +22,7 @@ from f.utils.string import remove_prefix
 
 
 BROWSER_TIMEOUT = 180000
+CRAWL_SOURCE = "tv_tropes"
 
 
 async def crawl_data(
@@ -81,7 +84,7 @@ async def crawl_rotten_tomatoes_page(
         print(f"trying url: {url}")
         page = await browser.new_page()
         response = await page.goto(url)
-        if response.status == 403:
+        if response.status in (403, 429):
             return TvTropesCrawlResult(
                 url=None,
                 tropes=[],
@@ -232,6 +235,7 @@ def store_result(
     next_entry: Union[TvTropesMovieTags, TvTropesTvTags],
     result: TvTropesCrawlResult,
 ):
+    state = document_state(next_entry)
     if type(result.url) in [str]:
         next_entry.tvtropes_url = result.url
 
@@ -259,6 +263,7 @@ def store_result(
 
     next_entry.is_selected = False
     next_entry.save()
+    count_changes(next_entry, state)
 
 
 async def tvtropes_crawl_tags(next_entry: Union[TvTropesMovieTags, TvTropesTvTags]):
@@ -283,7 +288,7 @@ async def tvtropes_crawl_tags(next_entry: Union[TvTropesMovieTags, TvTropesTvTag
             await browser.close()
 
     if crawl_result.rate_limit_reached:
-        raise Exception(
+        raise RateLimitReached(
             f"Rate limit reached for {next_entry.original_title}, retrying."
         )
 
@@ -304,6 +309,7 @@ def main(next_id: dict):
         movie_model=TvTropesMovieTags,
         tv_model=TvTropesTvTags,
     )
-    result = asyncio.run(tvtropes_crawl_tags(next_entry))
+    with track_crawl(CRAWL_SOURCE):
+        result = asyncio.run(tvtropes_crawl_tags(next_entry))
     close_mongodb()
     return result
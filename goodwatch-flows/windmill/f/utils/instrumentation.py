@@ -0,0 +1,306 @@
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+
+# node_exporter textfile collector (goodwatch-metrics), mounted into the windmill workers
+METRICS_DIR = os.getenv("SYNC_METRICS_DIR", "/var/lib/node_exporter/textfile")
+PROFILE_DIR = os.getenv("SYNC_PROFILE_DIR", "/tmp/goodwatch/profiles")
+MAX_BATCH_RECORDS = 50
+PROFILE_INTERVAL_S = 0.005
+# payload sizes re-encode what was read/written, which costs time inside the measured stages,
+# so they are opt-in: SYNC_MEASURE_BYTES=true for a run that should report bytes
+MEASURE_BYTES = os.getenv("SYNC_MEASURE_BYTES", "false").lower() == "true"
+JSON_CHUNK_ROWS = 1000
+
+
+# ===== Memory =====
+
+def _read_status_kib(field: str) -> Optional[int]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    """Reset VmHWM so the next read is the peak of the current stage (linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes() -> int:
+    hwm = _read_status_kib("VmHWM")
+    if hwm is not None:
+        return hwm * 1024
+    # ru_maxrss is KiB on linux, bytes on macos
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+# ===== Payload sizes =====
+
+def bson_bytes(documents: Iterable[dict]) -> int:
+    """Encoded size of documents read from Mongo, which is what the server sent for them."""
+    if not MEASURE_BYTES:
+        return 0
+    import bson
+
+    return sum(len(bson.encode(document)) for document in documents)
+
+
+def _plain(record: Any) -> Any:
+    return record.model_dump() if hasattr(record, "model_dump") else record
+
+
+def json_bytes(records: Iterable[Any]) -> int:
+    """
+    Size of records (dicts, tuples or pydantic models) as JSON, the encoding the CrateDB and
+    ArangoDB HTTP APIs receive them in. Encoded in chunks, so large batches stay bounded in memory.
+    """
+    if not MEASURE_BYTES:
+        return 0
+    total = 0
+    chunk: List[Any] = []
+    for record in records:
+        chunk.append(_plain(record))
+        if len(chunk) >= JSON_CHUNK_ROWS:
+            total += len(json.dumps(chunk, default=str, separators=(",", ":")).encode())
+            chunk = []
+    if chunk:
+        total += len(json.dumps(chunk, default=str, separators=(",", ":")).encode())
+    return total
+
+
+# ===== Sampling profiler =====
+
+class StackSampler:
+    """
+    Minimal in-process sampling profiler. A daemon thread samples the stack of the
+    profiled thread every few milliseconds and counts folded stacks, which can be
+    rendered with flamegraph.pl, speedscope or inferno.
+    """
+
+    def __init__(self, interval_s: float = PROFILE_INTERVAL_S):
+        self.interval_s = interval_s
+        self.counts: Counter = Counter()
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_folded(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+# ===== Stage metrics =====
+
+class StageRecord:
+    """
+    Handle yielded by `SyncMetrics.stage`, set `rows` / `bytes` inside the block. Bytes are
+    what the stage read or wrote: `bson_bytes` for Mongo reads, `json_bytes` for Crate/Arango
+    writes and Postgres value lists, the COPY payload for Postgres. They stay 0 unless
+    SYNC_MEASURE_BYTES is set.
+    """
+
+    def __init__(self, name: str, batch: Optional[int]):
+        self.name = name
+        self.batch = batch
+        self.rows = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.peak_rss = 0
+
+
+class SyncMetrics:
+    """
+    Per-stage timing for sync scripts.
+
+    usage:
+        metrics = SyncMetrics("tmdb_details_movie", profile_batch=3)
+        for batch_no, ... in enumerate(batches):
+            with metrics.stage("mongo_read", batch_no) as stage:
+                docs = list(cursor)
+                stage.rows = len(docs)
+                stage.bytes = bson_bytes(docs)
+            # or, around long blocks
+            stage = metrics.begin("transform", batch_no)
+            ...
+            metrics.end(stage, rows=len(rows))
+        result["metrics"] = metrics.finish()
+
+    `finish` returns a json summary for the Windmill result and writes a Prometheus text file.
+    With `profile_batch` set, all stages of that batch are sampled and written as a folded-stack file.
+    """
+
+    def __init__(self, script: str, profile_batch: Optional[int] = None, metrics_dir: str = METRICS_DIR):
+        self.script = script
+        self.profile_batch = profile_batch
+        self.metrics_dir = metrics_dir
+        self.started = time.perf_counter()
+        self.totals: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "rows": 0, "bytes": 0, "peak_rss": 0}
+        )
+        self.batches: Dict[int, Dict[str, float]] = {}
+        self.profile_path: Optional[str] = None
+        self._sampler: Optional[StackSampler] = None
+
+    def begin(self, name: str, batch: Optional[int] = None) -> StageRecord:
+        """Start a stage without a `with` block, close it with `end`."""
+        record = StageRecord(name, batch)
+        self._maybe_start_profile(batch)
+        record._reset = _reset_peak_rss()
+        record._started = time.perf_counter()
+        return record
+
+    def end(self, record: StageRecord, rows: Optional[int] = None, bytes_: Optional[int] = None) -> StageRecord:
+        record.seconds = time.perf_counter() - record._started
+        record.peak_rss = peak_rss_bytes() if record._reset else 0
+        if rows is not None:
+            record.rows = rows
+        if bytes_ is not None:
+            record.bytes = bytes_
+        self._add(record)
+        return record
+
+    @contextmanager
+    def stage(self, name: str, batch: Optional[int] = None):
+        record = self.begin(name, batch)
+        try:
+            yield record
+        finally:
+            self.end(record)
+
+    def _maybe_start_profile(self, batch: Optional[int]):
+        if self.profile_batch is None or batch is None:
+            return
+        if batch == self.profile_batch and self._sampler is None and self.profile_path is None:
+            self._sampler = StackSampler()
+            self._sampler.start()
+        elif batch != self.profile_batch and self._sampler is not None:
+            self._stop_profile()
+
+    def _stop_profile(self):
+        self._sampler.stop()
+        self.profile_path = os.path.join(
+            PROFILE_DIR, f"{self.script}_batch{self.profile_batch}_{int(time.time())}.folded"
+        )
+        self._sampler.write_folded(self.profile_path)
+        print(f"Wrote profile of batch {self.profile_batch} to {self.profile_path}")
+        self._sampler = None
+
+    def _add(self, record: StageRecord):
+        total = self.totals[record.name]
+        total["calls"] += 1
+        total["seconds"] += record.seconds
+        total["max_seconds"] = max(total["max_seconds"], record.seconds)
+        total["rows"] += record.rows
+        total["bytes"] += record.bytes
+        total["peak_rss"] = max(total["peak_rss"], record.peak_rss)
+        if record.batch is not None and (record.batch in self.batches or len(self.batches) < MAX_BATCH_RECORDS):
+            batch = self.batches.setdefault(record.batch, {})
+            batch[record.name] = round(batch.get(record.name, 0.0) + record.seconds, 4)
+
+    def summary(self) -> dict:
+        wall = time.perf_counter() - self.started
+        staged = sum(t["seconds"] for t in self.totals.values()) or 1e-9
+        stages = {}
+        for name, t in sorted(self.totals.items(), key=lambda item: -item[1]["seconds"]):
+            stages[name] = {
+                "calls": int(t["calls"]),
+                "seconds": round(t["seconds"], 3),
+                "max_seconds": round(t["max_seconds"], 3),
+                "share": round(t["seconds"] / staged, 3),
+                "rows": int(t["rows"]),
+                "rows_per_s": round(t["rows"] / t["seconds"], 1) if t["seconds"] else None,
+                "bytes": int(t["bytes"]),
+                "peak_rss_mb": round(t["peak_rss"] / 1024**2, 1) if t["peak_rss"] else None,
+            }
+        return {
+            "script": self.script,
+            "wall_seconds": round(wall, 3),
+            "peak_rss_mb": round(peak_rss_bytes() / 1024**2, 1),
+            "stages": stages,
+            "batches": self.batches,
+            "profile": self.profile_path,
+        }
+
+    def write_prometheus(self, summary: dict) -> Optional[str]:
+        labels = f'script="{self.script}"'
+        lines = [
+            "# TYPE goodwatch_sync_wall_seconds gauge",
+            f"goodwatch_sync_wall_seconds{{{labels}}} {summary['wall_seconds']}",
+            "# TYPE goodwatch_sync_last_run_timestamp_seconds gauge",
+            f"goodwatch_sync_last_run_timestamp_seconds{{{labels}}} {int(time.time())}",
+        ]
+        metric_fields = [
+            ("goodwatch_sync_stage_seconds", "seconds"),
+            ("goodwatch_sync_stage_max_seconds", "max_seconds"),
+            ("goodwatch_sync_stage_calls", "calls"),
+            ("goodwatch_sync_stage_rows", "rows"),
+            ("goodwatch_sync_stage_bytes", "bytes"),
+        ]
+        for metric, field in metric_fields:
+            lines.append(f"# TYPE {metric} gauge")
+            for name, stage in summary["stages"].items():
+                lines.append(f'{metric}{{{labels},stage="{name}"}} {stage[field]}')
+        lines.append("# TYPE goodwatch_sync_stage_peak_rss_bytes gauge")
+        for name, t in self.totals.items():
+            lines.append(f'goodwatch_sync_stage_peak_rss_bytes{{{labels},stage="{name}"}} {int(t["peak_rss"])}')
+
+        path = os.path.join(self.metrics_dir, f"goodwatch_sync_{self.script}.prom")
+        try:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            with open(path + ".tmp", "w") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(path + ".tmp", path)
+            return path
+        except OSError as e:
+            print(f"Could not write sync metrics to {path}: {e}")
+            return None
+
+    def finish(self) -> dict:
+        if self._sampler is not None:
+            self._stop_profile()
+        summary = self.summary()
+        summary["prometheus_file"] = self.write_prometheus(summary)
+        for name, stage in summary["stages"].items():
+            print(f"  {name:<20} {stage['seconds']:>9.2f}s {stage['share']:>6.1%}  rows={stage['rows']}")
+        return summary
+
+
+def main():
+    pass
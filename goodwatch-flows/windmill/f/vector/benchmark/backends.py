@@ -0,0 +1,278 @@
+import re
+import subprocess
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from f.vector.benchmark.dataset import BenchmarkDataset, BenchmarkQuery
+
+BENCH_COLLECTION = "bench_vectors"
+INSERT_BATCH_SIZE = 2000
+
+_MEM_UNITS = {"b": 1, "kib": 1024, "mib": 1024**2, "gib": 1024**3, "kb": 1000, "mb": 1000**2, "gb": 1000**3}
+
+
+def container_memory_bytes(container: Optional[str]) -> Optional[int]:
+    """
+    Current memory usage of a local docker container, e.g. "qdrant-bench".
+    """
+    if not container:
+        return None
+    try:
+        out = subprocess.run(
+            ["docker", "stats", "--no-stream", "--format", "{{.MemUsage}}", container],
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=30,
+        ).stdout
+    except Exception as e:
+        print(f"Could not read memory of container '{container}': {e}")
+        return None
+    match = re.match(r"\s*([\d.]+)\s*([A-Za-z]+)", out)
+    if not match:
+        return None
+    return int(float(match.group(1)) * _MEM_UNITS.get(match.group(2).lower(), 1))
+
+
+class VectorBackend(ABC):
+    """
+    Common interface for all benchmarked backends.
+
+    - build: load the dataset and build the index, returns nothing (caller measures time)
+    - search: top-k point ids for a query, `ef` is the search-time candidate count
+    """
+
+    name = "base"
+
+    def __init__(self, container: Optional[str] = None):
+        self.container = container
+
+    @abstractmethod
+    def build(self, ds: BenchmarkDataset, m: int, ef_construct: int) -> None:
+        ...
+
+    @abstractmethod
+    def search(self, query: BenchmarkQuery, k: int, ef: int) -> List[int]:
+        ...
+
+    def memory_bytes(self) -> Optional[int]:
+        return container_memory_bytes(self.container)
+
+    def close(self) -> None:
+        pass
+
+
+class BruteForceBackend(VectorBackend):
+    """
+    Exact in-process scan. Ground truth and lower bound for latency.
+    """
+
+    name = "bruteforce"
+
+    def build(self, ds: BenchmarkDataset, m: int, ef_construct: int) -> None:
+        self.ds = ds
+
+    def search(self, query: BenchmarkQuery, k: int, ef: int) -> List[int]:
+        return self.ds.exact_top_k(query, k)
+
+    def memory_bytes(self) -> Optional[int]:
+        return int(self.ds.vectors.nbytes)
+
+
+class QdrantBackend(VectorBackend):
+    name = "qdrant"
+
+    def __init__(self, url: str = "http://localhost:6333", container: Optional[str] = None):
+        from qdrant_client import QdrantClient, models as qm
+
+        super().__init__(container)
+        self.qm = qm
+        self.client = QdrantClient(url=url, timeout=600)
+
+    def build(self, ds: BenchmarkDataset, m: int, ef_construct: int) -> None:
+        qm = self.qm
+        if self.client.collection_exists(BENCH_COLLECTION):
+            self.client.delete_collection(BENCH_COLLECTION)
+        self.client.create_collection(
+            collection_name=BENCH_COLLECTION,
+            vectors_config=qm.VectorParams(size=ds.dim, distance=qm.Distance.COSINE),
+            hnsw_config=qm.HnswConfigDiff(m=m, ef_construct=ef_construct),
+        )
+        self.client.create_payload_index(BENCH_COLLECTION, "media_type", qm.PayloadSchemaType.KEYWORD)
+        self.client.create_payload_index(BENCH_COLLECTION, "score", qm.PayloadSchemaType.FLOAT)
+
+        payloads = [
+            {"media_type": str(mt), "score": None if np.isnan(s) else float(s)}
+            for mt, s in zip(ds.media_types.tolist(), ds.scores.tolist())
+        ]
+        self.client.upload_collection(
+            collection_name=BENCH_COLLECTION,
+            ids=[int(i) for i in ds.ids],
+            vectors=ds.vectors,
+            payload=payloads,
+            batch_size=INSERT_BATCH_SIZE,
+            wait=True,
+        )
+        # index building is async, wait until the optimizer is done
+        while self.client.get_collection(BENCH_COLLECTION).status != qm.CollectionStatus.GREEN:
+            time.sleep(0.5)
+
+    def _filter(self, filter_: Optional[Dict[str, Any]]):
+        if not filter_:
+            return None
+        qm = self.qm
+        must = []
+        if filter_.get("media_type"):
+            must.append(qm.FieldCondition(key="media_type", match=qm.MatchValue(value=filter_["media_type"])))
+        if filter_.get("min_score") is not None:
+            must.append(qm.FieldCondition(key="score", range=qm.Range(gt=float(filter_["min_score"]))))
+        return qm.Filter(must=must)
+
+    def search(self, query: BenchmarkQuery, k: int, ef: int) -> List[int]:
+        hits = self.client.search(
+            collection_name=BENCH_COLLECTION,
+            query_vector=query.vector.tolist(),
+            limit=k,
+            query_filter=self._filter(query.filter),
+            search_params=self.qm.SearchParams(hnsw_ef=ef),
+        )
+        return [int(h.id) for h in hits]
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class CrateBackend(VectorBackend):
+    """
+    Crate indexes FLOAT_VECTOR columns with Lucene HNSW, `m`/`ef_construct` are fixed by Crate.
+    `ef` maps to the per-shard candidate count of KNN_MATCH.
+    """
+
+    name = "crate"
+
+    def __init__(self, hosts: str = "http://localhost:4200", container: Optional[str] = None):
+        from crate import client
+
+        super().__init__(container)
+        self.con = client.connect(hosts.split(","))
+        self.cur = self.con.cursor()
+
+    def build(self, ds: BenchmarkDataset, m: int, ef_construct: int) -> None:
+        self.cur.execute(f"DROP TABLE IF EXISTS {BENCH_COLLECTION}")
+        self.cur.execute(
+            f"""
+            CREATE TABLE {BENCH_COLLECTION} (
+                id BIGINT PRIMARY KEY,
+                media_type TEXT,
+                score REAL,
+                v FLOAT_VECTOR({ds.dim})
+            ) WITH (number_of_replicas = 0)
+            """
+        )
+        sql = f"INSERT INTO {BENCH_COLLECTION} (id, media_type, score, v) VALUES (?, ?, ?, ?)"
+        for start in range(0, len(ds.ids), INSERT_BATCH_SIZE):
+            end = start + INSERT_BATCH_SIZE
+            rows = [
+                [int(pid), str(mt), None if np.isnan(s) else float(s), vec.tolist()]
+                for pid, mt, s, vec in zip(
+                    ds.ids[start:end], ds.media_types[start:end], ds.scores[start:end], ds.vectors[start:end]
+                )
+            ]
+            self.cur.executemany(sql, rows)
+        self.cur.execute(f"REFRESH TABLE {BENCH_COLLECTION}")
+        self.cur.execute(f"OPTIMIZE TABLE {BENCH_COLLECTION} WITH (max_num_segments = 1)")
+
+    def search(self, query: BenchmarkQuery, k: int, ef: int) -> List[int]:
+        where = ["KNN_MATCH(v, ?, ?)"]
+        params: List[Any] = [query.vector.tolist(), max(ef, k)]
+        filter_ = query.filter or {}
+        if filter_.get("media_type"):
+            where.append("media_type = ?")
+            params.append(filter_["media_type"])
+        if filter_.get("min_score") is not None:
+            where.append("score > ?")
+            params.append(float(filter_["min_score"]))
+        self.cur.execute(
+            f"""
+            SELECT id FROM {BENCH_COLLECTION}
+            WHERE {" AND ".join(where)}
+            ORDER BY _score DESC
+            LIMIT {int(k)}
+            """,
+            params,
+        )
+        return [int(r[0]) for r in self.cur.fetchall()]
+
+    def close(self) -> None:
+        self.con.close()
+
+
+class MilvusBackend(VectorBackend):
+    name = "milvus"
+
+    def __init__(self, host: str = "localhost", port: int = 19530, container: Optional[str] = None):
+        from pymilvus import connections
+
+        super().__init__(container)
+        self.alias = "bench"
+        connections.connect(alias=self.alias, host=host, port=str(port))
+
+    def build(self, ds: BenchmarkDataset, m: int, ef_construct: int) -> None:
+        from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+
+        if utility.has_collection(BENCH_COLLECTION, using=self.alias):
+            utility.drop_collection(BENCH_COLLECTION, using=self.alias)
+        schema = CollectionSchema(
+            fields=[
+                FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=False),
+                FieldSchema(name="media_type", dtype=DataType.VARCHAR, max_length=16),
+                FieldSchema(name="score", dtype=DataType.FLOAT),
+                FieldSchema(name="v", dtype=DataType.FLOAT_VECTOR, dim=ds.dim),
+            ]
+        )
+        self.col = Collection(BENCH_COLLECTION, schema=schema, using=self.alias)
+        for start in range(0, len(ds.ids), INSERT_BATCH_SIZE):
+            end = start + INSERT_BATCH_SIZE
+            self.col.insert(
+                [
+                    ds.ids[start:end].tolist(),
+                    [str(mt) for mt in ds.media_types[start:end]],
+                    np.nan_to_num(ds.scores[start:end], nan=-1.0).tolist(),
+                    ds.vectors[start:end],
+                ]
+            )
+        self.col.flush()
+        self.col.create_index(
+            field_name="v",
+            index_params={
+                "index_type": "HNSW",
+                "metric_type": "COSINE",
+                "params": {"M": m, "efConstruction": ef_construct},
+            },
+        )
+        utility.wait_for_index_building_complete(BENCH_COLLECTION, using=self.alias)
+        self.col.load()
+
+    def search(self, query: BenchmarkQuery, k: int, ef: int) -> List[int]:
+        filter_ = query.filter or {}
+        expr = []
+        if filter_.get("media_type"):
+            expr.append(f'media_type == "{filter_["media_type"]}"')
+        if filter_.get("min_score") is not None:
+            expr.append(f"score > {float(filter_['min_score'])}")
+        res = self.col.search(
+            data=[query.vector.tolist()],
+            anns_field="v",
+            param={"metric_type": "COSINE", "params": {"ef": max(ef, k)}},
+            limit=k,
+            expr=" and ".join(expr) or None,
+        )
+        return [int(hit.id) for hit in res[0]]
+
+    def close(self) -> None:
+        from pymilvus import connections
+
+        connections.disconnect(self.alias)
@@ -0,0 +1,213 @@
+import json
+import os
+import random
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from f.db.qdrant import QdrantConnector
+from f.sync.models.qdrant_schemas import MEDIA_COLLECTION
+
+DEFAULT_DATASET_DIR = "/tmp/goodwatch/vector_benchmark"
+SCORE_FIELD = "goodwatch_overall_score_normalized_percent"
+SCROLL_PAGE_SIZE = 1000
+CENTROID_SEEDS = 4
+
+
+@dataclass
+class BenchmarkQuery:
+    """
+    Recorded query. Only the seed ids are stored, the query vector is derived
+    from the dataset so every backend replays exactly the same input.
+
+    - single: vector of one title
+    - centroid: mean of several titles of the same media type
+    - filtered: single, restricted to a media type and a minimum score
+    """
+    kind: str
+    seed_ids: List[int]
+    filter: Optional[Dict[str, Any]] = None
+    vector: Optional[np.ndarray] = field(default=None, repr=False)
+
+
+@dataclass
+class BenchmarkDataset:
+    vector_name: str
+    ids: np.ndarray  # (n,) int64 point ids
+    vectors: np.ndarray  # (n, d) float32, L2-normalized
+    media_types: np.ndarray  # (n,) "movie" | "show"
+    scores: np.ndarray  # (n,) float32, NaN if unknown
+    queries: List[BenchmarkQuery]
+
+    @property
+    def dim(self) -> int:
+        return int(self.vectors.shape[1])
+
+    def mask(self, filter_: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not filter_:
+            return None
+        m = np.ones(len(self.ids), dtype=bool)
+        if filter_.get("media_type"):
+            m &= self.media_types == filter_["media_type"]
+        if filter_.get("min_score") is not None:
+            m &= np.nan_to_num(self.scores, nan=-1.0) > float(filter_["min_score"])
+        return m
+
+    def exact_top_k(self, query: BenchmarkQuery, k: int) -> List[int]:
+        """
+        Ground truth: exact cosine similarity over all (filtered) vectors.
+        """
+        sims = self.vectors @ query.vector
+        m = self.mask(query.filter)
+        if m is not None:
+            sims = np.where(m, sims, -np.inf)
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [int(self.ids[i]) for i in top if np.isfinite(sims[i])]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def export_dataset(
+    out_dir: str = DEFAULT_DATASET_DIR,
+    vector_name: str = "fingerprint_v1",
+    max_points: Optional[int] = None,
+) -> int:
+    """
+    Export vectors plus the payload fields used by the filtered queries from Qdrant into .npy files.
+    """
+    qc = QdrantConnector()
+    ids: List[int] = []
+    vectors: List[List[float]] = []
+    media_types: List[str] = []
+    scores: List[float] = []
+
+    offset = None
+    while True:
+        points, offset = qc.client.scroll(
+            collection_name=MEDIA_COLLECTION,
+            offset=offset,
+            limit=SCROLL_PAGE_SIZE,
+            with_payload=["media_type", SCORE_FIELD],
+            with_vectors=[vector_name],
+        )
+        for p in points:
+            vec = (p.vector or {}).get(vector_name)
+            if not vec:
+                continue
+            payload = p.payload or {}
+            ids.append(int(p.id))
+            vectors.append(vec)
+            media_types.append(payload.get("media_type") or "")
+            score = payload.get(SCORE_FIELD)
+            scores.append(float(score) if score is not None else np.nan)
+        print(f"exported {len(ids)} points")
+        if offset is None or (max_points and len(ids) >= max_points):
+            break
+    qc.close()
+
+    if max_points:
+        ids, vectors = ids[:max_points], vectors[:max_points]
+        media_types, scores = media_types[:max_points], scores[:max_points]
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "ids.npy"), np.array(ids, dtype=np.int64))
+    np.save(os.path.join(out_dir, "vectors.npy"), _normalize(np.array(vectors, dtype=np.float32)))
+    np.save(os.path.join(out_dir, "media_types.npy"), np.array(media_types, dtype="<U8"))
+    np.save(os.path.join(out_dir, "scores.npy"), np.array(scores, dtype=np.float32))
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({"vector_name": vector_name, "points": len(ids)}, f)
+    return len(ids)
+
+
+def record_queries(
+    out_dir: str = DEFAULT_DATASET_DIR,
+    per_kind: int = 200,
+    min_score: float = 50.0,
+    seed: int = 42,
+) -> int:
+    """
+    Draw a reproducible query set (single, centroid, filtered) from an exported dataset.
+    Centroid and filtered queries need a media type with at least CENTROID_SEEDS points,
+    without one they are left out; an empty dataset gives an empty query set.
+    """
+    ids = np.load(os.path.join(out_dir, "ids.npy"))
+    media_types = np.load(os.path.join(out_dir, "media_types.npy"))
+    rng = random.Random(seed)
+
+    by_type: Dict[str, List[int]] = {}
+    for pid, mt in zip(ids.tolist(), media_types.tolist()):
+        by_type.setdefault(mt, []).append(pid)
+    types = [mt for mt, members in by_type.items() if mt and len(members) >= CENTROID_SEEDS]
+
+    queries: List[Dict[str, Any]] = []
+    if not len(ids):
+        print(f"no points exported to {out_dir}, recording an empty query set")
+    elif not types:
+        print(f"no media type has {CENTROID_SEEDS} points, recording only single queries")
+    for pid in rng.sample(ids.tolist(), min(per_kind, len(ids))):
+        queries.append({"kind": "single", "seed_ids": [pid]})
+    for _ in range(per_kind if types else 0):
+        mt = rng.choice(types)
+        queries.append({"kind": "centroid", "seed_ids": rng.sample(by_type[mt], CENTROID_SEEDS)})
+    for _ in range(per_kind if types else 0):
+        mt = rng.choice(types)
+        queries.append(
+            {
+                "kind": "filtered",
+                "seed_ids": [rng.choice(by_type[mt])],
+                "filter": {"media_type": mt, "min_score": min_score},
+            }
+        )
+
+    with open(os.path.join(out_dir, "queries.json"), "w") as f:
+        json.dump(queries, f)
+    return len(queries)
+
+
+def load_dataset(data_dir: str = DEFAULT_DATASET_DIR) -> BenchmarkDataset:
+    with open(os.path.join(data_dir, "meta.json")) as f:
+        meta = json.load(f)
+    with open(os.path.join(data_dir, "queries.json")) as f:
+        raw_queries = json.load(f)
+
+    ids = np.load(os.path.join(data_dir, "ids.npy"))
+    vectors = np.load(os.path.join(data_dir, "vectors.npy"), mmap_mode="r")
+    position = {int(pid): i for i, pid in enumerate(ids.tolist())}
+
+    queries: List[BenchmarkQuery] = []
+    for q in raw_queries:
+        rows = [position[pid] for pid in q["seed_ids"] if pid in position]
+        if not rows:
+            continue
+        vec = np.asarray(vectors[rows], dtype=np.float32).mean(axis=0)
+        vec /= np.linalg.norm(vec) or 1.0
+        queries.append(BenchmarkQuery(q["kind"], q["seed_ids"], q.get("filter"), vec))
+
+    return BenchmarkDataset(
+        vector_name=meta["vector_name"],
+        ids=ids,
+        vectors=np.asarray(vectors, dtype=np.float32),
+        media_types=np.load(os.path.join(data_dir, "media_types.npy")),
+        scores=np.load(os.path.join(data_dir, "scores.npy")),
+        queries=queries,
+    )
+
+
+def main(
+    out_dir: str = DEFAULT_DATASET_DIR,
+    vector_name: str = "fingerprint_v1",
+    max_points: Optional[int] = None,
+    queries_per_kind: int = 200,
+    min_score: float = 50.0,
+    seed: int = 42,
+):
+    points = export_dataset(out_dir, vector_name, max_points)
+    queries = record_queries(out_dir, queries_per_kind, min_score, seed)
+    return {"out_dir": out_dir, "points": points, "queries": queries}
@@ -0,0 +1,146 @@
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from f.vector.benchmark.backends import (
+    BruteForceBackend,
+    CrateBackend,
+    MilvusBackend,
+    QdrantBackend,
+    VectorBackend,
+)
+from f.vector.benchmark.dataset import DEFAULT_DATASET_DIR, BenchmarkDataset, load_dataset
+
+QUERY_KINDS = ["single", "centroid", "filtered"]
+
+
+def _make_backend(name: str, hosts: Dict[str, str], containers: Dict[str, str]) -> VectorBackend:
+    container = containers.get(name)
+    if name == "bruteforce":
+        return BruteForceBackend()
+    if name == "qdrant":
+        return QdrantBackend(url=hosts.get("qdrant", "http://localhost:6333"), container=container)
+    if name == "crate":
+        return CrateBackend(hosts=hosts.get("crate", "http://localhost:4200"), container=container)
+    if name == "milvus":
+        host, _, port = hosts.get("milvus", "localhost:19530").partition(":")
+        return MilvusBackend(host=host, port=int(port or 19530), container=container)
+    raise ValueError(f"Unknown backend '{name}'")
+
+
+def _replay(
+    backend: VectorBackend,
+    ds: BenchmarkDataset,
+    ground_truth: Dict[int, List[int]],
+    k: int,
+    ef: int,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Replay the whole query set serially, grouped by query kind.
+    """
+    per_kind: Dict[str, Dict[str, list]] = {kind: {"lat": [], "recall": []} for kind in QUERY_KINDS}
+    for qi, query in enumerate(ds.queries):
+        started = time.perf_counter()
+        found = backend.search(query, k, ef)
+        elapsed = time.perf_counter() - started
+
+        truth = ground_truth[qi]
+        recall = len(set(found) & set(truth)) / len(truth) if truth else 1.0
+        per_kind[query.kind]["lat"].append(elapsed)
+        per_kind[query.kind]["recall"].append(recall)
+
+    stats: Dict[str, Dict[str, float]] = {}
+    for kind, values in per_kind.items():
+        if not values["lat"]:
+            continue
+        lat = np.array(values["lat"])
+        stats[kind] = {
+            "queries": len(lat),
+            "qps": round(len(lat) / lat.sum(), 1),
+            "p50_ms": round(float(np.percentile(lat, 50)) * 1000, 3),
+            "p99_ms": round(float(np.percentile(lat, 99)) * 1000, 3),
+            f"recall_at_{k}": round(float(np.mean(values["recall"])), 4),
+        }
+    return stats
+
+
+def run_benchmark(
+    data_dir: str,
+    backends: List[str],
+    m_values: List[int],
+    ef_construct: int,
+    ef_values: List[int],
+    k: int,
+    hosts: Dict[str, str],
+    containers: Dict[str, str],
+) -> List[Dict[str, Any]]:
+    ds = load_dataset(data_dir)
+    print(f"Loaded {len(ds.ids)} vectors (dim={ds.dim}) and {len(ds.queries)} queries")
+    ground_truth = {qi: ds.exact_top_k(q, k) for qi, q in enumerate(ds.queries)}
+
+    rows: List[Dict[str, Any]] = []
+    for name in backends:
+        backend = _make_backend(name, hosts, containers)
+        try:
+            # Crate and brute force have no tunable graph params
+            build_m_values = m_values if name in ("qdrant", "milvus") else [None]
+            for m in build_m_values:
+                memory_before = backend.memory_bytes() if name != "bruteforce" else 0
+                started = time.perf_counter()
+                backend.build(ds, m or 16, ef_construct)
+                build_s = time.perf_counter() - started
+                memory_after = backend.memory_bytes()
+
+                for ef in ef_values:
+                    stats = _replay(backend, ds, ground_truth, k, ef)
+                    row = {
+                        "backend": name,
+                        "m": m,
+                        "ef_construct": ef_construct if m else None,
+                        "ef": ef,
+                        "build_s": round(build_s, 2),
+                        "memory_mib": round(memory_after / 1024**2, 1) if memory_after else None,
+                        "memory_delta_mib": (
+                            round((memory_after - memory_before) / 1024**2, 1)
+                            if memory_after and memory_before is not None
+                            else None
+                        ),
+                        "kinds": stats,
+                    }
+                    print(row)
+                    rows.append(row)
+                    if name == "bruteforce":
+                        break
+        finally:
+            backend.close()
+    return rows
+
+
+def main(
+    data_dir: str = DEFAULT_DATASET_DIR,
+    backends: List[str] = ["bruteforce", "qdrant", "crate", "milvus"],
+    m_values: List[int] = [16, 32],
+    ef_construct: int = 200,
+    ef_values: List[int] = [64, 128, 256],
+    k: int = 20,
+    hosts: Optional[dict] = None,
+    containers: Optional[dict] = None,
+):
+    """
+    Benchmark local vector backends on the same exported vectors and recorded queries.
+    Run `f/vector/benchmark/dataset` first to export the dataset.
+
+    hosts example: {"qdrant": "http://localhost:6333", "crate": "http://localhost:4200", "milvus": "localhost:19530"}
+    containers example (for memory usage): {"qdrant": "qdrant-bench", "crate": "crate-bench", "milvus": "milvus-standalone"}
+    """
+    return run_benchmark(
+        data_dir=data_dir,
+        backends=backends,
+        m_values=m_values,
+        ef_construct=ef_construct,
+        ef_values=ef_values,
+        k=k,
+        hosts=hosts or {},
+        containers=containers or {},
+    )
@@ -0,0 +1,185 @@
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from f.db.qdrant import QdrantConnector, build_search_params
+from f.sync.models.qdrant_schemas import MEDIA_COLLECTION, desired_media_collection, search_spec
+
+SCROLL_PAGE_SIZE = 1000
+
+
+def _sample_query_vectors(
+    qc: QdrantConnector,
+    vector_name: str,
+    sample_size: int,
+    max_pages: int,
+    seed: int,
+) -> List[List[float]]:
+    candidates: List[List[float]] = []
+    offset = None
+    for _ in range(max_pages):
+        points, offset = qc.client.scroll(
+            collection_name=MEDIA_COLLECTION,
+            offset=offset,
+            limit=SCROLL_PAGE_SIZE,
+            with_payload=False,
+            with_vectors=[vector_name],
+        )
+        for p in points:
+            vec = (p.vector or {}).get(vector_name)
+            if vec:
+                candidates.append(vec)
+        if offset is None:
+            break
+    rng = random.Random(seed)
+    return rng.sample(candidates, min(sample_size, len(candidates)))
+
+
+def _run(
+    search: Callable[[List[float]], List[Any]],
+    queries: List[List[float]],
+) -> tuple[List[List[Any]], List[float]]:
+    ids: List[List[Any]] = []
+    latencies_ms: List[float] = []
+    for q in queries:
+        started = time.perf_counter()
+        hits = search(q)
+        latencies_ms.append((time.perf_counter() - started) * 1000)
+        ids.append([h.id for h in hits])
+    return ids, latencies_ms
+
+
+def _recall(approx: List[List[Any]], exact: List[List[Any]], k: int) -> float:
+    if not exact:
+        return 0.0
+    hits = sum(len(set(a[:k]) & set(e[:k])) for a, e in zip(approx, exact))
+    return hits / (k * len(exact))
+
+
+def _summary(
+    approx: List[List[Any]],
+    exact: List[List[Any]],
+    latencies_ms: List[float],
+    k: int,
+) -> Dict[str, float]:
+    lat = np.array(latencies_ms)
+    return {
+        f"recall_at_{k}": round(_recall(approx, exact, k), 4),
+        "p50_ms": round(float(np.percentile(lat, 50)), 2),
+        "p99_ms": round(float(np.percentile(lat, 99)), 2),
+        "mean_ms": round(float(lat.mean()), 2),
+    }
+
+
+def _estimate_vector_ram(points_count: int, dim: int, kind: Optional[str]) -> Dict[str, float]:
+    """
+    RAM of one named vector computed from points x dims, not measured: ignores the HNSW graph,
+    payload and segment overhead, so it only shows the ratio quantization buys.
+    """
+    mib = 1024 * 1024
+    float32_bytes = points_count * dim * 4
+    if kind == "scalar":
+        quantized_bytes = points_count * dim
+    elif kind == "binary":
+        quantized_bytes = points_count * ((dim + 7) // 8)
+    else:
+        quantized_bytes = float32_bytes
+    return {
+        "float32_mib": round(float32_bytes / mib, 1),
+        "in_ram_mib": round(quantized_bytes / mib, 1),
+        "reduction_factor": round(float32_bytes / quantized_bytes, 1) if quantized_bytes else 0.0,
+    }
+
+
+def main(
+    vector_name: str = "essence_text_v1",
+    sample_size: int = 200,
+    k: int = 20,
+    oversampling_values: List[float] = [1.0, 2.0, 3.0],
+    hnsw_ef: Optional[int] = None,
+    max_pages: int = 20,
+    seed: int = 42,
+):
+    """
+    Compare quantized search against the unquantized baseline on `media`.
+
+    - baseline: exact brute-force over the float32 originals (ground truth)
+    - hnsw_original: HNSW traversal on the originals (what we had before quantization)
+    - quantized_raw: quantized scores only, no rescoring
+    - quantized_configured: the SearchSpec of the named vector, what production searches pass to `search_quantized`
+    - quantized_rescore_xN: oversample N times on the quantized index, rescore with originals
+    """
+    # the default list is shared between calls, never touch it
+    oversampling_values = sorted(set(oversampling_values))
+    qc = QdrantConnector()
+    spec = desired_media_collection()
+    vector_spec = spec.vectors[vector_name]
+
+    queries = _sample_query_vectors(qc, vector_name, sample_size, max_pages, seed)
+    print(f"Benchmarking '{vector_name}' with {len(queries)} queries, k={k}")
+
+    def with_params(search_params):
+        return lambda q: qc.search(MEDIA_COLLECTION, vector_name, q, limit=k, search_params=search_params)
+
+    exact_ids, exact_lat = _run(
+        lambda q: qc.search_exact(MEDIA_COLLECTION, vector_name, q, limit=k), queries
+    )
+
+    results: Dict[str, Any] = {"baseline_exact": _summary(exact_ids, exact_ids, exact_lat, k)}
+
+    ids, lat = _run(with_params(build_search_params(hnsw_ef=hnsw_ef, ignore_quantization=True)), queries)
+    results["hnsw_original"] = _summary(ids, exact_ids, lat, k)
+
+    ids, lat = _run(with_params(build_search_params(hnsw_ef=hnsw_ef, rescore=False, oversampling=1.0)), queries)
+    results["quantized_raw"] = _summary(ids, exact_ids, lat, k)
+
+    configured = search_spec(MEDIA_COLLECTION, vector_name)
+    ids, lat = _run(
+        lambda q: qc.search_quantized(
+            MEDIA_COLLECTION,
+            vector_name,
+            q,
+            limit=k,
+            oversampling=configured.oversampling,
+            rescore=configured.rescore,
+            hnsw_ef=configured.hnsw_ef if hnsw_ef is None else hnsw_ef,
+        ),
+        queries,
+    )
+    results["quantized_configured"] = {
+        "oversampling": configured.oversampling,
+        "rescore": configured.rescore,
+        **_summary(ids, exact_ids, lat, k),
+    }
+
+    for oversampling in oversampling_values:
+        ids, lat = _run(
+            lambda q: qc.search_quantized(
+                MEDIA_COLLECTION,
+                vector_name,
+                q,
+                limit=k,
+                oversampling=oversampling,
+                rescore=True,
+                hnsw_ef=hnsw_ef,
+            ),
+            queries,
+        )
+        results[f"quantized_rescore_x{oversampling:g}"] = _summary(ids, exact_ids, lat, k)
+
+    info = qc.client.get_collection(MEDIA_COLLECTION)
+    points_count = info.points_count or 0
+    kind = vector_spec.quantization.kind if vector_spec.quantization else None
+    results["vector_ram_estimate"] = {
+        "points": points_count,
+        "quantization": kind,
+        **_estimate_vector_ram(points_count, vector_spec.size, kind),
+    }
+
+    for name, summary in results.items():
+        print(f"{name}: {summary}")
+
+    qc.close()
+    return results
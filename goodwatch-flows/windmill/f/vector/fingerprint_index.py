@@ -0,0 +1,518 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from f.db.mongodb import init_mongodb, close_mongodb
+from f.sync.copy.vector_data import (
+    _build_batch_payloads,
+    _fetch_tmdb_ids_keyset,
+    _source_collections,
+)
+
+INDEX_DIR = "/tmp/goodwatch/fingerprint_index"
+FINGERPRINT_DIM = 74
+BATCH_SIZE = 2000
+MEDIA_TYPES = ["movie", "show"]
+SCORE_FIELD = "goodwatch_overall_score_normalized_percent"
+VOTES_FIELD = "goodwatch_overall_score_voting_count"
+# collections whose updates change a row: fingerprint, streaming, and the ratings the scores are built from
+REFRESH_DRIVERS = ["dna", "details", "imdb", "meta", "rotten"]
+
+# fixed-width arrays, one row per title
+ARRAY_FILES = [
+    "tmdb_ids",
+    "media_types",
+    "vectors",
+    "scores",
+    "votes",
+    "streaming_indptr",
+    "streaming_codes",
+]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class FingerprintIndex:
+    """
+    Exact cosine similarity over all fingerprint vectors in one float32 matrix.
+
+    Files in the index dir:
+    - vectors.npy (n, 74) float32, L2-normalized, memory-mapped on load
+    - tmdb_ids.npy / media_types.npy (0=movie, 1=show): row identity
+    - scores.npy / votes.npy: goodwatch overall score and voting count for threshold masks
+    - streaming_indptr.npy / streaming_codes.npy + streaming_vocab.json: CSR list of
+      "{provider_id}_{country_code}" codes per row for streaming masks
+    - meta.json: refreshed_at for incremental refreshes
+    """
+
+    def __init__(
+        self,
+        tmdb_ids: np.ndarray,
+        media_types: np.ndarray,
+        vectors: np.ndarray,
+        scores: np.ndarray,
+        votes: np.ndarray,
+        streaming_indptr: np.ndarray,
+        streaming_codes: np.ndarray,
+        streaming_vocab: List[str],
+        refreshed_at: Optional[datetime] = None,
+    ):
+        self.tmdb_ids = tmdb_ids
+        self.media_types = media_types
+        self.vectors = vectors
+        self.scores = scores
+        self.votes = votes
+        self.streaming_indptr = streaming_indptr
+        self.streaming_codes = streaming_codes
+        self.streaming_vocab = streaming_vocab
+        self.refreshed_at = refreshed_at
+        self._streaming_rows: Optional[np.ndarray] = None
+        self._rows: Optional[Dict[Tuple[int, int], int]] = None
+
+    def __len__(self) -> int:
+        return len(self.tmdb_ids)
+
+    # ---- Persistence ----
+
+    @classmethod
+    def empty(cls) -> "FingerprintIndex":
+        return cls(
+            tmdb_ids=np.zeros(0, dtype=np.int64),
+            media_types=np.zeros(0, dtype=np.uint8),
+            vectors=np.zeros((0, FINGERPRINT_DIM), dtype=np.float32),
+            scores=np.zeros(0, dtype=np.float32),
+            votes=np.zeros(0, dtype=np.int64),
+            streaming_indptr=np.zeros(1, dtype=np.int64),
+            streaming_codes=np.zeros(0, dtype=np.int32),
+            streaming_vocab=[],
+        )
+
+    @classmethod
+    def load(cls, index_dir: str = INDEX_DIR, mmap: bool = True) -> "FingerprintIndex":
+        mode = "r" if mmap else None
+        arrays = {
+            name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode=mode)
+            for name in ARRAY_FILES
+        }
+        with open(os.path.join(index_dir, "streaming_vocab.json")) as f:
+            vocab = json.load(f)
+        with open(os.path.join(index_dir, "meta.json")) as f:
+            meta = json.load(f)
+        refreshed_at = meta.get("refreshed_at")
+        return cls(
+            **arrays,
+            streaming_vocab=vocab,
+            refreshed_at=datetime.fromisoformat(refreshed_at) if refreshed_at else None,
+        )
+
+    def save(self, index_dir: str = INDEX_DIR) -> None:
+        """
+        Write into a sibling dir and swap it in, so readers never see a half-written index.
+        """
+        tmp_dir = f"{index_dir}.tmp"
+        old_dir = f"{index_dir}.old"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name in ARRAY_FILES:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(tmp_dir, "streaming_vocab.json"), "w") as f:
+            json.dump(self.streaming_vocab, f)
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(
+                {
+                    "rows": len(self),
+                    "refreshed_at": self.refreshed_at.isoformat() if self.refreshed_at else None,
+                },
+                f,
+            )
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(index_dir):
+            os.rename(index_dir, old_dir)
+        os.rename(tmp_dir, index_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    # ---- Lookups & masks ----
+
+    def row_of(self, media_type: str, tmdb_id: int) -> Optional[int]:
+        if self._rows is None:
+            # the index is never modified in place (upsert/remove return a new one), so built once
+            self._rows = {
+                key: row
+                for row, key in enumerate(zip(self.media_types.tolist(), self.tmdb_ids.tolist()))
+            }
+        return self._rows.get((MEDIA_TYPES.index(media_type), int(tmdb_id)))
+
+    def mask(
+        self,
+        media_type: Optional[str] = None,
+        streaming: Optional[List[str]] = None,
+        min_score: Optional[float] = None,
+        min_votes: Optional[int] = None,
+    ) -> Optional[np.ndarray]:
+        """
+        Boolean row mask. `streaming` matches rows available on ANY of the given
+        "{provider_id}_{country_code}" codes.
+        """
+        m: Optional[np.ndarray] = None
+
+        def _and(cond: np.ndarray) -> None:
+            nonlocal m
+            m = cond if m is None else (m & cond)
+
+        if media_type:
+            _and(self.media_types == MEDIA_TYPES.index(media_type))
+        if min_score is not None:
+            _and(np.nan_to_num(self.scores, nan=-1.0) >= min_score)
+        if min_votes is not None:
+            _and(self.votes >= min_votes)
+        if streaming:
+            vocab_pos = {code: i for i, code in enumerate(self.streaming_vocab)}
+            wanted = np.array([vocab_pos[c] for c in streaming if c in vocab_pos], dtype=np.int32)
+            if self._streaming_rows is None:
+                self._streaming_rows = np.repeat(
+                    np.arange(len(self), dtype=np.int64), np.diff(self.streaming_indptr)
+                )
+            available = np.zeros(len(self), dtype=bool)
+            available[self._streaming_rows[np.isin(self.streaming_codes, wanted)]] = True
+            _and(available)
+        return m
+
+    # ---- Search ----
+
+    def top_k(
+        self,
+        queries: np.ndarray,
+        k: int = 20,
+        mask: Optional[np.ndarray] = None,
+        exclude_rows: Optional[List[List[int]]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact batched top-k by cosine similarity.
+
+        Args:
+            queries: (b, 74) query vectors, normalized here
+            mask: optional (n,) boolean row mask shared by all queries
+            exclude_rows: optional rows per query to drop (e.g. the seed titles)
+
+        Returns (rows, similarities), both (b, k'), best first. Masked-out slots are -1 / -inf.
+        """
+        q = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        sims = q @ self.vectors.T
+        if mask is not None:
+            sims[:, ~mask] = -np.inf
+        for qi, rows in enumerate(exclude_rows or []):
+            sims[qi, rows] = -np.inf
+
+        k = min(k, sims.shape[1])
+        if k == 0:
+            return np.zeros((len(q), 0), dtype=np.int64), np.zeros((len(q), 0), dtype=np.float32)
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_sims, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_sims = np.take_along_axis(top_sims, order, axis=1)
+        top[~np.isfinite(top_sims)] = -1
+        return top, top_sims
+
+    def similar(
+        self,
+        media_type: str,
+        tmdb_ids: List[int],
+        k: int = 20,
+        centroid: bool = False,
+        mask: Optional[np.ndarray] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Titles most similar to each seed (or to the centroid of all seeds), seeds excluded.
+        """
+        seed_rows = [r for r in (self.row_of(media_type, t) for t in tmdb_ids) if r is not None]
+        if not seed_rows:
+            return []
+        seeds = np.asarray(self.vectors[seed_rows])
+        if centroid:
+            queries = seeds.mean(axis=0, keepdims=True)
+            exclude = [seed_rows]
+        else:
+            queries = seeds
+            exclude = [[r] for r in seed_rows]
+
+        rows, sims = self.top_k(queries, k, mask, exclude)
+        return [
+            [
+                {
+                    "tmdb_id": int(self.tmdb_ids[r]),
+                    "media_type": MEDIA_TYPES[int(self.media_types[r])],
+                    "similarity": round(float(s), 4),
+                }
+                for r, s in zip(row, sim)
+                if r >= 0
+            ]
+            for row, sim in zip(rows, sims)
+        ]
+
+    # ---- Incremental updates ----
+
+    def upsert(self, entries: List[Dict[str, Any]]) -> "FingerprintIndex":
+        """
+        Return a new in-memory index with `entries` replacing or appending rows.
+        Entry keys: media_type, tmdb_id, vector, score, votes, streaming.
+        """
+        if not entries:
+            return self
+        updated = {(MEDIA_TYPES.index(e["media_type"]), int(e["tmdb_id"])) for e in entries}
+        keep = np.array(
+            [(int(mt), int(tid)) not in updated for mt, tid in zip(self.media_types.tolist(), self.tmdb_ids.tolist())],
+            dtype=bool,
+        )
+
+        vocab = list(self.streaming_vocab)
+        vocab_pos = {code: i for i, code in enumerate(vocab)}
+        new_codes: List[int] = []
+        new_lengths: List[int] = []
+        for e in entries:
+            codes = e.get("streaming") or []
+            for code in codes:
+                if code not in vocab_pos:
+                    vocab_pos[code] = len(vocab)
+                    vocab.append(code)
+                new_codes.append(vocab_pos[code])
+            new_lengths.append(len(codes))
+
+        lengths = np.diff(self.streaming_indptr)
+        kept_codes = np.asarray(self.streaming_codes)[np.repeat(keep, lengths)]
+        all_lengths = np.concatenate([lengths[keep], np.array(new_lengths, dtype=np.int64)])
+
+        scores = [e.get("score") for e in entries]
+        return FingerprintIndex(
+            tmdb_ids=np.concatenate(
+                [self.tmdb_ids[keep], np.array([e["tmdb_id"] for e in entries], dtype=np.int64)]
+            ),
+            media_types=np.concatenate(
+                [
+                    self.media_types[keep],
+                    np.array([MEDIA_TYPES.index(e["media_type"]) for e in entries], dtype=np.uint8),
+                ]
+            ),
+            vectors=np.concatenate(
+                [
+                    np.asarray(self.vectors)[keep],
+                    _normalize(np.array([e["vector"] for e in entries], dtype=np.float32)),
+                ]
+            ),
+            scores=np.concatenate(
+                [
+                    self.scores[keep],
+                    np.array([np.nan if s is None else s for s in scores], dtype=np.float32),
+                ]
+            ),
+            votes=np.concatenate(
+                [self.votes[keep], np.array([e.get("votes") or 0 for e in entries], dtype=np.int64)]
+            ),
+            streaming_indptr=np.concatenate([[0], np.cumsum(all_lengths)]).astype(np.int64),
+            streaming_codes=np.concatenate(
+                [kept_codes, np.array(new_codes, dtype=np.int32)]
+            ).astype(np.int32),
+            streaming_vocab=vocab,
+            refreshed_at=self.refreshed_at,
+        )
+
+    def remove(self, keys: Set[Tuple[str, int]]) -> "FingerprintIndex":
+        """Return a new in-memory index without the given (media_type, tmdb_id) rows."""
+        drop = {(MEDIA_TYPES.index(media_type), int(tmdb_id)) for media_type, tmdb_id in keys}
+        keep = np.array(
+            [(int(mt), int(tid)) not in drop for mt, tid in zip(self.media_types.tolist(), self.tmdb_ids.tolist())],
+            dtype=bool,
+        )
+        if keep.all():
+            return self
+        lengths = np.diff(self.streaming_indptr)
+        return FingerprintIndex(
+            tmdb_ids=self.tmdb_ids[keep],
+            media_types=self.media_types[keep],
+            vectors=np.asarray(self.vectors)[keep],
+            scores=self.scores[keep],
+            votes=self.votes[keep],
+            streaming_indptr=np.concatenate([[0], np.cumsum(lengths[keep])]).astype(np.int64),
+            streaming_codes=np.asarray(self.streaming_codes)[np.repeat(keep, lengths)],
+            streaming_vocab=self.streaming_vocab,
+            refreshed_at=self.refreshed_at,
+        )
+
+
+# ---- Building from Mongo ---------------------------------------------------
+
+
+def _collect_entries(media_type: str, base_selector: dict, driver: str) -> List[Dict[str, Any]]:
+    cols = _source_collections(media_type)
+    entries: List[Dict[str, Any]] = []
+    last_tmdb_id: Optional[int] = None
+    while True:
+        ids, last_tmdb_id = _fetch_tmdb_ids_keyset(
+            cols[driver],
+            base_selector=base_selector,
+            last_tmdb_id=last_tmdb_id,
+            limit=BATCH_SIZE,
+        )
+        if not ids:
+            break
+        for tmdb_id, payload, vectors in _build_batch_payloads(cols, media_type, ids):
+            fingerprint = vectors.get("fingerprint_v1")
+            if not fingerprint or len(fingerprint) != FINGERPRINT_DIM:
+                continue
+            entries.append(
+                {
+                    "media_type": media_type,
+                    "tmdb_id": tmdb_id,
+                    "vector": fingerprint,
+                    "score": payload.get(SCORE_FIELD),
+                    "votes": payload.get(VOTES_FIELD),
+                    "streaming": payload.get("streaming_availability") or [],
+                }
+            )
+        print(f"{media_type} ({driver}): {len(entries)} fingerprints collected")
+    return entries
+
+
+def _fingerprint_ids(media_type: str) -> Set[int]:
+    """tmdb ids that currently have a DNA fingerprint."""
+    cursor = _source_collections(media_type)["dna"].find(
+        {"vector_fingerprint.0": {"$exists": True}}, {"tmdb_id": 1, "_id": 0}
+    ).batch_size(50_000)
+    return {doc["tmdb_id"] for doc in cursor if doc.get("tmdb_id") is not None}
+
+
+def _entries_from_catalogue() -> List[Dict[str, Any]]:
+    """
+    Read the same fields from the latest catalogue Parquet snapshot instead of joining Mongo.
+    """
+    from f.sync.export.catalogue_parquet import read_catalogue
+
+    table = read_catalogue(
+        ["tmdb_id", "media_type", "vector_fingerprint", SCORE_FIELD, VOTES_FIELD, "streaming_availability"]
+    )
+    entries: List[Dict[str, Any]] = []
+    for row in table.to_pylist():
+        fingerprint = row["vector_fingerprint"]
+        if not fingerprint or len(fingerprint) != FINGERPRINT_DIM:
+            continue
+        entries.append(
+            {
+                "media_type": row["media_type"],
+                "tmdb_id": row["tmdb_id"],
+                "vector": fingerprint,
+                "score": row[SCORE_FIELD],
+                "votes": row[VOTES_FIELD],
+                "streaming": row["streaming_availability"] or [],
+            }
+        )
+    return entries
+
+
+def build_index(index_dir: str = INDEX_DIR, source: str = "mongo") -> int:
+    started_at = datetime.utcnow()
+    if source == "parquet":
+        entries = _entries_from_catalogue()
+    else:
+        init_mongodb()
+        try:
+            entries = []
+            for media_type in MEDIA_TYPES:
+                entries += _collect_entries(
+                    media_type, {"vector_fingerprint.0": {"$exists": True}}, "dna"
+                )
+        finally:
+            close_mongodb()
+    index = FingerprintIndex.empty().upsert(entries)
+    index.refreshed_at = started_at
+    index.save(index_dir)
+    return len(index)
+
+
+def refresh_index(index_dir: str = INDEX_DIR) -> int:
+    """
+    Re-read titles whose fingerprint, details (streaming) or ratings (scores, votes) changed
+    since the last refresh, and drop titles that no longer have a fingerprint.
+    Falls back to a full build if there is no index yet.
+    """
+    if not os.path.exists(os.path.join(index_dir, "meta.json")):
+        return build_index(index_dir)
+
+    index = FingerprintIndex.load(index_dir, mmap=False)
+    started_at = datetime.utcnow()
+    since = {"updated_at": {"$gte": index.refreshed_at}} if index.refreshed_at else {}
+
+    init_mongodb()
+    try:
+        changed: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        removed: Set[Tuple[str, int]] = set()
+        for media_type in MEDIA_TYPES:
+            for driver in REFRESH_DRIVERS:
+                for e in _collect_entries(media_type, since, driver):
+                    changed[(e["media_type"], e["tmdb_id"])] = e
+            # a full id scan, deleted DNA documents never show up in the updated_at filter
+            with_fingerprint = _fingerprint_ids(media_type)
+            media_type_code = MEDIA_TYPES.index(media_type)
+            removed |= {
+                (media_type, tmdb_id)
+                for mt, tmdb_id in zip(index.media_types.tolist(), index.tmdb_ids.tolist())
+                if mt == media_type_code and tmdb_id not in with_fingerprint
+            }
+    finally:
+        close_mongodb()
+
+    index = index.upsert(list(changed.values())).remove(removed)
+    index.refreshed_at = started_at
+    index.save(index_dir)
+    print(f"Refreshed {len(changed)} fingerprints, removed {len(removed)}")
+    return len(changed) + len(removed)
+
+
+def main(
+    action: str = "query",
+    media_type: str = "show",
+    tmdb_ids: List[int] = [1396, 71715, 1402, 64199],
+    k: int = 20,
+    centroid: bool = False,
+    same_media_type: bool = True,
+    streaming: List[str] = [],
+    min_score: Optional[float] = None,
+    min_votes: Optional[int] = None,
+    index_dir: str = INDEX_DIR,
+    source: str = "mongo",
+):
+    """
+    - build: full rebuild from the DNA collections (or the catalogue Parquet snapshot with source="parquet")
+    - refresh: incremental update since the last build/refresh
+    - query: fingerprint "similar titles" for the given seeds
+    """
+    if action == "build":
+        return {"rows": build_index(index_dir, source)}
+    if action == "refresh":
+        return {"updated": refresh_index(index_dir)}
+
+    index = FingerprintIndex.load(index_dir)
+    started = time.perf_counter()
+    results = index.similar(
+        media_type,
+        tmdb_ids,
+        k=k,
+        centroid=centroid,
+        mask=index.mask(
+            media_type=media_type if same_media_type else None,
+            streaming=streaming,
+            min_score=min_score,
+            min_votes=min_votes,
+        ),
+    )
+    compute_ms = (time.perf_counter() - started) * 1000
+    print(f"Searched {len(index)} fingerprints in {compute_ms:.2f}ms")
+    return {"compute_ms": round(compute_ms, 3), "results": results}
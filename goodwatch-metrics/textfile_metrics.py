@@ -0,0 +1,69 @@
+"""
+Prometheus textfile helpers shared by the backup scripts (goodwatch-crate/backup.py,
+goodwatch-qdrant/backup.py). node-exporter's textfile collector reads the files, Alloy scrapes it.
+Standard library only, so the scripts' uv dependencies stay as they are.
+"""
+
+import os
+
+# Metrics written by both backup scripts, defined once so the HELP text, labels and meaning agree.
+# name: (help, labels). service is "crate" or "qdrant", target the collection (Crate: "all",
+# it snapshots all tables as one unit). All are gauges, see write_metrics_textfile.
+BACKUP_METRICS = {
+    "goodwatch_backup_success": ("1 if the last backup of the target succeeded", ("service", "target")),
+    "goodwatch_backup_duration_seconds": ("Time from requesting the snapshot until it is stored on the backup disk", ("service", "target")),
+    "goodwatch_backup_bytes_written": ("Bytes newly written to the backup disk", ("service", "target")),
+    "goodwatch_backup_throughput_megabytes_per_second": ("Bytes newly written to the backup disk divided by duration", ("service", "target")),
+    "goodwatch_backup_tier_snapshots": ("Snapshots kept per retention tier after cleanup", ("service", "tier")),
+    "goodwatch_backup_disk_free_bytes": ("Free space on the backup disk after cleanup", ("service",)),
+    "goodwatch_backup_disk_total_bytes": ("Size of the backup disk", ("service",)),
+    "goodwatch_backup_last_run_timestamp_seconds": ("Unix time of the last backup run", ("service",)),
+    "goodwatch_backup_last_success_timestamp_seconds": ("Unix time of the last run in which every target was backed up", ("service",)),
+}
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels.keys(), escaped)) + "}"
+
+def previous_metric_value(path, name):
+    """Last written value of an unlabeled metric, so timestamps survive failed runs."""
+    try:
+        for line in path.read_text().splitlines():
+            if line.startswith(name + "{") or line.startswith(name + " "):
+                return float(line.rsplit(" ", 1)[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+def backup_metric(name, samples):
+    """(name, help, samples) entry of a BACKUP_METRICS metric, raises ValueError if a sample has other labels."""
+    help_text, label_names = BACKUP_METRICS[name]
+    for labels, _ in samples:
+        if tuple(labels) != label_names:
+            raise ValueError(f"{name} expects labels {label_names}, got {tuple(labels)}")
+    return name, help_text, samples
+
+def throughput_megabytes_per_second(bytes_written, duration_seconds):
+    return round(bytes_written / 1e6 / max(duration_seconds, 1e-6), 3)
+
+def write_metrics_textfile(path, metrics):
+    """
+    metrics: list of (name, help, samples), samples a list of (labels dict, value). All gauges.
+    Written to a temp file and renamed, so the collector never reads a half written file.
+    """
+    lines = []
+    for name, help_text, samples in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not write metrics to {path}: {e}")
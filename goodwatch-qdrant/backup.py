@@ -4,26 +4,45 @@
 # dependencies = [
 #     "requests",
 #     "python-dotenv",
+#     "numpy",
 # ]
 # ///
 
 import requests
 import shutil
 import datetime
+import errno
+import fcntl
+import hashlib
+import json
 import sys
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
 
+# Prometheus textfile helpers shared by the backup scripts, from the monorepo checkout the cron job runs in
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "goodwatch-metrics"))
+from textfile_metrics import backup_metric, previous_metric_value, throughput_megabytes_per_second, write_metrics_textfile  # noqa: E402
+
 # --- CONFIGURATION ---
 # 1. Load Environment Variables
 script_dir = Path(__file__).parent
-load_dotenv(script_dir / ".env") 
+load_dotenv(script_dir / ".env")
 
 # 2. Get Config from Env
 QDRANT_HOST = os.getenv("QDRANT_HOST", "http://10.0.0.20:6333")
 API_KEY = os.getenv("QDRANT_API_KEY")
 BACKUP_ROOT = Path("/mnt/backup-qdrant/snapshots")
+# Collections snapshotted in parallel. Each snapshot is I/O heavy on the Qdrant node, keep this small.
+SNAPSHOT_WORKERS = int(os.getenv("QDRANT_SNAPSHOT_WORKERS", "2"))
+# Store snapshots as content-defined chunks, only chunks not seen before are written
+CHUNK_STORE_ENABLED = os.getenv("QDRANT_CHUNK_STORE", "false").lower() in ("1", "true", "yes")
+CHUNK_STORE = BACKUP_ROOT / ".chunks"
+# Picked up by node-exporter's textfile collector, which Alloy scrapes
+METRICS_TEXTFILE = Path(os.getenv("BACKUP_METRICS_TEXTFILE", "/var/lib/node_exporter/textfile/goodwatch_qdrant_backup.prom"))
 # ---------------------
 
 # Common Headers for Auth
@@ -31,6 +50,16 @@ HEADERS = {
     "api-key": API_KEY
 }
 
+IO_BLOCK_SIZE = 8 * 1024 * 1024
+FICLONE = 0x40049409  # linux ioctl to reflink a file (btrfs, xfs)
+
+# content-defined chunking: ~1 MiB average chunks between 256 KiB and 4 MiB
+CHUNK_AVG_BITS = 20
+CHUNK_MIN_SIZE = 256 * 1024
+CHUNK_MAX_SIZE = 4 * 1024 * 1024
+CHUNK_WINDOW = 64
+CHUNK_MANIFEST_SUFFIX = ".chunks"
+
 def get_collections():
     try:
         r = requests.get(f"{QDRANT_HOST}/collections", headers=HEADERS)
@@ -41,22 +70,17 @@ def get_collections():
         return []
 
 def create_snapshot(collection_name):
+    """Returns (raw filename generated by Qdrant, sha256 checksum reported by Qdrant)"""
     print(f"[{collection_name}] Triggering snapshot...")
     try:
         # wait=true ensures the file is fully written on disk before we move it
         r = requests.post(f"{QDRANT_HOST}/collections/{collection_name}/snapshots?wait=true", headers=HEADERS)
         r.raise_for_status()
-        return r.json()['result']['name'] # Returns the raw filename generated by Qdrant
+        result = r.json()['result']
+        return result['name'], result.get('checksum')
     except Exception as e:
         print(f"[{collection_name}] Snapshot failed: {e}")
-        return None
-
-def secure_copy(src, dest):
-    """Helper to copy file or directory safely"""
-    if src.is_dir():
-        shutil.copytree(src, dest)
-    else:
-        shutil.copy2(src, dest)
+        return None, None
 
 def secure_delete(target):
     """Helper to delete file or directory safely"""
@@ -65,66 +89,275 @@ def secure_delete(target):
     else:
         target.unlink()
 
-def rotate_and_clean(collection_name, raw_filename):
+# --- FILE OPERATIONS ---
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(IO_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+def move_verified(src, dest, expected_checksum=None):
+    """
+    Move a snapshot and verify its sha256 in the same pass.
+    On the same filesystem this is a rename plus one read; across devices the bytes
+    are hashed while they are copied, so the file is never read twice.
+    Returns the sha256 hex digest, raises ValueError on a checksum mismatch.
+    """
+    try:
+        os.rename(src, dest)
+        checksum = hash_file(dest)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        digest = hashlib.sha256()
+        with open(src, "rb") as fin, open(dest, "wb") as fout:
+            while block := fin.read(IO_BLOCK_SIZE):
+                digest.update(block)
+                fout.write(block)
+        shutil.copystat(src, dest)
+        checksum = digest.hexdigest()
+        src.unlink()
+
+    if expected_checksum and checksum != expected_checksum.strip().lower():
+        dest.unlink()
+        raise ValueError(f"checksum mismatch for {dest.name}: expected {expected_checksum.strip()}, got {checksum}")
+    return checksum
+
+def link_tier_copy(src, dest):
+    """
+    Create a retention tier copy without duplicating bytes:
+    hard link first, reflink if hard links are not possible, plain copy as last resort.
+    Returns the method used.
+    """
+    if src.is_dir():
+        shutil.copytree(src, dest, copy_function=lambda s, d: link_tier_copy(Path(s), Path(d)))
+        return "tree"
+    try:
+        os.link(src, dest)
+        return "hardlink"
+    except OSError:
+        pass
+    try:
+        with open(src, "rb") as fin, open(dest, "wb") as fout:
+            fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+        shutil.copystat(src, dest)
+        return "reflink"
+    except OSError:
+        if dest.exists():
+            dest.unlink()
+    shutil.copy2(src, dest)
+    return "copy"
+
+def read_checksum_file(path):
+    if not path.exists():
+        return None
+    parts = path.read_text().split()
+    return parts[0] if parts else None
+
+# --- CHUNK STORE ---
+
+_GEAR = None
+
+def _gear_table():
+    global _GEAR
+    if _GEAR is None:
+        import numpy as np
+        _GEAR = np.random.default_rng(0x9E3779B9).integers(0, 2**63, size=256, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    return _GEAR
+
+def _chunk_cuts(buffer, final):
+    """
+    Chunk end offsets inside `buffer`. A cut is placed where the sum of gear values over the
+    last CHUNK_WINDOW bytes has its top CHUNK_AVG_BITS bits zero, so boundaries move with the
+    content and unchanged regions produce identical chunks.
+    """
+    import numpy as np
+
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    cuts = []
+    last = 0
+    if len(data) > CHUNK_WINDOW:
+        sums = np.cumsum(_gear_table()[data], dtype=np.uint64)
+        window = sums[CHUNK_WINDOW:] - sums[:-CHUNK_WINDOW]
+        candidates = np.flatnonzero((window >> np.uint64(64 - CHUNK_AVG_BITS)) == 0) + CHUNK_WINDOW + 1
+        for cut in candidates.tolist():
+            if cut - last < CHUNK_MIN_SIZE:
+                continue
+            while cut - last > CHUNK_MAX_SIZE:
+                last += CHUNK_MAX_SIZE
+                cuts.append(last)
+            cuts.append(cut)
+            last = cut
+    while len(data) - last > CHUNK_MAX_SIZE:
+        last += CHUNK_MAX_SIZE
+        cuts.append(last)
+    if final and last < len(data):
+        cuts.append(len(data))
+    return cuts
+
+def _chunk_path(chunk_hash):
+    return CHUNK_STORE / chunk_hash[:2] / chunk_hash
+
+def store_chunked(snapshot_file, manifest_file, expected_checksum=None):
     """
-    Moves the raw snapshot AND its checksum to our organized folder.
+    Split a snapshot into content-defined chunks, write the chunks missing from the store
+    and a manifest next to the tier files. Verifies the whole-file checksum in the same pass.
+    """
+    file_digest = hashlib.sha256()
+    chunks = []
+    stats = {"chunks": 0, "chunks_new": 0, "bytes": 0, "bytes_new": 0}
+
+    def put(chunk):
+        chunk_hash = hashlib.sha256(chunk).hexdigest()
+        path = _chunk_path(chunk_hash)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # unique temp name, parallel collections may store the same chunk at once
+            tmp_path = path.with_name(f"{chunk_hash}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(chunk)
+            os.replace(tmp_path, path)
+            stats["chunks_new"] += 1
+            stats["bytes_new"] += len(chunk)
+        chunks.append([chunk_hash, len(chunk)])
+        stats["chunks"] += 1
+        stats["bytes"] += len(chunk)
+
+    pending = b""
+    with open(snapshot_file, "rb") as f:
+        while True:
+            block = f.read(IO_BLOCK_SIZE)
+            file_digest.update(block)
+            buffer = pending + block
+            final = not block
+            start = 0
+            for cut in _chunk_cuts(buffer, final):
+                put(buffer[start:cut])
+                start = cut
+            pending = buffer[start:]
+            if final:
+                break
+
+    checksum = file_digest.hexdigest()
+    if expected_checksum and checksum != expected_checksum.strip().lower():
+        raise ValueError(f"checksum mismatch for {snapshot_file.name}: expected {expected_checksum.strip()}, got {checksum}")
+
+    manifest = {"version": 1, "sha256": checksum, "size": stats["bytes"], "chunks": chunks}
+    tmp_manifest = manifest_file.with_suffix(".tmp")
+    tmp_manifest.write_text(json.dumps(manifest))
+    os.replace(tmp_manifest, manifest_file)
+    return stats
+
+def restore_chunked(manifest_file, dest):
+    """Reassemble a snapshot from its chunk manifest and verify the result."""
+    manifest = json.loads(Path(manifest_file).read_text())
+    digest = hashlib.sha256()
+    with open(dest, "wb") as fout:
+        for chunk_hash, _ in manifest["chunks"]:
+            chunk = _chunk_path(chunk_hash).read_bytes()
+            digest.update(chunk)
+            fout.write(chunk)
+    if digest.hexdigest() != manifest["sha256"]:
+        raise ValueError(f"restored file {dest} does not match manifest checksum")
+    print(f"Restored {manifest_file} to {dest} ({manifest['size']} bytes)")
+
+def gc_chunk_store():
+    """Delete chunks no longer referenced by any manifest. Runs after all collections are done."""
+    if not CHUNK_STORE.exists():
+        return 0
+    referenced = set()
+    for manifest_file in BACKUP_ROOT.glob(f"*/*{CHUNK_MANIFEST_SUFFIX}"):
+        try:
+            referenced.update(chunk_hash for chunk_hash, _ in json.loads(manifest_file.read_text())["chunks"])
+        except Exception as e:
+            # never delete chunks based on an unreadable manifest
+            print(f"Skipping chunk cleanup, unreadable manifest {manifest_file}: {e}")
+            return 0
+    removed = 0
+    for path in CHUNK_STORE.glob("*/*"):
+        if path.name not in referenced:
+            path.unlink()
+            removed += 1
+    if removed:
+        print(f"Removed {removed} unreferenced chunks")
+    return removed
+
+# --- ROTATION ---
+
+def rotate_and_clean(collection_name, raw_filename, reported_checksum=None):
+    """
+    Moves the raw snapshot to our organized folder, verifying its checksum on the way.
     Applies retention logic:
     - Always save as HOURLY
-    - If midnight -> Save copy as DAILY
-    - If Sunday midnight -> Save copy as WEEKLY
+    - If midnight -> link as DAILY
+    - If Sunday midnight -> link as WEEKLY
+    Tier files share their bytes with the hourly file (hard link / reflink).
+    With the chunk store enabled the tiers are small chunk manifests instead of full snapshots.
     """
-    
+
     # The folder inside the docker volume (mapped to host)
     col_backup_dir = BACKUP_ROOT / collection_name
     col_backup_dir.mkdir(parents=True, exist_ok=True)
-    
+
     source_file = col_backup_dir / raw_filename
     source_checksum = col_backup_dir / (raw_filename + ".checksum")
-    
+
     if not source_file.exists():
         print(f"[{collection_name}] Error: Source file {source_file} not found!")
-        return
+        return None
 
     now = datetime.datetime.now()
     timestamp = now.strftime("%Y%m%d_%H%M%S")
-    
+    expected_checksum = reported_checksum or read_checksum_file(source_checksum)
+    result = {"collection": collection_name, "tiers": []}
+
     # 1. Define Destinations
-    # We append .checksum for the checksum files
-    hourly_name = f"hourly_{timestamp}.snapshot"
-    daily_name = f"daily_{timestamp}.snapshot"
-    weekly_name = f"weekly_{timestamp}.snapshot"
-    
-    # 2. Always create Hourly
-    secure_copy(source_file, col_backup_dir / hourly_name)
-    if source_checksum.exists():
-        secure_copy(source_checksum, col_backup_dir / (hourly_name + ".checksum"))
-    
-    print(f"[{collection_name}] Created {hourly_name}")
-
-    # 3. Create Daily (At 00:00)
+    tiers = ["hourly"]
     if now.hour == 0:
-        secure_copy(source_file, col_backup_dir / daily_name)
+        tiers.append("daily")
+        if now.weekday() == 6: # Sunday is 6
+            tiers.append("weekly")
+    suffix = ".snapshot" + (CHUNK_MANIFEST_SUFFIX if CHUNK_STORE_ENABLED else "")
+    hourly_path = col_backup_dir / f"hourly_{timestamp}{suffix}"
+
+    # 2. Always create Hourly, verified against Qdrant's checksum
+    try:
+        if CHUNK_STORE_ENABLED:
+            result.update(store_chunked(source_file, hourly_path, expected_checksum))
+            result["bytes_written"] = result["bytes_new"]
+            secure_delete(source_file)
+            print(f"[{collection_name}] Stored {result['chunks']} chunks, {result['chunks_new']} new ({result['bytes_new']} of {result['bytes']} bytes written)")
+        else:
+            checksum = move_verified(source_file, hourly_path, expected_checksum)
+            (col_backup_dir / (hourly_path.name + ".checksum")).write_text(checksum)
+            result["bytes"] = hourly_path.stat().st_size
+            result["bytes_written"] = result["bytes"]
+    except ValueError as e:
+        print(f"[{collection_name}] Error: {e}")
+        return None
+    finally:
         if source_checksum.exists():
-            secure_copy(source_checksum, col_backup_dir / (daily_name + ".checksum"))
-        print(f"[{collection_name}] Created {daily_name}")
+            secure_delete(source_checksum)
+    result["tiers"].append("hourly")
+    print(f"[{collection_name}] Created {hourly_path.name}")
 
-        # 4. Create Weekly (Sunday at 00:00)
-        if now.weekday() == 6: # Sunday is 6
-            secure_copy(source_file, col_backup_dir / weekly_name)
-            if source_checksum.exists():
-                secure_copy(source_checksum, col_backup_dir / (weekly_name + ".checksum"))
-            print(f"[{collection_name}] Created {weekly_name}")
-
-    # 5. Delete the raw files from Qdrant (we have our copies now)
-    secure_delete(source_file)
-    if source_checksum.exists():
-        secure_delete(source_checksum)
-
-    # 6. Cleanup / Retention
-    # This glob will catch both .snapshot and .snapshot.checksum files automatically
+    # 3. Daily and weekly share the bytes of the hourly snapshot
+    for tier in tiers[1:]:
+        tier_path = col_backup_dir / f"{tier}_{timestamp}{suffix}"
+        method = link_tier_copy(hourly_path, tier_path)
+        hourly_checksum = col_backup_dir / (hourly_path.name + ".checksum")
+        if hourly_checksum.exists():
+            shutil.copy2(hourly_checksum, col_backup_dir / (tier_path.name + ".checksum"))
+        result["tiers"].append(tier)
+        print(f"[{collection_name}] Created {tier_path.name} ({method})")
+
+    # 4. Cleanup / Retention
+    # This glob will catch snapshots, manifests and .checksum files automatically
     cleanup_files(col_backup_dir, "hourly_", hours=3)
     cleanup_files(col_backup_dir, "daily_", days=3)
     cleanup_files(col_backup_dir, "weekly_", days=21)
+    return result
 
 def cleanup_files(directory, prefix, hours=0, days=0):
     """Deletes files starting with prefix that are older than X hours/days"""
@@ -141,9 +374,75 @@ def cleanup_files(directory, prefix, hours=0, days=0):
                 print(f"Cleaning up old backup directory: {f.name}")
                 shutil.rmtree(f)
 
+def backup_collection(collection_name):
+    started = time.monotonic()
+    raw_name, checksum = create_snapshot(collection_name)
+    if not raw_name:
+        return None
+    snapshot_seconds = time.monotonic() - started
+    result = rotate_and_clean(collection_name, raw_name, checksum)
+    if result:
+        result["snapshot_seconds"] = snapshot_seconds
+        result["duration_seconds"] = time.monotonic() - started
+    return result
+
+# --- METRICS ---
+
+def count_tier_snapshots():
+    counts = {}
+    for tier in ("hourly", "daily", "weekly"):
+        counts[tier] = sum(
+            1 for f in BACKUP_ROOT.glob(f"*/{tier}_*") if not f.name.endswith((".checksum", ".tmp"))
+        )
+    return counts
+
+def report_metrics(collections, results, run_seconds):
+    base = {"service": "qdrant"}
+    ok = [(col, r) for col, r in zip(collections, results) if r]
+    disk = shutil.disk_usage(BACKUP_ROOT)
+    now = time.time()
+    metrics = [
+        backup_metric("goodwatch_backup_success",
+            [({**base, "target": col}, 1 if r else 0) for col, r in zip(collections, results)]),
+        ("goodwatch_backup_snapshot_duration_seconds", "Time until the snapshot was written by Qdrant",
+            [({**base, "target": col}, round(r["snapshot_seconds"], 3)) for col, r in ok]),
+        backup_metric("goodwatch_backup_duration_seconds",
+            [({**base, "target": col}, round(r["duration_seconds"], 3)) for col, r in ok]),
+        ("goodwatch_backup_snapshot_bytes", "Size of the snapshot",
+            [({**base, "target": col}, r.get("bytes", 0)) for col, r in ok]),
+        backup_metric("goodwatch_backup_bytes_written",
+            [({**base, "target": col}, r.get("bytes_written", 0)) for col, r in ok]),
+        backup_metric("goodwatch_backup_throughput_megabytes_per_second",
+            [({**base, "target": col}, throughput_megabytes_per_second(r.get("bytes_written", 0), r["duration_seconds"])) for col, r in ok]),
+        backup_metric("goodwatch_backup_tier_snapshots",
+            [({**base, "tier": tier}, count) for tier, count in count_tier_snapshots().items()]),
+        backup_metric("goodwatch_backup_disk_free_bytes", [(base, disk.free)]),
+        backup_metric("goodwatch_backup_disk_total_bytes", [(base, disk.total)]),
+        ("goodwatch_backup_run_duration_seconds", "Wall time of the whole backup run",
+            [(base, round(run_seconds, 3))]),
+        backup_metric("goodwatch_backup_last_run_timestamp_seconds", [(base, int(now))]),
+    ]
+    last_success = now if ok and len(ok) == len(collections) else previous_metric_value(METRICS_TEXTFILE, "goodwatch_backup_last_success_timestamp_seconds")
+    if last_success:
+        metrics.append(backup_metric("goodwatch_backup_last_success_timestamp_seconds", [(base, int(last_success))]))
+    write_metrics_textfile(METRICS_TEXTFILE, metrics)
+
 if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "restore":
+        restore_chunked(Path(sys.argv[2]), Path(sys.argv[3]))
+        sys.exit(0)
+
+    run_started = time.monotonic()
     collections = get_collections()
-    for col in collections:
-        raw_name = create_snapshot(col)
-        if raw_name:
-            rotate_and_clean(col, raw_name)
\ No newline at end of file
+    with ThreadPoolExecutor(max_workers=max(1, SNAPSHOT_WORKERS)) as executor:
+        results = list(executor.map(backup_collection, collections))
+
+    if CHUNK_STORE_ENABLED:
+        gc_chunk_store()
+
+    report_metrics(collections, results, time.monotonic() - run_started)
+
+    failed = [col for col, result in zip(collections, results) if not result]
+    if failed:
+        print(f"Backup failed for: {', '.join(failed)}")
+        sys.exit(1)
@@ -0,0 +1,104 @@
+import logging
+import os
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Batches are limited by padded tokens (items x longest item), not by item count: 256 labels
+# of 6 tokens cost about as much as 6 overviews of 256 tokens.
+TOKEN_BUDGET = int(os.environ.get("EMBEDDING_TOKEN_BUDGET", "8192"))
+MAX_BATCH_ITEMS = int(os.environ.get("EMBEDDING_MAX_BATCH_ITEMS", "256"))
+
+# Runs one padded batch ({"input_ids", "attention_mask", "token_type_ids"} as int64 arrays),
+# returns the sentence embeddings of its rows
+BatchRunner = Callable[[Dict[str, np.ndarray]], np.ndarray]
+
+
+def _preprocess(model, texts: List[str]) -> List[str]:
+    """The text preprocessing of sentence-transformers' Transformer module (strip, optional lowercasing)."""
+    texts = [text.strip() for text in texts]
+    if getattr(model[0], "do_lower_case", False):
+        texts = [text.lower() for text in texts]
+    return texts
+
+
+def tokenize(model, texts: List[str]) -> Tuple[List[List[int]], List[int]]:
+    """
+    Tokenizes through model.tokenize, the preprocessing and truncation (max_seq_length) of
+    SentenceTransformer.encode, and returns the unpadded input ids of every text plus its
+    untruncated token count. The count is only reported, the ids are what gets embedded.
+    """
+    ids = []
+    for start in range(0, len(texts), MAX_BATCH_ITEMS):
+        features = model.tokenize(texts[start:start + MAX_BATCH_ITEMS])
+        for row_ids, row_mask in zip(features["input_ids"].tolist(), features["attention_mask"].tolist()):
+            ids.append([token for token, keep in zip(row_ids, row_mask) if keep])
+    full_ids = model.tokenizer(_preprocess(model, texts), add_special_tokens=True, truncation=False, verbose=False)["input_ids"]
+    token_counts = [max(len(full), len(row)) for full, row in zip(full_ids, ids)]
+    return ids, token_counts
+
+
+def plan_batches(lengths: List[int], token_budget: int = TOKEN_BUDGET, max_items: int = MAX_BATCH_ITEMS) -> List[List[int]]:
+    """
+    Groups input indices into batches of similar length: inputs are sorted by length and a
+    batch is closed once its padded size (items x longest) would exceed token_budget.
+    A single input longer than the budget gets a batch of its own.
+    """
+    batches = []
+    batch, batch_max = [], 0
+    for index in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+        longest = max(batch_max, lengths[index])
+        if batch and (longest * (len(batch) + 1) > token_budget or len(batch) >= max_items):
+            batches.append(batch)
+            batch, longest = [], lengths[index]
+        batch.append(index)
+        batch_max = longest
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def pad(ids: List[List[int]], pad_token_id: int) -> Dict[str, np.ndarray]:
+    longest = max(len(row) for row in ids)
+    input_ids = np.full((len(ids), longest), pad_token_id, dtype=np.int64)
+    attention_mask = np.zeros((len(ids), longest), dtype=np.int64)
+    for row, row_ids in enumerate(ids):
+        input_ids[row, :len(row_ids)] = row_ids
+        attention_mask[row, :len(row_ids)] = 1
+    return {
+        "input_ids": input_ids,
+        "attention_mask": attention_mask,
+        "token_type_ids": np.zeros_like(input_ids),
+    }
+
+
+def embed(texts: List[str], model, run_batch: BatchRunner,
+          token_budget: int = TOKEN_BUDGET) -> Tuple[np.ndarray, List[Dict]]:
+    """
+    Embeds texts in length-bucketed, token-budgeted batches and returns the embeddings in
+    input order, plus per input its token count and whether it was truncated. model is the
+    SentenceTransformer whose tokenization is used, run_batch runs its forward pass.
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32), []
+    ids, token_counts = tokenize(model, texts)
+    lengths = [len(row) for row in ids]
+    pad_token_id = model.tokenizer.pad_token_id if model.tokenizer.pad_token_id is not None else 0
+
+    embeddings = None
+    batches = plan_batches(lengths, token_budget)
+    for batch in batches:
+        batch_embeddings = run_batch(pad([ids[i] for i in batch], pad_token_id))
+        if embeddings is None:
+            embeddings = np.zeros((len(texts), batch_embeddings.shape[1]), dtype=np.float32)
+        embeddings[batch] = batch_embeddings
+
+    inputs = [
+        {"tokens": count, "truncated": count > length}
+        for count, length in zip(token_counts, lengths)
+    ]
+    padded = sum(max(lengths[i] for i in batch) * len(batch) for batch in batches)
+    logger.info(f"Embedded {len(texts)} texts in {len(batches)} batches ({sum(lengths)} tokens, {padded} with padding).")
+    return embeddings, inputs
@@ -0,0 +1,181 @@
+import inspect
+import json
+import logging
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+
+import batching
+
+logger = logging.getLogger(__name__)
+
+# Exported models are baked into the image at build time (see preload_models.py)
+ONNX_CACHE_DIR = os.environ.get("ONNX_CACHE_DIR", "/app/.cache/onnx")
+ONNX_OPSET = 17
+ONNX_MODEL_FILENAME = "model.int8.onnx"
+ONNX_META_FILENAME = "meta.json"
+TOKENIZER_INPUTS = ["input_ids", "attention_mask", "token_type_ids"]
+
+# Fixed sample for the startup self-check: short and long, plain and noisy, similar to what gets embedded
+SELF_CHECK_TEXTS = [
+    "Dark Humor",
+    "Time Loop",
+    "A lonely robot falls in love while cleaning up an abandoned Earth.",
+    "Gritty neo-noir about a disgraced detective hunting a serial killer through a rain-soaked city.",
+    "Wholesome coming-of-age comedy, summer camp, first love, friendship",
+    "Slow-burn psychological horror with an unreliable narrator and an ambiguous ending.",
+    "Epic space opera with political intrigue, desert planets, prophecy and giant sandworms.",
+    "Mockumentary sitcom following the employees of a small paper company branch office.",
+    "Bleak, Melancholic, Hopeful",
+    "A heist crew of misfits plans to rob the unrobbable casino vault on fight night, "
+    "but the plan unravels as old grudges and double crosses surface among them. "
+    "Fast-paced dialogue, stylish split screens and a jazzy score carry the film.",
+    "Documentary about the last glaciers of the Alps and the scientists who measure them every year.",
+    "K-drama romance, chaebol heir, contract marriage, slow burn",
+    "Anime, mecha, found family, war trauma, coming of age",
+    "Das Leben der Anderen: a Stasi officer surveils a playwright in 1984 East Berlin.",
+    "",
+    "!!!",
+]
+
+
+class _SentenceEmbedding(torch.nn.Module):
+    """Wraps the whole sentence-transformers pipeline (transformer, pooling, dense, normalize) for export."""
+
+    def __init__(self, model: SentenceTransformer):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids=None):
+        features = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if token_type_ids is not None:
+            features["token_type_ids"] = token_type_ids
+        return self.model(features)["sentence_embedding"]
+
+
+def model_dir(model_name: str) -> str:
+    return os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "__"))
+
+
+def export_onnx(model: SentenceTransformer, model_name: str) -> str:
+    """
+    Exports the model to ONNX with dynamic batch and sequence axes, then quantizes the
+    weights to int8 (dynamic quantization, activations stay float). Returns the model path.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    target_dir = model_dir(model_name)
+    os.makedirs(target_dir, exist_ok=True)
+    fp32_path = os.path.join(target_dir, "model.fp32.onnx")
+    int8_path = os.path.join(target_dir, ONNX_MODEL_FILENAME)
+
+    model = model.to("cpu").eval()
+    sample = model.tokenize(["export sample", "a longer export sample sentence"])
+    input_names = [name for name in TOKENIZER_INPUTS if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["sentence_embedding"] = {0: "batch"}
+
+    # the TorchScript exporter gives a graph ORT fuses better than the dynamo one, newer torch defaults to dynamo
+    exporter_kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    started = time.perf_counter()
+    with torch.no_grad():
+        torch.onnx.export(
+            _SentenceEmbedding(model),
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["sentence_embedding"],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+            do_constant_folding=True,
+            **exporter_kwargs,
+        )
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8, per_channel=True)
+    os.remove(fp32_path)
+
+    with open(os.path.join(target_dir, ONNX_META_FILENAME), "w") as f:
+        json.dump({
+            "model_name": model_name,
+            "input_names": input_names,
+            "dimension": int(model.encode(["x"], convert_to_numpy=True, show_progress_bar=False).shape[1]),
+            "max_seq_length": model.max_seq_length,
+            "opset": ONNX_OPSET,
+            "quantization": "dynamic int8 (per channel)",
+        }, f, indent=2)
+    logger.info(f"Exported {model_name} to {int8_path} in {time.perf_counter() - started:.1f}s "
+                f"({os.path.getsize(int8_path) / 1e6:.0f} MB).")
+    return int8_path
+
+
+class OnnxEmbedder:
+    """
+    Serves sentence embeddings from the int8 ONNX export through ONNX Runtime. Tokenization
+    stays with the sentence-transformers tokenizer, so inputs (truncation, special tokens)
+    are identical to the fp32 model.
+    """
+
+    def __init__(self, model: SentenceTransformer, model_name: str, intra_op_threads: int, inter_op_threads: int = 1):
+        import onnxruntime as ort
+
+        target_dir = model_dir(model_name)
+        with open(os.path.join(target_dir, ONNX_META_FILENAME)) as f:
+            self.meta = json.load(f)
+        self.tokenize = model.tokenize
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        self.session = ort.InferenceSession(
+            os.path.join(target_dir, ONNX_MODEL_FILENAME),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """Embeddings in input order. Like SentenceTransformer.encode, batches are formed from length-sorted texts to limit padding."""
+        embeddings = np.zeros((len(texts), self.meta["dimension"]), dtype=np.float32)
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        for start in range(0, len(texts), batch_size):
+            indices = order[start:start + batch_size]
+            features = self.tokenize([texts[i] for i in indices])
+            embeddings[indices] = self.run({name: features[name].numpy() for name in features})
+        return embeddings
+
+    def run(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        """Embeddings for one already tokenized and padded batch."""
+        inputs = {name: features[name].astype(np.int64) for name in self.input_names}
+        return self.session.run(None, inputs)[0]
+
+
+def self_check(reference: SentenceTransformer, embedder: OnnxEmbedder, min_cosine: float) -> Dict:
+    """
+    Cosine similarity between fp32 embeddings (SentenceTransformer.encode, like the stored vectors)
+    and int8 embeddings of SELF_CHECK_TEXTS, `passed` when the minimum reaches min_cosine. The int8
+    side goes through batching.embed, the path that serves requests.
+    """
+    started = time.perf_counter()
+    expected = reference.encode(SELF_CHECK_TEXTS, convert_to_numpy=True, show_progress_bar=False, batch_size=len(SELF_CHECK_TEXTS))
+    fp32_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual, _ = batching.embed(SELF_CHECK_TEXTS, reference, embedder.run)
+    onnx_seconds = time.perf_counter() - started
+
+    norms = np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    cosines = np.sum(expected * actual, axis=1) / np.maximum(norms, 1e-12)
+    return {
+        "passed": bool(cosines.min() >= min_cosine),
+        "min_cosine": round(float(cosines.min()), 5),
+        "mean_cosine": round(float(cosines.mean()), 5),
+        "threshold": min_cosine,
+        "samples": len(SELF_CHECK_TEXTS),
+        "fp32_seconds": round(fp32_seconds, 3),
+        "onnx_seconds": round(onnx_seconds, 3),
+    }
@@ -21,8 +21,15 @@ if not embedding_model_name:
 else:
     try:
         logger.info(f'--- Preloading sentence transformer: {embedding_model_name} ---')
-        SentenceTransformer(embedding_model_name)
+        embedding_model = SentenceTransformer(embedding_model_name)
         logger.info('--- Sentence transformer loaded successfully ---')
+
+        # Export the int8 ONNX model at build time, the server only exports at startup if this is missing
+        if os.environ.get('EMBEDDING_BACKEND') == 'onnx':
+            import onnx_backend
+            logger.info(f'--- Exporting {embedding_model_name} to ONNX (dynamic int8) ---')
+            onnx_path = onnx_backend.export_onnx(embedding_model, embedding_model_name)
+            logger.info(f'--- ONNX model written to {onnx_path} ---')
     except Exception as e:
         logger.error(f"*** ERROR: Failed to preload embedding model {embedding_model_name}: {e} ***", exc_info=True)
         # raise e # Decide if build should fail
@@ -0,0 +1,190 @@
+import gc
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A loader returns the model and its size in bytes (what counts against the memory budget)
+Loader = Callable[[], Tuple[Any, int]]
+Unloader = Callable[[Any], None]
+
+RETRY_FAILED_AFTER_S = 60
+
+
+class ModelUnavailable(Exception):
+    """The model is unknown or failed to load, endpoints answer with 503."""
+
+
+class ModelRegistry:
+    """
+    Loads models on first use and keeps them resident in LRU order within a memory budget.
+
+    - `use(name)` loads the model if needed and marks it in use, models in use are never evicted
+    - once the resident models exceed `budget_bytes`, the least recently used ones are unloaded
+      (pinned models stay), a budget of 0 disables eviction
+    - a failed load is retried at the earliest RETRY_FAILED_AFTER_S later, until then requests fail fast
+    """
+
+    def __init__(self, budget_bytes: int = 0):
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        self._specs: Dict[str, Tuple[Loader, Optional[Unloader]]] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._resident: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # least recently used first
+        self._info: Dict[str, Dict[str, Any]] = {}
+        self.pinned = set()
+
+    def register(self, name: str, loader: Loader, unloader: Optional[Unloader] = None, pinned: bool = False):
+        self._specs[name] = (loader, unloader)
+        self._load_locks[name] = threading.Lock()
+        self._info[name] = {"state": "cold", "bytes": None, "loads": 0, "load_seconds": None, "error": None, "failed_at": None}
+        if pinned:
+            self.pinned.add(name)
+
+    @contextmanager
+    def use(self, name: str):
+        """
+        usage:
+            with registry.use("llm") as llm:
+                llm.create_chat_completion(...)
+        """
+        model = self._acquire(name)
+        try:
+            yield model
+        finally:
+            self._release(name)
+
+    def get_if_loaded(self, name: str) -> Any:
+        """The resident model without loading or marking it as used, None when cold."""
+        with self._lock:
+            entry = self._resident.get(name)
+            return entry["model"] if entry else None
+
+    def _acquire(self, name: str) -> Any:
+        if name not in self._specs:
+            raise ModelUnavailable(f"Unknown model '{name}', available: {sorted(self._specs)}")
+        with self._lock:
+            if self._take(name):
+                return self._resident[name]["model"]
+
+        with self._load_locks[name]:
+            with self._lock:
+                # loaded by another request while we waited for the load lock
+                if self._take(name):
+                    return self._resident[name]["model"]
+                info = self._info[name]
+                if info["failed_at"] and time.time() - info["failed_at"] < RETRY_FAILED_AFTER_S:
+                    raise ModelUnavailable(f"Model '{name}' failed to load: {info['error']}")
+                # make room up front if the size is known from an earlier load
+                self._evict(reserve=info["bytes"] or 0)
+                info["state"] = "loading"
+
+            loader, _ = self._specs[name]
+            started = time.perf_counter()
+            try:
+                model, size = loader()
+            except Exception as e:
+                logger.error(f"Failed to load model '{name}': {e}", exc_info=True)
+                with self._lock:
+                    info.update(state="failed", error=str(e), failed_at=time.time())
+                raise ModelUnavailable(f"Model '{name}' failed to load: {e}")
+
+            with self._lock:
+                info.update(state="warm", bytes=size, error=None, failed_at=None,
+                            load_seconds=round(time.perf_counter() - started, 2), loads=info["loads"] + 1)
+                self._resident[name] = {"model": model, "users": 1, "last_used": time.time()}
+                self._evict()
+            logger.info(f"Loaded model '{name}' in {info['load_seconds']}s ({size / 2 ** 20:.0f} MB, "
+                        f"{self.resident_bytes() / 2 ** 20:.0f} MB resident).")
+            return model
+
+    def _take(self, name: str) -> bool:
+        """With the lock held: mark a resident model as used and most recent."""
+        entry = self._resident.get(name)
+        if entry is None:
+            return False
+        entry["users"] += 1
+        entry["last_used"] = time.time()
+        self._resident.move_to_end(name)
+        return True
+
+    def _release(self, name: str):
+        with self._lock:
+            entry = self._resident.get(name)
+            if entry is not None:
+                entry["users"] -= 1
+                entry["last_used"] = time.time()
+            # eviction may have been deferred while the model was in use
+            self._evict()
+
+    def _evict(self, reserve: int = 0):
+        """With the lock held: unload least recently used, idle, unpinned models until the budget fits."""
+        if not self.budget_bytes:
+            return
+        evicted = []
+        while self._resident_bytes() + reserve > self.budget_bytes:
+            idle = [name for name, entry in self._resident.items() if entry["users"] == 0 and name not in self.pinned]
+            if not idle:
+                break
+            name = idle[0]
+            entry = self._resident.pop(name)
+            self._info[name]["state"] = "cold"
+            _, unloader = self._specs[name]
+            try:
+                if unloader:
+                    unloader(entry["model"])
+            except Exception as e:
+                logger.warning(f"Error while unloading model '{name}': {e}")
+            evicted.append(name)
+        if evicted:
+            gc.collect()
+            logger.info(f"Evicted models {evicted} to stay within {self.budget_bytes / 2 ** 20:.0f} MB.")
+
+    def _resident_bytes(self) -> int:
+        return sum(self._info[name]["bytes"] or 0 for name in self._resident)
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return self._resident_bytes()
+
+    # ---- warm-up and readiness ----
+
+    def warm_up(self, names: Iterable[str]) -> threading.Thread:
+        """Loads the models one after the other in a background thread, so startup is not blocked."""
+        def run():
+            for name in names:
+                try:
+                    with self.use(name):
+                        pass
+                except ModelUnavailable as e:
+                    logger.error(f"Warm-up of '{name}' failed: {e}")
+
+        thread = threading.Thread(target=run, name="model-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def ready(self) -> bool:
+        """All pinned models are resident."""
+        with self._lock:
+            return all(name in self._resident for name in self.pinned)
+
+    def status(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "name": name,
+                    "state": info["state"],
+                    "pinned": name in self.pinned,
+                    "in_use": self._resident[name]["users"] if name in self._resident else 0,
+                    "size_mb": round(info["bytes"] / 2 ** 20) if info["bytes"] else None,
+                    "loads": info["loads"],
+                    "load_seconds": info["load_seconds"],
+                    "last_used": self._resident[name]["last_used"] if name in self._resident else None,
+                    "error": info["error"],
+                }
+                for name, info in self._info.items()
+            ]
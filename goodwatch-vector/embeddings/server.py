@@ -1,18 +1,27 @@
 import fastapi
-from fastapi import FastAPI, HTTPException, Body
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Body, Response
+from pydantic import BaseModel, Field
 from sentence_transformers import SentenceTransformer
 import torch
 import traceback
-from typing import Dict, List, Any # Added Any
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple # Added Any
+import hashlib
+import json
 import logging
 import os
+import threading
+import time
 
 # Import Llama and downloader
 from llama_cpp import Llama, LlamaGrammar # Import Llama and LlamaGrammar
 from huggingface_hub import hf_hub_download # Import downloader
 from starlette.concurrency import run_in_threadpool
 
+import batching
+import onnx_backend
+import registry
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -23,12 +32,27 @@ app = FastAPI(title="Embeddings and Generation Server (llama-cpp-python)")
 MAX_TEXT_LENGTH = 8192     # Maximum *characters* per text input for embeddings
 MAX_BATCH_SIZE = 1000      # Maximum number of texts per embedding request
 MAX_OUTPUT_TOKENS = 8192   # Default maximum new tokens for LLM generation
+MAX_DNA_BATCH_SIZE = 20    # Maximum number of titles per DNA request
+DNA_MAX_OUTPUT_TOKENS = 2048  # One DNA object is ~1.2k tokens, the grammar leaves no room for prose
+DNA_SCHEMA_PATH = os.environ.get("DNA_SCHEMA_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dna_schema.json"))
 
 # --- Model Configuration (Read from Environment - Set by docker-compose) ---
 EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL_NAME", "czesty/ea-setfit-v1-classifier")
 LLM_MODEL_REPO_ID = os.environ.get("LLM_MODEL_REPO_ID", "google/gemma-3-1b-it-qat-q4_0-gguf")
 LLM_MODEL_FILENAME = os.environ.get("LLM_MODEL_FILENAME", "gemma-3-1b-it-q4_0.gguf")
 HUGGING_FACE_HUB_TOKEN = os.environ.get("HUGGING_FACE_HUB_TOKEN") # For download
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch") # "onnx" serves the int8 ONNX export on CPU
+ONNX_MIN_COSINE = float(os.environ.get("ONNX_MIN_COSINE", "0.99")) # Self-check threshold against the fp32 model
+# Additional embedding models, comma separated, selectable with ?model=...
+EMBEDDING_MODELS = list(dict.fromkeys([EMBEDDING_MODEL_NAME] + [name.strip() for name in os.environ.get("EMBEDDING_MODELS", "").split(",") if name.strip()]))
+LLM_REGISTRY_NAME = "llm"
+LLM_CONTEXT_SIZE = 8192
+# Models are loaded on first use, least recently used ones are unloaded above the budget (0 = no limit)
+MODEL_MEMORY_BUDGET_MB = int(os.environ.get("MODEL_MEMORY_BUDGET_MB", "0"))
+# Comma separated models (embedding model names or "llm") loaded in the background at startup and never evicted
+MODEL_WARMUP = [name.strip() for name in os.environ.get("MODEL_WARMUP", "").split(",") if name.strip()]
+# Compiled grammars kept for client supplied schemas, least recently used ones are dropped beyond this
+GRAMMAR_CACHE_SIZE = max(1, int(os.environ.get("GRAMMAR_CACHE_SIZE", "32")))
 
 DEFAULT_SYSTEM_PROMPT = """
 **Objective:**
@@ -472,6 +496,16 @@ Final Check:
 * Confirm all 25 dimensional_scores are assigned an integer between 1 and 10.
 """
 
+# Structure, field names and allowed values are enforced by the grammar, the prompt only has to explain the meaning
+DNA_SYSTEM_PROMPT = """
+You are DNA-AI, a media analysis model. For the given movie or show, return one JSON object describing it.
+- fingerprint.scores: integers 0-10 (0=not present/irrelevant, 1=minimal presence, 10=defining attribute).
+- fingerprint.highlight_keys: the 4-8 most defining score keys, most defining first.
+- essence_tags: 8-10 distinct, descriptive tags ordered by importance, more detailed than a genre.
+- essence_text: 4-5 evocative sentences about the audience experience, tone and distinctive qualities, no plot summary.
+- For TV shows, describe the show's overall identity, not a single season.
+"""
+
 # --- Device Configuration & Thread Count ---
 if torch.cuda.is_available():
     embedding_device_type = "cuda"
@@ -484,53 +518,146 @@ cpu_count = os.cpu_count() or 1
 llama_threads = max(1, int(cpu_count * 0.75)) # Use 75% of cores
 logger.info(f"Using {llama_threads} threads for llama.cpp LLM ({LLM_MODEL_REPO_ID}).")
 
-# --- Model Loading ---
-models = {}
-llm_components = {} # Store Llama instance and model path
+# --- Model Loading (lazy, on first use, see registry.py) ---
+def load_onnx_backend(model: SentenceTransformer, model_name: str) -> Tuple[Optional[onnx_backend.OnnxEmbedder], Dict[str, Any]]:
+    """Quantized ONNX backend (CPU only), served only if it reproduces the fp32 embeddings."""
+    onnx_status = {"enabled": EMBEDDING_BACKEND == "onnx", "serving": False}
+    if EMBEDDING_BACKEND != "onnx" or embedding_device_type != "cpu":
+        return None, onnx_status
+    try:
+        onnx_path = os.path.join(onnx_backend.model_dir(model_name), onnx_backend.ONNX_MODEL_FILENAME)
+        if not os.path.exists(onnx_path):
+            logger.warning(f"No ONNX export found at {onnx_path} (not preloaded?), exporting now.")
+            onnx_backend.export_onnx(model, model_name)
+        onnx_embedder = onnx_backend.OnnxEmbedder(
+            model,
+            model_name,
+            intra_op_threads=int(os.environ.get("ONNX_INTRA_OP_THREADS", cpu_count)),
+            inter_op_threads=int(os.environ.get("ONNX_INTER_OP_THREADS", 1)),
+        )
+        onnx_status["self_check"] = onnx_backend.self_check(model, onnx_embedder, ONNX_MIN_COSINE)
+        if onnx_status["self_check"]["passed"]:
+            onnx_status["serving"] = True
+            logger.info(f"Serving embeddings of {model_name} from int8 ONNX model: {onnx_status['self_check']}")
+            return onnx_embedder, onnx_status
+        logger.error(f"ONNX self-check failed, refusing to serve the quantized model, using fp32: {onnx_status['self_check']}")
+    except Exception as e:
+        logger.error(f"Failed to load ONNX embedding backend, using fp32: {e}", exc_info=True)
+        onnx_status["error"] = str(e)
+    return None, onnx_status
+
+def load_embedding_model(model_name: str) -> Tuple[Dict[str, Any], int]:
+    logger.info(f"Loading embedding model: {model_name} onto device: {embedding_device_type}")
+    model = SentenceTransformer(model_name, device=embedding_device_type)
+    logger.info(f"Embedding model {model_name} loaded successfully.")
+    onnx_embedder, onnx_status = load_onnx_backend(model, model_name)
+    size = sum(p.numel() * p.element_size() for p in model.parameters())
+    if onnx_embedder is not None:
+        size += os.path.getsize(os.path.join(onnx_backend.model_dir(model_name), onnx_backend.ONNX_MODEL_FILENAME))
+    return {"model": model, "onnx": onnx_embedder, "onnx_status": onnx_status}, size
+
+def load_llm() -> Tuple[Dict[str, Any], int]:
+    # Download first (if not preloaded or cache missing), then load
+    logger.info(f"Ensuring GGUF LLM model is available: {LLM_MODEL_REPO_ID}/{LLM_MODEL_FILENAME}")
+    try:
+        # Use the cached (preloaded) file first, so the server starts without network access
+        try:
+            model_path = hf_hub_download(
+                repo_id=LLM_MODEL_REPO_ID,
+                filename=LLM_MODEL_FILENAME,
+                local_files_only=True
+            )
+        except Exception:
+            if "google/" in LLM_MODEL_REPO_ID and not HUGGING_FACE_HUB_TOKEN:
+                raise ValueError("HUGGING_FACE_HUB_TOKEN environment variable is required to download official Google models.")
+            # Download the model file using huggingface_hub, it handles caching
+            model_path = hf_hub_download(
+                repo_id=LLM_MODEL_REPO_ID,
+                filename=LLM_MODEL_FILENAME,
+                token=HUGGING_FACE_HUB_TOKEN,
+                resume_download=True
+            )
+        logger.info(f"GGUF model path: {model_path}")
+
+        # Load the model using llama_cpp.Llama
+        llm = Llama(
+            model_path=model_path,
+            n_ctx=LLM_CONTEXT_SIZE,   # Context window size
+            n_gpu_layers=0,       # Force CPU
+            n_threads=llama_threads,  # Number of CPU threads
+            verbose=False         # Set True for Llama.cpp internal logging
+        )
+        logger.info(f"llama.cpp LLM model loaded successfully from {model_path}.")
+    except Exception as e:
+        logger.error(f"Failed to download or load GGUF LLM model '{LLM_MODEL_REPO_ID}/{LLM_MODEL_FILENAME}': {e}", exc_info=True)
+        if "google/" in LLM_MODEL_REPO_ID and ('401' in str(e) or 'gated' in str(e).lower() or 'authentication' in str(e).lower()):
+             logger.error("!!! This is likely an AUTHENTICATION ERROR. Ensure token is valid and Gemma terms were accepted. !!!")
+        raise e
 
-# Load Embedding Model
-try:
-    logger.info(f"Loading embedding model: {EMBEDDING_MODEL_NAME} onto device: {embedding_device_type}")
-    models['embedding'] = SentenceTransformer(EMBEDDING_MODEL_NAME, device=embedding_device_type)
-    logger.info("Embedding model loaded successfully.")
-except Exception as e:
-    logger.error(f"Failed to load embedding model '{EMBEDDING_MODEL_NAME}': {e}", exc_info=True)
-    # raise e
+    if default_dna_schema is not None:
+        get_dna_grammar(default_dna_schema)
+    return {"llm": llm, "model_path": model_path}, os.path.getsize(model_path) + _kv_cache_bytes(llm)
+
+def _kv_cache_bytes(llm: Llama) -> int:
+    """Estimated f16 KV cache size from the GGUF metadata, 0 if the keys are missing."""
+    def value(suffix: str) -> int:
+        return next((int(v) for k, v in llm.metadata.items() if k.endswith(suffix)), 0)
+    n_head = value(".attention.head_count")
+    kv_ratio = value(".attention.head_count_kv") / n_head if n_head else 1
+    return int(2 * 2 * LLM_CONTEXT_SIZE * value(".block_count") * value(".embedding_length") * kv_ratio)
+
+def unload_llm(components: Dict[str, Any]):
+    llm = components.get("llm")
+    if llm is not None and hasattr(llm, "close"):
+        llm.close()
+
+# --- DNA Grammar (compiled once per schema, LRU cached by schema hash) ---
+llm_lock = threading.Lock() # llama.cpp contexts are not thread-safe, one generation at a time
+grammar_cache_lock = threading.Lock()
+_grammar_cache: "OrderedDict[str, LlamaGrammar]" = OrderedDict()  # least recently used first
+default_dna_schema: Optional[dict] = None
+
+def schema_hash(schema: dict) -> str:
+    canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+def get_dna_grammar(schema: dict) -> Tuple[str, LlamaGrammar]:
+    """
+    Returns (hash, grammar) for a JSON schema, compiling the GBNF grammar on first use only.
+    Schemas are client supplied, so at most GRAMMAR_CACHE_SIZE grammars are kept.
+    """
+    key = schema_hash(schema)
+    with grammar_cache_lock:
+        if key in _grammar_cache:
+            _grammar_cache.move_to_end(key)
+        else:
+            started = time.perf_counter()
+            _grammar_cache[key] = LlamaGrammar.from_json_schema(json.dumps(schema), verbose=False)
+            logger.info(f"Compiled DNA grammar {key} in {time.perf_counter() - started:.2f}s.")
+            while len(_grammar_cache) > GRAMMAR_CACHE_SIZE:
+                evicted, _ = _grammar_cache.popitem(last=False)
+                logger.info(f"Dropped DNA grammar {evicted} from the cache.")
+        return key, _grammar_cache[key]
 
-# Load LLM Model (using llama-cpp-python)
-# Download first (if not preloaded or cache missing), then load
 try:
-    logger.info(f"Ensuring GGUF LLM model is available: {LLM_MODEL_REPO_ID}/{LLM_MODEL_FILENAME}")
-    if "google/" in LLM_MODEL_REPO_ID and not HUGGING_FACE_HUB_TOKEN:
-        raise ValueError("HUGGING_FACE_HUB_TOKEN environment variable is required to download official Google models.")
-
-    # Download the model file using huggingface_hub, it handles caching
-    model_path = hf_hub_download(
-        repo_id=LLM_MODEL_REPO_ID,
-        filename=LLM_MODEL_FILENAME,
-        token=HUGGING_FACE_HUB_TOKEN,
-        resume_download=True
-    )
-    logger.info(f"GGUF model path: {model_path}")
-
-    # Load the model using llama_cpp.Llama
-    llm = Llama(
-        model_path=model_path,
-        n_ctx=8192,           # Context window size
-        n_gpu_layers=0,       # Force CPU
-        n_threads=llama_threads,  # Number of CPU threads
-        verbose=False         # Set True for Llama.cpp internal logging
-    )
-    llm_components['llm'] = llm
-    llm_components['model_path'] = model_path # Store path for reference
-    logger.info(f"llama.cpp LLM model loaded successfully from {model_path}.")
-
+    with open(DNA_SCHEMA_PATH) as f:
+        default_dna_schema = json.load(f)
 except Exception as e:
-    logger.error(f"Failed to download or load GGUF LLM model '{LLM_MODEL_REPO_ID}/{LLM_MODEL_FILENAME}': {e}", exc_info=True)
-    if "google/" in LLM_MODEL_REPO_ID and ('401' in str(e) or 'gated' in str(e).lower() or 'authentication' in str(e).lower()):
-         logger.error("!!! This is likely an AUTHENTICATION ERROR. Ensure token is valid and Gemma terms were accepted. !!!")
-    # LLM is not critical for server startup, endpoints will check availability
-    # raise e
+    logger.error(f"Failed to load DNA schema '{DNA_SCHEMA_PATH}': {e}", exc_info=True)
+
+# --- Model Registry ---
+model_registry = registry.ModelRegistry(budget_bytes=MODEL_MEMORY_BUDGET_MB * 2 ** 20)
+for embedding_model_name in EMBEDDING_MODELS:
+    model_registry.register(
+        embedding_model_name,
+        loader=lambda name=embedding_model_name: load_embedding_model(name),
+        pinned=embedding_model_name in MODEL_WARMUP,
+    )
+model_registry.register(LLM_REGISTRY_NAME, loader=load_llm, unloader=unload_llm, pinned=LLM_REGISTRY_NAME in MODEL_WARMUP)
+unknown_warmup = [name for name in MODEL_WARMUP if name not in EMBEDDING_MODELS and name != LLM_REGISTRY_NAME]
+if unknown_warmup:
+    logger.warning(f"Ignoring unknown models in MODEL_WARMUP: {unknown_warmup}")
+model_registry.warm_up([name for name in MODEL_WARMUP if name in model_registry.pinned])
 
 # --- Pydantic Models ---
 class EmbeddingInput(BaseModel):
@@ -540,42 +667,73 @@ class GenerationInput(BaseModel):
     prompt: str
     max_new_tokens: int = MAX_OUTPUT_TOKENS # Allow overriding default max tokens
 
-# --- Helper Functions ---
-def get_embedding_model():
-    if 'embedding' not in models:
-        raise HTTPException(status_code=503, detail="Embedding model is not available.")
-    return models['embedding']
+class DnaTitle(BaseModel):
+    title: str
+    year: Optional[int] = None
+    media_type: str = "movie"
+    overview: str = ""
+    id: Optional[str] = None # Returned unchanged, e.g. the tmdb id
 
-def get_llm():
-    if 'llm' not in llm_components:
-        error_detail = "LLM model is not available (failed to load during startup)."
-        raise HTTPException(status_code=503, detail=error_detail)
-    return llm_components['llm']
+class DnaGenerationInput(BaseModel):
+    titles: List[DnaTitle]
+    max_new_tokens: int = DNA_MAX_OUTPUT_TOKENS
+    temperature: float = 0.3
+    schema_: Optional[dict] = Field(None, alias="schema") # Overrides the bundled DNA schema
+
+# --- Helper Functions ---
+def resolve_embedding_model(model_name: Optional[str]) -> str:
+    if model_name is None:
+        return EMBEDDING_MODEL_NAME
+    if model_name not in EMBEDDING_MODELS:
+        raise HTTPException(status_code=400, detail=f"Unknown embedding model '{model_name}', available: {EMBEDDING_MODELS}")
+    return model_name
 
 # --- Embedding Logic ---
-def generate_single_embedding(text: str) -> List[float]:
-    """Generates embedding for a single text using the loaded embedding model."""
+def _torch_batch_runner(model: SentenceTransformer) -> batching.BatchRunner:
+    input_names = model.tokenizer.model_input_names
+    def run(features):
+        with torch.inference_mode():
+            tensors = {name: torch.from_numpy(array).to(model.device) for name, array in features.items() if name in input_names}
+            return model(tensors)["sentence_embedding"].float().cpu().numpy()
+    return run
+
+def embed_texts(texts: List[str], model_name: str = EMBEDDING_MODEL_NAME) -> Tuple[List[List[float]], List[Dict[str, Any]]]:
+    """
+    Embeds texts with the active backend in length-bucketed, token-budgeted batches.
+    Returns the embeddings in input order and per text its token count and truncation.
+    """
+    with model_registry.use(model_name) as components:
+        model = components["model"]
+        run_batch = components["onnx"].run if components["onnx"] is not None else _torch_batch_runner(model)
+        embeddings, inputs = batching.embed(texts, model, run_batch)
+    return [emb.tolist() for emb in embeddings], inputs
+
+def generate_single_embedding(text: str, model_name: str = EMBEDDING_MODEL_NAME) -> List[float]:
+    """Generates embedding for a single text using the requested embedding model."""
     try:
-        model = get_embedding_model()
-        embedding = model.encode(text, convert_to_tensor=False, show_progress_bar=False)
-        return embedding.tolist()
+        embeddings, inputs = embed_texts([text], model_name)
+        if inputs[0]["truncated"]:
+            logger.warning(f"Input text of {inputs[0]['tokens']} tokens truncated to the max sequence length of {model_name}.")
+        return embeddings[0]
     except Exception as e:
         logger.error(f"Error in generate_single_embedding: {e}", exc_info=True)
         raise e
 
-def generate_batch_embeddings(texts: List[str]) -> List[List[float]]:
-    """Generates embeddings for a batch of texts using the loaded embedding model."""
+def generate_batch_embeddings(texts: List[str], model_name: str = EMBEDDING_MODEL_NAME) -> Tuple[List[List[float]], List[Dict[str, Any]]]:
+    """Generates embeddings for a batch of texts using the requested embedding model, with per text token counts."""
     try:
-        model = get_embedding_model()
-        embeddings = model.encode(texts, convert_to_tensor=False, show_progress_bar=False, batch_size=min(len(texts), 32))
-        return [emb.tolist() for emb in embeddings]
+        return embed_texts(texts, model_name)
     except Exception as e:
         logger.error(f"Error in generate_batch_embeddings: {e}", exc_info=True)
         raise e
 
 # --- LLM Generation Logic (with Thread Pooling) ---
-def _run_llm_generation(llm: Llama, user_prompt: str, max_tokens: int): # Pass user_prompt directly
-    """Synchronous function containing the blocking llama.cpp call using chat completion."""
+def _run_llm_generation(user_prompt: str, max_tokens: int): # Pass user_prompt directly
+    """Synchronous function containing the blocking llama.cpp call using chat completion, loads the LLM if needed."""
+    with model_registry.use(LLM_REGISTRY_NAME) as llm_components:
+        return _run_llm_chat_completion(llm_components["llm"], user_prompt, max_tokens)
+
+def _run_llm_chat_completion(llm: Llama, user_prompt: str, max_tokens: int):
     try:
         # Construct messages list including the system prompt
         messages = [
@@ -584,15 +742,16 @@ def _run_llm_generation(llm: Llama, user_prompt: str, max_tokens: int): # Pass u
         ]
 
         logger.debug(f"Starting llama.cpp chat completion with max_tokens={max_tokens}, system prompt added.")
-        completion = llm.create_chat_completion(
-            messages=messages,
-            max_tokens=max_tokens,
-            temperature=0.7,
-            top_p=0.9,
-            top_k=50,
-            stop=["<end_of_turn>", "<eos>"],
-            # repetition_penalty=1.1 # Add if needed
-        )
+        with llm_lock:
+            completion = llm.create_chat_completion(
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=0.7,
+                top_p=0.9,
+                top_k=50,
+                stop=["<end_of_turn>", "<eos>"],
+                # repetition_penalty=1.1 # Add if needed
+            )
         logger.debug("llama.cpp chat completion finished.")
 
         if completion and 'choices' in completion and len(completion['choices']) > 0:
@@ -612,15 +771,12 @@ async def generate_text(prompt: str, max_new_tokens: int) -> str:
     System prompt is added internally.
     """
     try:
-        llm = get_llm() # Will raise 503 if LLM not loaded
-
         # The system prompt is now handled inside _run_llm_generation
         # We only need the user prompt here.
 
         logger.info(f"Dispatching llama.cpp generation task to thread pool (max_tokens={max_new_tokens})...")
         result = await run_in_threadpool(
             _run_llm_generation,
-            llm=llm,
             user_prompt=prompt, # Pass only the user prompt now
             max_tokens=max_new_tokens
         )
@@ -631,43 +787,118 @@ async def generate_text(prompt: str, max_new_tokens: int) -> str:
         logger.error(f"Error in generate_text async function: {e}", exc_info=True)
         raise e
 
+# --- DNA Generation Logic (grammar-constrained) ---
+def build_dna_prompt(title: DnaTitle) -> str:
+    year = f" ({title.year})" if title.year else ""
+    media_type = "TV show" if title.media_type == "tv" else "movie"
+    prompt = f"Analyze the {media_type} \"{title.title}\"{year}."
+    if title.overview:
+        prompt += f"\nOverview: {title.overview}"
+    return prompt
+
+def _run_dna_generation(titles: List[DnaTitle], grammar: LlamaGrammar, max_tokens: int, temperature: float) -> List[Dict[str, Any]]:
+    """
+    Synchronous, runs in the thread pool. Titles of a batch are generated one after the other,
+    the grammar only allows tokens that keep the output valid against the schema, so the
+    result always parses unless it was cut off by max_tokens.
+    """
+    with model_registry.use(LLM_REGISTRY_NAME) as llm_components:
+        return _generate_dna(llm_components["llm"], titles, grammar, max_tokens, temperature)
+
+def _generate_dna(llm: Llama, titles: List[DnaTitle], grammar: LlamaGrammar, max_tokens: int, temperature: float) -> List[Dict[str, Any]]:
+    results = []
+    for title in titles:
+        started = time.perf_counter()
+        result = {"id": title.id, "title": title.title, "dna": None, "error": None, "completion_tokens": 0}
+        try:
+            with llm_lock:
+                completion = llm.create_chat_completion(
+                    messages=[
+                        {"role": "system", "content": DNA_SYSTEM_PROMPT},
+                        {"role": "user", "content": build_dna_prompt(title)}
+                    ],
+                    grammar=grammar,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                )
+            choice = completion["choices"][0]
+            result["completion_tokens"] = completion.get("usage", {}).get("completion_tokens", 0)
+            if choice.get("finish_reason") == "length":
+                result["error"] = f"Output truncated at max_new_tokens={max_tokens}."
+            else:
+                result["dna"] = json.loads(choice["message"]["content"])
+        except Exception as e:
+            logger.error(f"DNA generation failed for '{title.title}': {e}", exc_info=True)
+            result["error"] = str(e)
+        result["seconds"] = round(time.perf_counter() - started, 2)
+        results.append(result)
+    return results
+
 
 # --- API Endpoints ---
 @app.get("/health")
 async def health_check():
-    """Basic health check reporting status of loaded models."""
+    """Basic health check reporting status of loaded models. Models load on first use, so cold models are fine."""
     health_status = {"status": "ok", "models_loaded": {}}
-    health_status["models_loaded"]["embedding"] = 'embedding' in models
-    health_status["models_loaded"]["llm"] = 'llm' in llm_components
-    if 'llm' not in llm_components:
-         # Add more detail if loading failed vs. just not present
-         health_status["llm_status"] = "LLM failed to load during startup or is unavailable."
+    for model_status in model_registry.status():
+        health_status["models_loaded"][model_status["name"]] = model_status["state"] == "warm"
+        if model_status["state"] == "failed":
+            health_status.setdefault("errors", {})[model_status["name"]] = model_status["error"]
+    embedding_components = model_registry.get_if_loaded(EMBEDDING_MODEL_NAME)
+    if embedding_components is not None:
+        health_status["embedding_backend"] = "onnx-int8" if embedding_components["onnx"] is not None else "torch-fp32"
+        health_status["onnx"] = embedding_components["onnx_status"]
+    health_status["dna_grammar"] = schema_hash(default_dna_schema) if default_dna_schema else None
+    health_status["grammars_cached"] = len(_grammar_cache)
     return health_status
 
+@app.get("/ready")
+async def readiness_check(response: Response):
+    """Ready (200) once all pinned models (MODEL_WARMUP) are loaded, 503 while warming up. Lists every model and its state."""
+    ready = model_registry.ready()
+    if not ready:
+        response.status_code = 503
+    return {
+        "ready": ready,
+        "memory_budget_mb": MODEL_MEMORY_BUDGET_MB or None,
+        "resident_mb": round(model_registry.resident_bytes() / 2 ** 20),
+        "models": model_registry.status(),
+    }
+
 # Kept original v2 paths for embedding compatibility
 @app.post("/v2/embedding")
-async def embedding_single_v2(input_data: EmbeddingInput):
-    """Generates an embedding for a single text input."""
+async def embedding_single_v2(input_data: EmbeddingInput, model: Optional[str] = None):
+    """Generates an embedding for a single text input, with ?model=... one of the EMBEDDING_MODELS."""
     try:
+        model_name = resolve_embedding_model(model)
         if not input_data.text:
              raise HTTPException(status_code=400, detail="Input text cannot be empty.")
         # Simple length check (optional)
         if len(input_data.text) > MAX_TEXT_LENGTH * 2:
              logger.warning(f"Input text length ({len(input_data.text)}) is very large.")
 
-        embedding = generate_single_embedding(input_data.text)
+        embedding = await run_in_threadpool(generate_single_embedding, input_data.text, model_name)
         return {"embedding": embedding}
     except HTTPException as http_ex:
         raise http_ex
+    except registry.ModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         # Avoid leaking raw exception details in production if sensitive
         logger.error(f"Error processing single embedding request: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error during embedding generation.")
 
 @app.post("/v2/embeddings")
-async def embeddings_batch_v2(texts: Dict[str, str] = Body(...)):
-    """Generates embeddings for a batch of texts provided as a JSON object (key: text)."""
+async def embeddings_batch_v2(response: Response, texts: Dict[str, str] = Body(...), report: bool = False, model: Optional[str] = None):
+    """
+    Generates embeddings for a batch of texts provided as a JSON object (key: text),
+    with ?model=... one of the EMBEDDING_MODELS.
+    Inputs over the model's max sequence length are truncated, their count is returned in the
+    X-Truncated-Inputs header. With ?report=true the response is
+    {"embeddings": {key: embedding}, "inputs": {key: {"tokens": n, "truncated": bool}}}.
+    """
     try:
+        model_name = resolve_embedding_model(model)
         if not texts:
             raise HTTPException(status_code=400, detail="Input dictionary cannot be empty.")
         if len(texts) > MAX_BATCH_SIZE:
@@ -689,12 +920,20 @@ async def embeddings_batch_v2(texts: Dict[str, str] = Body(...)):
                 logger.warning(f"Text for key '{key}' length ({len(text)}) is very large.")
             text_list.append(text)
 
-        embeddings_list = generate_batch_embeddings(text_list)
+        embeddings_list, inputs = await run_in_threadpool(generate_batch_embeddings, text_list, model_name)
         result = {key: embedding for key, embedding in zip(keys, embeddings_list)}
+        truncated = [key for key, info in zip(keys, inputs) if info["truncated"]]
+        if truncated:
+            logger.warning(f"{len(truncated)} inputs truncated to the max sequence length of {model_name}: {truncated[:10]}")
+        response.headers["X-Truncated-Inputs"] = str(len(truncated))
+        if report:
+            return {"embeddings": result, "inputs": dict(zip(keys, inputs))}
         return result
 
     except HTTPException as http_ex:
         raise http_ex
+    except registry.ModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing batch embedding request: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error during batch embedding generation.")
@@ -706,12 +945,6 @@ async def generate_llm_text_endpoint(input_data: GenerationInput):
     Generates text based on a prompt using the GGUF LLM via ctransformers,
     handling the blocking call asynchronously using a thread pool.
     """
-    # Check LLM availability early
-    try:
-        get_llm() # Will raise 503 if not available
-    except HTTPException as http_ex:
-        raise http_ex
-
     try:
         if not input_data.prompt:
             raise HTTPException(status_code=400, detail="Input prompt cannot be empty.")
@@ -727,11 +960,53 @@ async def generate_llm_text_endpoint(input_data: GenerationInput):
 
     except HTTPException as http_ex:
         raise http_ex
+    except registry.ModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Unhandled error processing generation request: {e}", exc_info=True)
         # Consider more generic error message for clients
         raise HTTPException(status_code=500, detail="Internal server error during text generation.")
 
+@app.post("/v2/dna")
+async def generate_dna_endpoint(input_data: DnaGenerationInput):
+    """
+    Generates DNA objects for a batch of titles, decoding is constrained by the GBNF grammar
+    compiled from the DNA schema, so every complete result is valid JSON for the schema.
+    Errors are reported per title, without retries.
+    """
+    if not input_data.titles:
+        raise HTTPException(status_code=400, detail="titles cannot be empty.")
+    if len(input_data.titles) > MAX_DNA_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch size exceeds the maximum limit of {MAX_DNA_BATCH_SIZE}.")
+    if input_data.max_new_tokens <= 0:
+        raise HTTPException(status_code=400, detail="max_new_tokens must be positive.")
+
+    schema = input_data.schema_ or default_dna_schema
+    if schema is None:
+        raise HTTPException(status_code=503, detail=f"DNA schema is not available ({DNA_SCHEMA_PATH}).")
+    try:
+        grammar_hash, grammar = get_dna_grammar(schema)
+    except Exception as e:
+        logger.error(f"Failed to compile DNA grammar: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=f"Schema could not be compiled to a grammar: {e}")
+
+    try:
+        logger.info(f"Dispatching DNA generation for {len(input_data.titles)} titles to thread pool (grammar {grammar_hash})...")
+        results = await run_in_threadpool(
+            _run_dna_generation,
+            titles=input_data.titles,
+            grammar=grammar,
+            max_tokens=min(input_data.max_new_tokens, MAX_OUTPUT_TOKENS),
+            temperature=input_data.temperature,
+        )
+        logger.info(f"DNA generation finished: {sum(1 for r in results if r['dna'] is not None)}/{len(results)} succeeded.")
+        return {"results": results, "grammar": grammar_hash}
+    except registry.ModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unhandled error processing DNA request: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error during DNA generation.")
+
 # --- Optional: Run directly (for testing without Docker/Uvicorn command line) ---
 # if __name__ == "__main__":
 #     import uvicorn
@@ -1,8 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Literal, Union, Dict, List
+from typing import Literal, Union, Dict, List, Optional, Tuple
+import glob
+import gzip
+import hashlib
 import os
 import json
-import subprocess
 import re
 from crate import client
 from dotenv import load_dotenv
@@ -11,8 +14,14 @@ from utils import slugify
 
 load_dotenv()
 
-BATCH_SIZE = 1000
+BATCH_SIZE = 5000
+# detail shards cover a fixed tmdb_id range, so a changed title only touches its own shard
+# (a range never holds more than the 50k urls allowed per sitemap)
+SHARD_ID_SPAN = 50_000
+SHARD_WORKERS = 4
 SITEMAP_DIR = "../public/sitemaps/"
+# next to the sitemaps it describes, not in git (see .gitignore)
+MANIFEST_PATH = os.path.join(SITEMAP_DIR, "sitemap_manifest.json")
 BASE_URL = {
     "movies": "https://goodwatch.app/movies/",
     "shows": "https://goodwatch.app/shows/",
@@ -32,6 +41,133 @@ MAIN_CATEGORIES = [
     "genres"
 ]
 
+XML_ESCAPES = {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&apos;"}
+
+
+# ===== Manifest and writing =====
+
+def load_manifest() -> Dict[str, Dict[str, str]]:
+    """Content hash and lastmod of every sitemap written by a previous run."""
+    try:
+        with open(MANIFEST_PATH, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(manifest: Dict[str, Dict[str, str]]):
+    tmp_path = f"{MANIFEST_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def write_if_changed(
+    manifest: Dict[str, Dict[str, str]],
+    filename: str,
+    content: str,
+    lastmod: str,
+    digest: Optional[str] = None,
+) -> bool:
+    """
+    Write a sitemap file (gzip for .gz names) only if its content hash changed.
+    Files are written to a temp file first and swapped in, so readers never see partial files.
+    """
+    digest = digest or content_hash(content)
+    path = os.path.join(SITEMAP_DIR, filename)
+    previous = manifest.get(filename)
+    if previous and previous.get("hash") == digest and os.path.exists(path):
+        return False
+
+    tmp_path = f"{path}.tmp"
+    data = content.encode("utf-8")
+    if filename.endswith(".gz"):
+        # mtime=0 keeps the gzip output byte-identical for identical content
+        with open(tmp_path, "wb") as raw, gzip.GzipFile(filename="", mode="wb", fileobj=raw, mtime=0) as gz:
+            gz.write(data)
+    else:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+    os.replace(tmp_path, path)
+    manifest[filename] = {"hash": digest, "lastmod": lastmod}
+    return True
+
+
+def xml_escape(text: str) -> str:
+    return re.sub(r"[&<>\"']", lambda m: XML_ESCAPES[m.group(0)], text)
+
+
+def render_urlset(urls: List[Tuple[str, Optional[str], Optional[str]]]) -> str:
+    """urls: (loc, lastmod, changefreq)"""
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">',
+    ]
+    for loc, lastmod, changefreq in urls:
+        lines.append("  <url>")
+        lines.append(f"    <loc>{xml_escape(loc)}</loc>")
+        if lastmod:
+            lines.append(f"    <lastmod>{lastmod}</lastmod>")
+        if changefreq:
+            lines.append(f"    <changefreq>{changefreq}</changefreq>")
+        lines.append("  </url>")
+    lines.append("</urlset>")
+    return "\n".join(lines) + "\n"
+
+
+def render_sitemap_index(sitemaps: List[Tuple[str, Optional[str]]]) -> str:
+    """sitemaps: (filename, lastmod)"""
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">',
+    ]
+    for filename, lastmod in sitemaps:
+        lines.append("  <sitemap>")
+        lines.append(f"    <loc>{BASE_URL['sitemaps']}{filename}</loc>")
+        if lastmod:
+            lines.append(f"    <lastmod>{lastmod}</lastmod>")
+        lines.append("  </sitemap>")
+    lines.append("</sitemapindex>")
+    return "\n".join(lines) + "\n"
+
+
+def write_static_urlset(
+    manifest: Dict[str, Dict[str, str]],
+    filename: str,
+    locs: List[str],
+    changefreq: Optional[str] = None,
+) -> bool:
+    """
+    Sitemaps without a source timestamp keep their previous lastmod as long as the urls stay the same.
+    """
+    locs_digest = content_hash("\n".join(locs))
+    previous = manifest.get(filename) or {}
+    if previous.get("locs_hash") == locs_digest and previous.get("lastmod"):
+        lastmod = previous["lastmod"]
+    else:
+        lastmod = datetime.now(timezone.utc).date().isoformat()
+    content = render_urlset([(loc, lastmod, changefreq) for loc in locs])
+    written = write_if_changed(manifest, filename, content, lastmod)
+    manifest[filename]["locs_hash"] = locs_digest
+    return written
+
+
+def to_lastmod(value) -> Optional[str]:
+    """Crate returns TIMESTAMP columns as epoch milliseconds."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        dt = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    else:
+        dt = datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+    return dt.date().isoformat()
+
+
+# ===== Categories =====
 
 def extract_subcategories_from_typescript(media_type: str, category: str) -> List[str]:
     """
@@ -50,17 +186,12 @@ def extract_subcategories_from_typescript(media_type: str, category: str) -> Lis
         camel_case = parts[0] + ''.join(p.capitalize() for p in parts[1:])
         ts_file = f"../app/ui/explore/category/{camel_case}.ts"
 
-        # Use grep to find paths in the TypeScript files
-        result = subprocess.run(
-            f"grep -E 'type:|path:' {ts_file}",
-            shell=True,
-            capture_output=True,
-            text=True
-        )
+        # Only the type and path lines are relevant
+        with open(ts_file, "r") as f:
+            lines = [line for line in f.read().splitlines() if re.search(r'type:|path:', line)]
 
         # Extract paths using regex
         paths = []
-        lines = result.stdout.splitlines()
 
         i = 0
         while i < len(lines):
@@ -95,165 +226,172 @@ def extract_subcategories_from_typescript(media_type: str, category: str) -> Lis
         return []
 
 
-def create_category_sitemaps():
+def create_category_sitemaps(manifest: Dict[str, Dict[str, str]]):
     """Create sitemaps for category pages."""
-    now = datetime.now(timezone.utc).date()
     sitemap_filename = "sitemap_categories.xml"
-    sitemap_path = os.path.join(SITEMAP_DIR, sitemap_filename)
-
-    with open(sitemap_path, "w") as sitemap_file:
-        sitemap_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-        sitemap_file.write('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
-
-        url_count = 0
-
-        # Add main category pages
-        for media_type in ["movies", "shows"]:
-            for category in MAIN_CATEGORIES:
-                sitemap_file.write("  <url>\n")
-                sitemap_file.write(f"    <loc>https://goodwatch.app/{media_type}/{category}</loc>\n")
-                sitemap_file.write(f"    <lastmod>{now}</lastmod>\n")
-                sitemap_file.write(f"    <changefreq>weekly</changefreq>\n")
-                sitemap_file.write("  </url>\n")
-                url_count += 1
-
-                # Add subcategory pages
-                subcategories = extract_subcategories_from_typescript(media_type, category)
-                for subcategory in subcategories:
-                    sitemap_file.write("  <url>\n")
-                    sitemap_file.write(f"    <loc>https://goodwatch.app/{media_type}/{category}/{subcategory}</loc>\n")
-                    sitemap_file.write(f"    <lastmod>{now}</lastmod>\n")
-                    sitemap_file.write(f"    <changefreq>weekly</changefreq>\n")
-                    sitemap_file.write("  </url>\n")
-                    url_count += 1
-
-        sitemap_file.write('</urlset>\n')
 
+    locs = []
+    for media_type in ["movies", "shows"]:
+        for category in MAIN_CATEGORIES:
+            locs.append(f"https://goodwatch.app/{media_type}/{category}")
+            for subcategory in extract_subcategories_from_typescript(media_type, category):
+                locs.append(f"https://goodwatch.app/{media_type}/{category}/{subcategory}")
+
+    written = write_static_urlset(manifest, sitemap_filename, locs, changefreq="weekly")
     return {
-        "category_url_count": url_count,
-        "sitemap_filename": sitemap_filename
+        "category_url_count": len(locs),
+        "sitemap_filename": sitemap_filename,
+        "written": written,
     }
 
 
-def create_detail_sitemaps(crate_cursor, table_name: Union[Literal["movie"], Literal["show"]]):
-    """Create sitemaps for movie and show detail pages."""
-    sitemaps = []
-    batch_data = []
-    now = datetime.now(timezone.utc).date()
+# ===== Detail pages =====
+
+def shard_filename(table_name: str, shard_index: int) -> str:
+    return f"sitemap_{table_name}_detail_{shard_index * SHARD_ID_SPAN}.xml.gz"
 
-    # Map table_name to the appropriate detail URL base
-    detail_url_key = "movie_detail" if table_name == "movie" else "show_detail"
 
-    # Count with filter
+def fetch_shard_sources(crate_cursor, table_name: str) -> Dict[int, List[int]]:
+    """
+    Per shard range: MAX(updated_at), row count and tmdb_id sum of the listed titles, in one
+    aggregation. A shard whose values match the previous run has no changed, added or removed title.
+    """
     crate_cursor.execute(
-        f"SELECT COUNT(*) FROM {table_name} WHERE {FILTER_CONDITION}"
+        f"SELECT tmdb_id / {SHARD_ID_SPAN} AS shard, MAX(updated_at), COUNT(*), SUM(tmdb_id) "
+        f"FROM {table_name} "
+        f"WHERE {FILTER_CONDITION} "
+        f"GROUP BY tmdb_id / {SHARD_ID_SPAN}"
     )
-    result = crate_cursor.fetchone()
-    total_count = result[0] if result else 0
+    return {int(shard): [max_updated_at, count, id_sum] for shard, max_updated_at, count, id_sum in crate_cursor.fetchall()}
+
 
-    for offset in range(0, total_count, BATCH_SIZE):
-        print(f"Fetching batch starting from {offset}")
+def stream_detail_rows(crate_cursor, table_name: str, shard_index: int):
+    """Keyset pagination over tmdb_id within one shard range, stable even while popularity or scores change."""
+    last_tmdb_id = shard_index * SHARD_ID_SPAN - 1
+    end_tmdb_id = (shard_index + 1) * SHARD_ID_SPAN
+    while True:
         crate_cursor.execute(
-            f"SELECT tmdb_id, title FROM {table_name} "
-            f"WHERE {FILTER_CONDITION} "
-            f"ORDER BY popularity ASC "
-            f"LIMIT {BATCH_SIZE} OFFSET {offset}"
+            f"SELECT tmdb_id, title, updated_at FROM {table_name} "
+            f"WHERE {FILTER_CONDITION} AND tmdb_id > ? AND tmdb_id < ? "
+            f"ORDER BY tmdb_id ASC "
+            f"LIMIT {BATCH_SIZE}",
+            (last_tmdb_id, end_tmdb_id),
         )
         batch = crate_cursor.fetchall()
-        batch_data.extend(batch)
-        print(f"Selected {len(batch)} {table_name}")
-
-        sitemap_filename = f"sitemap_{table_name}_detail_{offset}.xml"
-        sitemap_path = os.path.join(SITEMAP_DIR, sitemap_filename)
-
-        with open(sitemap_path, "w") as sitemap_file:
-            sitemap_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-            sitemap_file.write('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
-            for tmdb_id, title in batch:
-                encoded_title = slugify(title) if title else ""
-                sitemap_file.write("  <url>\n")
-                sitemap_file.write(f"    <loc>{BASE_URL[detail_url_key]}{tmdb_id}-{encoded_title}</loc>\n")
-                sitemap_file.write(f"    <lastmod>{now}</lastmod>\n")
-                sitemap_file.write(f"    <changefreq>weekly</changefreq>\n")
-                sitemap_file.write("  </url>\n")
-            sitemap_file.write('</urlset>\n')
-
-        sitemaps.append(sitemap_filename)
-        print(f"Processed batch {offset//BATCH_SIZE + 1}")
+        if not batch:
+            return
+        print(f"Selected {len(batch)} {table_name} after tmdb_id {last_tmdb_id}")
+        yield from batch
+        last_tmdb_id = batch[-1][0]
+
+
+def build_detail_shard(manifest, table_name: str, shard_index: int, rows: list) -> Tuple[str, Optional[str], bool]:
+    detail_url_key = "movie_detail" if table_name == "movie" else "show_detail"
+    urls = []
+    lastmods = []
+    for tmdb_id, title, updated_at in rows:
+        encoded_title = slugify(title) if title else ""
+        lastmod = to_lastmod(updated_at)
+        if lastmod:
+            lastmods.append(lastmod)
+        urls.append((f"{BASE_URL[detail_url_key]}{tmdb_id}-{encoded_title}", lastmod, "weekly"))
+
+    sitemap_filename = shard_filename(table_name, shard_index)
+    shard_lastmod = max(lastmods) if lastmods else None
+    written = write_if_changed(manifest, sitemap_filename, render_urlset(urls), shard_lastmod or "")
+    return sitemap_filename, shard_lastmod, written
+
+
+def remove_stale_shards(manifest, table_name: str, current: List[str]) -> int:
+    """Drop shards whose tmdb_id range became empty, and the old offset-based files."""
+    removed = 0
+    for path in glob.glob(os.path.join(SITEMAP_DIR, f"sitemap_{table_name}_detail_*.xml*")):
+        filename = os.path.basename(path)
+        if filename not in current:
+            os.remove(path)
+            manifest.pop(filename, None)
+            removed += 1
+    return removed
+
+
+def create_detail_sitemaps(
+    crate_cursor,
+    table_name: Union[Literal["movie"], Literal["show"]],
+    manifest: Dict[str, Dict[str, str]],
+):
+    """
+    Create sitemaps for movie and show detail pages. Only shards whose source values
+    (see fetch_shard_sources) changed since the last run are read and rendered.
+    """
+    shard_sources = fetch_shard_sources(crate_cursor, table_name)
+    total_url_count = sum(count for _, count, _ in shard_sources.values())
+
+    with ThreadPoolExecutor(max_workers=SHARD_WORKERS) as executor:
+        pending: List[Tuple[int, object]] = []
+        for shard_index in sorted(shard_sources):
+            filename = shard_filename(table_name, shard_index)
+            previous = manifest.get(filename) or {}
+            if previous.get("source") == shard_sources[shard_index] and os.path.exists(os.path.join(SITEMAP_DIR, filename)):
+                pending.append((shard_index, (filename, previous.get("lastmod") or None, False)))
+                continue
+            rows = list(stream_detail_rows(crate_cursor, table_name, shard_index))
+            pending.append((shard_index, executor.submit(build_detail_shard, manifest, table_name, shard_index, rows)))
+
+        shards: List[Tuple[str, Optional[str], bool]] = []
+        for shard_index, shard in pending:
+            if not isinstance(shard, tuple):
+                shard = shard.result()
+                manifest[shard[0]]["source"] = shard_sources[shard_index]
+            shards.append(shard)
+
+    removed = remove_stale_shards(manifest, table_name, [filename for filename, _, _ in shards])
 
     # Create sitemap index for this table
     sitemap_index_filename = f"sitemap_index_{table_name}_detail.xml"
-    sitemap_index_path = os.path.join(SITEMAP_DIR, sitemap_index_filename)
-    with open(sitemap_index_path, "w") as index_file:
-        index_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-        index_file.write('<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
-        for sitemap in sitemaps:
-            index_file.write("  <sitemap>\n")
-            index_file.write(f"    <loc>{BASE_URL['sitemaps']}{sitemap}</loc>\n")
-            index_file.write(f"    <lastmod>{now}</lastmod>\n")
-            index_file.write("  </sitemap>\n")
-        index_file.write('</sitemapindex>\n')
+    index_content = render_sitemap_index([(filename, lastmod) for filename, lastmod, _ in shards])
+    index_lastmod = max((lastmod for _, lastmod, _ in shards if lastmod), default="")
+    write_if_changed(manifest, sitemap_index_filename, index_content, index_lastmod)
 
     return {
-        "total_sitemap_count": len(sitemaps),
-        "total_url_count": len(batch_data),
+        "total_sitemap_count": len(shards),
+        "written_sitemap_count": sum(1 for _, _, written in shards if written),
+        "removed_sitemap_count": removed,
+        "total_url_count": total_url_count,
     }
 
 
-def create_landing_sitemaps():
+# ===== Landing pages and master index =====
+
+def create_landing_sitemaps(manifest: Dict[str, Dict[str, str]]):
     """Create sitemaps for main landing pages."""
-    now = datetime.now(timezone.utc).date()
     static_routes = [
         "/", "/taste/quiz", "/movies", "/shows", "/discover",
         "/sign-up", "/sign-in", "/forgot-password", "/how-it-works", "/about", "/disclaimer", "/privacy"
     ]
     sitemap_filename = "sitemap_static.xml"
-    sitemap_path = os.path.join(SITEMAP_DIR, sitemap_filename)
-    with open(sitemap_path, "w") as sitemap_file:
-        sitemap_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-        sitemap_file.write('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
-        for route in static_routes:
-            sitemap_file.write("  <url>\n")
-            sitemap_file.write(f"    <loc>https://goodwatch.app{route}</loc>\n")
-            sitemap_file.write(f"    <lastmod>{now}</lastmod>\n")
-            sitemap_file.write("  </url>\n")
-        sitemap_file.write('</urlset>\n')
+    written = write_static_urlset(manifest, sitemap_filename, [f"https://goodwatch.app{route}" for route in static_routes])
     return {
         "static_url_count": len(static_routes),
+        "written": written,
     }
 
 
-def create_master_sitemap_index():
+def create_master_sitemap_index(manifest: Dict[str, Dict[str, str]]):
     """Create a master sitemap index that links to all other sitemap files."""
-    now = datetime.now(timezone.utc).date()
-    sitemap_files = []
-
-    # Add static sitemap
-    sitemap_files.append("sitemap_static.xml")
-
-    # Add category sitemap
-    sitemap_files.append("sitemap_categories.xml")
-
-    # Add detail page indexes
-    sitemap_files.append("sitemap_index_movie_detail.xml")
-    sitemap_files.append("sitemap_index_show_detail.xml")
-
-    # Create master index
-    master_index_filename = "sitemap.xml"
-    master_index_path = os.path.join(SITEMAP_DIR, master_index_filename)
-
-    with open(master_index_path, "w") as index_file:
-        index_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-        index_file.write('<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
-        for sitemap in sitemap_files:
-            index_file.write("  <sitemap>\n")
-            index_file.write(f"    <loc>{BASE_URL['sitemaps']}{sitemap}</loc>\n")
-            index_file.write(f"    <lastmod>{now}</lastmod>\n")
-            index_file.write("  </sitemap>\n")
-        index_file.write('</sitemapindex>\n')
+    sitemap_files = [
+        "sitemap_static.xml",
+        "sitemap_categories.xml",
+        "sitemap_index_movie_detail.xml",
+        "sitemap_index_show_detail.xml",
+    ]
+    content = render_sitemap_index(
+        [(filename, (manifest.get(filename) or {}).get("lastmod") or None) for filename in sitemap_files]
+    )
+    written = write_if_changed(manifest, "sitemap.xml", content, datetime.now(timezone.utc).date().isoformat())
 
     return {
         "master_index_created": True,
+        "written": written,
         "sitemap_count": len(sitemap_files)
     }
 
@@ -265,10 +403,10 @@ def init_crate():
     port = os.getenv("CRATE_PORT", "4200")
     user = os.getenv("CRATE_USER", "")
     password = os.getenv("CRATE_PASS", "")
-    
+
     if not hosts or not hosts[0]:
         raise ValueError("CRATE_HOSTS environment variable is not set")
-    
+
     connection_string = f"http://{user}:{password}@{hosts[0]}:{port}"
     connection = client.connect(connection_string)
     print("Successfully initialized CrateDB")
@@ -281,26 +419,29 @@ if __name__ == "__main__":
 
     # Ensure the sitemap directory exists
     os.makedirs(SITEMAP_DIR, exist_ok=True)
+    manifest = load_manifest()
 
     # Generate sitemaps for movie detail pages
-    movies_result = create_detail_sitemaps(crate_cursor, table_name="movie")
+    movies_result = create_detail_sitemaps(crate_cursor, table_name="movie", manifest=manifest)
     print(f"Movies Detail Sitemap Result: {movies_result}")
 
     # Generate sitemaps for show detail pages
-    show_result = create_detail_sitemaps(crate_cursor, table_name="show")
+    show_result = create_detail_sitemaps(crate_cursor, table_name="show", manifest=manifest)
     print(f"Show Detail Sitemap Result: {show_result}")
 
     # Generate sitemap for categories and subcategories
-    category_result = create_category_sitemaps()
+    category_result = create_category_sitemaps(manifest)
     print(f"Category Sitemap Result: {category_result}")
 
     # Generate sitemap for static navigation
-    static_result = create_landing_sitemaps()
+    static_result = create_landing_sitemaps(manifest)
     print(f"Static Sitemap Result: {static_result}")
 
     # Create master sitemap index
-    master_result = create_master_sitemap_index()
+    master_result = create_master_sitemap_index(manifest)
     print(f"Master Sitemap Index Result: {master_result}")
 
+    save_manifest(manifest)
+
     crate_cursor.close()
-    crate_connection.close()
\ No newline at end of file
+    crate_connection.close()